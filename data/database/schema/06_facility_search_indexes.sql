@@ -0,0 +1,12 @@
+-- Facility search indexes
+-- Trigram GIN indexes let search_facilities' LOWER(...) LIKE '%term%' and
+-- similarity (%) predicates use an index instead of scanning buildings/portfolios.
+-- The last_updated indexes serve the agent's incremental facility index refresh.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_buildings_location_trgm ON buildings USING GIN (LOWER(location) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_portfolios_company_trgm ON portfolios USING GIN (LOWER(company_name) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_buildings_last_updated ON buildings(last_updated);
+CREATE INDEX IF NOT EXISTS idx_portfolios_last_updated ON portfolios(last_updated);
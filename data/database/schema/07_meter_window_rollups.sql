@@ -0,0 +1,25 @@
+-- Meter window rollups
+-- Pre-aggregated per-meter and per-building windows written by the streaming
+-- window aggregator (redaptive.streaming.windowing.RollupTableSink), so dashboards
+-- and agents read 1-minute, 15-minute and hourly rollups instead of raw readings.
+-- Rows are upserted: a re-emitted window adds to its counts and sums.
+
+CREATE TABLE IF NOT EXISTS meter_window_rollups (
+    scope VARCHAR(20) NOT NULL CHECK (scope IN ('meter', 'building')),
+    entity_id VARCHAR(50) NOT NULL, -- meter_id or building_id, depending on scope
+    unit VARCHAR(20) NOT NULL,
+    window_seconds INTEGER NOT NULL,
+    slide_seconds INTEGER NOT NULL, -- equals window_seconds for tumbling windows
+    window_start TIMESTAMP NOT NULL,
+    window_end TIMESTAMP NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum DOUBLE PRECISION NOT NULL,
+    value_min DOUBLE PRECISION NOT NULL,
+    value_max DOUBLE PRECISION NOT NULL,
+    value_avg DOUBLE PRECISION GENERATED ALWAYS AS (value_sum / NULLIF(reading_count, 0)) STORED,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (scope, entity_id, unit, window_seconds, slide_seconds, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_meter_window_rollups_window
+    ON meter_window_rollups (window_seconds, window_start);
@@ -0,0 +1,19 @@
+-- Stream archive
+-- Entries trimmed from Redis streams by the retention trimmer
+-- (redaptive.streaming.retention.PostgresStreamArchive), kept for audits and
+-- backfills after they age out of Redis. Re-archived entries are ignored.
+
+CREATE TABLE IF NOT EXISTS stream_archive (
+    stream_name VARCHAR(100) NOT NULL,
+    entry_id VARCHAR(40) NOT NULL, -- Redis entry id (<millis>-<seq>)
+    message_id VARCHAR(100) NOT NULL,
+    message_type VARCHAR(50) NOT NULL,
+    source VARCHAR(100),
+    published_at TIMESTAMP NOT NULL,
+    message JSONB NOT NULL, -- full StreamMessage, as StreamMessage.to_json()
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (stream_name, entry_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stream_archive_published
+    ON stream_archive (stream_name, published_at);
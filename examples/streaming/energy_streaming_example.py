@@ -62,6 +62,9 @@ async def simulate_meter_data_producer(stream_manager: EnergyStreamManager,
             time_factor = 1.0 + (0.3 * (hour - 12) / 12)  # Peak during day
             
             value = base_value * (1 + variance) * time_factor
+            # Occasional spikes for the streaming anomaly detector to catch
+            if random.random() < 0.005:
+                value *= 3
             
             # Create meter reading
             reading = MeterReading(
@@ -92,45 +95,6 @@ async def simulate_meter_data_producer(stream_manager: EnergyStreamManager,
     print(f"📊 Simulation complete: {message_count} messages produced")
 
 
-async def simulate_anomaly_detection(stream_manager: EnergyStreamManager):
-    """Simulate anomaly detection and alerting."""
-    print("🚨 Starting anomaly detection simulation...")
-    
-    # Simulate finding anomalies periodically
-    for i in range(5):
-        await asyncio.sleep(10)  # Wait 10 seconds between anomalies
-        
-        # Generate anomaly
-        anomaly_data = {
-            "type": "consumption_spike",
-            "meter_id": f"meter_{random.randint(0, 99):04d}",
-            "building_id": f"building_{random.randint(0, 9):03d}",
-            "severity": random.choice(["low", "medium", "high"]),
-            "description": f"Consumption spike detected at {datetime.now().strftime('%H:%M:%S')}",
-            "threshold_exceeded": random.uniform(1.5, 3.0),
-            "recommended_action": "Investigate equipment status"
-        }
-        
-        # Publish anomaly
-        success = await stream_manager.publish_anomaly(anomaly_data)
-        if success:
-            print(f"🔍 Anomaly detected: {anomaly_data['description']}")
-        
-        # Generate alert if high severity
-        if anomaly_data["severity"] == "high":
-            alert_data = {
-                "type": "critical_anomaly",
-                "meter_id": anomaly_data["meter_id"],
-                "building_id": anomaly_data["building_id"],
-                "message": f"Critical anomaly in {anomaly_data['meter_id']}",
-                "priority": "high",
-                "created_at": datetime.now().isoformat()
-            }
-            
-            await stream_manager.publish_alert(alert_data)
-            print(f"🚨 High priority alert sent for {anomaly_data['meter_id']}")
-
-
 async def demonstrate_streaming_processing():
     """Main demonstration of streaming processing."""
     print("🔋 Redaptive Energy Streaming Demo")
@@ -162,6 +126,10 @@ async def demonstrate_streaming_processing():
             print("❌ Failed to setup energy streams")
             return
         
+        # Detect anomalies inline as meter readings are consumed; baselines are
+        # checkpointed so a restarted consumer keeps its per-meter history
+        stream_manager.enable_anomaly_detection(checkpoint_path="/tmp/redaptive_anomaly_checkpoint.json")
+        
         # Start consumers
         print("👥 Starting stream consumers...")
         success = await stream_manager.start_energy_consumers()
@@ -172,14 +140,9 @@ async def demonstrate_streaming_processing():
         print("✅ Stream processing infrastructure ready!")
         print()
         
-        # Start data production and anomaly detection
+        # Start data production; consumers publish detected anomalies and alerts
         print("🚀 Starting data production and processing...")
-        
-        # Run producer and anomaly detector concurrently
-        await asyncio.gather(
-            simulate_meter_data_producer(stream_manager, num_meters=50, duration_seconds=30),
-            simulate_anomaly_detection(stream_manager)
-        )
+        await simulate_meter_data_producer(stream_manager, num_meters=50, duration_seconds=30)
         
         # Wait a bit for processing to complete
         await asyncio.sleep(5)
@@ -98,6 +98,30 @@ run_sql_scripts() {
         exit 1
     fi
     
+    # Search indexes (pg_trgm); the agents fall back to LIKE scans if the extension is unavailable
+    if [ -f "$DATA_DIR/schema/06_facility_search_indexes.sql" ]; then
+        print_status "Creating facility search indexes..."
+        if psql -h "$DB_HOST_ENERGY" -p "$DB_PORT_ENERGY" -U "$DB_ADMIN_ENERGY_USER" -d "$DB_NAME_ENERGY" -f "$DATA_DIR/schema/06_facility_search_indexes.sql"; then
+            print_success "Facility search indexes created"
+        else
+            print_warning "Could not create facility search indexes (pg_trgm unavailable?)"
+        fi
+    fi
+    
+    # Window rollups written by the streaming aggregator
+    if [ -f "$DATA_DIR/schema/07_meter_window_rollups.sql" ]; then
+        print_status "Creating meter window rollup table..."
+        psql -h "$DB_HOST_ENERGY" -p "$DB_PORT_ENERGY" -U "$DB_ADMIN_ENERGY_USER" -d "$DB_NAME_ENERGY" -f "$DATA_DIR/schema/07_meter_window_rollups.sql"
+        print_success "Meter window rollup table created"
+    fi
+    
+    # Archive of entries trimmed from Redis streams by the retention trimmer
+    if [ -f "$DATA_DIR/schema/08_stream_archive.sql" ]; then
+        print_status "Creating stream archive table..."
+        psql -h "$DB_HOST_ENERGY" -p "$DB_PORT_ENERGY" -U "$DB_ADMIN_ENERGY_USER" -d "$DB_NAME_ENERGY" -f "$DATA_DIR/schema/08_stream_archive.sql"
+        print_success "Stream archive table created"
+    fi
+    
     # Insert sample data
     for seed_file in "$DATA_DIR/seed"/04_redaptive_sample_data*.sql; do
         if [ -f "$seed_file" ]; then
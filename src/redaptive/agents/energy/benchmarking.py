@@ -0,0 +1,339 @@
+"""
+Precomputed benchmark percentile index for the Portfolio Intelligence Agent.
+
+Energy use intensity (EUI) and cost-per-sqft distributions are summarized into
+small percentile tables keyed by building type, location (ASHRAE climate zone
+where known, otherwise census region) and size bucket.
+Ranking a portfolio is then a vectorized lookup of each building's annual
+intensity against its peer-group row instead of a scan of usage history.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ALL = "all"
+METRICS = ("energy_use_intensity", "cost_per_sqft")
+SIZE_BUCKETS = (
+    (0, "small"),            # < 25k sqft
+    (25000, "medium"),       # 25k - 100k sqft
+    (100000, "large"),       # 100k - 500k sqft
+    (500000, "very_large")   # >= 500k sqft
+)
+# benchmark_data types that "industry" comparisons draw on, in order of preference
+INDUSTRY_BENCHMARK_TYPES = ("industry", "cbecs", "boma", "ashrae")
+
+# US Census regions, matching the region labels used in benchmark_data
+STATE_REGIONS = {
+    **dict.fromkeys(["CT", "ME", "MA", "NH", "RI", "VT", "NJ", "NY", "PA"], "Northeast"),
+    **dict.fromkeys(["IL", "IN", "MI", "OH", "WI", "IA", "KS", "MN", "MO", "NE", "ND", "SD"], "Midwest"),
+    **dict.fromkeys(["DE", "DC", "FL", "GA", "MD", "NC", "SC", "VA", "WV", "AL", "KY", "MS",
+                     "TN", "AR", "LA", "OK", "TX"], "South"),
+    **dict.fromkeys(["AZ", "CO", "ID", "MT", "NV", "NM", "UT", "WY", "AK", "CA", "HI", "OR", "WA"], "West")
+}
+
+
+def region_for_location(location: Optional[str]) -> str:
+    """Map a 'City, ST' location to its census region."""
+    if not location:
+        return ALL
+    state = location.rsplit(",", 1)[-1].strip().upper()[:2]
+    return STATE_REGIONS.get(state, ALL)
+
+
+def size_bucket(floor_area: Optional[float]) -> str:
+    """Map floor area in sqft to a size bucket label."""
+    label = SIZE_BUCKETS[0][1]
+    for lower_bound, bucket in SIZE_BUCKETS:
+        if floor_area is not None and float(floor_area) >= lower_bound:
+            label = bucket
+    return label
+
+
+def size_bucket_for_range(floor_area_min: Optional[float], floor_area_max: Optional[float]) -> str:
+    """Map a benchmark's floor-area range to the size bucket it covers, or "all" if it spans several."""
+    if floor_area_min is None and floor_area_max is None:
+        return ALL
+    low = size_bucket(floor_area_min)
+    high = SIZE_BUCKETS[-1][1]
+    if floor_area_max is not None:
+        # The upper bound is exclusive, so a 25k sqft maximum stays within "small"
+        below = [bucket for lower_bound, bucket in SIZE_BUCKETS if lower_bound < float(floor_area_max)]
+        high = below[-1] if below else SIZE_BUCKETS[0][1]
+    return low if low == high else ALL
+
+
+def _group_candidates(record: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+    """Groups a building belongs to, most specific first.
+
+    The location slot holds the building's climate zone, then its census region,
+    then the ``"all"`` wildcard; each is tried with the size bucket before all sizes.
+    """
+    kind, bucket = record["building_type"], record["size_bucket"]
+    locations = []
+    for location in (record.get("climate_zone"), record["region"], ALL):
+        if location and location not in locations:
+            locations.append(location)
+    candidates = []
+    for location in locations:
+        for key in ((kind, location, bucket), (kind, location, ALL)):
+            if key not in candidates:
+                candidates.append(key)
+    candidates.append((ALL, ALL, ALL))
+    return candidates
+
+
+def _fill_percentile_grid(known: Dict[int, float]) -> "np.ndarray":
+    """Expand published percentile points into a full 0-100 grid.
+
+    Points between published percentiles are interpolated linearly; the tails
+    extend the slope of the outermost segment and are clamped at zero.
+    """
+    points = np.array(sorted(known), dtype=float)
+    values = np.array([known[int(point)] for point in points], dtype=float)
+    grid = np.arange(101, dtype=float)
+    if len(points) == 1:
+        return np.full(101, values[0])
+
+    table = np.interp(grid, points, values)
+    low_slope = (values[1] - values[0]) / (points[1] - points[0])
+    high_slope = (values[-1] - values[-2]) / (points[-1] - points[-2])
+    table = np.where(grid < points[0], values[0] - low_slope * (points[0] - grid), table)
+    table = np.where(grid > points[-1], values[-1] + high_slope * (grid - points[-1]), table)
+    return np.maximum(table, 0.0)
+
+
+def _rounded(value: float, digits: int) -> Optional[float]:
+    """Round a numpy scalar, mapping NaN (no benchmark) to None."""
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+class BenchmarkIndex:
+    """Percentile tables for peer and published benchmarks, refreshed on a TTL.
+
+    Each source ("peer" for the platform's own buildings, otherwise the
+    benchmark_data ``benchmark_type`` such as "energy_star" or "cbecs") holds one
+    101-point percentile row per metric and group. Groups are (building_type,
+    location, size_bucket) with ``"all"`` wildcards, so a building with too few
+    peers falls back to a coarser group.
+    """
+
+    def __init__(self, refresh_interval: float = 86400.0, min_sample_size: int = 5):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy is required for BenchmarkIndex. Install with: pip install numpy")
+
+        self.refresh_interval = refresh_interval
+        self.min_sample_size = min_sample_size
+        self.refreshed_at: Optional[float] = None
+        self.groups: Dict[str, Dict[Tuple[str, str, str], int]] = {"peer": {}}
+        self.tables: Dict[str, Dict[str, "np.ndarray"]] = {"peer": {metric: np.zeros((0, 101)) for metric in METRICS}}
+        self.sample_sizes: Dict[str, "np.ndarray"] = {"peer": np.zeros(0, dtype=np.int64)}
+        # Latest annual intensities per building, captured during refresh
+        self.buildings: Dict[str, Dict[str, Any]] = {}
+
+    def is_stale(self) -> bool:
+        """Check whether the index needs a refresh."""
+        return self.refreshed_at is None or time.time() - self.refreshed_at >= self.refresh_interval
+
+    def refresh(self, building_rows: Iterable[Dict[str, Any]],
+                reference_rows: Iterable[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """Rebuild the index from building annual totals and published benchmarks.
+
+        Args:
+            building_rows: Rows with building_id, building_type, location, floor_area,
+                annual_kwh, annual_cost and optionally climate_zone
+            reference_rows: benchmark_data rows, newest first; each benchmark_type
+                becomes its own source
+
+        Returns:
+            Refresh summary
+        """
+        self.buildings = {}
+        for row in building_rows:
+            floor_area = float(row.get("floor_area") or 0)
+            if floor_area <= 0 or row.get("annual_kwh") is None:
+                continue
+            self.buildings[row["building_id"]] = {
+                "building_id": row["building_id"],
+                "portfolio_id": row.get("portfolio_id"),
+                "building_type": row["building_type"],
+                "climate_zone": (row.get("climate_zone") or "").strip().upper() or None,
+                "region": region_for_location(row.get("location")),
+                "size_bucket": size_bucket(floor_area),
+                "floor_area": floor_area,
+                "energy_use_intensity": float(row["annual_kwh"]) / floor_area,
+                "cost_per_sqft": float(row.get("annual_cost") or 0) / floor_area
+            }
+
+        self._build_peer_tables()
+        self._build_reference_tables(reference_rows)
+        self.refreshed_at = time.time()
+
+        return {
+            "buildings_indexed": len(self.buildings),
+            "peer_groups": len(self.groups["peer"]),
+            "reference_groups": {source: len(groups) for source, groups in self.groups.items() if source != "peer"}
+        }
+
+    def reference_source(self, benchmark_type: str) -> str:
+        """Resolve a requested comparison to the index source it ranks against.
+
+        "custom" uses peer tables and "industry" uses the first loaded type in
+        INDUSTRY_BENCHMARK_TYPES; anything else names a benchmark_data type.
+        """
+        if benchmark_type == "custom":
+            return "peer"
+        if benchmark_type == "industry":
+            for candidate in INDUSTRY_BENCHMARK_TYPES:
+                if self.groups.get(candidate):
+                    return candidate
+        return benchmark_type
+
+    def _build_peer_tables(self):
+        """Compute percentile rows for every peer group with enough buildings."""
+        records = list(self.buildings.values())
+        members: Dict[Tuple[str, str, str], List[int]] = {}
+        for position, record in enumerate(records):
+            for key in _group_candidates(record):
+                members.setdefault(key, []).append(position)
+
+        keys = [key for key, positions in members.items() if len(positions) >= self.min_sample_size]
+        self.groups["peer"] = {key: row for row, key in enumerate(keys)}
+        self.sample_sizes["peer"] = np.array([len(members[key]) for key in keys], dtype=np.int64)
+        for metric in METRICS:
+            values = np.array([record[metric] for record in records], dtype=float)
+            rows = [np.percentile(values[members[key]], np.arange(101)) for key in keys]
+            self.tables["peer"][metric] = np.array(rows) if rows else np.zeros((0, 101))
+
+    def _build_reference_tables(self, reference_rows: Iterable[Dict[str, Any]]):
+        """Expand published benchmark percentiles into full percentile rows, one source per benchmark_type."""
+        keys: Dict[str, List[Tuple[str, str, str]]] = {}
+        sizes: Dict[str, List[int]] = {}
+        tables: Dict[str, Dict[str, List["np.ndarray"]]] = {}
+        for row in reference_rows:
+            known = {
+                percentile: float(row[f"percentile_{percentile}"])
+                for percentile in (10, 25, 50, 75, 90)
+                if row.get(f"percentile_{percentile}") is not None
+            }
+            median = row.get("energy_use_intensity")
+            if median is not None:
+                known.setdefault(50, float(median))
+            if not known:
+                continue
+
+            source = str(row.get("benchmark_type") or "reference").lower()
+            region = row.get("region") or ALL
+            location = (row.get("climate_zone") or "").strip().upper() or (ALL if region == "National" else region)
+            key = (row["building_type"], location, size_bucket_for_range(row.get("floor_area_min"), row.get("floor_area_max")))
+            if key in keys.get(source, ()):
+                continue  # first row wins within a type; rows are loaded newest first
+
+            eui_grid = _fill_percentile_grid(known)
+            # Published percentiles are for EUI; cost is scaled by the median cost/EUI ratio
+            cost_median = row.get("energy_cost_intensity", row.get("cost_per_sqft"))
+            cost_ratio = float(cost_median) / known[50] if cost_median is not None and known.get(50) else 0.0
+
+            keys.setdefault(source, []).append(key)
+            sizes.setdefault(source, []).append(int(row.get("sample_size") or 0))
+            source_tables = tables.setdefault(source, {metric: [] for metric in METRICS})
+            source_tables["energy_use_intensity"].append(eui_grid)
+            source_tables["cost_per_sqft"].append(eui_grid * cost_ratio if cost_ratio else np.full(101, np.nan))
+
+        for source in [source for source in self.groups if source != "peer"]:
+            del self.groups[source], self.tables[source], self.sample_sizes[source]
+        for source, source_keys in keys.items():
+            self.groups[source] = {key: row for row, key in enumerate(source_keys)}
+            self.sample_sizes[source] = np.array(sizes[source], dtype=np.int64)
+            self.tables[source] = {metric: np.array(tables[source][metric]) for metric in METRICS}
+
+    def _resolve_groups(self, source: str, records: List[Dict[str, Any]]) -> Tuple["np.ndarray", List[Optional[Tuple]]]:
+        """Find each record's most specific group in a source, or -1."""
+        groups = self.groups.get(source, {})
+        indices, keys = [], []
+        for record in records:
+            match = None
+            for key in _group_candidates(record):
+                if key in groups:
+                    match = key
+                    break
+            indices.append(groups[match] if match else -1)
+            keys.append(match)
+        return np.array(indices, dtype=np.int64), keys
+
+    @staticmethod
+    def _percentile_position(table: "np.ndarray", values: "np.ndarray") -> "np.ndarray":
+        """Vectorized position (0-100) of each value within its own percentile row."""
+        below = (table <= values[:, None]).sum(axis=1)
+        lower_index = np.clip(below - 1, 0, 99)
+        rows = np.arange(len(values))
+        lower = table[rows, lower_index]
+        upper = table[rows, lower_index + 1]
+        span = upper - lower
+        fraction = np.where(span > 0, (values - lower) / np.where(span > 0, span, 1), 0.0)
+        position = lower_index + np.clip(fraction, 0.0, 1.0)
+        return np.where(below == 0, 0.0, np.where(below >= 101, 100.0, position))
+
+    def rank(self, building_ids: List[str], source: str = "peer") -> List[Dict[str, Any]]:
+        """Rank indexed buildings against a benchmark source.
+
+        Buildings missing from the requested source fall back to peer tables. The
+        peer group's region is the matched climate zone or census region.
+        Efficiency percentiles read as "better than N% of the comparison group".
+
+        Returns:
+            One ranking record per indexed building
+        """
+        records = [self.buildings[building_id] for building_id in building_ids if building_id in self.buildings]
+        if not records:
+            return []
+
+        group_index, group_keys = self._resolve_groups(source, records)
+        sources = [source] * len(records)
+        if source != "peer":
+            peer_index, peer_keys = self._resolve_groups("peer", records)
+            for position in np.flatnonzero(group_index < 0):
+                group_index[position] = peer_index[position]
+                group_keys[position] = peer_keys[position]
+                sources[position] = "peer"
+        source_array = np.array(sources)
+
+        results = {metric: np.full(len(records), np.nan) for metric in METRICS}
+        medians = {metric: np.full(len(records), np.nan) for metric in METRICS}
+        samples = np.zeros(len(records), dtype=np.int64)
+        for table_source in set(sources):
+            mask = (source_array == table_source) & (group_index >= 0)
+            if not mask.any():
+                continue
+            rows = group_index[mask]
+            samples[mask] = self.sample_sizes[table_source][rows]
+            for metric in METRICS:
+                table = self.tables[table_source][metric][rows]
+                values = np.array([records[position][metric] for position in np.flatnonzero(mask)])
+                # Lower intensity is better, so efficiency is the share of the group above
+                efficiency = 100.0 - self._percentile_position(table, values)
+                results[metric][mask] = np.where(np.isnan(table[:, 50]), np.nan, efficiency)
+                medians[metric][mask] = table[:, 50]
+
+        rankings = []
+        for position, record in enumerate(records):
+            ranked = group_index[position] >= 0
+            rankings.append({
+                **record,
+                "benchmark_source": sources[position] if ranked else None,
+                "peer_group": dict(zip(("building_type", "region", "size_bucket"), group_keys[position])) if ranked else None,
+                "peer_sample_size": int(samples[position]),
+                "benchmark_median": {metric: _rounded(medians[metric][position], 2) for metric in METRICS},
+                "energy_efficiency_percentile": _rounded(results["energy_use_intensity"][position], 1),
+                "cost_efficiency_percentile": _rounded(results["cost_per_sqft"][position], 1)
+            })
+        return rankings
@@ -0,0 +1,200 @@
+"""
+In-process trigram index for facility search.
+
+Mirrors pg_trgm's trigram extraction so ranking matches the database fallback:
+each word is lower-cased and padded with two leading spaces and one trailing
+space before being split into 3-character grams. Facilities are indexed on
+location and company name, refreshed incrementally from ``last_updated``.
+"""
+
+import heapq
+import logging
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ("location", "company_name")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(text: Optional[str]) -> Set[str]:
+    """Extract pg_trgm-style trigrams from text."""
+    grams = set()
+    for word in _WORD_PATTERN.findall((text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FacilityIndex:
+    """Trigram inverted index over facilities with ranked, filtered search.
+
+    Results are ranked by match quality: a prefix of a word in the location or
+    company name scores highest, then any substring, then fuzzy trigram
+    coverage (typo tolerance). Ties keep the original ordering by ENERGY STAR
+    score and floor area. Needles shorter than a trigram are matched by a
+    substring scan, since their padded grams only hit word starts.
+    """
+
+    def __init__(self, refresh_interval: float = 60.0, full_refresh_interval: float = 3600.0,
+                 min_similarity: float = 0.6):
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.min_similarity = min_similarity
+
+        self.facilities: Dict[str, Dict[str, Any]] = {}
+        # Postings hold integer keys (slot * len(SEARCH_FIELDS) + field) since int hashing is
+        # much cheaper than tuple hashing when broad terms touch most of the index
+        self._postings: Dict[str, Set[int]] = {}
+        self._slots: Dict[str, int] = {}
+        self._slot_ids: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._texts: List[str] = []
+        self._grams: List[Set[str]] = []
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at: Optional[float] = None
+        self.fully_refreshed_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.facilities)
+
+    def needs_full_refresh(self) -> bool:
+        """Full reloads pick up deletions, which incremental refreshes cannot see."""
+        return self.fully_refreshed_at is None or time.time() - self.fully_refreshed_at >= self.full_refresh_interval
+
+    def needs_refresh(self) -> bool:
+        """Check whether an incremental refresh is due."""
+        return self.refreshed_at is None or time.time() - self.refreshed_at >= self.refresh_interval
+
+    def load(self, rows: Iterable[Dict[str, Any]], full: bool = False) -> int:
+        """Insert or replace facilities; a full load drops everything not in ``rows``.
+
+        Rows need ``facility_id`` and may carry ``last_updated`` to advance the
+        incremental watermark.
+
+        Returns:
+            Number of facilities upserted
+        """
+        if full:
+            self.facilities.clear()
+            self._postings.clear()
+            self._slots.clear()
+            self._slot_ids.clear()
+            self._free_slots.clear()
+            self._texts.clear()
+            self._grams.clear()
+            self.watermark = None
+
+        count = 0
+        for row in rows:
+            facility = dict(row)
+            facility_id = facility["facility_id"]
+            self.remove(facility_id)
+            self.facilities[facility_id] = facility
+
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._slot_ids[slot] = facility_id
+            else:
+                slot = len(self._slot_ids)
+                self._slot_ids.append(facility_id)
+                self._texts.extend([""] * len(SEARCH_FIELDS))
+                self._grams.extend(set() for _ in SEARCH_FIELDS)
+            self._slots[facility_id] = slot
+
+            for field_index, field in enumerate(SEARCH_FIELDS):
+                key = slot * len(SEARCH_FIELDS) + field_index
+                text = (facility.get(field) or "").lower()
+                grams = trigrams(text)
+                self._texts[key] = text
+                self._grams[key] = grams
+                for gram in grams:
+                    self._postings.setdefault(gram, set()).add(key)
+
+            updated = facility.pop("last_updated", None)
+            if updated is not None and (self.watermark is None or updated > self.watermark):
+                self.watermark = updated
+            count += 1
+
+        now = time.time()
+        self.refreshed_at = now
+        if full:
+            self.fully_refreshed_at = now
+        return count
+
+    def remove(self, facility_id: str) -> bool:
+        """Drop a facility from the index."""
+        if self.facilities.pop(facility_id, None) is None:
+            return False
+        slot = self._slots.pop(facility_id)
+        for field_index in range(len(SEARCH_FIELDS)):
+            key = slot * len(SEARCH_FIELDS) + field_index
+            for gram in self._grams[key]:
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del self._postings[gram]
+            self._texts[key] = ""
+            self._grams[key] = set()
+        self._slot_ids[slot] = None
+        self._free_slots.append(slot)
+        return True
+
+    def search(self, query: str, facility_type: str = None, min_capacity: float = None,
+               max_capacity: float = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Ranked search over location and company name.
+
+        Returns:
+            Facility dicts with a ``relevance_score`` in [0, 1], best first;
+            all matches unless ``limit`` is given
+        """
+        needle = query.strip().lower()
+        query_grams = trigrams(needle)
+        if not query_grams:
+            return []
+
+        overlap: Counter = Counter()
+        if len(needle) < 3:
+            overlap.update(key for key, text in enumerate(self._texts) if needle in text)
+        else:
+            for gram in query_grams:
+                overlap.update(self._postings.get(gram, ()))
+
+        field_count = len(SEARCH_FIELDS)
+        scores: Dict[str, float] = {}
+        for key, shared in overlap.items():
+            text = self._texts[key]
+            position = text.find(needle)
+            if position == 0 or (position > 0 and not text[position - 1].isalnum()):
+                score = 1.0
+            elif position > 0:
+                score = 0.9
+            else:
+                coverage = shared / len(query_grams)
+                if coverage < self.min_similarity:
+                    continue
+                score = 0.8 * coverage
+            facility_id = self._slot_ids[key // field_count]
+            if score > scores.get(facility_id, 0.0):
+                scores[facility_id] = score
+
+        candidates = []
+        for facility_id, score in scores.items():
+            facility = self.facilities[facility_id]
+            if facility_type and facility.get("facility_type") != facility_type:
+                continue
+            capacity = float(facility.get("capacity_sqft") or 0)
+            if min_capacity and capacity < min_capacity:
+                continue
+            if max_capacity and capacity > max_capacity:
+                continue
+            candidates.append((-score, -(facility.get("energy_star_score") or 0), -capacity, facility_id))
+
+        # Broad type-ahead terms can match most of the index; only the top page is materialized
+        top = heapq.nsmallest(limit, candidates) if limit is not None else sorted(candidates)
+        return [{**self.facilities[facility_id], "relevance_score": round(-score, 3)} for score, _, _, facility_id in top]
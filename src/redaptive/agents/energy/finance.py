@@ -19,21 +19,41 @@ Key capabilities:
 import sys
 import os
 import asyncio
+import copy
 import json
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Awaitable
 from datetime import datetime, timedelta
 import math
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
 # Use new import structure
 
 from redaptive.agents.base import BaseMCPServer
 from redaptive.config.database import db
+from redaptive.tools.cache import LRUCache, canonical_hash
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Default dense search space for contract grid search (~150k structures)
+DEFAULT_CONTRACT_SEARCH_SPACE = {
+    "contract_terms": {"min": 5, "max": 20, "step": 1},
+    "sharing_percentages": {"min": 0.5, "max": 0.9, "step": 0.01},
+    "savings_guarantees": {"min": 0.7, "max": 0.95, "step": 0.01},
+    "performance_thresholds": {"min": 0.75, "max": 0.95, "step": 0.025}
+}
+MAX_CONTRACT_GRID_SIZE = 1_000_000
+CONTRACT_GRID_CHUNK_SIZE = 65536
+MAX_FRONTIER_POINTS = 50
+
 class EnergyFinanceAgent(BaseMCPServer):
     """
     Energy Project Finance Agent for Redaptive's EaaS Revenue Optimization
@@ -42,7 +62,7 @@ class EnergyFinanceAgent(BaseMCPServer):
     calculations for energy-as-a-service projects and technology investments.
     """
 
-    def __init__(self):
+    def __init__(self, memo_cache_size: int = 512):
         super().__init__("energy-finance-agent")
         self.financial_models = {}
         self.market_rates = {
@@ -59,6 +79,9 @@ class EnergyFinanceAgent(BaseMCPServer):
             "Storage": {"cost_per_kwh": 800, "lifetime_years": 15, "maintenance_factor": 0.03},
             "Controls": {"cost_per_sqft": 3, "lifetime_years": 12, "maintenance_factor": 0.04}
         }
+        # Memo cache for deterministic computations, keyed on inputs plus market assumptions
+        self.memo_cache = LRUCache(max_size=memo_cache_size)
+        self._market_fingerprint = canonical_hash(self.market_rates, self.technology_costs)
         self.setup_tools()
         logger.info("Energy Project Finance Agent initialized for EaaS optimization")
 
@@ -171,6 +194,27 @@ class EnergyFinanceAgent(BaseMCPServer):
                             "max_payback": {"type": "number", "description": "Maximum payback period (years)", "default": 7},
                             "min_savings_guarantee": {"type": "number", "description": "Minimum savings guarantee", "default": 0.8}
                         }
+                    },
+                    "search_mode": {
+                        "type": "string",
+                        "enum": ["scenarios", "grid"],
+                        "description": "'scenarios' evaluates a handful of preset structures, 'grid' sweeps a dense parameter grid",
+                        "default": "scenarios"
+                    },
+                    "search_space": {
+                        "type": "object",
+                        "description": "Grid axes for search_mode='grid'; each axis is a list of values or {min, max, step}",
+                        "properties": {
+                            "contract_terms": {"description": "Contract terms in years"},
+                            "sharing_percentages": {"description": "Redaptive savings shares (0-1)"},
+                            "savings_guarantees": {"description": "Savings guarantee levels (0-1)"},
+                            "performance_thresholds": {"description": "Performance thresholds (0-1)"}
+                        }
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": "Number of top contract structures to return in grid mode",
+                        "default": 10
                     }
                 },
                 "required": ["contract_parameters", "project_costs"]
@@ -382,6 +426,20 @@ class EnergyFinanceAgent(BaseMCPServer):
     async def calculate_project_roi(self, project_details: Dict, energy_savings: Dict, 
                                   financial_parameters: Dict = None, risk_factors: Dict = None) -> Dict[str, Any]:
         """Calculate comprehensive ROI analysis for energy projects"""
+        return await self._memoized(
+            "calculate_project_roi",
+            {
+                "project_details": project_details,
+                "energy_savings": energy_savings,
+                "financial_parameters": financial_parameters or {},
+                "risk_factors": risk_factors or {}
+            },
+            lambda: self._calculate_project_roi(project_details, energy_savings, financial_parameters, risk_factors)
+        )
+
+    async def _calculate_project_roi(self, project_details: Dict, energy_savings: Dict,
+                                     financial_parameters: Dict = None, risk_factors: Dict = None) -> Dict[str, Any]:
+        """Uncached ROI analysis behind calculate_project_roi"""
         try:
             # Set default parameters
             if financial_parameters is None:
@@ -504,14 +562,44 @@ class EnergyFinanceAgent(BaseMCPServer):
             }
 
     async def optimize_eaas_contract(self, contract_parameters: Dict, project_costs: Dict, 
-                                   optimization_objectives: List[str] = None, constraints: Dict = None) -> Dict[str, Any]:
+                                   optimization_objectives: List[str] = None, constraints: Dict = None,
+                                   search_mode: str = "scenarios", search_space: Dict = None,
+                                   top_k: int = 10) -> Dict[str, Any]:
         """Optimize Energy-as-a-Service contract structure"""
+        return await self._memoized(
+            "optimize_eaas_contract",
+            {
+                "contract_parameters": contract_parameters,
+                "project_costs": project_costs,
+                "optimization_objectives": optimization_objectives or ["maximize_npv", "minimize_risk"],
+                "constraints": constraints or {},
+                "search_mode": search_mode,
+                "search_space": search_space or {},
+                "top_k": top_k
+            },
+            lambda: self._optimize_eaas_contract(
+                contract_parameters, project_costs, optimization_objectives,
+                constraints, search_mode, search_space, top_k
+            )
+        )
+
+    async def _optimize_eaas_contract(self, contract_parameters: Dict, project_costs: Dict,
+                                      optimization_objectives: List[str] = None, constraints: Dict = None,
+                                      search_mode: str = "scenarios", search_space: Dict = None,
+                                      top_k: int = 10) -> Dict[str, Any]:
+        """Uncached contract optimization behind optimize_eaas_contract"""
         try:
             if optimization_objectives is None:
                 optimization_objectives = ["maximize_npv", "minimize_risk"]
             if constraints is None:
                 constraints = {}
             
+            if search_mode == "grid":
+                return await self._optimize_contract_grid(
+                    contract_parameters, project_costs, optimization_objectives,
+                    constraints, search_space, top_k
+                )
+            
             # Extract parameters
             contract_term = contract_parameters["contract_term"]
             guaranteed_savings = contract_parameters["guaranteed_savings"]
@@ -903,6 +991,40 @@ class EnergyFinanceAgent(BaseMCPServer):
                 "timestamp": datetime.now().isoformat()
             }
 
+    # Memo cache for repeated finance computations
+    async def _memoized(self, operation: str, inputs: Dict[str, Any],
+                        compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Serve a deterministic computation from the memo cache, computing it on a miss"""
+        fingerprint = canonical_hash(self.market_rates, self.technology_costs)
+        if fingerprint != self._market_fingerprint:
+            # Market assumptions changed in place; every cached result is stale
+            self.memo_cache.clear()
+            self._market_fingerprint = fingerprint
+
+        key = canonical_hash(operation, inputs, fingerprint)
+        cached = self.memo_cache.get(key)
+        if cached is not None:
+            result = copy.deepcopy(cached)
+            result["cached"] = True
+            return result
+
+        result = await compute()
+        # Only successful results are cached so transient failures are retried
+        if result.get("status") == "success":
+            self.memo_cache.put(key, copy.deepcopy(result))
+        return result
+
+    def update_market_rates(self, **rates: float):
+        """Update market rate assumptions and invalidate memoized results"""
+        self.market_rates.update(rates)
+        self.memo_cache.clear()
+        self._market_fingerprint = canonical_hash(self.market_rates, self.technology_costs)
+        logger.info(f"Market rates updated: {rates}")
+
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """Get memo cache hit/miss metrics"""
+        return self.memo_cache.get_metrics()
+
     # Helper methods for financial calculations
     def _calculate_npv(self, cash_flows: List[float], discount_rate: float) -> float:
         """Calculate Net Present Value"""
@@ -1091,6 +1213,252 @@ class EnergyFinanceAgent(BaseMCPServer):
             "overall_risk_score": 0.25
         }
 
+    # Vectorized contract grid search
+    async def _optimize_contract_grid(self, contract_parameters: Dict, project_costs: Dict,
+                                      objectives: List[str], constraints: Dict,
+                                      search_space: Optional[Dict], top_k: int) -> Dict[str, Any]:
+        """Sweep a dense grid of contract structures and return the top-k and efficient frontier.
+
+        Every structure is evaluated as a row of a cash-flow matrix: year 0 carries the
+        capital outlay, years 1..term the escalated shared savings net of operating and
+        maintenance costs. Constraints are applied cheapest-first (guarantee floor, payback,
+        then NPV at the IRR hurdle) so IRR is only solved for feasible structures.
+        """
+        if not NUMPY_AVAILABLE:
+            return {
+                "status": "error",
+                "error": "numpy not available - install with: pip install numpy",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        guaranteed_savings = contract_parameters["guaranteed_savings"]
+        capital_cost = project_costs["capital_cost"]
+        operating_costs = project_costs.get("operating_costs", capital_cost * 0.03)
+        maintenance_costs = project_costs.get("maintenance_costs", capital_cost * 0.02)
+
+        min_irr = constraints.get("min_irr", 0.15)
+        max_payback = constraints.get("max_payback", 7)
+        min_savings_guarantee = constraints.get("min_savings_guarantee", 0.8)
+
+        axes = self._build_contract_search_axes(search_space)
+        grid_size = int(np.prod([len(values) for values in axes.values()]))
+        if grid_size > MAX_CONTRACT_GRID_SIZE:
+            return {
+                "status": "error",
+                "error": f"Search space has {grid_size} structures, limit is {MAX_CONTRACT_GRID_SIZE}",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        terms, shares, guarantees, thresholds = (
+            axis.ravel() for axis in np.meshgrid(
+                axes["contract_terms"], axes["sharing_percentages"],
+                axes["savings_guarantees"], axes["performance_thresholds"],
+                indexing="ij"
+            )
+        )
+        annual_revenue = guaranteed_savings * shares * guarantees
+        risk_scores = self._contract_risk_scores(terms, guarantees, thresholds)
+
+        # Parameter-only constraints prune before any cash flows are built
+        candidates = np.flatnonzero(guarantees >= min_savings_guarantee)
+        pruned = {"savings_guarantee": grid_size - len(candidates), "payback": 0, "irr": 0}
+
+        years = np.arange(int(axes["contract_terms"].max()) + 1)
+        escalation = (1 + self.market_rates["electricity_escalation"]) ** np.maximum(years - 1, 0)
+        discount_rate = self.market_rates["discount_rate"]
+
+        feasible_parts = []
+        for start in range(0, len(candidates), CONTRACT_GRID_CHUNK_SIZE):
+            idx = candidates[start:start + CONTRACT_GRID_CHUNK_SIZE]
+            cash_flows = self._contract_grid_cash_flows(
+                terms[idx], annual_revenue[idx], operating_costs + maintenance_costs,
+                capital_cost, escalation
+            )
+
+            payback = self._vectorized_payback(cash_flows)
+            keep = payback <= max_payback  # NaN (never paid back) compares False
+            pruned["payback"] += int(len(idx) - keep.sum())
+            idx, cash_flows, payback = idx[keep], cash_flows[keep], payback[keep]
+
+            # IRR >= hurdle <=> NPV at the hurdle rate >= 0 for conventional cash flows
+            keep = self._vectorized_npv(cash_flows, min_irr) >= 0
+            pruned["irr"] += int(len(idx) - keep.sum())
+            idx, cash_flows, payback = idx[keep], cash_flows[keep], payback[keep]
+
+            if len(idx):
+                feasible_parts.append((
+                    idx,
+                    self._vectorized_npv(cash_flows, discount_rate),
+                    self._vectorized_irr(cash_flows),
+                    payback,
+                    cash_flows[:, 1]
+                ))
+
+        if not feasible_parts:
+            return {
+                "status": "no_feasible_solution",
+                "message": "No contract structure meets the specified constraints",
+                "constraints": constraints,
+                "search_summary": {
+                    "structures_evaluated": grid_size,
+                    "feasible_structures": 0,
+                    "pruned": pruned
+                },
+                "timestamp": datetime.now().isoformat()
+            }
+
+        idx, npv, irr, payback, first_year_cash_flow = (
+            np.concatenate(column) for column in zip(*feasible_parts)
+        )
+        risk = risk_scores[idx]
+
+        # Same weighting as _calculate_optimization_score, plus the risk and cash flow
+        # objectives that only make sense once risk is scored per structure
+        score = np.zeros(len(idx))
+        if "maximize_npv" in objectives:
+            score += npv / 100000
+        if "maximize_irr" in objectives:
+            score += np.nan_to_num(irr) * 10
+        if "minimize_payback" in objectives:
+            score += np.maximum(0, 10 - payback)
+        if "minimize_risk" in objectives:
+            score -= risk * 10
+        if "maximize_cash_flow" in objectives:
+            score += first_year_cash_flow / 100000
+
+        def describe(position: int) -> Dict[str, Any]:
+            i = idx[position]
+            return {
+                "contract_term": int(terms[i]),
+                "sharing_percentage": round(float(shares[i]), 4),
+                "savings_guarantee": round(float(guarantees[i]), 4),
+                "performance_threshold": round(float(thresholds[i]), 4),
+                "estimated_annual_revenue": round(float(annual_revenue[i]), 2),
+                "npv": round(float(npv[position]), 2),
+                "irr": None if np.isnan(irr[position]) else round(float(irr[position]), 4),
+                "payback_period": round(float(payback[position]), 2),
+                "risk_score": round(float(risk[position]), 4),
+                "optimization_score": round(float(score[position]), 4)
+            }
+
+        k = max(1, min(int(top_k), len(idx)))
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top])]
+        top_contracts = [describe(position) for position in top]
+        best = top_contracts[0]
+
+        frontier = self._efficient_frontier(npv, risk)
+
+        return {
+            "status": "success",
+            "search_mode": "grid",
+            "optimized_contract": best,
+            "financial_performance": {
+                "expected_npv": best["npv"],
+                "expected_irr": round(best["irr"] * 100, 2) if best["irr"] is not None else None,
+                "payback_period": round(best["payback_period"], 1),
+                "optimization_score": round(best["optimization_score"], 2)
+            },
+            "contract_terms": {
+                "contract_term": best["contract_term"],
+                "sharing_percentage": best["sharing_percentage"],
+                "savings_guarantee": best["savings_guarantee"],
+                "performance_threshold": best["performance_threshold"],
+                "escalation_rate": self.market_rates["electricity_escalation"],
+                "true_up_frequency": "annual"
+            },
+            "top_contracts": top_contracts,
+            "efficient_frontier": [describe(position) for position in frontier],
+            "search_summary": {
+                "structures_evaluated": grid_size,
+                "feasible_structures": int(len(idx)),
+                "pruned": pruned,
+                "search_space": {axis: [float(values.min()), float(values.max()), len(values)]
+                                 for axis, values in axes.items()}
+            },
+            "recommendations": await self._generate_contract_recommendations(best, top_contracts),
+            "risk_analysis": await self._analyze_contract_risk(best, best["contract_term"]),
+            "optimization_objectives": objectives,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def _build_contract_search_axes(self, search_space: Optional[Dict]) -> Dict[str, Any]:
+        """Expand search axes given as value lists or {min, max, step} ranges"""
+        search_space = search_space or {}
+        axes = {}
+        for axis, default in DEFAULT_CONTRACT_SEARCH_SPACE.items():
+            spec = search_space.get(axis, default)
+            if isinstance(spec, dict):
+                values = np.arange(spec["min"], spec["max"] + spec["step"] / 2, spec["step"])
+            else:
+                values = np.asarray(spec, dtype=float)
+            if values.size == 0:
+                raise ValueError(f"Search axis '{axis}' is empty")
+            axes[axis] = np.unique(np.round(values, 6))
+
+        axes["contract_terms"] = axes["contract_terms"].astype(int)
+        if axes["contract_terms"].min() < 1:
+            raise ValueError("Contract terms must be at least 1 year")
+        return axes
+
+    def _contract_risk_scores(self, terms, guarantees, thresholds):
+        """Relative risk (0-1): guaranteed exposure times threshold strictness, growing with term"""
+        return guarantees * thresholds * (0.5 + 0.5 * np.minimum(terms, 25) / 25)
+
+    def _contract_grid_cash_flows(self, terms, annual_revenue, annual_costs: float,
+                                  capital_cost: float, escalation):
+        """Build an (n_structures, max_term + 1) cash flow matrix, zero past each term"""
+        years = np.arange(escalation.size)
+        cash_flows = annual_revenue[:, None] * escalation[None, :] - annual_costs
+        cash_flows[:, 0] = -capital_cost
+        cash_flows[years[None, :] > terms[:, None]] = 0.0
+        return cash_flows
+
+    def _vectorized_npv(self, cash_flows, discount_rate):
+        """Row-wise NPV for a scalar or per-row discount rate"""
+        years = np.arange(cash_flows.shape[1])
+        rates = np.broadcast_to(np.asarray(discount_rate, dtype=float), (cash_flows.shape[0],))
+        return (cash_flows * (1 + rates)[:, None] ** -years[None, :]).sum(axis=1)
+
+    def _vectorized_irr(self, cash_flows, iterations: int = 50):
+        """Row-wise IRR by bisection on [-99%, 1000%]; NaN where no root is bracketed"""
+        low = np.full(cash_flows.shape[0], -0.99)
+        high = np.full(cash_flows.shape[0], 10.0)
+        bracketed = (self._vectorized_npv(cash_flows, low) > 0) & (self._vectorized_npv(cash_flows, high) < 0)
+
+        for _ in range(iterations):
+            mid = (low + high) / 2
+            positive = self._vectorized_npv(cash_flows, mid) > 0
+            low = np.where(positive, mid, low)
+            high = np.where(positive, high, mid)
+
+        return np.where(bracketed, (low + high) / 2, np.nan)
+
+    def _vectorized_payback(self, cash_flows):
+        """Row-wise counterpart of _calculate_payback_period; NaN where payback is not reached"""
+        investment = -cash_flows[:, 0]
+        cumulative = np.cumsum(cash_flows[:, 1:], axis=1)
+        reached = cumulative >= investment[:, None]
+        year = reached.argmax(axis=1)
+        rows = np.arange(cash_flows.shape[0])
+        previous = np.where(year > 0, cumulative[rows, year - 1], 0.0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            payback = year + (investment - previous) / cash_flows[rows, year + 1]
+        payback = np.where(reached.any(axis=1), payback, np.nan)
+        return np.where(investment <= 0, 0.0, payback)
+
+    def _efficient_frontier(self, npv, risk):
+        """Positions on the NPV/risk Pareto frontier, ordered by increasing risk"""
+        order = np.lexsort((-npv, risk))
+        sorted_npv = npv[order]
+        best_so_far = np.concatenate(([-np.inf], np.maximum.accumulate(sorted_npv)[:-1]))
+        frontier = order[sorted_npv > best_so_far]
+
+        if len(frontier) > MAX_FRONTIER_POINTS:
+            frontier = frontier[np.linspace(0, len(frontier) - 1, MAX_FRONTIER_POINTS).astype(int)]
+        return frontier
+
     # Additional helper method stubs (would be fully implemented in production)
     async def _evaluate_technology(self, tech: str, conditions: Dict, criteria: Dict, requirements: Dict) -> Dict:
         """Evaluate individual technology option"""
@@ -0,0 +1,329 @@
+"""
+Energy demand forecasting for the Portfolio Intelligence Agent.
+
+Fits one ridge regression per building on monthly rollups of energy usage,
+weather degree days and occupancy. All buildings in a portfolio are fitted in a
+single batched solve, and the per-building sufficient statistics (X'X, X'y,
+y'y) are kept so that new months can be folded in without revisiting history.
+"""
+
+import logging
+import math
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Degree days are scaled down so ridge shrinkage treats all features comparably
+DEGREE_DAY_SCALE = 100.0
+# Two-sided 90% normal interval
+FORECAST_Z_SCORE = 1.645
+
+
+def month_ordinal(value: Any) -> int:
+    """Convert a date, datetime or 'YYYY-MM' string into a month counter."""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:7], "%Y-%m")
+    return value.year * 12 + value.month - 1
+
+
+def ordinal_to_month(ordinal: int) -> date:
+    """Convert a month counter back into the first day of that month."""
+    return date(ordinal // 12, ordinal % 12 + 1, 1)
+
+
+class DemandForecaster:
+    """Batched, incrementally refittable monthly demand model for a set of buildings.
+
+    Each building gets its own coefficients over the features: intercept, linear
+    trend (years since the building's first month), annual seasonality (sin/cos),
+    heating and cooling degree days, and occupancy fraction. The weather and
+    occupancy features can be switched off.
+    """
+
+    def __init__(self, include_weather: bool = True, include_occupancy: bool = True,
+                 ridge_alpha: float = 1e-3, min_history_months: int = 12):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy is required for DemandForecaster. Install with: pip install numpy")
+
+        self.include_weather = include_weather
+        self.include_occupancy = include_occupancy
+        self.ridge_alpha = ridge_alpha
+        self.min_history_months = min_history_months
+
+        self.feature_names = ["intercept", "trend", "season_sin", "season_cos"]
+        if include_weather:
+            self.feature_names += ["heating_degree_days", "cooling_degree_days"]
+        if include_occupancy:
+            self.feature_names.append("occupancy")
+        n_features = len(self.feature_names)
+
+        self.building_ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._dirty: set = set()
+
+        # Per-building sufficient statistics and fitted state
+        self.xtx = np.zeros((0, n_features, n_features))
+        self.xty = np.zeros((0, n_features))
+        self.yty = np.zeros(0)
+        self.n_obs = np.zeros(0, dtype=np.int64)
+        self.origin = np.zeros(0, dtype=np.int64)
+        self.last_month = np.zeros(0, dtype=np.int64)
+        self.coefficients = np.zeros((0, n_features))
+        self.precision_inv = np.zeros((0, n_features, n_features))
+        self.residual_std = np.zeros(0)
+
+        # Calendar-month climatology used for future exogenous inputs
+        self.hdd_sum = np.zeros((0, 12))
+        self.cdd_sum = np.zeros((0, 12))
+        self.weather_count = np.zeros((0, 12))
+        self.occupancy_sum = np.zeros(0)
+        self.occupancy_count = np.zeros(0)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    @property
+    def watermark(self) -> Optional[date]:
+        """Earliest last-seen month across buildings, used to request new rollups."""
+        if not self.building_ids:
+            return None
+        return ordinal_to_month(int(self.last_month.min()))
+
+    def _add_buildings(self, building_ids: List[str], origins: List[int]):
+        """Grow the per-building arrays for newly seen buildings."""
+        count = len(building_ids)
+        n_features = self.n_features
+        for building_id in building_ids:
+            self._index[building_id] = len(self.building_ids)
+            self.building_ids.append(building_id)
+
+        self.xtx = np.concatenate([self.xtx, np.zeros((count, n_features, n_features))])
+        self.xty = np.concatenate([self.xty, np.zeros((count, n_features))])
+        self.yty = np.concatenate([self.yty, np.zeros(count)])
+        self.n_obs = np.concatenate([self.n_obs, np.zeros(count, dtype=np.int64)])
+        self.origin = np.concatenate([self.origin, np.asarray(origins, dtype=np.int64)])
+        self.last_month = np.concatenate([self.last_month, np.full(count, -1, dtype=np.int64)])
+        self.coefficients = np.concatenate([self.coefficients, np.zeros((count, n_features))])
+        self.precision_inv = np.concatenate([self.precision_inv, np.zeros((count, n_features, n_features))])
+        self.residual_std = np.concatenate([self.residual_std, np.zeros(count)])
+        self.hdd_sum = np.concatenate([self.hdd_sum, np.zeros((count, 12))])
+        self.cdd_sum = np.concatenate([self.cdd_sum, np.zeros((count, 12))])
+        self.weather_count = np.concatenate([self.weather_count, np.zeros((count, 12))])
+        self.occupancy_sum = np.concatenate([self.occupancy_sum, np.zeros(count)])
+        self.occupancy_count = np.concatenate([self.occupancy_count, np.zeros(count)])
+
+    def _design_matrix(self, months: "np.ndarray", origins: "np.ndarray", hdd: "np.ndarray",
+                       cdd: "np.ndarray", occupancy: "np.ndarray") -> "np.ndarray":
+        """Build feature rows; all inputs broadcast against each other."""
+        angle = 2 * math.pi * (months % 12) / 12
+        columns = [
+            np.ones_like(angle),
+            (months - origins) / 12.0,
+            np.sin(angle),
+            np.cos(angle)
+        ]
+        if self.include_weather:
+            columns += [hdd / DEGREE_DAY_SCALE, cdd / DEGREE_DAY_SCALE]
+        if self.include_occupancy:
+            columns.append(occupancy / 100.0)
+        return np.stack(np.broadcast_arrays(*columns), axis=-1)
+
+    def update(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Fold monthly rollups into the model statistics.
+
+        Each row needs ``building_id``, ``month`` and ``consumption`` and may carry
+        ``hdd``, ``cdd`` and ``occupancy``. Months at or before a building's last
+        ingested month are ignored, so overlapping reloads are safe.
+
+        Returns:
+            Number of new building-months ingested
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+
+        months = np.array([month_ordinal(row["month"]) for row in rows], dtype=np.int64)
+        new_ids: Dict[str, int] = {}
+        for row, month in zip(rows, months):
+            building_id = row["building_id"]
+            if building_id not in self._index:
+                new_ids[building_id] = min(new_ids.get(building_id, month), month)
+        if new_ids:
+            self._add_buildings(list(new_ids), list(new_ids.values()))
+
+        idx = np.array([self._index[row["building_id"]] for row in rows], dtype=np.int64)
+        fresh = months > self.last_month[idx]
+        if not fresh.any():
+            return 0
+
+        rows = [row for row, keep in zip(rows, fresh) if keep]
+        idx, months = idx[fresh], months[fresh]
+
+        def column(name: str, default: float) -> "np.ndarray":
+            values = np.array([row.get(name) for row in rows], dtype=float)
+            if np.isnan(values).all():
+                return np.full(len(rows), default)
+            # Gaps take the batch mean rather than an extreme value
+            return np.where(np.isnan(values), np.nanmean(values), values)
+
+        consumption = np.array([float(row["consumption"]) for row in rows])
+        hdd = column("hdd", 0.0)
+        cdd = column("cdd", 0.0)
+        occupancy = column("occupancy", 100.0)
+
+        features = self._design_matrix(months, self.origin[idx], hdd, cdd, occupancy)
+        np.add.at(self.xtx, idx, features[:, :, None] * features[:, None, :])
+        np.add.at(self.xty, idx, features * consumption[:, None])
+        np.add.at(self.yty, idx, consumption ** 2)
+        np.add.at(self.n_obs, idx, 1)
+        np.maximum.at(self.last_month, idx, months)
+
+        calendar = months % 12
+        np.add.at(self.hdd_sum, (idx, calendar), hdd)
+        np.add.at(self.cdd_sum, (idx, calendar), cdd)
+        np.add.at(self.weather_count, (idx, calendar), 1)
+        np.add.at(self.occupancy_sum, idx, occupancy)
+        np.add.at(self.occupancy_count, idx, 1)
+
+        self._dirty.update(idx.tolist())
+        return len(rows)
+
+    def fit(self) -> int:
+        """Refit every building touched since the last fit in one batched solve.
+
+        Returns:
+            Number of buildings refitted
+        """
+        if not self._dirty:
+            return 0
+
+        idx = np.array(sorted(self._dirty), dtype=np.int64)
+        penalty = np.eye(self.n_features) * self.ridge_alpha
+        penalty[0, 0] = 0.0  # never shrink the intercept
+
+        xtx = self.xtx[idx]
+        xty = self.xty[idx]
+        precision = xtx + penalty
+        # The intercept column keeps the system non-singular once a month is observed
+        precision_inv = np.linalg.inv(precision)
+        beta = np.einsum("bfg,bg->bf", precision_inv, xty)
+
+        sse = (self.yty[idx]
+               - 2 * np.einsum("bf,bf->b", beta, xty)
+               + np.einsum("bf,bfg,bg->b", beta, xtx, beta))
+        dof = np.maximum(self.n_obs[idx] - self.n_features, 1)
+
+        self.coefficients[idx] = beta
+        self.precision_inv[idx] = precision_inv
+        self.residual_std[idx] = np.sqrt(np.maximum(sse, 0.0) / dof)
+        self._dirty.clear()
+        return len(idx)
+
+    def forecast(self, horizon: int, start_month: Any = None) -> Dict[str, Any]:
+        """Forecast monthly consumption for every building.
+
+        Args:
+            horizon: Number of months to forecast
+            start_month: First forecast month; defaults to the month after the latest data
+
+        Returns:
+            Dictionary with months, building_ids, (building x month) ``predictions``,
+            ``std`` and per-feature ``contributions`` arrays
+        """
+        if not self.building_ids:
+            raise ValueError("No history ingested")
+        self.fit()
+
+        start = month_ordinal(start_month) if start_month is not None else int(self.last_month.max()) + 1
+        months = np.arange(start, start + horizon, dtype=np.int64)
+        calendar = months % 12
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hdd = self.hdd_sum[:, calendar] / self.weather_count[:, calendar]
+            cdd = self.cdd_sum[:, calendar] / self.weather_count[:, calendar]
+            occupancy = self.occupancy_sum / self.occupancy_count
+        # Calendar months never observed fall back to the building's overall climate
+        hdd = np.where(np.isnan(hdd), (self.hdd_sum.sum(axis=1) / np.maximum(self.weather_count.sum(axis=1), 1))[:, None], hdd)
+        cdd = np.where(np.isnan(cdd), (self.cdd_sum.sum(axis=1) / np.maximum(self.weather_count.sum(axis=1), 1))[:, None], cdd)
+        occupancy = np.where(np.isnan(occupancy), 100.0, occupancy)[:, None]
+
+        features = self._design_matrix(months[None, :], self.origin[:, None], hdd, cdd, occupancy)
+        contributions = features * self.coefficients[:, None, :]
+        predictions = contributions.sum(axis=2)
+        leverage = np.einsum("bhf,bfg,bhg->bh", features, self.precision_inv, features)
+        std = self.residual_std[:, None] * np.sqrt(1 + leverage)
+
+        # Short histories cannot support the full model; use their mean level instead
+        short = self.n_obs < self.min_history_months
+        if short.any():
+            counts = np.maximum(self.n_obs[short], 1)
+            mean = self.xty[short, 0] / counts
+            variance = np.maximum(self.yty[short] / counts - mean ** 2, 0.0)
+            predictions[short] = mean[:, None]
+            std[short] = np.sqrt(variance)[:, None]
+            contributions[short] = 0.0
+            contributions[short, :, 0] = mean[:, None]
+
+        return {
+            "months": [ordinal_to_month(int(month)) for month in months],
+            "building_ids": list(self.building_ids),
+            "predictions": np.maximum(predictions, 0.0),
+            "std": std,
+            "contributions": contributions,
+            "short_history": short
+        }
+
+    def summarize_portfolio(self, forecast: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Aggregate a building forecast into portfolio-level monthly totals."""
+        totals = forecast["predictions"].sum(axis=0)
+        # Building errors are treated as independent
+        total_std = np.sqrt((forecast["std"] ** 2).sum(axis=0))
+        drivers = forecast["contributions"].sum(axis=0)
+
+        monthly = []
+        for position, month in enumerate(forecast["months"]):
+            driver_values = dict(zip(self.feature_names, drivers[position].tolist()))
+            factors = {
+                "baseline": driver_values["intercept"],
+                "trend": driver_values["trend"],
+                "seasonal": driver_values["season_sin"] + driver_values["season_cos"]
+            }
+            if self.include_weather:
+                factors["weather"] = driver_values["heating_degree_days"] + driver_values["cooling_degree_days"]
+            if self.include_occupancy:
+                factors["occupancy"] = driver_values["occupancy"]
+
+            total = float(totals[position])
+            margin = FORECAST_Z_SCORE * float(total_std[position])
+            monthly.append({
+                "month": position + 1,
+                "period": month.strftime("%Y-%m"),
+                "forecasted_consumption": total,
+                "confidence_interval": {
+                    "lower": max(total - margin, 0.0),
+                    "upper": total + margin
+                },
+                "factors": {name: float(value) for name, value in factors.items()}
+            })
+        return monthly
+
+    def annual_growth_rate(self) -> float:
+        """Portfolio trend as a fraction of current monthly consumption per year."""
+        if not self.building_ids:
+            return 0.0
+        self.fit()
+        modeled = self.n_obs >= self.min_history_months
+        level = self.xty[:, 0] / np.maximum(self.n_obs, 1)
+        total_level = level.sum()
+        if total_level <= 0:
+            return 0.0
+        return float(self.coefficients[modeled, 1].sum() / total_level)
@@ -93,6 +93,21 @@ class StreamingSettings:
         )
 
 
+@dataclass
+class StorageSettings:
+    """Local analytics storage configuration."""
+    history_archive_path: str = ""  # Parquet archive of energy_usage; empty disables it
+    meter_store_path: str = ""  # Memory-mapped recent meter series; empty keeps in-process caches
+    
+    @classmethod
+    def from_env(cls) -> "StorageSettings":
+        """Load storage settings from environment variables."""
+        return cls(
+            history_archive_path=os.getenv("HISTORY_ARCHIVE_PATH", ""),
+            meter_store_path=os.getenv("METER_STORE_PATH", "")
+        )
+
+
 @dataclass
 class PlatformSettings:
     """Main platform configuration."""
@@ -100,6 +115,7 @@ class PlatformSettings:
     agents: AgentSettings = field(default_factory=AgentSettings.from_env)
     orchestration: OrchestrationSettings = field(default_factory=OrchestrationSettings.from_env)
     streaming: StreamingSettings = field(default_factory=StreamingSettings.from_env)
+    storage: StorageSettings = field(default_factory=StorageSettings.from_env)
     environment: str = "development"
     debug: bool = False
     api_version: str = "v1"
@@ -114,7 +130,8 @@ class PlatformSettings:
             database=DatabaseSettings.from_env(),
             agents=AgentSettings.from_env(),
             orchestration=OrchestrationSettings.from_env(),
-            streaming=StreamingSettings.from_env()
+            streaming=StreamingSettings.from_env(),
+            storage=StorageSettings.from_env()
         )
 
 
@@ -8,16 +8,35 @@ supporting 48k+ data points per hour.
 
 from .redis_client import RedisStreamProcessor
 from .kafka_client import KafkaStreamProcessor
+from .memory_client import MemoryStreamProcessor
 from .stream_manager import StreamManager, EnergyStreamManager, StreamBackend
-from .data_models import MeterReading, StreamMessage, ProcessingResult
+from .data_models import MeterReading, MeterReadingBatch, StreamMessage, ProcessingResult
+from .windowing import WindowAggregator, WindowAggregate, WindowSpec
+from .anomaly import StreamingAnomalyDetector
+from .autoscaler import ConsumerAutoscaler, AutoscalePolicy
+from .idempotency import IdempotencyGuard
+from .replay import StreamReplay
+from .retention import PostgresStreamArchive, StreamTrimmer
 
 __all__ = [
     "RedisStreamProcessor",
     "KafkaStreamProcessor", 
+    "MemoryStreamProcessor",
     "StreamManager",
     "EnergyStreamManager",
     "StreamBackend",
     "MeterReading",
+    "MeterReadingBatch",
     "StreamMessage",
-    "ProcessingResult"
+    "ProcessingResult",
+    "WindowAggregator",
+    "WindowAggregate",
+    "WindowSpec",
+    "StreamingAnomalyDetector",
+    "ConsumerAutoscaler",
+    "AutoscalePolicy",
+    "IdempotencyGuard",
+    "StreamReplay",
+    "StreamTrimmer",
+    "PostgresStreamArchive"
 ]
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Streaming anomaly detection for meter readings.
+===============================================
+
+Scores every reading inline against a per-meter exponentially weighted mean
+and variance, so consumption spikes and drops are flagged at ingest rate
+without a round trip to the energy monitoring agent. The thresholds match
+``EnergyMonitoringAgent.anomaly_thresholds`` (in standard deviations).
+
+State is sharded by meter: a detector configured with ``shard_index`` and
+``shard_count`` only tracks the meters that hash to its shard. Snapshots of
+the state can be checkpointed to disk and restored on restart.
+"""
+
+import json
+import logging
+import math
+import os
+import tempfile
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .data_models import MeterReading, MeterReadingBatch, from_epoch_micros, slotted, to_epoch_micros
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+def shard_for(meter_id: str, shard_count: int) -> int:
+    """Shard owning a meter; stable across processes (unlike ``hash()``)."""
+    return zlib.crc32(meter_id.encode("utf-8")) % shard_count
+
+
+@slotted
+@dataclass
+class MeterBaseline:
+    """Rolling per-meter state: EWMA mean and variance of recent readings."""
+    count: int = 0
+    mean: float = 0.0
+    variance: float = 0.0
+    last_timestamp: int = 0  # epoch microseconds of the newest reading seen
+
+    def update(self, value: float, alpha: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+        self.count += 1
+
+
+class StreamingAnomalyDetector:
+    """
+    Per-meter EWMA anomaly detector.
+
+    A reading is scored against the baseline *before* being folded into it.
+    Readings no newer than the meter's last reading are skipped, which also
+    makes redelivered messages harmless.
+    """
+
+    def __init__(self, spike_threshold: float = 2.5, drop_threshold: float = 2.0,
+                 alpha: float = 0.1, min_readings: int = 5,
+                 shard_index: int = 0, shard_count: int = 1):
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard index {shard_index} out of range for {shard_count} shards")
+        self.spike_threshold = spike_threshold
+        self.drop_threshold = drop_threshold
+        self.alpha = alpha
+        self.min_readings = min_readings
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.baselines: Dict[str, MeterBaseline] = {}
+        self.metrics = {
+            "readings_scored": 0,
+            "readings_skipped": 0,
+            "anomalies_detected": 0
+        }
+
+    def owns(self, meter_id: str) -> bool:
+        """Whether this detector's shard tracks a meter."""
+        return self.shard_count == 1 or shard_for(meter_id, self.shard_count) == self.shard_index
+
+    def observe(self, meter_id: str, building_id: str, unit: str,
+                timestamp_micros: int, value: float) -> Optional[Dict[str, Any]]:
+        """
+        Score one reading and update the meter's baseline.
+
+        Returns:
+            Anomaly payload (as published to the anomalies stream), or None
+        """
+        if not self.owns(meter_id):
+            return None
+        baseline = self.baselines.get(meter_id)
+        if baseline is None:
+            baseline = self.baselines[meter_id] = MeterBaseline()
+        elif timestamp_micros <= baseline.last_timestamp:
+            self.metrics["readings_skipped"] += 1
+            return None
+
+        anomaly = None
+        std = math.sqrt(baseline.variance)
+        if baseline.count >= self.min_readings and std > 0:
+            z_score = (value - baseline.mean) / std
+            if z_score > self.spike_threshold:
+                anomaly = self._anomaly("consumption_spike", z_score, self.spike_threshold, baseline, std,
+                                        meter_id, building_id, unit, timestamp_micros, value)
+            elif z_score < -self.drop_threshold:
+                anomaly = self._anomaly("consumption_drop", z_score, self.drop_threshold, baseline, std,
+                                        meter_id, building_id, unit, timestamp_micros, value)
+
+        baseline.update(value, self.alpha)
+        baseline.last_timestamp = timestamp_micros
+        self.metrics["readings_scored"] += 1
+        if anomaly:
+            self.metrics["anomalies_detected"] += 1
+        return anomaly
+
+    def observe_reading(self, reading: MeterReading) -> Optional[Dict[str, Any]]:
+        """Score a MeterReading."""
+        return self.observe(
+            reading.meter_id, reading.building_id, reading.unit,
+            to_epoch_micros(reading.timestamp), reading.value
+        )
+
+    def observe_batch(self, batch: MeterReadingBatch) -> List[Dict[str, Any]]:
+        """Score every reading of a columnar batch; returns the anomalies found."""
+        meter_ids, building_ids, units = batch.meter_ids, batch.building_ids, batch.units
+        anomalies = []
+        for index, timestamp, value in zip(batch.meter_index, batch.timestamps, batch.values):
+            anomaly = self.observe(meter_ids[index], building_ids[index], units[index], timestamp, value)
+            if anomaly:
+                anomalies.append(anomaly)
+        return anomalies
+
+    def _anomaly(self, anomaly_type: str, z_score: float, threshold: float, baseline: MeterBaseline,
+                 std: float, meter_id: str, building_id: str, unit: str,
+                 timestamp_micros: int, value: float) -> Dict[str, Any]:
+        timestamp = from_epoch_micros(timestamp_micros).isoformat()
+        direction = "spike" if anomaly_type == "consumption_spike" else "drop"
+        deviation = (value - baseline.mean) / baseline.mean * 100 if baseline.mean else 0.0
+        return {
+            "type": anomaly_type,
+            "meter_id": meter_id,
+            "building_id": building_id,
+            "severity": "high" if abs(z_score) > 3 else "medium",
+            "current_value": value,
+            "expected_value": baseline.mean,
+            "expected_range": f"{baseline.mean - std:.2f} - {baseline.mean + std:.2f}",
+            "deviation": f"{deviation:.1f}%",
+            "z_score": z_score,
+            "threshold_exceeded": abs(z_score) / threshold,
+            "unit": unit,
+            "timestamp": timestamp,
+            "description": f"Consumption {direction} on {meter_id} at {timestamp}: {value:.2f} {unit}",
+            "detector": "streaming_ewma"
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serializable copy of the detector state."""
+        return {
+            "version": CHECKPOINT_VERSION,
+            "shard_index": self.shard_index,
+            "shard_count": self.shard_count,
+            "baselines": {
+                meter_id: [b.count, b.mean, b.variance, b.last_timestamp]
+                for meter_id, b in self.baselines.items()
+            }
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> int:
+        """
+        Load state from ``snapshot()``, keeping only meters this shard owns
+        (so a checkpoint survives a change in shard count).
+
+        Returns:
+            Number of meter baselines restored
+        """
+        if snapshot.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported anomaly checkpoint version {snapshot.get('version')}")
+        self.baselines = {
+            meter_id: MeterBaseline(count, mean, variance, last_timestamp)
+            for meter_id, (count, mean, variance, last_timestamp) in snapshot["baselines"].items()
+            if self.owns(meter_id)
+        }
+        return len(self.baselines)
+
+
+def write_checkpoint(path: str, snapshot: Dict[str, Any]):
+    """Atomically write a detector snapshot (temp file + rename)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".anomaly_checkpoint_")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+def read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    """Detector snapshot from a checkpoint file, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
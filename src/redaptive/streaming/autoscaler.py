@@ -0,0 +1,188 @@
+"""
+Lag-driven autoscaling of stream consumers.
+===========================================
+
+``ConsumerAutoscaler`` supervises the consumers of one stream and consumer
+group. Every check it reads the group's backlog (undelivered lag plus pending
+entries, via ``get_consumer_lag`` on the processor) and sizes the group to
+``ceil(backlog / target_lag_per_consumer)`` within the policy's bounds.
+
+Scaling up jumps straight to the needed size, so a burst of readings after
+sites reconnect drains quickly. Scaling down removes one consumer at a time,
+and only once the backlog has stayed low for ``scale_down_delay_seconds``, so
+idle periods release tasks and connections without flapping. Removed consumers
+drain: they finish and acknowledge their current batch before stopping, and
+anything they leave pending is claimed by the rest of the group.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AutoscalePolicy:
+    """Bounds and thresholds for one autoscaled consumer group."""
+    min_consumers: int = 1
+    max_consumers: int = 8
+    target_lag_per_consumer: int = 1000  # backlog one consumer is expected to absorb
+    scale_down_delay_seconds: float = 60.0
+    check_interval_seconds: float = 5.0
+    drain_timeout_seconds: float = 5.0
+
+    def __post_init__(self):
+        if not 0 < self.min_consumers <= self.max_consumers:
+            raise ValueError(
+                f"Need 0 < min_consumers <= max_consumers, got {self.min_consumers} and {self.max_consumers}"
+            )
+        if self.target_lag_per_consumer <= 0:
+            raise ValueError("target_lag_per_consumer must be positive")
+
+    def desired_consumers(self, backlog: int) -> int:
+        """Consumer count for a backlog, clamped to the policy bounds."""
+        needed = math.ceil(backlog / self.target_lag_per_consumer)
+        return min(max(needed, self.min_consumers), self.max_consumers)
+
+
+class ConsumerAutoscaler:
+    """
+    Adds and removes consumers of one stream based on consumer group lag.
+
+    Consumers are named ``{consumer_prefix}_{n}`` with the lowest free ``n``, so
+    on Redis the group's consumer list stays bounded by ``max_consumers`` and a
+    restarted consumer reuses the name of one that was removed.
+    """
+
+    def __init__(self, manager, stream_name: str, consumer_group: Optional[str] = None,
+                 policy: Optional[AutoscalePolicy] = None, consumer_prefix: Optional[str] = None):
+        self.manager = manager
+        self.stream_name = stream_name
+        self.consumer_group = consumer_group or f"{stream_name}_processors"
+        self.policy = policy or AutoscalePolicy()
+        self.consumer_prefix = consumer_prefix or f"{stream_name}_consumer"
+        self.consumers: List[str] = []
+        self.last_lag: Dict[str, Any] = {}
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._low_since: Optional[float] = None
+        self.metrics = {
+            "checks": 0,
+            "lag_errors": 0,
+            "scale_ups": 0,
+            "scale_downs": 0,
+            "consumers_started": 0,
+            "consumers_stopped": 0
+        }
+
+    async def start(self) -> bool:
+        """Start the minimum number of consumers and the supervision loop."""
+        if self.running:
+            return True
+        success = await self._scale_to(self.policy.min_consumers)
+        self.running = True
+        self._task = asyncio.create_task(self._supervise())
+        logger.info(
+            f"Autoscaling consumers of '{self.stream_name}' ({self.consumer_group}) between "
+            f"{self.policy.min_consumers} and {self.policy.max_consumers}"
+        )
+        return success
+
+    async def stop(self, stop_consumers: bool = True):
+        """Stop supervising and, by default, drain and stop every consumer it started."""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if stop_consumers:
+            await self._scale_to(0)
+
+    async def _supervise(self):
+        while self.running:
+            await asyncio.sleep(self.policy.check_interval_seconds)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Autoscaler check failed for '{self.stream_name}': {e}")
+
+    async def check(self) -> int:
+        """
+        Read the group's lag once and scale accordingly.
+
+        Returns:
+            Number of consumers running after the check
+        """
+        self.metrics["checks"] += 1
+        lag = await self.manager.get_consumer_lag(self.stream_name, self.consumer_group)
+        if not lag:
+            # Lag unknown (e.g. broker unreachable): keep the current consumers
+            self.metrics["lag_errors"] += 1
+            return len(self.consumers)
+        self.last_lag = lag
+
+        current = len(self.consumers)
+        desired = self.policy.desired_consumers(lag.get("lag", 0) + lag.get("pending", 0))
+        if desired > current:
+            self._low_since = None
+            self.metrics["scale_ups"] += 1
+            logger.info(f"Scaling '{self.stream_name}' consumers {current} -> {desired} (lag {lag})")
+            await self._scale_to(desired)
+        elif desired < current:
+            now = time.monotonic()
+            if self._low_since is None:
+                self._low_since = now
+            if now - self._low_since >= self.policy.scale_down_delay_seconds:
+                # One consumer per delay period, so a dip in traffic cannot empty the group
+                self._low_since = now
+                self.metrics["scale_downs"] += 1
+                logger.info(f"Scaling '{self.stream_name}' consumers {current} -> {current - 1}")
+                await self._scale_to(current - 1)
+        else:
+            self._low_since = None
+        return len(self.consumers)
+
+    async def _scale_to(self, count: int) -> bool:
+        success = True
+        while len(self.consumers) < count:
+            name = self._free_name()
+            if not await self.manager.start_consumer(self.stream_name, name, self.consumer_group):
+                success = False
+                break
+            self.consumers.append(name)
+            self.metrics["consumers_started"] += 1
+        while len(self.consumers) > count:
+            name = self.consumers.pop()
+            await self.manager.stop_consumer(
+                self.stream_name, name, drain_timeout_seconds=self.policy.drain_timeout_seconds
+            )
+            self.metrics["consumers_stopped"] += 1
+        return success
+
+    def _free_name(self) -> str:
+        taken = set(self.consumers)
+        index = 0
+        while f"{self.consumer_prefix}_{index}" in taken:
+            index += 1
+        return f"{self.consumer_prefix}_{index}"
+
+    def status(self) -> Dict[str, Any]:
+        """Current consumers, last observed lag and scaling counters."""
+        return {
+            "consumer_group": self.consumer_group,
+            "consumers": len(self.consumers),
+            "min_consumers": self.policy.min_consumers,
+            "max_consumers": self.policy.max_consumers,
+            "lag": self.last_lag.get("lag"),
+            "pending": self.last_lag.get("pending"),
+            **self.metrics
+        }
@@ -0,0 +1,112 @@
+"""
+Producer-side batching for stream publishing.
+==============================================
+
+Coalesces individual publishes into ``publish_batch`` calls, flushing when a
+batch fills up or when the oldest pending message has lingered long enough.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from .data_models import StreamMessage
+
+logger = logging.getLogger(__name__)
+
+PublishBatchFn = Callable[[List[StreamMessage]], Awaitable[List[Optional[str]]]]
+
+
+class BatchPublisher:
+    """
+    Linger-based batching front end for a single stream.
+
+    Each ``submit`` returns a future that resolves to the message id assigned
+    by the backend (or ``None`` if that message failed). Concurrent publishers
+    share round trips; a lone publisher waits at most ``linger_ms``.
+    """
+
+    def __init__(self, publish_batch: PublishBatchFn, batch_size: int = 500, linger_ms: float = 5.0):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.publish_batch = publish_batch
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        self._pending: List[Tuple[StreamMessage, asyncio.Future]] = []
+        self._linger_task: Optional[asyncio.Task] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.metrics = {
+            "messages_submitted": 0,
+            "batches_flushed": 0,
+            "messages_failed": 0
+        }
+
+    def submit(self, message: StreamMessage) -> asyncio.Future:
+        """Queue a message and return a future for its message id."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message, future))
+        self.metrics["messages_submitted"] += 1
+
+        if len(self._pending) >= self.batch_size:
+            self._start_flush()
+        elif self._linger_task is None:
+            self._linger_task = asyncio.create_task(self._linger())
+
+        return future
+
+    async def publish(self, message: StreamMessage) -> Optional[str]:
+        """Queue a message and wait for its batch to be written."""
+        return await self.submit(message)
+
+    async def flush(self):
+        """Write everything pending and wait for in-flight batches."""
+        self._start_flush()
+        if self._flush_tasks:
+            await asyncio.gather(*list(self._flush_tasks), return_exceptions=True)
+
+    async def close(self):
+        """Flush and stop the linger timer."""
+        await self.flush()
+        if self._linger_task:
+            self._linger_task.cancel()
+            self._linger_task = None
+
+    async def _linger(self):
+        try:
+            await asyncio.sleep(self.linger_ms / 1000)
+        except asyncio.CancelledError:
+            return
+        self._linger_task = None
+        self._start_flush()
+
+    def _start_flush(self):
+        """Hand the pending batch to a background write."""
+        if self._linger_task and self._linger_task is not asyncio.current_task():
+            self._linger_task.cancel()
+        self._linger_task = None
+
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _write(self, batch: List[Tuple[StreamMessage, asyncio.Future]]):
+        try:
+            message_ids = await self.publish_batch([message for message, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch publish of {len(batch)} messages failed: {e}")
+            self.metrics["messages_failed"] += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.metrics["batches_flushed"] += 1
+        for (_, future), message_id in zip(batch, message_ids):
+            if message_id is None:
+                self.metrics["messages_failed"] += 1
+            if not future.done():
+                future.set_result(message_id)
@@ -0,0 +1,364 @@
+"""
+Streaming Throughput Benchmark
+==============================
+
+Drives ``EnergyStreamManager`` end to end with a synthetic meter fleet at a
+fixed reading rate. It reports:
+
+- publish and consume throughput
+- end-to-end latency percentiles
+- consumer lag
+- bytes per message
+
+Results are printed as JSON so runs can be tracked for regressions.
+
+Usage::
+
+    python -m redaptive.streaming.benchmark --backend memory --meters 12000 --rate 2000 --duration 30
+    python -m redaptive.streaming.benchmark --backend redis --output results.json
+
+Redis and Kafka runs use the usual connection settings (see ``docs/streaming``),
+e.g. local containers.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .codecs import get_codec
+from .data_models import MessageType, MeterReading, MeterType, StreamMessage
+from .stream_manager import EnergyStreamManager, StreamBackend
+
+logger = logging.getLogger(__name__)
+
+# The platform's stated sustained load
+TARGET_POINTS_PER_HOUR = 48000
+
+PUBLISH_MODES = ("bulk", "batched", "single")
+
+# Readings per tick when publishing unthrottled (rate 0)
+UNTHROTTLED_TICK_READINGS = 1000
+
+# Fleet mix: mostly electricity, as in the customer portfolios
+_METER_MIX = (
+    (MeterType.ELECTRICITY, "kWh", 0.7),
+    (MeterType.GAS, "therm", 0.1),
+    (MeterType.WATER, "gal", 0.1),
+    (MeterType.CHILLED_WATER, "ton-hr", 0.05),
+    (MeterType.STEAM, "lb", 0.05)
+)
+
+
+@dataclass
+class BenchmarkConfig:
+    """Benchmark parameters."""
+    backend: str = "memory"
+    meters: int = 12000
+    meters_per_building: int = 10
+    rate: float = 2000.0  # readings per second; 0 publishes as fast as possible
+    duration_seconds: float = 30.0
+    publish_mode: str = "bulk"  # bulk: publish_meter_readings, batched: coalescing publisher, single
+    tick_ms: float = 100.0  # readings for each tick are published together
+    consumers: int = 3
+    codec: Optional[str] = None  # None keeps the energy stream default
+    memory_latency_ms: float = 0.0
+    drain_timeout_seconds: float = 30.0
+    trace_memory: bool = False
+    seed: int = 42
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of pre-sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class MeterFleet:
+    """Synthetic meters with per-meter baselines, a daily load shape and noise."""
+
+    def __init__(self, meters: int, meters_per_building: int = 10, seed: int = 42):
+        rng = random.Random(seed)
+        self.rng = rng
+        types, weights = zip(*(((meter_type, unit), weight) for meter_type, unit, weight in _METER_MIX))
+        self.meters = []
+        for i in range(meters):
+            meter_type, unit = rng.choices(types, weights)[0]
+            self.meters.append((
+                f"meter_{i:05d}", f"building_{i // meters_per_building:04d}",
+                meter_type, unit, rng.uniform(5, 500)
+            ))
+        self._next = 0
+
+    def readings(self, count: int, sent_at: float) -> List[MeterReading]:
+        """Next ``count`` readings, cycling through the fleet."""
+        now = datetime.now()
+        # Daytime peak, night-time trough
+        load_shape = 1.0 + 0.3 * math.sin((now.hour + now.minute / 60 - 6) / 24 * 2 * math.pi)
+        readings = []
+        for _ in range(count):
+            meter_id, building_id, meter_type, unit, baseline = self.meters[self._next]
+            self._next = (self._next + 1) % len(self.meters)
+            readings.append(MeterReading(
+                meter_id=meter_id,
+                building_id=building_id,
+                meter_type=meter_type,
+                timestamp=now,
+                value=baseline * load_shape * self.rng.uniform(0.8, 1.2),
+                unit=unit,
+                quality_score=self.rng.uniform(0.95, 1.0),
+                metadata={"bench_sent": sent_at}
+            ))
+        return readings
+
+
+class StreamBenchmark:
+    """One benchmark run against a fresh ``EnergyStreamManager``."""
+
+    def __init__(self, config: BenchmarkConfig):
+        if config.publish_mode not in PUBLISH_MODES:
+            raise ValueError(f"Unknown publish mode '{config.publish_mode}', expected one of {PUBLISH_MODES}")
+        self.config = config
+        self.fleet = MeterFleet(config.meters, config.meters_per_building, config.seed)
+        self.latencies: List[float] = []
+        self.published = 0
+        self.publish_failures = 0
+        self.consumed = 0
+        self.lag_samples: List[int] = []
+        self.last_consumed_at = 0.0
+
+    async def run(self) -> Dict[str, Any]:
+        """Run the benchmark and return the JSON-serializable report."""
+        config = self.config
+        manager = EnergyStreamManager(
+            StreamBackend(config.backend),
+            batch_publishing=config.publish_mode == "batched",
+            memory_latency_ms=config.memory_latency_ms
+        )
+        if not await manager.start():
+            raise RuntimeError(f"Could not start the {config.backend} stream backend")
+
+        try:
+            await manager.setup_energy_streams()
+            stream_name = manager.energy_streams["meter_readings"]
+            if config.codec:
+                manager.streams[stream_name].codec = config.codec
+                await manager.create_stream(stream_name, manager.streams[stream_name])
+            self._instrument(manager)
+            for i in range(config.consumers):
+                await manager.start_consumer(stream_name, f"bench_consumer_{i}")
+
+            if config.trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            publish_seconds = await self._publish(manager)
+            drained = await self._drain()
+            total_seconds = (self.last_consumed_at or time.perf_counter()) - started
+            memory = self._memory_report(manager, stream_name)
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            await manager.stop()
+
+        return self._report(publish_seconds, total_seconds, drained, memory)
+
+    def _instrument(self, manager: EnergyStreamManager):
+        """Wrap the meter reading processor to record end-to-end latency."""
+        process = manager.message_processors[MessageType.METER_READING.value]
+
+        async def timed(message: StreamMessage):
+            result = await process(message)
+            now = time.time()
+            sent_at = message.payload.get("metadata", {}).get("bench_sent")
+            if sent_at is not None:
+                self.latencies.append((now - sent_at) * 1000)
+            self.consumed += 1
+            self.last_consumed_at = time.perf_counter()
+            return result
+
+        manager.register_processor(MessageType.METER_READING.value, timed)
+
+    async def _publish(self, manager: EnergyStreamManager) -> float:
+        """
+        Publish on a fixed tick schedule for the configured duration; returns the seconds spent.
+
+        A rate of 0 publishes unthrottled (``UNTHROTTLED_TICK_READINGS`` per tick),
+        which measures capacity rather than behaviour at a given load.
+        """
+        config = self.config
+        tick = config.tick_ms / 1000
+        per_tick = config.rate * tick if config.rate > 0 else UNTHROTTLED_TICK_READINGS
+        owed = 0.0
+        index = 0
+        started = time.perf_counter()
+
+        while time.perf_counter() - started < config.duration_seconds:
+            owed += per_tick
+            count = int(owed)
+            owed -= count
+            if count:
+                readings = self.fleet.readings(count, time.time())
+                ok = await self._publish_readings(manager, readings)
+                self.published += ok
+                self.publish_failures += count - ok
+            self.lag_samples.append(self.published - self.consumed)
+
+            # Absolute schedule: a slow tick is caught up instead of shifting the rest
+            index += 1
+            delay = started + index * tick - time.perf_counter() if config.rate > 0 else 0
+            await asyncio.sleep(max(delay, 0))
+
+        # Drain coalescing publishers and the Kafka producer
+        await manager.flush()
+        return time.perf_counter() - started
+
+    async def _publish_readings(self, manager: EnergyStreamManager, readings: List[MeterReading]) -> int:
+        mode = self.config.publish_mode
+        if mode == "bulk":
+            ids = await manager.publish_meter_readings(readings)
+            return sum(1 for message_id in ids if message_id is not None)
+        results = await asyncio.gather(*(manager.publish_meter_reading(reading) for reading in readings))
+        return sum(1 for result in results if result)
+
+    async def _drain(self) -> bool:
+        """Wait for consumers to catch up; False if they did not within the timeout."""
+        deadline = time.perf_counter() + self.config.drain_timeout_seconds
+        while self.consumed < self.published:
+            if time.perf_counter() >= deadline:
+                return False
+            self.lag_samples.append(self.published - self.consumed)
+            await asyncio.sleep(0.05)
+        return True
+
+    def _memory_report(self, manager: EnergyStreamManager, stream_name: str) -> Dict[str, Any]:
+        config = manager.streams[stream_name]
+        sample = self.fleet.readings(1, time.time())[0]
+        message = StreamMessage(
+            message_id="00000000-0000-0000-0000-000000000000",
+            message_type=MessageType.METER_READING,
+            source="energy_meter",
+            timestamp=datetime.now(),
+            payload=sample.to_dict()
+        )
+        report = {
+            "codec": config.codec,
+            "wire_bytes_per_message": len(get_codec(config.codec).encode(message))
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report["traced_peak_bytes"] = peak
+            report["traced_bytes_per_message"] = peak / self.published if self.published else 0
+        return report
+
+    def _report(self, publish_seconds: float, total_seconds: float, drained: bool,
+                memory: Dict[str, Any]) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        consume_rate = self.consumed / total_seconds if total_seconds > 0 else 0.0
+        return {
+            "benchmark": "streaming_throughput",
+            "timestamp": datetime.now().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform()
+            },
+            "config": asdict(self.config),
+            "publish": {
+                "published": self.published,
+                "failed": self.publish_failures,
+                "seconds": publish_seconds,
+                "per_second": self.published / publish_seconds if publish_seconds > 0 else 0.0
+            },
+            "consume": {
+                "consumed": self.consumed,
+                "seconds": total_seconds,
+                "per_second": consume_rate,
+                "drained": drained
+            },
+            "latency_ms": {
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1] if latencies else 0.0,
+                "mean": sum(latencies) / len(latencies) if latencies else 0.0
+            },
+            "lag": {
+                "max_messages": max(self.lag_samples, default=0),
+                "final_messages": self.published - self.consumed
+            },
+            "memory": memory,
+            "target": {
+                "points_per_hour": TARGET_POINTS_PER_HOUR,
+                "sustained_points_per_hour": consume_rate * 3600,
+                "headroom": consume_rate * 3600 / TARGET_POINTS_PER_HOUR
+            }
+        }
+
+
+async def run_benchmark(config: BenchmarkConfig) -> Dict[str, Any]:
+    """Run one benchmark and return its report."""
+    return await StreamBenchmark(config).run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Redaptive streaming throughput benchmark")
+    parser.add_argument("--backend", default=defaults.backend, choices=["memory", "redis", "kafka"])
+    parser.add_argument("--meters", type=int, default=defaults.meters)
+    parser.add_argument("--meters-per-building", type=int, default=defaults.meters_per_building)
+    parser.add_argument("--rate", type=float, default=defaults.rate, help="Readings per second (0: unthrottled)")
+    parser.add_argument("--duration", type=float, default=defaults.duration_seconds, help="Publish duration (s)")
+    parser.add_argument("--publish-mode", default=defaults.publish_mode, choices=PUBLISH_MODES)
+    parser.add_argument("--tick-ms", type=float, default=defaults.tick_ms)
+    parser.add_argument("--consumers", type=int, default=defaults.consumers)
+    parser.add_argument("--codec", choices=["json", "msgpack"], help="Override the meter stream codec")
+    parser.add_argument("--memory-latency-ms", type=float, default=defaults.memory_latency_ms,
+                        help="Simulated round trip for the memory backend")
+    parser.add_argument("--drain-timeout", type=float, default=defaults.drain_timeout_seconds)
+    parser.add_argument("--trace-memory", action="store_true", help="Track Python allocations (slower)")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()))
+    # Importing the package may already have configured logging; per-reading INFO logs would dominate
+    logging.getLogger("redaptive").setLevel(getattr(logging, args.log_level.upper()))
+    config = BenchmarkConfig(
+        backend=args.backend,
+        meters=args.meters,
+        meters_per_building=args.meters_per_building,
+        rate=args.rate,
+        duration_seconds=args.duration,
+        publish_mode=args.publish_mode,
+        tick_ms=args.tick_ms,
+        consumers=args.consumers,
+        codec=args.codec,
+        memory_latency_ms=args.memory_latency_ms,
+        drain_timeout_seconds=args.drain_timeout,
+        trace_memory=args.trace_memory,
+        seed=args.seed
+    )
+    report = asyncio.run(run_benchmark(config))
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0 if report["consume"]["drained"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+Wire codecs for stream messages.
+================================
+
+``json`` is the original text format. ``msgpack`` is a compact, versioned binary
+format: a 3-byte header (magic, format version, codec id) followed by a
+positional msgpack array. Naive timestamps travel as integer microseconds
+since the epoch and enums as small integer codes. Meter-reading payloads are
+packed positionally too, so field names and ISO strings are not repeated on
+every message.
+
+The magic byte 0xC1 can never start a UTF-8 string, a JSON document or a valid
+msgpack value, so decoders tell the formats apart without any stream metadata.
+"""
+
+import json
+import logging
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Union
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+from .data_models import MessageType, StreamMessage
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0xC1
+FORMAT_VERSION = 1
+MSGPACK_CODEC_ID = 1
+_MSGPACK_HEADER = bytes((MAGIC, FORMAT_VERSION, MSGPACK_CODEC_ID))
+# Redis connections decode with surrogateescape, which maps the magic byte to this
+_ESCAPED_MAGIC = "\udcc1"
+
+# Append-only wire code tables; reordering them breaks messages already in streams
+MESSAGE_TYPE_CODES = ("meter_reading", "alert", "anomaly", "diagnostic", "heartbeat", "meter_reading_batch",
+                      "meter_aggregate")
+METER_TYPE_CODES = ("electricity", "gas", "water", "steam", "chilled_water")
+
+_MESSAGE_TYPES = [MessageType(value) for value in MESSAGE_TYPE_CODES]
+_MESSAGE_TYPE_INDEX = {message_type: code for code, message_type in enumerate(_MESSAGE_TYPES)}
+_METER_TYPE_INDEX = {value: code for code, value in enumerate(METER_TYPE_CODES)}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_METER_READING_KEYS = frozenset((
+    "meter_id", "building_id", "meter_type", "timestamp", "value", "unit", "quality_score", "metadata"
+))
+
+# Payload kinds
+_GENERIC_PAYLOAD = 0
+_METER_READING_PAYLOAD = 1
+_METER_BATCH_PAYLOAD = 2
+
+# MeterReadingBatch columns travel as raw little-endian array bytes
+_BATCH_COLUMNS = (("meter_index", "I"), ("timestamps", "q"), ("values", "d"), ("quality_scores", "d"))
+_SWAP_BYTES = sys.byteorder != "little"
+
+# Meters report on shared intervals, so a batch repeats a handful of reading
+# timestamps; caching their conversions skips most ISO parsing and formatting
+_TIMESTAMP_CACHE_SIZE = 4096
+_packed_timestamps: Dict[str, Optional[int]] = {}
+_unpacked_timestamps: Dict[int, str] = {}
+
+
+def _pack_datetime(value: datetime) -> Union[int, str]:
+    """Naive datetimes as epoch microseconds; aware ones keep their ISO form (and offset)."""
+    if value.tzinfo is None:
+        return (value - _EPOCH) // _MICROSECOND
+    return value.isoformat()
+
+
+def _unpack_datetime(value: Union[int, str]) -> datetime:
+    if isinstance(value, int):
+        return _EPOCH + timedelta(microseconds=value)
+    return datetime.fromisoformat(value)
+
+
+def _pack_meter_reading(payload: Dict[str, Any]) -> Optional[list]:
+    """Positional form of a ``MeterReading.to_dict()`` payload, or None if it would not round-trip."""
+    if payload.keys() != _METER_READING_KEYS:
+        return None
+    meter_type = _METER_TYPE_INDEX.get(payload["meter_type"])
+    timestamp = payload["timestamp"]
+    if meter_type is None or not isinstance(timestamp, str):
+        return None
+    packed_timestamp = _pack_iso_timestamp(timestamp)
+    if packed_timestamp is None:
+        return None
+    return [
+        payload["meter_id"], payload["building_id"], meter_type, packed_timestamp,
+        payload["value"], payload["unit"], payload["quality_score"], payload["metadata"]
+    ]
+
+
+def _pack_iso_timestamp(timestamp: str) -> Optional[int]:
+    """Epoch microseconds for a naive ISO timestamp, or None if it would not round-trip exactly."""
+    if timestamp in _packed_timestamps:
+        return _packed_timestamps[timestamp]
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        parsed = None
+    packed = None
+    if parsed is not None and parsed.tzinfo is None and parsed.isoformat() == timestamp:
+        packed = _pack_datetime(parsed)
+    if len(_packed_timestamps) >= _TIMESTAMP_CACHE_SIZE:
+        _packed_timestamps.clear()
+    _packed_timestamps[timestamp] = packed
+    return packed
+
+
+def _unpack_iso_timestamp(packed: int) -> str:
+    timestamp = _unpacked_timestamps.get(packed)
+    if timestamp is None:
+        timestamp = _unpack_datetime(packed).isoformat()
+        if len(_unpacked_timestamps) >= _TIMESTAMP_CACHE_SIZE:
+            _unpacked_timestamps.clear()
+        _unpacked_timestamps[packed] = timestamp
+    return timestamp
+
+
+def _pack_meter_batch(payload: Dict[str, Any]) -> Optional[list]:
+    """Raw-bytes form of a ``MeterReadingBatch.to_dict()`` payload, or None if its columns are not typed arrays."""
+    columns = []
+    for name, typecode in _BATCH_COLUMNS:
+        column = payload.get(name)
+        if not isinstance(column, array) or column.typecode != typecode:
+            return None
+        if _SWAP_BYTES:
+            column = array(typecode, column)
+            column.byteswap()
+        columns.append(column.tobytes())
+    return [payload["meters"], payload.get("metadata", {}), *columns]
+
+
+def _unpack_meter_batch(packed: list) -> Dict[str, Any]:
+    meters, metadata, *columns = packed
+    payload = {"meters": meters, "metadata": metadata}
+    for (name, typecode), raw in zip(_BATCH_COLUMNS, columns):
+        column = array(typecode)
+        column.frombytes(raw)
+        if _SWAP_BYTES:
+            column.byteswap()
+        payload[name] = column
+    return payload
+
+
+def _unpack_meter_reading(packed: list) -> Dict[str, Any]:
+    meter_id, building_id, meter_type, timestamp, value, unit, quality_score, metadata = packed
+    return {
+        # Interned: the same few thousand ids repeat across every batch
+        "meter_id": sys.intern(meter_id),
+        "building_id": sys.intern(building_id),
+        "meter_type": METER_TYPE_CODES[meter_type],
+        "timestamp": _unpack_iso_timestamp(timestamp),
+        "value": value,
+        "unit": sys.intern(unit),
+        "quality_score": quality_score,
+        "metadata": metadata
+    }
+
+
+class JsonCodec:
+    """Original text encoding (``StreamMessage.to_json``)."""
+
+    name = "json"
+
+    def encode(self, message: StreamMessage) -> str:
+        return message.to_json()
+
+    def decode(self, data: Union[str, bytes]) -> StreamMessage:
+        return StreamMessage.from_json(data)
+
+
+class MsgpackCodec:
+    """Compact versioned binary encoding."""
+
+    name = "msgpack"
+
+    def __init__(self):
+        if not MSGPACK_AVAILABLE:
+            raise ImportError("msgpack not available. Install with: pip install msgpack")
+
+    def encode(self, message: StreamMessage) -> bytes:
+        payload = message.payload
+        payload_kind = _GENERIC_PAYLOAD
+        if isinstance(payload, dict):
+            packed = None
+            if message.message_type is MessageType.METER_READING:
+                packed, kind = _pack_meter_reading(payload), _METER_READING_PAYLOAD
+            elif message.message_type is MessageType.METER_READING_BATCH:
+                packed, kind = _pack_meter_batch(payload), _METER_BATCH_PAYLOAD
+            if packed is not None:
+                payload, payload_kind = packed, kind
+
+        body = [
+            message.message_id,
+            _MESSAGE_TYPE_INDEX[message.message_type],
+            message.source,
+            _pack_datetime(message.timestamp),
+            message.priority,
+            message.retry_count,
+            message.metadata,
+            payload_kind,
+            payload
+        ]
+        return _MSGPACK_HEADER + msgpack.packb(body, use_bin_type=True)
+
+    def decode(self, data: bytes) -> StreamMessage:
+        if data[1] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported stream message format version {data[1]}")
+        (message_id, message_type, source, timestamp, priority,
+         retry_count, metadata, payload_kind, payload) = msgpack.unpackb(data[3:], raw=False)
+        if payload_kind == _METER_READING_PAYLOAD:
+            payload = _unpack_meter_reading(payload)
+        elif payload_kind == _METER_BATCH_PAYLOAD:
+            payload = _unpack_meter_batch(payload)
+        return StreamMessage(
+            message_id=message_id,
+            message_type=_MESSAGE_TYPES[message_type],
+            source=sys.intern(source),
+            timestamp=_unpack_datetime(timestamp),
+            payload=payload,
+            priority=priority,
+            retry_count=retry_count,
+            metadata=metadata
+        )
+
+
+JSON_CODEC = JsonCodec()
+_CODECS: Dict[str, Any] = {"json": JSON_CODEC}
+_BINARY_CODECS: Dict[int, Any] = {}
+if MSGPACK_AVAILABLE:
+    _CODECS["msgpack"] = _BINARY_CODECS[MSGPACK_CODEC_ID] = MsgpackCodec()
+
+
+def get_codec(name: Optional[str]):
+    """Codec by name; unknown or unavailable codecs fall back to JSON."""
+    codec = _CODECS.get(name or "json")
+    if codec is None:
+        logger.warning(f"Stream codec '{name}' unavailable, falling back to json")
+        return JSON_CODEC
+    return codec
+
+
+def is_binary(data: Union[str, bytes]) -> bool:
+    """Whether encoded data uses a binary codec."""
+    if isinstance(data, str):
+        return data.startswith(_ESCAPED_MAGIC)
+    return data[:1] == _MSGPACK_HEADER[:1]
+
+
+def decode_message(data: Union[str, bytes]) -> StreamMessage:
+    """
+    Decode a message written by any codec.
+
+    Accepts bytes, or a str decoded from bytes with the ``surrogateescape``
+    error handler, as read back from Redis.
+    """
+    if is_binary(data):
+        if isinstance(data, str):
+            data = data.encode("utf-8", "surrogateescape")
+        codec = _BINARY_CODECS.get(data[2])
+        if codec is None:
+            raise ValueError(f"Unsupported stream codec id {data[2]}")
+        return codec.decode(data)
+    return StreamMessage.from_json(data)
+
+
+def decode_record_value(data: bytes) -> Union[StreamMessage, Dict[str, Any]]:
+    """Kafka value deserializer: binary records decode to a StreamMessage, JSON to a dict."""
+    if is_binary(data):
+        return decode_message(data)
+    return json.loads(data.decode("utf-8"))
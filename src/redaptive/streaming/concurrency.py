@@ -0,0 +1,189 @@
+"""
+Consumer-side concurrency for stream processing.
+=================================================
+
+Processes a fetched batch with bounded concurrency while keeping messages that
+share an ordering key (normally the meter) in their original order, and stops
+consumer tasks either immediately or after they finish their current batch.
+
+Entries whose effects are still buffered in memory (readings in open rollup
+windows) are held unacknowledged until the processor's ``ack_gate`` reports
+them flushed, see ``HeldAcks``.
+"""
+
+import asyncio
+import heapq
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+from .data_models import ProcessingResult, ProcessingStatus, StreamMessage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Result field: latest event time (epoch micros) a message applied to state that is written later
+FLUSH_EVENT_FIELD = "flush_event_micros"
+
+
+def ordering_key(message: StreamMessage) -> str:
+    """Key whose messages must be processed in order: meter, then building, then the message itself."""
+    payload = message.payload
+    if hasattr(payload, "get"):
+        return payload.get("meter_id") or payload.get("building_id") or message.message_id
+    return message.message_id
+
+
+async def process_keyed(items: Sequence[T], key: Callable[[T], Hashable],
+                        handler: Callable[[T], Awaitable[Any]],
+                        max_concurrency: int = 16,
+                        priority: Optional[Callable[[T], int]] = None,
+                        budget: Optional[asyncio.Semaphore] = None) -> List[Any]:
+    """
+    Run ``handler`` over a batch with at most ``max_concurrency`` calls in flight.
+
+    Items with the same key form a lane that is handled sequentially, so one slow
+    meter never reorders its own readings while other lanes keep the semaphore busy.
+    A handler exception is logged and recorded as ``None`` without stopping its lane.
+
+    With ``priority``, lanes holding higher-priority items are scheduled first.
+    ``budget`` is an extra semaphore shared with other batches (e.g. every
+    consumer of a priority lane) that each handler call must also hold.
+
+    Returns:
+        Handler results in the original item order
+    """
+    results: List[Any] = [None] * len(items)
+
+    async def handle(index: int):
+        try:
+            if budget is None:
+                results[index] = await handler(items[index])
+            else:
+                async with budget:
+                    results[index] = await handler(items[index])
+        except Exception as e:
+            logger.error(f"Handler failed for batch item {index}: {e}")
+
+    if len(items) <= 1 or (max_concurrency <= 1 and priority is None):
+        for index in range(len(items)):
+            await handle(index)
+        return results
+
+    lanes: Dict[Hashable, List[int]] = {}
+    for index, item in enumerate(items):
+        lanes.setdefault(key(item), []).append(index)
+    ordered = list(lanes.values())
+    if priority is not None:
+        ranks = [priority(item) for item in items]
+        # Stable, so equal-priority lanes keep their fetch order
+        ordered.sort(key=lambda indices: -max(ranks[index] for index in indices))
+
+    if max_concurrency <= 1:
+        for indices in ordered:
+            for index in indices:
+                await handle(index)
+        return results
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_lane(indices: List[int]):
+        for index in indices:
+            async with semaphore:
+                await handle(index)
+
+    # Lanes acquire the semaphore in the order they are started
+    await asyncio.gather(*(run_lane(indices) for indices in ordered))
+    return results
+
+
+async def stop_consumer_task(task: "asyncio.Task", drain_timeout_seconds: Optional[float] = None):
+    """
+    Stop a consumer task whose ``running`` flag has already been cleared.
+
+    With a drain timeout the task gets that long to finish its current batch and
+    exit its loop (so everything it fetched is acknowledged) before it is cancelled.
+    """
+    if drain_timeout_seconds:
+        done, _ = await asyncio.wait({task}, timeout=drain_timeout_seconds)
+        if done:
+            return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def run_commit_hooks(hooks: Sequence[Callable[[str], Awaitable[Any]]], stream_name: str) -> bool:
+    """
+    Await each pre-commit hook for a processed batch.
+
+    Returns:
+        False if a hook failed (logged); the batch must then not be acknowledged
+        or committed, so it is delivered again
+    """
+    for hook in hooks:
+        try:
+            await hook(stream_name)
+        except Exception as e:
+            logger.error(f"Pre-commit hook failed for '{stream_name}'; batch left unacknowledged: {e}")
+            return False
+    return True
+
+
+def held_until(result: Optional[ProcessingResult],
+               ack_gate: Optional[Callable[[], Optional[int]]]) -> Optional[int]:
+    """
+    Event time a completed entry must see flushed before it is acknowledged.
+
+    ``ack_gate`` returns the event time before which every buffered effect has
+    been written (None while nothing has). Returns None when the entry can be
+    acknowledged now.
+    """
+    if ack_gate is None or result is None or result.status != ProcessingStatus.COMPLETED:
+        return None
+    event_micros = (result.result_data or {}).get(FLUSH_EVENT_FIELD)
+    if event_micros is None:
+        return None
+    flushed_before = ack_gate()
+    if flushed_before is not None and event_micros < flushed_before:
+        return None
+    return event_micros
+
+
+class HeldAcks:
+    """
+    Processed entries waiting for their effects to be flushed before they are
+    acknowledged (Redis, memory) or committed past (Kafka).
+
+    A crash loses the open windows together with these entries, which are then
+    redelivered instead of lost. Not thread-safe; one per consumer.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def hold(self, entry: Hashable, event_micros: int):
+        self._seq += 1
+        heapq.heappush(self._heap, (event_micros, self._seq, entry))
+
+    def release(self, flushed_before: Optional[int]) -> List[Hashable]:
+        """Entries whose event time is now before the flushed cutoff."""
+        released = []
+        while self._heap and flushed_before is not None and self._heap[0][0] < flushed_before:
+            released.append(heapq.heappop(self._heap)[2])
+        return released
+
+    def entries(self) -> List[Hashable]:
+        """Every entry still held."""
+        return [entry for _, _, entry in self._heap]
+
+    def discard(self, keep: Callable[[Hashable], bool]):
+        """Forget held entries the consumer no longer owns, e.g. revoked Kafka partitions."""
+        self._heap = [item for item in self._heap if keep(item[2])]
+        heapq.heapify(self._heap)
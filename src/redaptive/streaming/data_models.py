@@ -2,9 +2,10 @@
 Data models for IoT streaming.
 """
 
-from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+from array import array
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Iterable, Iterator
 from enum import Enum
 import json
 
@@ -25,6 +26,8 @@ class MessageType(Enum):
     ANOMALY = "anomaly"
     DIAGNOSTIC = "diagnostic"
     HEARTBEAT = "heartbeat"
+    METER_READING_BATCH = "meter_reading_batch"
+    METER_AGGREGATE = "meter_aggregate"
 
 
 class ProcessingStatus(Enum):
@@ -36,6 +39,81 @@ class ProcessingStatus(Enum):
     RETRYING = "retrying"
 
 
+def _enum_lookup(enum_cls):
+    """Value -> member lookup that skips ``Enum.__call__`` on the hot path."""
+    members = {member.value: member for member in enum_cls}
+    
+    def lookup(value: Any):
+        member = members.get(value)
+        # Members themselves and invalid values go through the enum (which raises ValueError)
+        return member if member is not None else enum_cls(value)
+    
+    return lookup
+
+
+lookup_meter_type = _enum_lookup(MeterType)
+lookup_message_type = _enum_lookup(MessageType)
+lookup_processing_status = _enum_lookup(ProcessingStatus)
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_micros(value: datetime) -> int:
+    """Microseconds since the epoch; naive datetimes are taken as-is, aware ones as UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_micros(value: int) -> datetime:
+    """Naive datetime for epoch microseconds."""
+    return EPOCH + timedelta(microseconds=value)
+
+
+# Messages for the same interval share timestamps, so parsed datetimes (immutable) are reused
+_TIMESTAMP_CACHE_SIZE = 4096
+_parsed_timestamps: Dict[str, datetime] = {}
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """
+    Datetime from an ISO string, epoch microseconds or a datetime.
+    
+    ISO parsing is cached per distinct string; integers skip parsing entirely.
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, int):
+        return from_epoch_micros(value)
+    parsed = _parsed_timestamps.get(value)
+    if parsed is None:
+        parsed = datetime.fromisoformat(value)
+        if len(_parsed_timestamps) >= _TIMESTAMP_CACHE_SIZE:
+            _parsed_timestamps.clear()
+        _parsed_timestamps[value] = parsed
+    return parsed
+
+
+def slotted(cls):
+    """
+    Rebuild a dataclass with ``__slots__``.
+    
+    Equivalent to ``dataclass(slots=True)``, which needs Python 3.10: instances
+    drop their per-instance ``__dict__``, saving memory and attribute lookups.
+    """
+    field_names = tuple(f.name for f in fields(cls))
+    namespace = dict(cls.__dict__)
+    for name in field_names:
+        # Defaults live in the generated __init__; class attributes would clash with slots
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    namespace["__slots__"] = field_names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+@slotted
 @dataclass
 class MeterReading:
     """Standardized meter reading data model."""
@@ -67,8 +145,8 @@ class MeterReading:
         return cls(
             meter_id=data["meter_id"],
             building_id=data["building_id"],
-            meter_type=MeterType(data["meter_type"]),
-            timestamp=datetime.fromisoformat(data["timestamp"]),
+            meter_type=lookup_meter_type(data["meter_type"]),
+            timestamp=parse_timestamp(data["timestamp"]),
             value=float(data["value"]),
             unit=data["unit"],
             quality_score=float(data.get("quality_score", 1.0)),
@@ -76,6 +154,145 @@ class MeterReading:
         )
 
 
+def json_default(value: Any) -> Any:
+    """``json.dumps`` fallback for typed arrays (MeterReadingBatch columns)."""
+    if isinstance(value, array):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+@slotted
+@dataclass
+class MeterReadingBatch:
+    """
+    Column-oriented batch of meter readings.
+    
+    Per-meter attributes (id, building, type, unit) are stored once in a shared
+    dictionary; each reading is one slot in parallel typed arrays holding the
+    meter's dictionary index, epoch-microsecond timestamp, value and quality
+    score. A batch travels as a single METER_READING_BATCH stream message.
+    Per-reading metadata is not carried; ``metadata`` applies to the whole batch.
+    """
+    meter_ids: List[str] = field(default_factory=list)
+    building_ids: List[str] = field(default_factory=list)
+    meter_types: List[MeterType] = field(default_factory=list)
+    units: List[str] = field(default_factory=list)
+    meter_index: array = field(default_factory=lambda: array("I"))
+    timestamps: array = field(default_factory=lambda: array("q"))
+    values: array = field(default_factory=lambda: array("d"))
+    quality_scores: array = field(default_factory=lambda: array("d"))
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    _lookup: Dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self._lookup = {meter_id: index for index, meter_id in enumerate(self.meter_ids)}
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def meter_slot(self, meter_id: str, building_id: str, meter_type: MeterType, unit: str) -> int:
+        """Dictionary index for a meter, registering it on first use."""
+        index = self._lookup.get(meter_id)
+        if index is None:
+            index = len(self.meter_ids)
+            self._lookup[meter_id] = index
+            self.meter_ids.append(meter_id)
+            self.building_ids.append(building_id)
+            self.meter_types.append(meter_type)
+            self.units.append(unit)
+        return index
+    
+    def add(self, meter_id: str, building_id: str, meter_type: MeterType, timestamp: datetime,
+            value: float, unit: str, quality_score: float = 1.0):
+        """Append one reading."""
+        self.meter_index.append(self.meter_slot(meter_id, building_id, meter_type, unit))
+        self.timestamps.append(to_epoch_micros(timestamp))
+        self.values.append(value)
+        self.quality_scores.append(quality_score)
+    
+    @classmethod
+    def from_readings(cls, readings: List["MeterReading"]) -> "MeterReadingBatch":
+        """Build a batch from individual readings."""
+        batch = cls()
+        for reading in readings:
+            batch.add(
+                reading.meter_id, reading.building_id, reading.meter_type, reading.timestamp,
+                reading.value, reading.unit, reading.quality_score
+            )
+        return batch
+    
+    def select(self, positions: Iterable[int]) -> "MeterReadingBatch":
+        """Batch of the readings at the given positions, sharing this batch's meter dictionary."""
+        positions = list(positions)
+        return MeterReadingBatch(
+            meter_ids=self.meter_ids,
+            building_ids=self.building_ids,
+            meter_types=self.meter_types,
+            units=self.units,
+            meter_index=array("I", [self.meter_index[i] for i in positions]),
+            timestamps=array("q", [self.timestamps[i] for i in positions]),
+            values=array("d", [self.values[i] for i in positions]),
+            quality_scores=array("d", [self.quality_scores[i] for i in positions]),
+            metadata=self.metadata
+        )
+    
+    def readings(self) -> Iterator["MeterReading"]:
+        """Materialize individual readings (off the hot path, e.g. for persistence)."""
+        for index, timestamp, value, quality_score in zip(
+            self.meter_index, self.timestamps, self.values, self.quality_scores
+        ):
+            yield MeterReading(
+                meter_id=self.meter_ids[index],
+                building_id=self.building_ids[index],
+                meter_type=self.meter_types[index],
+                timestamp=from_epoch_micros(timestamp),
+                value=value,
+                unit=self.units[index],
+                quality_score=quality_score
+            )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Stream payload. Columns stay typed arrays: JSON encoding turns them into
+        lists (see ``json_default``) while binary codecs ship their raw bytes.
+        """
+        return {
+            "meters": [
+                [meter_id, building_id, meter_type.value, unit]
+                for meter_id, building_id, meter_type, unit in zip(
+                    self.meter_ids, self.building_ids, self.meter_types, self.units
+                )
+            ],
+            "meter_index": self.meter_index,
+            "timestamps": self.timestamps,
+            "values": self.values,
+            "quality_scores": self.quality_scores,
+            "metadata": self.metadata
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MeterReadingBatch":
+        """Create from a stream payload; typed array columns are adopted without copying."""
+        def column(typecode: str, values: Any) -> array:
+            if isinstance(values, array) and values.typecode == typecode:
+                return values
+            return array(typecode, values)
+        
+        meters = data["meters"]
+        return cls(
+            meter_ids=[meter[0] for meter in meters],
+            building_ids=[meter[1] for meter in meters],
+            meter_types=[lookup_meter_type(meter[2]) for meter in meters],
+            units=[meter[3] for meter in meters],
+            meter_index=column("I", data["meter_index"]),
+            timestamps=column("q", data["timestamps"]),
+            values=column("d", data["values"]),
+            quality_scores=column("d", data["quality_scores"]),
+            metadata=data.get("metadata", {})
+        )
+
+
+@slotted
 @dataclass
 class StreamMessage:
     """Generic stream message wrapper."""
@@ -100,7 +317,7 @@ class StreamMessage:
             "retry_count": self.retry_count,
             "metadata": self.metadata
         }
-        return json.dumps(data)
+        return json.dumps(data, default=json_default)
     
     @classmethod
     def from_json(cls, json_str: str) -> "StreamMessage":
@@ -108,9 +325,9 @@ class StreamMessage:
         data = json.loads(json_str)
         return cls(
             message_id=data["message_id"],
-            message_type=MessageType(data["message_type"]),
+            message_type=lookup_message_type(data["message_type"]),
             source=data["source"],
-            timestamp=datetime.fromisoformat(data["timestamp"]),
+            timestamp=parse_timestamp(data["timestamp"]),
             payload=data["payload"],
             priority=data.get("priority", 0),
             retry_count=data.get("retry_count", 0),
@@ -118,6 +335,7 @@ class StreamMessage:
         )
 
 
+@slotted
 @dataclass
 class ProcessingResult:
     """Result of stream message processing."""
@@ -142,6 +360,7 @@ class ProcessingResult:
         }
 
 
+@slotted
 @dataclass
 class StreamConfig:
     """Configuration for stream processing."""
@@ -153,6 +372,13 @@ class StreamConfig:
     consumer_group: Optional[str] = None
     auto_commit: bool = True
     processing_timeout_seconds: int = 30
+    publish_batch_size: int = 500
+    publish_linger_ms: float = 5.0
+    max_length: Optional[int] = None  # approximate cap (MAXLEN ~) applied on publish
+    retention_seconds: Optional[int] = None  # age after which the stream trimmer removes consumed entries
+    max_concurrency: int = 16  # messages processed concurrently per consumer batch
+    codec: str = "json"  # wire format: "json" or "msgpack" (see streaming.codecs)
+    lane: str = "standard"  # priority lane: "critical", "standard" or "bulk" (see streaming.priority)
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
@@ -164,5 +390,12 @@ class StreamConfig:
             "dead_letter_queue": self.dead_letter_queue,
             "consumer_group": self.consumer_group,
             "auto_commit": self.auto_commit,
-            "processing_timeout_seconds": self.processing_timeout_seconds
+            "processing_timeout_seconds": self.processing_timeout_seconds,
+            "publish_batch_size": self.publish_batch_size,
+            "publish_linger_ms": self.publish_linger_ms,
+            "max_length": self.max_length,
+            "retention_seconds": self.retention_seconds,
+            "max_concurrency": self.max_concurrency,
+            "codec": self.codec,
+            "lane": self.lane
         }
\ No newline at end of file
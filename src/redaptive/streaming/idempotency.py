@@ -0,0 +1,307 @@
+"""
+Idempotent processing of redelivered and replayed messages.
+===========================================================
+
+Consumers acknowledge (Redis) or commit (Kafka) a batch only after processing
+it, so a crash between the two delivers the batch again, and a replay re-reads
+history on purpose. ``IdempotencyGuard`` turns those second deliveries into
+no-ops. Meter readings are keyed by ``(meter_id, timestamp)``, so a reading
+republished under a new message id is still recognised. Other messages are
+keyed by ``message_id``.
+
+A key moves through three states:
+
+- applied: processed into in-memory state such as an open rollup window. Later
+  copies are skipped by this process. Nothing is persisted yet, because a
+  crash would lose the window together with the reading.
+- settled: its effect reached the sinks, e.g. every window holding the reading
+  was closed and written. The consumers' pre-commit hook then writes the key to
+  the dedup store before the batch is acknowledged or committed.
+- durable: recorded in the dedup store. Copies are skipped by every consumer
+  sharing the store, also after a restart, until the TTL expires.
+
+A reading's 1-minute window is written long before its hourly one, so with
+window aggregation every (reading, window) pair has a key of its own (see
+``window_key``), settled as soon as that window is written. A reading applied
+but lost in a crash is then re-added on redelivery or replay to exactly the
+windows that were not written yet, and additive rollups never count it twice.
+
+The dedup store is an exact TTL store, either in memory or in Redis shared by
+all consumers. In front of it sits a rotating Bloom filter of the keys this
+process committed, in fixed memory, so the duplicates of a replay are skipped
+without a store round trip. A Bloom filter has no false negatives; its false
+positives (``bloom_error_rate``) are new readings mistaken for duplicates, so
+keep the rate small.
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def reading_key(meter_id: str, timestamp_micros: int) -> str:
+    """Idempotency key of one meter reading."""
+    return f"{meter_id}@{timestamp_micros}"
+
+
+def window_key(reading: str, window_seconds: int, slide_seconds: int, window_end_micros: int) -> str:
+    """Idempotency key of a reading's contribution to one rollup window."""
+    return f"{reading}#{window_seconds}/{slide_seconds}@{window_end_micros}"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` keys at ``error_rate`` false positives."""
+
+    def __init__(self, capacity: int, error_rate: float = 1e-5):
+        if capacity <= 0:
+            raise ValueError("Bloom filter capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("Bloom filter error rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class RotatingBloomFilter:
+    """
+    Two Bloom filter generations; the older one is dropped when the current one
+    fills up or is ``rotate_seconds`` old, so memory stays at two filters and
+    a key is remembered for at least one generation.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 1e-5, rotate_seconds: float = 86400.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotate_seconds = rotate_seconds
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous: Optional[BloomFilter] = None
+        self._started = time.monotonic()
+        self.rotations = 0
+
+    def add(self, key: str):
+        if self.current.full or time.monotonic() - self._started >= self.rotate_seconds:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self._started = time.monotonic()
+            self.rotations += 1
+        self.current.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def memory_bytes(self) -> int:
+        return len(self.current.bits) * 2
+
+
+class MemoryTTLStore:
+    """Per-process dedup store: keys expire after ``ttl_seconds``; the oldest go first beyond ``max_keys``."""
+
+    def __init__(self, ttl_seconds: float = 86400.0, max_keys: int = 2_000_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+
+    def _expire(self, now: float):
+        expiry = self._expiry
+        while expiry:
+            key, expires_at = next(iter(expiry.items()))
+            if expires_at > now:
+                break
+            del expiry[key]
+
+    async def contains_many(self, keys: Sequence[str]) -> List[bool]:
+        self._expire(time.monotonic())
+        return [key in self._expiry for key in keys]
+
+    async def add_many(self, keys: Sequence[str]):
+        expires_at = time.monotonic() + self.ttl_seconds
+        expiry = self._expiry
+        for key in keys:
+            expiry[key] = expires_at
+            expiry.move_to_end(key)
+        while len(expiry) > self.max_keys:
+            expiry.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+
+class RedisTTLStore:
+    """Dedup store shared by every consumer: one expiring Redis key per idempotency key."""
+
+    def __init__(self, redis_client, ttl_seconds: float = 86400.0, prefix: str = "redaptive:dedup:"):
+        self.redis_client = redis_client
+        self.ttl_seconds = max(1, math.ceil(ttl_seconds))
+        self.prefix = prefix
+
+    async def contains_many(self, keys: Sequence[str]) -> List[bool]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(self.prefix + key)
+        return [bool(found) for found in await pipe.execute()]
+
+    async def add_many(self, keys: Sequence[str]):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(self.prefix + key, 1, ex=self.ttl_seconds)
+        await pipe.execute()
+
+
+class IdempotencyGuard:
+    """
+    Tracks idempotency keys from first processing until they are durable.
+
+    Not thread-safe; share one guard between the consumers of an event loop.
+    """
+
+    def __init__(self, store: Optional[Any] = None, ttl_seconds: float = 86400.0,
+                 bloom_capacity: int = 1_000_000, bloom_error_rate: float = 1e-5):
+        self.store = store if store is not None else MemoryTTLStore(ttl_seconds)
+        self.bloom = (
+            RotatingBloomFilter(bloom_capacity, bloom_error_rate, rotate_seconds=ttl_seconds)
+            if bloom_capacity else None
+        )
+        self._applied: Dict[str, Optional[int]] = {}  # key -> event time (epoch micros) if known
+        self._by_time: List[Tuple[int, str]] = []
+        self._settled: Dict[str, None] = {}  # ordered set awaiting the store
+        self.metrics = {
+            "keys_claimed": 0,
+            "duplicates_skipped": 0,
+            "keys_committed": 0,
+            "commit_failures": 0
+        }
+
+    def _known(self, key: str) -> bool:
+        return key in self._applied or key in self._settled or (self.bloom is not None and key in self.bloom)
+
+    async def claim(self, keys: Sequence[str],
+                    event_micros: Optional[Sequence[int]] = None) -> List[bool]:
+        """
+        Claim keys for processing.
+
+        ``event_micros`` gives each key's event time, so ``settle_before`` can
+        release it once its windows are written.
+
+        Returns:
+            Per key, True if it is new and should be processed; False for a
+            duplicate (including a repeat within ``keys``)
+        """
+        fresh = [False] * len(keys)
+        candidates: Dict[str, int] = {}
+        for index, key in enumerate(keys):
+            if key not in candidates and not self._known(key):
+                candidates[key] = index
+
+        if candidates:
+            stored = await self.store.contains_many(list(candidates))
+            for (key, index), seen in zip(candidates.items(), stored):
+                # Another consumer may have claimed the key while the store was queried
+                if seen or key in self._applied or key in self._settled:
+                    continue
+                fresh[index] = True
+                timestamp = event_micros[index] if event_micros is not None else None
+                self._applied[key] = timestamp
+                if timestamp is not None:
+                    heapq.heappush(self._by_time, (timestamp, key))
+
+        claimed = sum(fresh)
+        self.metrics["keys_claimed"] += claimed
+        self.metrics["duplicates_skipped"] += len(keys) - claimed
+        return fresh
+
+    def release(self, keys: Sequence[str]):
+        """Give up claims whose processing failed, so a redelivery processes them again."""
+        for key in keys:
+            self._applied.pop(key, None)
+        self._compact()
+
+    def settle(self, keys: Sequence[str]):
+        """Mark claimed keys whose effects are complete (nothing held in memory)."""
+        for key in keys:
+            if key in self._applied:
+                del self._applied[key]
+                self._settled[key] = None
+        self._compact()
+
+    def settle_before(self, cutoff_micros: int) -> int:
+        """Mark claimed keys with an event time before the cutoff as written to the sinks."""
+        settled = 0
+        while self._by_time and self._by_time[0][0] < cutoff_micros:
+            timestamp, key = heapq.heappop(self._by_time)
+            # Skip entries left behind by release() or settle()
+            if key in self._applied and self._applied[key] == timestamp:
+                del self._applied[key]
+                self._settled[key] = None
+                settled += 1
+        return settled
+
+    def _compact(self):
+        # Keys settled or released by name leave their heap entries behind
+        if len(self._by_time) > 2 * len(self._applied) + 1024:
+            self._by_time = [(timestamp, key) for timestamp, key in self._by_time
+                             if self._applied.get(key) == timestamp]
+            heapq.heapify(self._by_time)
+
+    async def commit(self) -> int:
+        """
+        Write settled keys to the dedup store; run before acknowledging a batch.
+
+        Raises:
+            The store's error; the keys stay settled and are written by the next commit
+        """
+        keys = list(self._settled)
+        if not keys:
+            return 0
+        try:
+            await self.store.add_many(keys)
+        except Exception:
+            self.metrics["commit_failures"] += 1
+            raise
+        for key in keys:
+            self._settled.pop(key, None)
+            if self.bloom is not None:
+                self.bloom.add(key)
+        self.metrics["keys_committed"] += len(keys)
+        return len(keys)
+
+    def status(self) -> Dict[str, Any]:
+        """Key counts per state and dedup counters."""
+        status = {
+            **self.metrics,
+            "store": type(self.store).__name__,
+            "keys_applied": len(self._applied),
+            "keys_settled": len(self._settled)
+        }
+        if self.bloom is not None:
+            status["bloom_memory_bytes"] = self.bloom.memory_bytes()
+            status["bloom_rotations"] = self.bloom.rotations
+        return status
@@ -9,7 +9,7 @@ Supports 12k+ energy meters with 48k+ data points per hour.
 import asyncio
 import logging
 import json
-from typing import Dict, List, Optional, Callable, Any
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Callable, Any, Set
 from datetime import datetime, timedelta
 import time
 import uuid
@@ -17,15 +17,82 @@ import uuid
 try:
     from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
     from aiokafka.errors import KafkaError
+    from aiokafka.structs import TopicPartition
+    from aiokafka.codec import has_gzip, has_lz4, has_zstd
     KAFKA_AVAILABLE = True
 except ImportError:
     KAFKA_AVAILABLE = False
 
 from redaptive.config import settings
-from .data_models import StreamMessage, ProcessingResult, ProcessingStatus, StreamConfig
+from .data_models import (
+    StreamMessage, ProcessingResult, ProcessingStatus, StreamConfig, MessageType, json_default,
+    lookup_message_type, parse_timestamp
+)
+from .codecs import JSON_CODEC, decode_record_value, get_codec
+from .concurrency import HeldAcks, held_until, ordering_key, process_keyed, run_commit_hooks, stop_consumer_task
+from .metrics import StreamHistograms
+from .priority import LaneScheduler
+from .replay import ReplayBound, ReplayEntry, epoch_millis
+from .retry import (
+    dead_letter_fields, dead_letter_name, failure_result, process_with_timeout, retry_message, retry_topic_name
+)
 
 logger = logging.getLogger(__name__)
 
+# Producer tuning. The standard profile favours latency; the high-throughput profile
+# lets records linger so the accumulator fills large, well-compressed batches.
+STANDARD_PRODUCER_SETTINGS = {
+    "compression_type": "gzip",
+    "max_batch_size": 16384,
+    "linger_ms": 10
+}
+HIGH_THROUGHPUT_PRODUCER_SETTINGS = {
+    "compression_type": "zstd",
+    "max_batch_size": 262144,
+    "linger_ms": 50
+}
+# Topics in lanes with dedicated connections share a second producer that sends at once;
+# it is started with the first such topic
+PRIORITY_PRODUCER_SETTINGS = {
+    "compression_type": None,
+    "max_batch_size": 16384,
+    "linger_ms": 0
+}
+
+# Longest pause between polls while batches keep failing (doubling from one second)
+MAX_POLL_BACKOFF_SECONDS = 30
+
+DeliveryFailureCallback = Callable[[str, StreamMessage, Exception], Any]
+
+
+def available_compression(preferred: Optional[str]) -> Optional[str]:
+    """Return the preferred codec if its library is installed, else the best installed one."""
+    if preferred is None:
+        return None
+    codecs = {"zstd": has_zstd, "lz4": has_lz4, "gzip": has_gzip}
+    if preferred in codecs and codecs[preferred]():
+        return preferred
+    for codec in ("zstd", "lz4", "gzip"):
+        if codecs[codec]():
+            logger.warning(f"Kafka compression '{preferred}' unavailable, falling back to '{codec}'")
+            return codec
+    return None
+
+
+def record_priority(record) -> int:
+    """``StreamMessage.priority`` of a consumed record (JSON dict or decoded binary message)."""
+    value = record.value
+    if isinstance(value, dict):
+        return int(value.get("priority") or 0)
+    return getattr(value, "priority", 0)
+
+
+def _serialize_value(value: Any) -> bytes:
+    """Encode a record value; pre-encoded bytes pass straight through."""
+    if isinstance(value, bytes):
+        return value
+    return json.dumps(value, separators=(",", ":"), default=json_default).encode('utf-8')
+
 
 class KafkaStreamProcessor:
     """
@@ -38,21 +105,54 @@ class KafkaStreamProcessor:
     - Automatic retry and dead letter topics
     - Message durability and exactly-once processing
     - Real-time metrics and monitoring
+    
+    With ``high_throughput=True`` the producer lingers longer, fills larger batches
+    and compresses with zstd/lz4 when installed. Publishing never waits on delivery:
+    records are enqueued, their delivery futures tracked, failures reported through
+    ``on_delivery_failure`` callbacks, and ``flush()`` acts as the delivery barrier.
     """
     
-    def __init__(self, bootstrap_servers: Optional[str] = None):
+    def __init__(self, bootstrap_servers: Optional[str] = None, high_throughput: bool = False,
+                 linger_ms: Optional[int] = None, max_batch_size: Optional[int] = None,
+                 compression_type: Optional[str] = None):
         if not KAFKA_AVAILABLE:
             raise ImportError("Kafka not available. Install with: pip install aiokafka")
         
         self.bootstrap_servers = bootstrap_servers or "localhost:9092"
+        self.high_throughput = high_throughput
+        self.producer_settings = dict(
+            HIGH_THROUGHPUT_PRODUCER_SETTINGS if high_throughput else STANDARD_PRODUCER_SETTINGS
+        )
+        if linger_ms is not None:
+            self.producer_settings["linger_ms"] = linger_ms
+        if max_batch_size is not None:
+            self.producer_settings["max_batch_size"] = max_batch_size
+        if compression_type is not None:
+            self.producer_settings["compression_type"] = compression_type
+        
         self.producer: Optional[AIOKafkaProducer] = None
+        self.priority_producer: Optional[AIOKafkaProducer] = None
+        self.lanes = LaneScheduler()
+        # Awaited with the stream name before a processed batch is acknowledged/committed
+        self.commit_hooks: List[Callable[[str], Awaitable[Any]]] = []
+        # Event time before which buffered effects are written; later records are held (see HeldAcks)
+        self.ack_gate: Optional[Callable[[], Optional[int]]] = None
         self.consumers: Dict[str, Dict[str, Any]] = {}
         self.running = False
         self.message_processors: Dict[str, Callable] = {}
+        self.topic_configs: Dict[str, StreamConfig] = {}
+        self.delivery_failure_callbacks: List[DeliveryFailureCallback] = []
+        self._in_flight: Set[asyncio.Future] = set()
+        # Processing/queue time and batch size distributions (see streaming.metrics)
+        self.histograms = StreamHistograms()
         self.metrics = {
             "messages_produced": 0,
+            "messages_enqueued": 0,
+            "delivery_failures": 0,
             "messages_consumed": 0,
             "messages_failed": 0,
+            "messages_retrying": 0,
+            "messages_dead_lettered": 0,
             "processing_time_total": 0.0,
             "last_processed": None
         }
@@ -61,15 +161,7 @@ class KafkaStreamProcessor:
         """Connect to Kafka cluster."""
         try:
             # Initialize producer
-            self.producer = AIOKafkaProducer(
-                bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                key_serializer=lambda k: k.encode('utf-8') if k else None,
-                compression_type='gzip',
-                batch_size=16384,
-                linger_ms=10,
-                max_request_size=1048576
-            )
+            self.producer = self._create_producer(self.producer_settings)
             
             await self.producer.start()
             logger.info("Connected to Kafka stream processor")
@@ -79,6 +171,23 @@ class KafkaStreamProcessor:
             logger.error(f"Failed to connect to Kafka: {e}")
             return False
     
+    def _create_producer(self, producer_settings: Dict[str, Any]) -> "AIOKafkaProducer":
+        return AIOKafkaProducer(
+            bootstrap_servers=self.bootstrap_servers,
+            value_serializer=_serialize_value,
+            key_serializer=lambda k: k.encode('utf-8') if k else None,
+            compression_type=available_compression(producer_settings["compression_type"]),
+            max_batch_size=producer_settings["max_batch_size"],
+            linger_ms=producer_settings["linger_ms"],
+            max_request_size=max(1048576, producer_settings["max_batch_size"])
+        )
+    
+    def _producer(self, topic_name: str) -> "AIOKafkaProducer":
+        """Producer for a topic: the priority producer when its lane has dedicated connections."""
+        if self.priority_producer is not None and self.lanes.dedicated(self._topic_config(topic_name)):
+            return self.priority_producer
+        return self.producer
+    
     async def disconnect(self):
         """Disconnect from Kafka."""
         # Stop all consumers
@@ -86,9 +195,13 @@ class KafkaStreamProcessor:
             topic, consumer_id = consumer_key.split(":", 1)
             await self.stop_consumer(topic, consumer_id)
         
-        # Stop producer
+        # Stop producer (stop() drains the accumulator; settle tracked deliveries too)
+        if self.priority_producer:
+            await self.priority_producer.stop()
         if self.producer:
             await self.producer.stop()
+            if self._in_flight:
+                await asyncio.gather(*list(self._in_flight), return_exceptions=True)
             logger.info("Disconnected from Kafka stream processor")
     
     async def create_topic(self, topic_name: str, config: StreamConfig) -> bool:
@@ -96,6 +209,10 @@ class KafkaStreamProcessor:
         try:
             # Note: In production, topics should be created by admin
             # This is a placeholder for topic configuration
+            self.topic_configs[topic_name] = config
+            if self.producer is not None and self.priority_producer is None and self.lanes.dedicated(config):
+                self.priority_producer = self._create_producer(PRIORITY_PRODUCER_SETTINGS)
+                await self.priority_producer.start()
             logger.info(f"Topic '{topic_name}' should be created with config: {config.to_dict()}")
             return True
             
@@ -103,49 +220,168 @@ class KafkaStreamProcessor:
             logger.error(f"Failed to create topic '{topic_name}': {e}")
             return False
     
+    @staticmethod
+    def _partition_key(message: StreamMessage) -> Optional[str]:
+        """Use meter_id or building_id as partition key for better distribution."""
+        if hasattr(message.payload, 'get'):
+            return ordering_key(message)
+        return None
+    
+    @staticmethod
+    def _message_data(message: StreamMessage) -> Dict[str, Any]:
+        """Kafka record value for a message."""
+        return {
+            "message_id": message.message_id,
+            "message_type": message.message_type.value,
+            "source": message.source,
+            "timestamp": message.timestamp.isoformat(),
+            "payload": message.payload,
+            "priority": message.priority,
+            "retry_count": message.retry_count,
+            "metadata": message.metadata
+        }
+    
+    def _encode(self, topic_name: str, message: StreamMessage) -> Any:
+        """Record value in the topic's codec: a dict for JSON, pre-encoded bytes otherwise."""
+        config = self.topic_configs.get(topic_name)
+        codec = get_codec(config.codec) if config else JSON_CODEC
+        if codec is JSON_CODEC:
+            return self._message_data(message)
+        return codec.encode(message)
+    
+    def on_delivery_failure(self, callback: DeliveryFailureCallback):
+        """Register ``callback(topic_name, message, exception)`` for records the broker never acknowledged."""
+        self.delivery_failure_callbacks.append(callback)
+    
+    async def publish_nowait(self, topic_name: str, message: StreamMessage,
+                             partition_key: Optional[str] = None) -> asyncio.Future:
+        """
+        Enqueue a message without waiting for delivery.
+        
+        Only blocks when the producer's accumulator is full (backpressure).
+        
+        Returns:
+            Delivery future resolving to the record metadata
+        """
+        future = await self._producer(topic_name).send(
+            topic_name,
+            value=self._encode(topic_name, message),
+            key=partition_key or self._partition_key(message)
+        )
+        self.metrics["messages_enqueued"] += 1
+        self._in_flight.add(future)
+        future.add_done_callback(lambda f: self._on_delivery(topic_name, message, f))
+        return future
+    
+    def _on_delivery(self, topic_name: str, message: StreamMessage, future: asyncio.Future):
+        """Account for a settled delivery and report failures."""
+        self._in_flight.discard(future)
+        if future.cancelled():
+            error: Optional[BaseException] = asyncio.CancelledError()
+        else:
+            error = future.exception()
+        
+        if error is None:
+            self.metrics["messages_produced"] += 1
+            return
+        
+        self.metrics["delivery_failures"] += 1
+        logger.error(f"Failed to deliver message {message.message_id} to topic '{topic_name}': {error}")
+        for callback in self.delivery_failure_callbacks:
+            try:
+                callback(topic_name, message, error)
+            except Exception as e:
+                logger.error(f"Delivery failure callback raised: {e}")
+    
+    async def enqueue_batch(self, topic_name: str, messages: List[StreamMessage]) -> List[Optional[str]]:
+        """
+        Enqueue messages without awaiting delivery, e.g. for bulk backfills.
+        
+        Call ``flush()`` for a delivery barrier; failures go to the delivery
+        failure callbacks.
+        
+        Returns:
+            Message id per enqueued message, in order; ``None`` where enqueueing failed
+        """
+        message_ids: List[Optional[str]] = []
+        for message in messages:
+            try:
+                await self.publish_nowait(topic_name, message)
+                message_ids.append(message.message_id)
+            except Exception as e:
+                logger.error(f"Failed to enqueue message {message.message_id} for topic '{topic_name}': {e}")
+                self.metrics["messages_failed"] += 1
+                message_ids.append(None)
+        return message_ids
+    
+    async def flush(self) -> Dict[str, int]:
+        """
+        Send everything lingering in the accumulator and wait for all tracked deliveries.
+        
+        Returns:
+            Counts of deliveries settled by this barrier and how many of them failed
+        """
+        pending = list(self._in_flight)
+        if self.priority_producer:
+            await self.priority_producer.flush()
+        if self.producer:
+            await self.producer.flush()
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        return {
+            "delivered": sum(1 for result in results if not isinstance(result, BaseException)),
+            "failed": sum(1 for result in results if isinstance(result, BaseException))
+        }
+    
     async def publish_message(self, topic_name: str, message: StreamMessage, 
                             partition_key: Optional[str] = None) -> bool:
-        """Publish a message to a Kafka topic."""
+        """Publish a message to a Kafka topic; returns once the record is enqueued."""
         try:
-            # Use meter_id or building_id as partition key for better distribution
-            if not partition_key and hasattr(message.payload, 'get'):
-                partition_key = (
-                    message.payload.get('meter_id') or 
-                    message.payload.get('building_id') or 
-                    message.message_id
-                )
-            
-            # Prepare message data
-            message_data = {
-                "message_id": message.message_id,
-                "message_type": message.message_type.value,
-                "source": message.source,
-                "timestamp": message.timestamp.isoformat(),
-                "payload": message.payload,
-                "priority": message.priority,
-                "retry_count": message.retry_count,
-                "metadata": message.metadata
-            }
-            
-            # Send message
-            await self.producer.send(
-                topic_name,
-                value=message_data,
-                key=partition_key
-            )
-            
-            self.metrics["messages_produced"] += 1
-            logger.debug(f"Published message {message.message_id} to topic {topic_name}")
+            await self.publish_nowait(topic_name, message, partition_key)
+            logger.debug(f"Enqueued message {message.message_id} for topic {topic_name}")
             return True
             
         except Exception as e:
             logger.error(f"Failed to publish message to topic '{topic_name}': {e}")
             return False
     
+    async def publish_batch(self, topic_name: str, messages: List[StreamMessage],
+                            batch_size: Optional[int] = None,
+                            max_length: Optional[int] = None) -> List[Optional[str]]:
+        """
+        Publish messages and wait for all deliveries together.
+        
+        ``send`` only appends to the producer's record accumulator, so every
+        message is enqueued before any delivery is awaited and the producer
+        packs them into as few requests as its batch settings allow.
+        ``batch_size`` and ``max_length`` are accepted for API parity with the
+        Redis processor; Kafka batching and retention are broker/producer settings.
+        
+        Returns:
+            "partition-offset" id per message, in order; ``None`` where delivery failed
+        """
+        futures = []
+        for message in messages:
+            try:
+                futures.append(await self.publish_nowait(topic_name, message))
+            except Exception as e:
+                logger.error(f"Failed to enqueue message {message.message_id} for topic '{topic_name}': {e}")
+                self.metrics["messages_failed"] += 1
+                futures.append(None)
+        
+        pending = [future for future in futures if future is not None]
+        results = iter(await asyncio.gather(*pending, return_exceptions=True))
+        
+        message_ids: List[Optional[str]] = []
+        for future in futures:
+            result = next(results) if future is not None else None
+            if result is None or isinstance(result, BaseException):
+                message_ids.append(None)
+            else:
+                message_ids.append(f"{result.partition}-{result.offset}")
+        return message_ids
+    
     async def publish_meter_reading(self, topic_name: str, meter_reading: Dict[str, Any]) -> bool:
         """Publish a meter reading to the topic."""
-        from .data_models import MessageType
-        
         message = StreamMessage(
             message_id=str(uuid.uuid4()),
             message_type=MessageType.METER_READING,
@@ -160,6 +396,31 @@ class KafkaStreamProcessor:
         
         return await self.publish_message(topic_name, message, partition_key)
     
+    async def publish_meter_readings(self, topic_name: str, meter_readings: List[Dict[str, Any]],
+                                     wait_for_delivery: bool = True) -> List[Optional[str]]:
+        """
+        Publish many meter readings, keyed by meter_id.
+        
+        With ``wait_for_delivery=False`` the readings are only enqueued (bursty
+        backfills); the returned ids are the message ids of the enqueued
+        messages and ``flush()`` is the delivery barrier.
+        """
+        timestamp = datetime.now()
+        messages = [
+            StreamMessage(
+                message_id=str(uuid.uuid4()),
+                message_type=MessageType.METER_READING,
+                source="energy_meter",
+                timestamp=timestamp,
+                payload=meter_reading,
+                priority=0
+            )
+            for meter_reading in meter_readings
+        ]
+        if not wait_for_delivery:
+            return await self.enqueue_batch(topic_name, messages)
+        return await self.publish_batch(topic_name, messages)
+    
     def register_processor(self, message_type: str, processor: Callable):
         """Register a message processor function."""
         self.message_processors[message_type] = processor
@@ -167,18 +428,27 @@ class KafkaStreamProcessor:
     
     async def start_consumer(self, topic_name: str, consumer_id: str,
                            consumer_group: str = "redaptive_energy_processors",
-                           batch_size: int = 100) -> bool:
-        """Start a consumer for a Kafka topic."""
+                           batch_size: int = 100, max_concurrency: int = 16,
+                           processors: Optional[Dict[str, Callable]] = None) -> bool:
+        """
+        Start a consumer for a Kafka topic.
+        
+        Polled batches are processed with up to ``max_concurrency`` records in
+        flight (same-key records stay in partition order) and offsets are
+        committed once per batch. The consumer also reads the topic's retry
+        topic, which holds failed records until their backoff elapses.
+        ``processors`` replaces the registered processors for this consumer.
+        """
         try:
             consumer = AIOKafkaConsumer(
                 topic_name,
+                retry_topic_name(topic_name),
                 bootstrap_servers=self.bootstrap_servers,
                 group_id=consumer_group,
-                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+                value_deserializer=decode_record_value,
                 key_deserializer=lambda k: k.decode('utf-8') if k else None,
                 auto_offset_reset='earliest',
-                enable_auto_commit=True,
-                auto_commit_interval_ms=1000,
+                enable_auto_commit=False,
                 max_poll_records=batch_size,
                 session_timeout_ms=30000,
                 heartbeat_interval_ms=10000
@@ -189,6 +459,10 @@ class KafkaStreamProcessor:
                 "consumer_id": consumer_id,
                 "consumer_group": consumer_group,
                 "consumer": consumer,
+                "batch_size": batch_size,
+                "max_concurrency": max_concurrency,
+                "processors": processors,
+                "held": HeldAcks(),
                 "running": True,
                 "task": None
             }
@@ -209,21 +483,22 @@ class KafkaStreamProcessor:
             logger.error(f"Failed to start consumer: {e}")
             return False
     
-    async def stop_consumer(self, topic_name: str, consumer_id: str):
-        """Stop a consumer."""
+    async def stop_consumer(self, topic_name: str, consumer_id: str,
+                            drain_timeout_seconds: Optional[float] = None):
+        """
+        Stop a consumer; leaving the group hands its partitions to the others.
+        
+        With ``drain_timeout_seconds`` it first finishes and commits its current batch.
+        """
         consumer_key = f"{topic_name}:{consumer_id}"
         
         if consumer_key in self.consumers:
             consumer_info = self.consumers[consumer_key]
             consumer_info["running"] = False
             
-            # Cancel consumer task
+            # Let the task finish its batch when draining, then cancel it
             if consumer_info["task"]:
-                consumer_info["task"].cancel()
-                try:
-                    await consumer_info["task"]
-                except asyncio.CancelledError:
-                    pass
+                await stop_consumer_task(consumer_info["task"], drain_timeout_seconds)
             
             # Stop consumer
             await consumer_info["consumer"].stop()
@@ -239,61 +514,360 @@ class KafkaStreamProcessor:
         
         logger.info(f"Starting message consumption for {topic_name}:{consumer_id}")
         
-        try:
-            async for message in consumer:
-                if not consumer_info["running"]:
-                    break
+        failures = 0
+        held = consumer_info.get("held")
+        while consumer_info["running"]:
+            try:
+                # Commit past held records once their effects are flushed
+                if held and held.release(self.ack_gate() if self.ack_gate else None):
+                    await self._commit_offsets(consumer, held)
                 
-                await self._process_message(message, topic_name, consumer_id)
+                batches = await consumer.getmany(
+                    timeout_ms=1000, max_records=consumer_info.get("batch_size", 100)
+                )
+                records = [record for partition_records in batches.values() for record in partition_records]
+                if records:
+                    await self._process_batch(
+                        consumer, records, topic_name, consumer_id,
+                        consumer_info.get("max_concurrency", 16), consumer_info.get("processors"), held
+                    )
+                failures = 0
                 
-        except asyncio.CancelledError:
-            logger.info(f"Consumer {consumer_id} for topic {topic_name} cancelled")
-        except Exception as e:
-            logger.error(f"Error in consumer {consumer_id}: {e}")
+            except asyncio.CancelledError:
+                logger.info(f"Consumer {consumer_id} for topic {topic_name} cancelled")
+                break
+            except Exception as e:
+                # Failed republishes, hooks and commits leave the batch rewound or uncommitted
+                failures += 1
+                logger.error(f"Error in consumer {consumer_id}: {e}")
+                # Back off while the broker or the dedup store stays down
+                await asyncio.sleep(min(2 ** (failures - 1), MAX_POLL_BACKOFF_SECONDS))
+    
+    async def _process_batch(self, consumer, records: List[Any], topic_name: str,
+                             consumer_id: str, max_concurrency: int = 16,
+                             processors: Optional[Dict[str, Callable]] = None,
+                             held: Optional[HeldAcks] = None) -> List[Optional[ProcessingResult]]:
+        """
+        Process polled records concurrently, settle failures, then commit offsets once.
+        
+        The commit hooks run first; if one fails the partitions are rewound and
+        nothing is committed and RuntimeError is raised, so the batch is delivered
+        again after the consumer loop's backoff.
+        
+        With ``held``, successes whose effects are not flushed yet are kept
+        there, and their partitions are committed only up to the first of them.
+        
+        Retry-topic records that are not yet due pause their partition until the
+        backoff elapses. Failed records are republished to the retry topic or the
+        dead-letter topic, and those deliveries complete before the commit so no
+        failure is lost.
+        """
+        records = self._defer_pending_retries(consumer, records, topic_name)
+        self.histograms.record_batch(topic_name, len(records))
+        config = self._topic_config(topic_name)
+        results = await process_keyed(
+            records,
+            lambda record: (record.topic, record.partition,
+                            record.key if record.key is not None else record.offset),
+            lambda record: self._process_message(record, topic_name, consumer_id, processors),
+            max_concurrency,
+            priority=record_priority,
+            budget=self.lanes.budget(config)
+        )
+        
+        if not await run_commit_hooks(self.commit_hooks, topic_name):
+            for tp, offset in self._first_offsets(records).items():
+                consumer.seek(tp, offset)
+            # The consumer loop backs off before polling the rewound batch again
+            raise RuntimeError(f"Pre-commit hooks failed for '{topic_name}'; batch rewound")
+        
+        try:
+            deliveries = []
+            for record, result in zip(records, results):
+                if result is None or result.status == ProcessingStatus.COMPLETED:
+                    continue
+                if result.status == ProcessingStatus.RETRYING:
+                    retry = retry_message(self._record_message(record), result)
+                    deliveries.append(await self.publish_nowait(
+                        retry_topic_name(topic_name), retry, partition_key=record.key
+                    ))
+                    self.metrics["messages_retrying"] += 1
+                else:
+                    deliveries.append(await self.producer.send(
+                        dead_letter_name(topic_name, config),
+                        value=dead_letter_fields(
+                            record.topic, f"{record.partition}-{record.offset}",
+                            self._record_json(record), result
+                        ),
+                        key=record.key
+                    ))
+                    self.metrics["messages_dead_lettered"] += 1
+            if deliveries:
+                await asyncio.gather(*deliveries)
+        except Exception:
+            # Rewind so the batch is redelivered rather than committed past its failures
+            for tp, offset in self._first_offsets(records).items():
+                consumer.seek(tp, offset)
+            raise
+        
+        if held is not None:
+            for record, result in zip(records, results):
+                event_micros = held_until(result, self.ack_gate)
+                if event_micros is not None:
+                    held.hold((TopicPartition(record.topic, record.partition), record.offset), event_micros)
+        await self._commit_offsets(consumer, held)
+        return results
+    
+    async def settle_held(self) -> int:
+        """Commit past every held record whose effects were flushed since, e.g. on shutdown."""
+        settled = 0
+        for consumer_info in list(self.consumers.values()):
+            held = consumer_info.get("held")
+            released = held.release(self.ack_gate() if self.ack_gate else None) if held else []
+            if released:
+                await self._commit_offsets(consumer_info["consumer"], held)
+                settled += len(released)
+        return settled
+    
+    @staticmethod
+    async def _commit_offsets(consumer, held: Optional[HeldAcks] = None):
+        """
+        Commit the consumed positions, but no partition past its first held record.
+        
+        Records after a held one are delivered again after a restart or
+        rebalance and skipped as duplicates.
+        """
+        if not held:
+            await consumer.commit()
+            return
+        assignment = consumer.assignment()
+        # Revoked partitions are redelivered to their new owner
+        held.discard(lambda entry: entry[0] in assignment)
+        floors: Dict[Any, int] = {}
+        for tp, offset in held.entries():
+            floors[tp] = min(floors.get(tp, offset), offset)
+        offsets = {}
+        for tp in assignment:
+            offsets[tp] = floors[tp] if tp in floors else await consumer.position(tp)
+        await consumer.commit(offsets)
+    
+    @staticmethod
+    def _first_offsets(records: List[Any]) -> Dict[Any, int]:
+        """Lowest offset per partition in a batch."""
+        offsets: Dict[Any, int] = {}
+        for record in records:
+            tp = TopicPartition(record.topic, record.partition)
+            offsets[tp] = min(offsets.get(tp, record.offset), record.offset)
+        return offsets
+    
+    def _defer_pending_retries(self, consumer, records: List[Any], topic_name: str) -> List[Any]:
+        """
+        Hold back retry-topic records whose backoff has not elapsed.
+        
+        The partition is rewound to the first early record, paused and resumed
+        when it is due, so the retry topic acts as a delay queue.
+        """
+        retry_topic = retry_topic_name(topic_name)
+        now = datetime.now()
+        deferred: Dict[Any, float] = {}
+        ready = []
+        for record in records:
+            tp = TopicPartition(record.topic, record.partition)
+            if tp in deferred:
+                continue
+            retry_after = None
+            if record.topic == retry_topic:
+                value = record.value
+                metadata = value.metadata if isinstance(value, StreamMessage) else (value or {}).get("metadata")
+                retry_after = (metadata or {}).get("retry_after")
+            if retry_after and datetime.fromisoformat(retry_after) > now:
+                deferred[tp] = (datetime.fromisoformat(retry_after) - now).total_seconds()
+                consumer.seek(tp, record.offset)
+                consumer.pause(tp)
+                continue
+            ready.append(record)
+        
+        loop = asyncio.get_running_loop()
+        for tp, delay in deferred.items():
+            loop.call_later(delay, consumer.resume, tp)
+        return ready
+    
+    def _topic_config(self, topic_name: str) -> StreamConfig:
+        """Configuration for a topic, falling back to defaults for unconfigured topics."""
+        return self.topic_configs.get(topic_name) or StreamConfig(stream_name=topic_name)
+    
+    def _lane_name(self, topic_name: str) -> str:
+        """Priority lane of a stream, for lane latency tracking."""
+        return self.lanes.lane(self._topic_config(topic_name)).name
+    
+    @staticmethod
+    def _record_json(kafka_message) -> str:
+        """JSON form of a record's value for dead-letter entries; works for undecodable messages too."""
+        value = kafka_message.value
+        if isinstance(value, StreamMessage):
+            return value.to_json()
+        return json.dumps(value, default=str)
     
-    async def _process_message(self, kafka_message, topic_name: str, consumer_id: str):
-        """Process a single Kafka message."""
+    @staticmethod
+    def _record_message(kafka_message) -> StreamMessage:
+        """Reconstruct the StreamMessage carried by a Kafka record."""
+        message_data = kafka_message.value
+        if isinstance(message_data, StreamMessage):
+            # Binary codecs decode straight to a message
+            return message_data
+        return StreamMessage(
+            message_id=message_data["message_id"],
+            message_type=lookup_message_type(message_data["message_type"]),
+            source=message_data["source"],
+            timestamp=parse_timestamp(message_data["timestamp"]),
+            payload=message_data["payload"],
+            priority=message_data.get("priority", 0),
+            retry_count=message_data.get("retry_count", 0),
+            metadata=message_data.get("metadata", {})
+        )
+    
+    async def _process_message(self, kafka_message, topic_name: str, consumer_id: str,
+                               processors: Optional[Dict[str, Callable]] = None) -> ProcessingResult:
+        """
+        Process a single Kafka message.
+        
+        Returns:
+            COMPLETED, RETRYING (with ``retry_after``) or FAILED for the dead-letter topic
+        """
         start_time = time.time()
+        processor = None
+        message_id = f"{kafka_message.partition}-{kafka_message.offset}"
+        message = None
         
         try:
             # Parse message data
-            message_data = kafka_message.value
-            
-            # Reconstruct StreamMessage
-            from .data_models import MessageType
-            message = StreamMessage(
-                message_id=message_data["message_id"],
-                message_type=MessageType(message_data["message_type"]),
-                source=message_data["source"],
-                timestamp=datetime.fromisoformat(message_data["timestamp"]),
-                payload=message_data["payload"],
-                priority=message_data.get("priority", 0),
-                retry_count=message_data.get("retry_count", 0),
-                metadata=message_data.get("metadata", {})
-            )
+            message = self._record_message(kafka_message)
             
             # Find appropriate processor
-            processor = self.message_processors.get(message.message_type.value)
+            if processors is None:
+                processors = self.message_processors
+            processor = processors.get(message.message_type.value)
             if not processor:
                 logger.warning(f"No processor found for message type: {message.message_type}")
-                return
+                self.metrics["messages_failed"] += 1
+                return failure_result(
+                    message_id, message, self._topic_config(topic_name),
+                    f"No processor for message type '{message.message_type.value}'",
+                    (time.time() - start_time) * 1000, retryable=False
+                )
             
             # Process message
-            result = await processor(message)
+            result = await process_with_timeout(processor, message, self._topic_config(topic_name))
             
             # Update metrics
             processing_time = (time.time() - start_time) * 1000
+            self.histograms.record_processing(
+                topic_name, message, processor, processing_time, self._lane_name(topic_name)
+            )
             self.metrics["messages_consumed"] += 1
             self.metrics["processing_time_total"] += processing_time
             self.metrics["last_processed"] = datetime.now()
             
             logger.debug(f"Processed message {message.message_id} in {processing_time:.2f}ms")
+            return ProcessingResult(
+                message_id=message_id,
+                status=ProcessingStatus.COMPLETED,
+                processed_at=datetime.now(),
+                processing_time_ms=processing_time,
+                result_data=result if isinstance(result, dict) else None
+            )
             
         except Exception as e:
             logger.error(f"Failed to process message: {e}")
             self.metrics["messages_failed"] += 1
+            if processor:
+                self.histograms.record_processing(
+                    topic_name, message, processor, (time.time() - start_time) * 1000,
+                    self._lane_name(topic_name)
+                )
+            # Undecodable records are poison and go straight to the dead-letter topic
+            return failure_result(
+                message_id, message, self._topic_config(topic_name), str(e),
+                (time.time() - start_time) * 1000, retryable=message is not None
+            )
+    
+    async def read_range(self, topic_name: str, start: ReplayBound = None, end: ReplayBound = None,
+                         batch_size: int = 1000) -> AsyncIterator[List[ReplayEntry]]:
+        """
+        Read a topic's history with a consumer outside any group.
+        
+        The consumer assigns every partition itself and commits nothing, so live
+        groups never see it. ``start`` and ``end`` are record times, one offset for
+        every partition, or ``{partition: offset}``; the start is inclusive and the
+        end exclusive. Without an end the replay stops at the end offsets as of the
+        call. Records keep their order within a partition.
+        """
+        consumer = AIOKafkaConsumer(
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=None,
+            enable_auto_commit=False,
+            auto_offset_reset='earliest',
+            value_deserializer=decode_record_value,
+            key_deserializer=lambda k: k.decode('utf-8') if k else None,
+            max_poll_records=batch_size
+        )
+        await consumer.start()
+        try:
+            partitions = consumer.partitions_for_topic(topic_name)
+            if partitions is None:
+                await consumer.topics()  # refresh metadata
+                partitions = consumer.partitions_for_topic(topic_name) or set()
+            tps = [TopicPartition(topic_name, partition) for partition in sorted(partitions)]
+            if not tps:
+                return
+            consumer.assign(tps)
+            beginning = await consumer.beginning_offsets(tps)
+            latest = await consumer.end_offsets(tps)
+            starts = await self._replay_offsets(consumer, tps, start, beginning, latest)
+            starts = {tp: max(offset, beginning[tp]) for tp, offset in starts.items()}
+            stops = await self._replay_offsets(consumer, tps, end, latest, latest)
             
-            # TODO: Implement retry logic and dead letter topic
+            remaining = []
+            for tp in tps:
+                if starts[tp] < stops[tp]:
+                    consumer.seek(tp, starts[tp])
+                    remaining.append(tp)
+            while remaining:
+                fetched = await consumer.getmany(*remaining, timeout_ms=1000, max_records=batch_size)
+                batch = []
+                for tp, records in fetched.items():
+                    for record in records:
+                        if record.offset >= stops[tp]:
+                            break
+                        try:
+                            batch.append((f"{record.partition}-{record.offset}", self._record_message(record)))
+                        except Exception as e:
+                            logger.warning(
+                                f"Skipping undecodable record {record.partition}-{record.offset} "
+                                f"in replay of '{topic_name}': {e}"
+                            )
+                # Positions, not record offsets, so compaction gaps and control records cannot stall a partition
+                remaining = [tp for tp in remaining if await consumer.position(tp) < stops[tp]]
+                if batch:
+                    yield batch
+        finally:
+            await consumer.stop()
+    
+    @staticmethod
+    async def _replay_offsets(consumer, tps: List[Any], bound: ReplayBound,
+                              default: Dict[Any, int], latest: Dict[Any, int]) -> Dict[Any, int]:
+        """Per-partition offsets for a replay bound."""
+        if bound is None:
+            return dict(default)
+        if isinstance(bound, datetime):
+            found = await consumer.offsets_for_times({tp: epoch_millis(bound) for tp in tps})
+            # No record at or after the time: the partition's end
+            return {tp: found[tp].offset if found.get(tp) else latest[tp] for tp in tps}
+        if isinstance(bound, dict):
+            return {tp: min(bound.get(tp.partition, default[tp]), latest[tp]) for tp in tps}
+        if isinstance(bound, int):
+            return {tp: min(bound, latest[tp]) for tp in tps}
+        raise ValueError(f"Kafka replays are bounded by times or offsets, got {bound!r}")
     
     async def get_topic_info(self, topic_name: str) -> Dict[str, Any]:
         """Get information about a topic."""
@@ -334,6 +908,61 @@ class KafkaStreamProcessor:
             logger.error(f"Failed to get consumer group info: {e}")
             return {}
     
+    async def get_consumer_lag(self, topic_name: str, consumer_group: str) -> Dict[str, Any]:
+        """
+        Backlog of a consumer group: end offset minus committed offset, summed over
+        the topic's partitions (partitions without a commit count from their
+        beginning, matching ``auto_offset_reset='earliest'``).
+        
+        Offsets are read through a running consumer of the group, or a short-lived
+        one that never joins the group when this process has none.
+        """
+        consumer = next(
+            (info["consumer"] for info in self.consumers.values()
+             if info["consumer_group"] == consumer_group and info["topic_name"] == topic_name),
+            None
+        )
+        temporary = consumer is None
+        try:
+            if temporary:
+                consumer = AIOKafkaConsumer(
+                    bootstrap_servers=self.bootstrap_servers,
+                    group_id=consumer_group,
+                    enable_auto_commit=False
+                )
+                await consumer.start()
+            
+            partitions = consumer.partitions_for_topic(topic_name)
+            if partitions is None:
+                await consumer.topics()  # refresh metadata
+                partitions = consumer.partitions_for_topic(topic_name) or set()
+            tps = [TopicPartition(topic_name, partition) for partition in sorted(partitions)]
+            if not tps:
+                return {"stream": topic_name, "consumer_group": consumer_group, "lag": 0, "pending": 0}
+            
+            end_offsets = await consumer.end_offsets(tps)
+            beginning_offsets = await consumer.beginning_offsets(tps)
+            lag = 0
+            for tp in tps:
+                committed = await consumer.committed(tp)
+                if committed is None:
+                    committed = beginning_offsets[tp]
+                lag += max(end_offsets[tp] - committed, 0)
+            
+            return {
+                "stream": topic_name,
+                "consumer_group": consumer_group,
+                "lag": lag,
+                "pending": 0,  # records are committed per polled batch
+                "partitions": len(tps)
+            }
+        except Exception as e:
+            logger.error(f"Failed to get lag for group '{consumer_group}' on '{topic_name}': {e}")
+            return {}
+        finally:
+            if temporary and consumer is not None:
+                await consumer.stop()
+    
     def get_metrics(self) -> Dict[str, Any]:
         """Get processing metrics."""
         total_messages = self.metrics["messages_consumed"] + self.metrics["messages_failed"]
@@ -344,14 +973,22 @@ class KafkaStreamProcessor:
         
         return {
             "messages_produced": self.metrics["messages_produced"],
+            "messages_enqueued": self.metrics["messages_enqueued"],
+            "delivery_failures": self.metrics["delivery_failures"],
+            "deliveries_in_flight": len(self._in_flight),
+            "high_throughput": self.high_throughput,
             "messages_consumed": self.metrics["messages_consumed"],
             "messages_failed": self.metrics["messages_failed"],
+            "messages_retrying": self.metrics["messages_retrying"],
+            "messages_dead_lettered": self.metrics["messages_dead_lettered"],
+            "messages_held": sum(len(consumer.get("held") or ()) for consumer in self.consumers.values()),
             "success_rate": (
                 self.metrics["messages_consumed"] / total_messages * 100
                 if total_messages > 0 else 0
             ),
             "average_processing_time_ms": avg_processing_time,
             "last_processed": self.metrics["last_processed"],
+            "histograms": self.histograms.snapshot(),
             "active_consumers": len([c for c in self.consumers.values() if c["running"]])
         }
     
@@ -0,0 +1,825 @@
+"""
+In-Memory Stream Processor
+==========================
+
+Single-process stream backend with Redis Streams semantics: append-only
+streams with entry ids, consumer groups, pending entries, acknowledgements,
+stale-entry claiming, delayed retries and dead-letter streams. Messages are
+encoded with the stream's codec exactly as on Redis, so serialization cost is
+part of any measurement.
+
+Intended for tests, local benchmarking and profiling without external brokers.
+``latency_ms`` injects a simulated network round trip into every publish call,
+fetch and acknowledgement.
+"""
+
+import asyncio
+import heapq
+import logging
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .codecs import JSON_CODEC, decode_message, get_codec
+from .concurrency import HeldAcks, held_until, ordering_key, process_keyed, run_commit_hooks, stop_consumer_task
+from .data_models import MessageType, ProcessingResult, ProcessingStatus, StreamConfig, StreamMessage
+from .metrics import StreamHistograms
+from .priority import LaneScheduler, field_priority
+from .replay import ReplayBound, ReplayEntry, entry_key, id_range, next_entry_id
+from .retry import (
+    dead_letter_fields, dead_letter_name, failure_result, process_with_timeout,
+    redeliveries_exhausted, redelivery_result, retry_message
+)
+
+logger = logging.getLogger(__name__)
+
+# (entry id, fields)
+Entry = Tuple[str, Dict[str, Any]]
+
+
+def _range_bound(bound: str, is_end: bool) -> Tuple[Tuple[int, int], bool]:
+    """(id, exclusive) for an XRANGE bound; a bare millisecond id spans all its sequence numbers."""
+    if bound == "-":
+        return (-1, -1), False
+    if bound == "+":
+        return (sys.maxsize, sys.maxsize), False
+    exclusive = bound.startswith("(")
+    millis, _, seq = bound.lstrip("(").partition("-")
+    return (int(millis), int(seq) if seq else (sys.maxsize if is_end else 0)), exclusive
+
+
+class _PendingEntry:
+    __slots__ = ("fields", "consumer", "delivered_at", "deliveries")
+
+    def __init__(self, fields: Dict[str, Any], consumer: str):
+        self.fields = fields
+        self.consumer = consumer
+        self.delivered_at = time.monotonic()
+        self.deliveries = 1
+
+
+class _ConsumerGroup:
+    __slots__ = ("name", "next_offset", "pending", "consumers")
+
+    def __init__(self, name: str, next_offset: int):
+        self.name = name
+        self.next_offset = next_offset  # absolute offset of the next undelivered entry
+        self.pending: Dict[str, _PendingEntry] = {}
+        self.consumers: Dict[str, float] = {}  # consumer name -> last seen (monotonic)
+
+
+class _MemoryStream:
+    __slots__ = ("entries", "first_offset", "last_id", "groups", "retries", "changed")
+
+    def __init__(self):
+        self.entries: List[Entry] = []
+        self.first_offset = 0  # absolute offset of entries[0]; grows as the stream is trimmed
+        self.last_id = (0, 0)
+        self.groups: Dict[str, _ConsumerGroup] = {}
+        self.retries: List[Tuple[float, int, Dict[str, Any]]] = []  # (due, seq, fields) heap
+        self.changed = asyncio.Condition()
+
+    @property
+    def end_offset(self) -> int:
+        return self.first_offset + len(self.entries)
+
+    def append(self, fields: Dict[str, Any], max_length: Optional[int] = None) -> str:
+        millis = int(time.time() * 1000)
+        last_millis, last_seq = self.last_id
+        self.last_id = (millis, 0) if millis > last_millis else (last_millis, last_seq + 1)
+        entry_id = f"{self.last_id[0]}-{self.last_id[1]}"
+        self.entries.append((entry_id, fields))
+        if max_length is not None and len(self.entries) > max_length:
+            self.trim(len(self.entries) - max_length)
+        return entry_id
+
+    def read(self, offset: int, count: int) -> List[Entry]:
+        start = max(offset - self.first_offset, 0)
+        return self.entries[start:start + count]
+
+    def position(self, low: Tuple[int, int], exclusive: bool = False) -> int:
+        """Index of the first entry at or after ``low`` (after it when exclusive)."""
+        # Entry ids increase with the offset, so the entry is found by bisection
+        entries = self.entries
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = entry_key(entries[mid][0])
+            if key < low or (exclusive and key == low):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def trim(self, count: int):
+        """Drop the ``count`` oldest entries."""
+        del self.entries[:count]
+        self.first_offset += count
+
+
+class MemoryStreamProcessor:
+    """
+    In-memory stream processor for tests and local benchmarks.
+
+    Features:
+    - Same interface as RedisStreamProcessor
+    - Consumer groups with pending entries, acks and stale-entry claiming
+    - Delayed retries and dead-letter streams
+    - Configurable injected latency per round trip
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.streams: Dict[str, _MemoryStream] = {}
+        self.consumers: Dict[str, Dict[str, Any]] = {}
+        self.running = False
+        self.message_processors: Dict[str, Callable] = {}
+        self.stream_configs: Dict[str, StreamConfig] = {}
+        self._retry_seq = 0
+        # Processing/queue time and batch size distributions (see streaming.metrics)
+        self.histograms = StreamHistograms()
+        # Priority lanes; there are no connections to dedicate, budgets and SLOs still apply
+        self.lanes = LaneScheduler()
+        # Awaited with the stream name before a processed batch is acknowledged/committed
+        self.commit_hooks: List[Callable[[str], Awaitable[Any]]] = []
+        # Event time before which buffered effects are written; later entries are held (see HeldAcks)
+        self.ack_gate: Optional[Callable[[], Optional[int]]] = None
+        self.metrics = {
+            "messages_published": 0,
+            "publish_batches": 0,
+            "messages_processed": 0,
+            "messages_failed": 0,
+            "messages_retrying": 0,
+            "messages_retried": 0,
+            "messages_dead_lettered": 0,
+            "messages_claimed": 0,
+            "processing_time_total": 0.0,
+            "last_processed": None
+        }
+
+    async def connect(self) -> bool:
+        """Nothing to connect to; always succeeds."""
+        self.running = True
+        logger.info("Started in-memory stream processor")
+        return True
+
+    async def disconnect(self):
+        """Stop all consumers."""
+        for key in list(self.consumers):
+            consumer_info = self.consumers[key]
+            await self.stop_consumer(consumer_info["stream_name"], consumer_info["consumer_name"])
+        self.running = False
+        logger.info("Stopped in-memory stream processor")
+
+    async def _round_trip(self):
+        """Simulated network latency."""
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def _stream(self, stream_name: str) -> _MemoryStream:
+        stream = self.streams.get(stream_name)
+        if stream is None:
+            stream = self.streams[stream_name] = _MemoryStream()
+        return stream
+
+    def _stream_config(self, stream_name: str) -> StreamConfig:
+        """Configuration for a stream, falling back to defaults for unconfigured streams."""
+        return self.stream_configs.get(stream_name) or StreamConfig(stream_name=stream_name)
+
+    def _lane_name(self, stream_name: str) -> str:
+        """Priority lane of a stream, for lane latency tracking."""
+        return self.lanes.lane(self._stream_config(stream_name)).name
+
+    def _codec(self, stream_name: str):
+        """Wire codec configured for a stream."""
+        config = self.stream_configs.get(stream_name)
+        return get_codec(config.codec) if config else JSON_CODEC
+
+    @staticmethod
+    def _message_fields(message: StreamMessage, codec=JSON_CODEC) -> Dict[str, Any]:
+        """Stream entry fields for a message (``priority`` only when set)."""
+        fields = {"data": codec.encode(message), "key": ordering_key(message)}
+        if message.priority:
+            fields["priority"] = message.priority
+        return fields
+
+    async def create_stream(self, stream_name: str, config: StreamConfig) -> bool:
+        """Create a stream and its consumer group (existing groups are kept)."""
+        stream = self._stream(stream_name)
+        if config.consumer_group and config.consumer_group not in stream.groups:
+            # Like XGROUP CREATE ... 0: new groups start from the beginning of the stream
+            stream.groups[config.consumer_group] = _ConsumerGroup(config.consumer_group, stream.first_offset)
+        self.stream_configs[stream_name] = config
+        logger.info(f"Created in-memory stream '{stream_name}' with config: {config.to_dict()}")
+        return True
+
+    async def _append(self, stream_name: str, fields_list: List[Dict[str, Any]],
+                      max_length: Optional[int] = None) -> List[str]:
+        stream = self._stream(stream_name)
+        if max_length is None:
+            max_length = self._stream_config(stream_name).max_length
+        entry_ids = [stream.append(fields, max_length) for fields in fields_list]
+        async with stream.changed:
+            stream.changed.notify_all()
+        return entry_ids
+
+    async def publish_message(self, stream_name: str, message: StreamMessage) -> bool:
+        """Publish a message to a stream."""
+        try:
+            await self._round_trip()
+            await self._append(stream_name, [self._message_fields(message, self._codec(stream_name))])
+            self.metrics["messages_published"] += 1
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish message to stream '{stream_name}': {e}")
+            return False
+
+    async def publish_batch(self, stream_name: str, messages: List[StreamMessage],
+                            batch_size: Optional[int] = None,
+                            max_length: Optional[int] = None) -> List[Optional[str]]:
+        """
+        Publish messages in chunks of ``batch_size``, one simulated round trip each.
+
+        Returns:
+            Stream entry id per message, in order; ``None`` where encoding failed
+        """
+        config = self.stream_configs.get(stream_name)
+        batch_size = batch_size or (config.publish_batch_size if config else 500)
+        codec = self._codec(stream_name)
+        message_ids: List[Optional[str]] = []
+
+        for start in range(0, len(messages), batch_size):
+            chunk = messages[start:start + batch_size]
+            await self._round_trip()
+            fields_list, positions = [], []
+            for message in chunk:
+                try:
+                    fields_list.append(self._message_fields(message, codec))
+                    positions.append(len(message_ids))
+                except Exception as e:
+                    logger.error(f"Failed to publish message {message.message_id} to stream '{stream_name}': {e}")
+                message_ids.append(None)
+            for position, entry_id in zip(positions, await self._append(stream_name, fields_list, max_length)):
+                message_ids[position] = entry_id
+            self.metrics["publish_batches"] += 1
+
+        self.metrics["messages_published"] += sum(1 for message_id in message_ids if message_id is not None)
+        return message_ids
+
+    async def publish_meter_reading(self, stream_name: str, meter_reading: Dict[str, Any]) -> bool:
+        """Publish a meter reading to the stream."""
+        message = StreamMessage(
+            message_id=str(uuid.uuid4()),
+            message_type=MessageType.METER_READING,
+            source="energy_meter",
+            timestamp=datetime.now(),
+            payload=meter_reading,
+            priority=0
+        )
+        return await self.publish_message(stream_name, message)
+
+    async def publish_meter_readings(self, stream_name: str,
+                                     meter_readings: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Publish many meter readings in batches."""
+        timestamp = datetime.now()
+        messages = [
+            StreamMessage(
+                message_id=str(uuid.uuid4()),
+                message_type=MessageType.METER_READING,
+                source="energy_meter",
+                timestamp=timestamp,
+                payload=meter_reading,
+                priority=0
+            )
+            for meter_reading in meter_readings
+        ]
+        return await self.publish_batch(stream_name, messages)
+
+    def register_processor(self, message_type: str, processor: Callable):
+        """Register a message processor function."""
+        self.message_processors[message_type] = processor
+        logger.info(f"Registered processor for message type: {message_type}")
+
+    async def start_consumer(self, stream_name: str, consumer_name: str,
+                             consumer_group: Optional[str] = None,
+                             batch_size: int = 100, max_concurrency: int = 16,
+                             processors: Optional[Dict[str, Callable]] = None) -> bool:
+        """
+        Start a consumer for a stream.
+
+        Without a consumer group the consumer only sees entries published after
+        it starts (like ``XREAD $``) and nothing is tracked as pending.
+        ``processors`` replaces the registered processors for this consumer.
+        """
+        try:
+            stream = self._stream(stream_name)
+            if consumer_group and consumer_group not in stream.groups:
+                stream.groups[consumer_group] = _ConsumerGroup(consumer_group, stream.first_offset)
+            consumer_info = {
+                "stream_name": stream_name,
+                "consumer_name": consumer_name,
+                "consumer_group": consumer_group,
+                "batch_size": batch_size,
+                "max_concurrency": max_concurrency,
+                "processors": processors,
+                "offset": stream.end_offset,
+                "held": HeldAcks(),
+                "running": True,
+                "task": None
+            }
+            consumer_info["task"] = asyncio.create_task(self._consume_messages(consumer_info))
+            self.consumers[f"{stream_name}:{consumer_name}"] = consumer_info
+            logger.info(f"Started consumer '{consumer_name}' for in-memory stream '{stream_name}'")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to start consumer: {e}")
+            return False
+
+    async def stop_consumer(self, stream_name: str, consumer_name: str,
+                            drain_timeout_seconds: Optional[float] = None):
+        """
+        Stop a consumer; its unacknowledged entries stay pending for others to claim.
+
+        With ``drain_timeout_seconds`` it first finishes and acknowledges its current batch.
+        """
+        consumer_key = f"{stream_name}:{consumer_name}"
+
+        if consumer_key in self.consumers:
+            consumer_info = self.consumers[consumer_key]
+            consumer_info["running"] = False
+
+            if consumer_info["task"]:
+                await stop_consumer_task(consumer_info["task"], drain_timeout_seconds)
+
+            del self.consumers[consumer_key]
+            logger.info(f"Stopped consumer '{consumer_name}' for in-memory stream '{stream_name}'")
+
+    async def _consume_messages(self, consumer_info: Dict[str, Any]):
+        """Internal method to consume messages from a stream."""
+        stream_name = consumer_info["stream_name"]
+        consumer_name = consumer_info["consumer_name"]
+        consumer_group = consumer_info["consumer_group"]
+        batch_size = consumer_info["batch_size"]
+        max_concurrency = consumer_info["max_concurrency"]
+        config = self._stream_config(stream_name)
+        last_claim = 0.0
+
+        while consumer_info["running"]:
+            try:
+                self._promote_due_retries(stream_name, batch_size)
+                if consumer_group:
+                    # Before claiming, so held entries never look stale
+                    await self._settle_held(consumer_info)
+
+                if consumer_group and time.monotonic() - last_claim >= config.processing_timeout_seconds:
+                    last_claim = time.monotonic()
+                    claimed = await self._claim_stale_entries(consumer_info, batch_size)
+                    if claimed:
+                        await self._process_batch(
+                            stream_name, claimed, consumer_group, consumer_name, max_concurrency,
+                            consumer_info.get("processors"), consumer_info["held"]
+                        )
+
+                entries = await self._read(consumer_info, batch_size, block_seconds=1.0)
+                if entries:
+                    await self._process_batch(
+                        stream_name, entries, consumer_group, consumer_name, max_concurrency,
+                        consumer_info.get("processors"), consumer_info["held"]
+                    )
+
+            except asyncio.CancelledError:
+                logger.info(f"Consumer {consumer_name} for stream {stream_name} cancelled")
+                break
+            except Exception as e:
+                logger.error(f"Error in consumer {consumer_name}: {e}")
+                await asyncio.sleep(1)
+
+    def _next_offset(self, consumer_info: Dict[str, Any]) -> int:
+        stream = self.streams[consumer_info["stream_name"]]
+        group_name = consumer_info["consumer_group"]
+        offset = stream.groups[group_name].next_offset if group_name else consumer_info["offset"]
+        return max(offset, stream.first_offset)
+
+    async def _read(self, consumer_info: Dict[str, Any], count: int, block_seconds: float) -> List[Entry]:
+        """Deliver up to ``count`` new entries, waiting up to ``block_seconds`` for some (XREADGROUP >)."""
+        stream = self.streams[consumer_info["stream_name"]]
+        if self._next_offset(consumer_info) >= stream.end_offset:
+            try:
+                async with stream.changed:
+                    await asyncio.wait_for(
+                        stream.changed.wait_for(lambda: self._next_offset(consumer_info) < stream.end_offset),
+                        timeout=block_seconds
+                    )
+            except asyncio.TimeoutError:
+                return []
+
+        await self._round_trip()
+        offset = self._next_offset(consumer_info)
+        entries = stream.read(offset, count)
+        group_name = consumer_info["consumer_group"]
+        if group_name:
+            group = stream.groups[group_name]
+            group.next_offset = offset + len(entries)
+            group.consumers[consumer_info["consumer_name"]] = time.monotonic()
+            for entry_id, fields in entries:
+                group.pending[entry_id] = _PendingEntry(fields, consumer_info["consumer_name"])
+        else:
+            consumer_info["offset"] = offset + len(entries)
+        return entries
+
+    def _promote_due_retries(self, stream_name: str, limit: int = 100) -> int:
+        """Move retries whose backoff has elapsed back onto the stream."""
+        stream = self.streams.get(stream_name)
+        if stream is None:
+            return 0
+        now = time.time()
+        promoted = 0
+        while stream.retries and stream.retries[0][0] <= now and promoted < limit:
+            _, _, fields = heapq.heappop(stream.retries)
+            stream.append(fields, self._stream_config(stream_name).max_length)
+            promoted += 1
+        self.metrics["messages_retried"] += promoted
+        return promoted
+
+    async def _claim_stale_entries(self, consumer_info: Dict[str, Any], count: int) -> List[Entry]:
+        """
+        Take over entries pending longer than the processing timeout (XAUTOCLAIM).
+
+        Entries redelivered more than ``max_retries`` times are dead-lettered and
+        acknowledged instead of being returned.
+        """
+        stream_name = consumer_info["stream_name"]
+        config = self._stream_config(stream_name)
+        group = self.streams[stream_name].groups[consumer_info["consumer_group"]]
+        now = time.monotonic()
+        claimed, exhausted = [], []
+        for entry_id, pending in group.pending.items():
+            if len(claimed) + len(exhausted) >= count:
+                break
+            if now - pending.delivered_at >= config.processing_timeout_seconds:
+                pending.consumer = consumer_info["consumer_name"]
+                pending.delivered_at = now
+                pending.deliveries += 1
+                if redeliveries_exhausted(config, pending.deliveries):
+                    exhausted.append((entry_id, pending))
+                else:
+                    claimed.append((entry_id, pending.fields))
+        if claimed or exhausted:
+            self.metrics["messages_claimed"] += len(claimed) + len(exhausted)
+            logger.info(f"Claimed {len(claimed) + len(exhausted)} stale entries on stream '{stream_name}'")
+        if exhausted:
+            await self._round_trip()
+            await self._append(dead_letter_name(stream_name, config), [
+                dead_letter_fields(stream_name, entry_id, pending.fields.get("data"),
+                                   redelivery_result(entry_id, pending.deliveries))
+                for entry_id, pending in exhausted
+            ])
+            self._ack(stream_name, consumer_info["consumer_group"], [entry_id for entry_id, _ in exhausted])
+            self.metrics["messages_dead_lettered"] += len(exhausted)
+            logger.warning(f"Dead-lettered {len(exhausted)} entries redelivered too often on stream '{stream_name}'")
+        return claimed
+
+    async def settle_held(self) -> int:
+        """Acknowledge every held entry whose effects were flushed since, e.g. on shutdown."""
+        settled = 0
+        for consumer_info in list(self.consumers.values()):
+            if consumer_info["consumer_group"]:
+                settled += await self._settle_held(consumer_info)
+        return settled
+
+    async def _settle_held(self, consumer_info: Dict[str, Any]) -> int:
+        """
+        Acknowledge held entries whose effects are now flushed and reset the idle
+        time of the rest, so they are not claimed as stale meanwhile.
+
+        Returns:
+            Number of entries acknowledged
+        """
+        held = consumer_info["held"]
+        if not len(held):
+            return 0
+        stream_name = consumer_info["stream_name"]
+        group = self.streams[stream_name].groups[consumer_info["consumer_group"]]
+        # Entries another consumer claimed after all are no longer ours to acknowledge
+        held.discard(lambda entry_id: getattr(group.pending.get(entry_id), "consumer", None)
+                     == consumer_info["consumer_name"])
+        released = held.release(self.ack_gate() if self.ack_gate else None)
+        now = time.monotonic()
+        for entry_id in held.entries():
+            group.pending[entry_id].delivered_at = now
+        if not released:
+            return 0
+        await self._round_trip()
+        return self._ack(stream_name, consumer_info["consumer_group"], released)
+
+    def _ack(self, stream_name: str, consumer_group: str, entry_ids: List[str]) -> int:
+        """Remove entries from a group's pending entries (XACK)."""
+        group = self.streams[stream_name].groups.get(consumer_group)
+        if group is None:
+            return 0
+        return sum(1 for entry_id in entry_ids if group.pending.pop(entry_id, None) is not None)
+
+    async def _process_batch(self, stream_name: str, entries: List[Entry],
+                             consumer_group: Optional[str], consumer_name: str,
+                             max_concurrency: int = 16,
+                             processors: Optional[Dict[str, Callable]] = None,
+                             held: Optional[HeldAcks] = None) -> List[str]:
+        """
+        Process fetched entries concurrently, then settle the batch.
+
+        Failures are scheduled for a delayed retry or written to the dead-letter
+        stream and acknowledged together with the successes. Nothing is
+        acknowledged when a commit hook fails. With ``held``, successes whose
+        effects are not flushed yet go there instead of being acknowledged.
+
+        Returns:
+            Ids of the entries that were acknowledged
+        """
+        self.histograms.record_batch(stream_name, len(entries))
+        config = self._stream_config(stream_name)
+        results = await process_keyed(
+            entries,
+            lambda entry: entry[1].get("key") or entry[0],
+            lambda entry: self._process_message(
+                stream_name, entry[0], entry[1], consumer_group, consumer_name, processors
+            ),
+            max_concurrency,
+            priority=lambda entry: field_priority(entry[1]),
+            budget=self.lanes.budget(config)
+        )
+
+        if not await run_commit_hooks(self.commit_hooks, stream_name):
+            return []
+
+        stream = self.streams[stream_name]
+        ack_ids = []
+        dead_letters = []
+        for (message_id, fields), result in zip(entries, results):
+            if result is None:
+                continue
+            if result.status == ProcessingStatus.RETRYING:
+                retry = retry_message(decode_message(fields["data"]), result)
+                self._retry_seq += 1
+                heapq.heappush(stream.retries, (
+                    result.retry_after.timestamp(), self._retry_seq,
+                    self._message_fields(retry, self._codec(stream_name))
+                ))
+                self.metrics["messages_retrying"] += 1
+            elif result.status == ProcessingStatus.FAILED:
+                dead_letters.append(dead_letter_fields(stream_name, message_id, fields.get("data"), result))
+                self.metrics["messages_dead_lettered"] += 1
+            elif held is not None and consumer_group:
+                event_micros = held_until(result, self.ack_gate)
+                if event_micros is not None:
+                    held.hold(message_id, event_micros)
+                    continue
+            ack_ids.append(message_id)
+
+        if ack_ids:
+            await self._round_trip()
+            if dead_letters:
+                await self._append(dead_letter_name(stream_name, config), dead_letters)
+            if consumer_group:
+                self._ack(stream_name, consumer_group, ack_ids)
+        return ack_ids
+
+    async def _process_message(self, stream_name: str, message_id: str,
+                               fields: Dict[str, Any], consumer_group: Optional[str],
+                               consumer_name: str,
+                               processors: Optional[Dict[str, Callable]] = None) -> ProcessingResult:
+        """
+        Process a single message.
+
+        Returns:
+            COMPLETED, RETRYING (with ``retry_after``) or FAILED for the dead-letter stream
+        """
+        start_time = time.time()
+        processor = None
+        message = None
+
+        try:
+            message = decode_message(fields["data"])
+
+            if processors is None:
+                processors = self.message_processors
+            processor = processors.get(message.message_type.value)
+            if not processor:
+                logger.warning(f"No processor found for message type: {message.message_type}")
+                self.metrics["messages_failed"] += 1
+                return failure_result(
+                    message_id, message, self._stream_config(stream_name),
+                    f"No processor for message type '{message.message_type.value}'",
+                    (time.time() - start_time) * 1000, retryable=False
+                )
+
+            result = await process_with_timeout(processor, message, self._stream_config(stream_name))
+
+            processing_time = (time.time() - start_time) * 1000
+            self.histograms.record_processing(
+                stream_name, message, processor, processing_time, self._lane_name(stream_name)
+            )
+            self.metrics["messages_processed"] += 1
+            self.metrics["processing_time_total"] += processing_time
+            self.metrics["last_processed"] = datetime.now()
+
+            return ProcessingResult(
+                message_id=message_id,
+                status=ProcessingStatus.COMPLETED,
+                processed_at=datetime.now(),
+                processing_time_ms=processing_time,
+                result_data=result if isinstance(result, dict) else None
+            )
+
+        except Exception as e:
+            logger.error(f"Failed to process message {message_id}: {e}")
+            self.metrics["messages_failed"] += 1
+            if processor:
+                self.histograms.record_processing(
+                    stream_name, message, processor, (time.time() - start_time) * 1000,
+                    self._lane_name(stream_name)
+                )
+            return failure_result(
+                message_id, message, self._stream_config(stream_name), str(e),
+                (time.time() - start_time) * 1000, retryable=message is not None
+            )
+
+    async def read_range(self, stream_name: str, start: ReplayBound = None, end: ReplayBound = None,
+                         batch_size: int = 1000) -> AsyncIterator[List[ReplayEntry]]:
+        """
+        Read a stream's history in id order, outside any consumer group (``XRANGE``).
+
+        ``start`` and ``end`` are entry ids or publish times; the start is inclusive
+        and the end exclusive. The replay stops at the stream's end as of the call.
+        """
+        stream = self.streams.get(stream_name)
+        if stream is None:
+            return
+        first, last = id_range(start, end)
+        low, low_exclusive = _range_bound(first, is_end=False)
+        high, high_exclusive = _range_bound(last, is_end=True)
+
+        offset = stream.first_offset + stream.position(low, low_exclusive)
+        stop = stream.end_offset
+
+        while offset < stop:
+            await self._round_trip()
+            chunk = stream.read(offset, min(batch_size, stop - offset))
+            if not chunk:
+                return
+            offset += len(chunk)
+            batch = []
+            for entry_id, fields in chunk:
+                key = entry_key(entry_id)
+                if key > high or (high_exclusive and key == high):
+                    offset = stop
+                    break
+                try:
+                    batch.append((entry_id, decode_message(fields["data"])))
+                except Exception as e:
+                    logger.warning(f"Skipping undecodable entry {entry_id} in replay of '{stream_name}': {e}")
+            if batch:
+                yield batch
+
+    async def retention_floor(self, stream_name: str) -> Optional[str]:
+        """
+        Smallest entry id a consumer group still needs (its oldest pending or first
+        undelivered entry); None when the stream has no groups.
+        """
+        stream = self.streams.get(stream_name)
+        if stream is None or not stream.groups:
+            return None
+        await self._round_trip()
+        floor = None
+        for group in stream.groups.values():
+            if group.pending:
+                needed = min(group.pending, key=entry_key)
+            elif group.next_offset < stream.end_offset:
+                needed = stream.read(group.next_offset, 1)[0][0]
+            else:
+                needed = next_entry_id(f"{stream.last_id[0]}-{stream.last_id[1]}")
+            if floor is None or entry_key(needed) < entry_key(floor):
+                floor = needed
+        return floor
+
+    async def trim_stream(self, stream_name: str, min_id: str, approximate: bool = True) -> int:
+        """Delete entries older than ``min_id`` (``XTRIM MINID``); always exact in memory."""
+        stream = self.streams.get(stream_name)
+        if stream is None:
+            return 0
+        await self._round_trip()
+        removed = stream.position(entry_key(min_id))
+        stream.trim(removed)
+        return removed
+
+    async def get_stream_info(self, stream_name: str) -> Dict[str, Any]:
+        """Get information about a stream."""
+        stream = self.streams.get(stream_name)
+        if stream is None:
+            return {}
+        return {
+            "length": len(stream.entries),
+            "groups": len(stream.groups),
+            "last_generated_id": f"{stream.last_id[0]}-{stream.last_id[1]}",
+            "first_entry": stream.entries[0] if stream.entries else None,
+            "last_entry": stream.entries[-1] if stream.entries else None,
+            "retries_scheduled": len(stream.retries)
+        }
+
+    async def get_consumer_info(self, stream_name: str, consumer_group: str) -> List[Dict[str, Any]]:
+        """Get information about consumers in a group."""
+        stream = self.streams.get(stream_name)
+        group = stream.groups.get(consumer_group) if stream else None
+        if group is None:
+            return []
+        now = time.monotonic()
+        pending_counts: Dict[str, int] = {}
+        for pending in group.pending.values():
+            pending_counts[pending.consumer] = pending_counts.get(pending.consumer, 0) + 1
+        return [
+            {
+                "name": name,
+                "pending": pending_counts.get(name, 0),
+                "idle": int((now - last_seen) * 1000)
+            }
+            for name, last_seen in group.consumers.items()
+        ]
+
+    async def get_pending(self, stream_name: str, consumer_group: str) -> List[Dict[str, Any]]:
+        """Pending (delivered, unacknowledged) entries of a group (XPENDING)."""
+        stream = self.streams.get(stream_name)
+        group = stream.groups.get(consumer_group) if stream else None
+        if group is None:
+            return []
+        now = time.monotonic()
+        return [
+            {
+                "message_id": entry_id,
+                "consumer": pending.consumer,
+                "idle": int((now - pending.delivered_at) * 1000),
+                "times_delivered": pending.deliveries
+            }
+            for entry_id, pending in group.pending.items()
+        ]
+
+    async def get_consumer_lag(self, stream_name: str, consumer_group: str) -> Dict[str, Any]:
+        """
+        Entries not yet delivered to a group (``lag``) and delivered but unacknowledged
+        (``pending``). Empty if the group does not exist.
+        """
+        stream = self.streams.get(stream_name)
+        group = stream.groups.get(consumer_group) if stream else None
+        if group is None:
+            return {}
+        await self._round_trip()
+        return {
+            "stream": stream_name,
+            "consumer_group": consumer_group,
+            "lag": stream.end_offset - max(group.next_offset, stream.first_offset),
+            "pending": len(group.pending),
+            "consumers": len(group.consumers)
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get processing metrics."""
+        total_messages = self.metrics["messages_processed"] + self.metrics["messages_failed"]
+        avg_processing_time = (
+            self.metrics["processing_time_total"] / self.metrics["messages_processed"]
+            if self.metrics["messages_processed"] > 0 else 0
+        )
+
+        return {
+            "messages_published": self.metrics["messages_published"],
+            "publish_batches": self.metrics["publish_batches"],
+            "messages_processed": self.metrics["messages_processed"],
+            "messages_failed": self.metrics["messages_failed"],
+            "messages_retrying": self.metrics["messages_retrying"],
+            "messages_retried": self.metrics["messages_retried"],
+            "messages_dead_lettered": self.metrics["messages_dead_lettered"],
+            "messages_claimed": self.metrics["messages_claimed"],
+            "messages_held": sum(len(consumer.get("held") or ()) for consumer in self.consumers.values()),
+            "success_rate": (
+                self.metrics["messages_processed"] / total_messages * 100
+                if total_messages > 0 else 0
+            ),
+            "average_processing_time_ms": avg_processing_time,
+            "last_processed": self.metrics["last_processed"],
+            "histograms": self.histograms.snapshot(),
+            "active_consumers": len(self.consumers)
+        }
+
+    async def health_check(self) -> Dict[str, Any]:
+        """Perform health check."""
+        healthy_consumers = sum(
+            1 for consumer in self.consumers.values()
+            if consumer["running"] and consumer["task"] and not consumer["task"].done()
+        )
+        return {
+            "status": "healthy" if self.running else "stopped",
+            "backend": "memory",
+            "active_consumers": healthy_consumers,
+            "total_consumers": len(self.consumers),
+            "metrics": self.get_metrics()
+        }
@@ -0,0 +1,262 @@
+"""
+Latency histograms for stream processing.
+=========================================
+
+``LatencyHistogram`` is an HDR-style log-linear histogram: every power of two
+is split into ``SUB_BUCKETS`` equal buckets, so quantiles carry a bounded
+relative error (about 3%) across microseconds to hours in a few hundred
+sparse counters, and recording is O(1).
+
+``StreamHistograms`` keeps one histogram per metric and label set. The stream
+processors record processing time per stream, message type and processor,
+queue time (publish to consume) per stream and message type, end-to-end time
+(publish to processed) per priority lane, and consumer batch sizes per stream. Snapshots are exposed through ``get_metrics()``, and
+``render_prometheus`` / ``serve_metrics`` publish them as Prometheus summaries.
+"""
+
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .data_models import StreamMessage
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKETS = 16
+# Values below 2**MIN_EXPONENT share the first octave; above 2**MAX_EXPONENT the last
+MIN_EXPONENT = -10
+MAX_EXPONENT = 40
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+PROCESSING_TIME = "processing_time_ms"
+QUEUE_TIME = "queue_time_ms"
+END_TO_END_TIME = "end_to_end_ms"
+BATCH_SIZE = "batch_size"
+
+_HELP = {
+    PROCESSING_TIME: "Time spent in the message processor",
+    QUEUE_TIME: "Time from publish to the start of processing",
+    END_TO_END_TIME: "Time from publish to the end of processing, per priority lane",
+    BATCH_SIZE: "Messages per consumer fetch"
+}
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative values with exact count, sum, min and max."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(value: float) -> int:
+        if value <= 0:
+            return -1
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, mantissa in [0.5, 1)
+        if exponent < MIN_EXPONENT:
+            return 0
+        if exponent > MAX_EXPONENT:
+            return (MAX_EXPONENT - MIN_EXPONENT + 1) * SUB_BUCKETS - 1
+        return (exponent - MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+    @staticmethod
+    def _upper_bound(index: int) -> float:
+        if index < 0:
+            return 0.0
+        exponent, sub_bucket = divmod(index, SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub_bucket + 1) / (2 * SUB_BUCKETS), exponent + MIN_EXPONENT)
+
+    def record(self, value: float, count: int = 1):
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, fraction: float) -> float:
+        """Value at a quantile: its bucket's upper bound, clamped to the observed range."""
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(fraction * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._upper_bound(index), self.min), self.max)
+        return self.max
+
+    def count_above(self, threshold: float) -> int:
+        """Values above a threshold, to bucket resolution."""
+        if self.max <= threshold:
+            return 0
+        return sum(count for index, count in self.counts.items() if self._upper_bound(index) > threshold)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Count, sum, mean, min, max and the standard quantiles."""
+        stats = {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max
+        }
+        for fraction in QUANTILES:
+            stats[f"p{fraction * 100:g}".replace(".", "")] = self.quantile(fraction)
+        return stats
+
+
+def queue_time_ms(message: StreamMessage, now: Optional[datetime] = None) -> Optional[float]:
+    """Milliseconds since a message was published, or None if its timestamp is not comparable."""
+    if message.timestamp.tzinfo is not None:
+        return None
+    elapsed = ((now or datetime.now()) - message.timestamp).total_seconds() * 1000
+    return max(elapsed, 0.0)
+
+
+def processor_name(processor: Callable) -> str:
+    """Label for a registered message processor."""
+    return getattr(processor, "__name__", None) or type(processor).__name__
+
+
+class StreamHistograms:
+    """Histograms keyed by metric name and labels."""
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, _Labels], LatencyHistogram] = {}
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(value)
+
+    def record_processing(self, stream: str, message: StreamMessage, processor: Callable,
+                          processing_ms: float, lane: Optional[str] = None):
+        """Processing and queue time for one processed message, plus end-to-end time for its lane."""
+        message_type = message.message_type.value
+        self.observe(PROCESSING_TIME, processing_ms, stream=stream, message_type=message_type,
+                     processor=processor_name(processor))
+        queued = queue_time_ms(message)
+        if queued is not None:
+            self.observe(QUEUE_TIME, queued, stream=stream, message_type=message_type)
+            if lane is not None:
+                self.observe(END_TO_END_TIME, queued + processing_ms, lane=lane)
+
+    def record_batch(self, stream: str, size: int):
+        self.observe(BATCH_SIZE, size, stream=stream)
+
+    def merge(self, other: "StreamHistograms"):
+        """Add another set's counts (e.g. from a worker process) series by series."""
+        for key, histogram in other.histograms.items():
+            target = self.histograms.get(key)
+            if target is None:
+                target = self.histograms[key] = LatencyHistogram()
+            target.merge(histogram)
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Per metric, one entry per label set with its labels and statistics."""
+        snapshot: Dict[str, List[Dict[str, Any]]] = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            snapshot.setdefault(name, []).append({**dict(labels), **histogram.snapshot()})
+        return snapshot
+
+    def reset(self):
+        self.histograms.clear()
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(histograms: StreamHistograms, counters: Optional[Dict[str, Any]] = None,
+                      prefix: str = "redaptive_stream", labels: Optional[Dict[str, str]] = None) -> str:
+    """
+    Prometheus text exposition: histograms as summaries (quantiles, sum, count)
+    and numeric ``counters`` (e.g. processor metrics) as untyped samples.
+    """
+    base_labels = dict(labels or {})
+    lines = []
+    for name, value in sorted((counters or {}).items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"# TYPE {prefix}_{name} untyped")
+        lines.append(f"{prefix}_{name}{_label_text(base_labels)} {value}")
+
+    by_name: Dict[str, List[Tuple[_Labels, LatencyHistogram]]] = {}
+    for (name, series_labels), histogram in sorted(histograms.histograms.items()):
+        by_name.setdefault(name, []).append((series_labels, histogram))
+
+    for name, series in by_name.items():
+        metric = f"{prefix}_{name}"
+        lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} summary")
+        for series_labels, histogram in series:
+            sample_labels = {**base_labels, **dict(series_labels)}
+            for fraction in QUANTILES:
+                quantile_labels = {**sample_labels, "quantile": f"{fraction:g}"}
+                lines.append(f"{metric}{_label_text(quantile_labels)} {histogram.quantile(fraction)}")
+            lines.append(f"{metric}_sum{_label_text(sample_labels)} {histogram.total}")
+            lines.append(f"{metric}_count{_label_text(sample_labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(render: Callable[[], str], host: str = "0.0.0.0", port: int = 9108):
+    """
+    Minimal HTTP endpoint answering ``GET /metrics`` with ``render()``.
+
+    Returns:
+        The asyncio server; close it with ``server.close()``
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            # Drain the request headers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                body = render().encode("utf-8")
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body, status, content_type = b"Not Found\n", "404 Not Found", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving stream metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,130 @@
+"""
+Priority lanes for stream processing.
+=====================================
+
+Every stream belongs to a lane (``StreamConfig.lane``): ``critical`` for field
+alerts, ``standard`` for anomalies and diagnostics, ``bulk`` for meter
+readings and rollups. Each lane has:
+
+- a latency SLO: the p99 end-to-end time from publish until processed
+- an optional in-flight budget shared by every consumer of the lane's streams,
+  so a flood of bulk readings cannot crowd alert handlers off the event loop
+- optionally its own connections: a separate Redis pool or Kafka producer, so
+  alert publishes and reads never queue behind bulk pipelines
+
+Within a fetched batch, messages with a higher ``StreamMessage.priority`` are
+scheduled first (per-meter ordering is still kept).
+"""
+
+import asyncio
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Dict, List, Mapping, Optional
+
+from .data_models import StreamConfig
+from .metrics import END_TO_END_TIME, StreamHistograms
+
+
+class Priority(IntEnum):
+    """``StreamMessage.priority`` levels; higher is processed first."""
+    BULK = 0
+    NORMAL = 1
+    HIGH = 2
+    CRITICAL = 3
+
+
+# Alert ``priority``/``severity`` values as used by the monitoring agents
+_ALERT_PRIORITIES = {
+    "critical": Priority.CRITICAL,
+    "high": Priority.HIGH,
+    "medium": Priority.NORMAL,
+    "low": Priority.NORMAL
+}
+
+
+def alert_priority(alert: Mapping[str, Any]) -> Priority:
+    """Message priority for an alert payload, from its ``priority`` or ``severity``."""
+    level = str(alert.get("priority") or alert.get("severity") or "").lower()
+    return _ALERT_PRIORITIES.get(level, Priority.HIGH)
+
+
+def field_priority(fields: Mapping[str, Any]) -> int:
+    """Priority of a Redis or in-memory stream entry (absent means bulk)."""
+    try:
+        return int(fields.get("priority", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True)
+class PriorityLane:
+    """Latency target and resource isolation for a class of streams."""
+    name: str
+    latency_slo_ms: float  # p99 publish-to-processed target
+    max_in_flight: Optional[int] = None  # messages processed at once across the lane; None = unbounded
+    dedicated_connection: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary."""
+        return {
+            "name": self.name,
+            "latency_slo_ms": self.latency_slo_ms,
+            "max_in_flight": self.max_in_flight,
+            "dedicated_connection": self.dedicated_connection
+        }
+
+
+CRITICAL_LANE = "critical"
+STANDARD_LANE = "standard"
+BULK_LANE = "bulk"
+
+DEFAULT_LANES = {
+    CRITICAL_LANE: PriorityLane(CRITICAL_LANE, latency_slo_ms=1000, dedicated_connection=True),
+    STANDARD_LANE: PriorityLane(STANDARD_LANE, latency_slo_ms=10000),
+    BULK_LANE: PriorityLane(BULK_LANE, latency_slo_ms=60000, max_in_flight=256)
+}
+
+
+class LaneScheduler:
+    """Resolves a stream's lane and hands out the lane's shared in-flight budget."""
+
+    def __init__(self, lanes: Optional[Mapping[str, PriorityLane]] = None):
+        self.lanes: Dict[str, PriorityLane] = dict(lanes or DEFAULT_LANES)
+        self._budgets: Dict[str, asyncio.Semaphore] = {}
+
+    def lane(self, config: StreamConfig) -> PriorityLane:
+        """Lane of a stream; unknown lane names fall back to standard."""
+        return self.lanes.get(config.lane) or self.lanes.get(STANDARD_LANE) or DEFAULT_LANES[STANDARD_LANE]
+
+    def dedicated(self, config: StreamConfig) -> bool:
+        """Whether a stream's lane uses its own connections."""
+        return self.lane(config).dedicated_connection
+
+    def budget(self, config: StreamConfig) -> Optional[asyncio.Semaphore]:
+        """Semaphore bounding in-flight messages across the lane, or None when unbounded."""
+        lane = self.lane(config)
+        if lane.max_in_flight is None:
+            return None
+        semaphore = self._budgets.get(lane.name)
+        if semaphore is None:
+            # Created on first use so it binds to the running event loop
+            semaphore = self._budgets[lane.name] = asyncio.Semaphore(lane.max_in_flight)
+        return semaphore
+
+    def slo_report(self, histograms: StreamHistograms) -> List[Dict[str, Any]]:
+        """Per lane: observed end-to-end p99 against its SLO and how many messages exceeded it."""
+        report = []
+        for lane in self.lanes.values():
+            histogram = histograms.histograms.get((END_TO_END_TIME, (("lane", lane.name),)))
+            if histogram is None or not histogram.count:
+                report.append({**lane.to_dict(), "count": 0, "p99_ms": None, "violations": 0, "slo_met": True})
+                continue
+            p99 = histogram.quantile(0.99)
+            report.append({
+                **lane.to_dict(),
+                "count": histogram.count,
+                "p99_ms": p99,
+                "violations": histogram.count_above(lane.latency_slo_ms),
+                "slo_met": p99 <= lane.latency_slo_ms
+            })
+        return report
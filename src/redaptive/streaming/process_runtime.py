@@ -0,0 +1,315 @@
+"""
+Multi-Process Sharded Consumer Runtime
+======================================
+
+Runs stream consumers in worker processes so CPU-bound message processing
+(decoding, window aggregation, anomaly scoring) uses every core of an ingest
+node instead of one event loop.
+
+Each worker builds its own stream manager and consumer group members. The
+consumer names are ``{consumer_prefix}_{worker}_{n}``, so on Redis every
+worker owns a fixed set of consumer names. On Kafka the workers' consumers
+join the same group and split the topic's partitions between them.
+
+The parent process supervises the workers:
+
+- it restarts a worker that exits unexpectedly, up to ``max_restarts``
+- it collects each worker's metrics and histograms over a queue
+- it reports totals and merged latency quantiles across workers
+
+Usage::
+
+    python -m redaptive.streaming.process_runtime --workers 8 --backend redis
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import StreamHistograms, render_prometheus, serve_metrics
+from .stream_manager import EnergyStreamManager, StreamBackend
+
+logger = logging.getLogger(__name__)
+
+# Consumers per worker for each energy stream; meter readings carry nearly all the load
+DEFAULT_WORKER_STREAMS = {
+    "energy_meter_readings": 2,
+    "energy_alerts": 1,
+    "energy_anomalies": 1,
+    "energy_diagnostics": 1
+}
+
+
+@dataclass
+class ProcessRuntimeConfig:
+    """
+    Worker layout for ``ShardedConsumerRuntime``.
+
+    ``manager_factory`` and ``setup`` run inside the workers, so they must be
+    picklable (module-level functions or classes). ``setup(manager, worker_index,
+    worker_count)`` is awaited after the manager starts, e.g. to enable anomaly
+    detection with ``shard_index=worker_index, shard_count=worker_count``.
+    """
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    backend: str = StreamBackend.AUTO.value
+    streams: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_WORKER_STREAMS))
+    consumer_groups: Dict[str, str] = field(default_factory=dict)  # default: the stream's configured group
+    manager_factory: Callable[..., Any] = EnergyStreamManager
+    setup: Optional[Callable[[Any, int, int], Awaitable[Any]]] = None
+    consumer_prefix: str = "worker"
+    metrics_interval_seconds: float = 5.0
+    max_restarts: int = 5
+    start_method: str = "spawn"  # forking a process with a running event loop is unsafe
+    log_level: str = "WARNING"
+
+
+def _run_worker(index: int, config: ProcessRuntimeConfig, stop_event, metrics_queue):
+    """Worker process entry point."""
+    level = getattr(logging, config.log_level.upper())
+    logging.basicConfig(level=level)
+    logging.getLogger("redaptive").setLevel(level)
+    try:
+        asyncio.run(_worker(index, config, stop_event, metrics_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker(index: int, config: ProcessRuntimeConfig, stop_event, metrics_queue):
+    manager = config.manager_factory(StreamBackend(config.backend))
+    if not await manager.start():
+        raise SystemExit(f"Worker {index} could not connect to the {config.backend} backend")
+    try:
+        if hasattr(manager, "setup_energy_streams"):
+            await manager.setup_energy_streams()
+        if config.setup:
+            await config.setup(manager, index, config.workers)
+        for stream_name, consumers in config.streams.items():
+            for n in range(consumers):
+                await manager.start_consumer(
+                    stream_name, f"{config.consumer_prefix}_{index}_{n}",
+                    config.consumer_groups.get(stream_name)
+                )
+
+        last_report = 0.0
+        while not stop_event.is_set():
+            if time.monotonic() - last_report >= config.metrics_interval_seconds:
+                last_report = time.monotonic()
+                _report(index, manager, metrics_queue)
+            await asyncio.sleep(min(config.metrics_interval_seconds, 0.2))
+    finally:
+        await manager.stop()
+        _report(index, manager, metrics_queue)
+
+
+def _report(index: int, manager, metrics_queue):
+    metrics = manager.get_metrics()
+    metrics.pop("histograms", None)  # sent whole below so the parent can merge quantiles
+    metrics_queue.put({
+        "worker": index,
+        "pid": os.getpid(),
+        "reported_at": time.time(),
+        "metrics": metrics,
+        "histograms": manager.processor.histograms
+    })
+
+
+# Per-worker ratios and averages that do not add up across workers
+_NON_ADDITIVE = {"success_rate", "average_processing_time_ms"}
+
+
+def _sum_counters(total: Dict[str, Any], metrics: Dict[str, Any]):
+    for name, value in metrics.items():
+        if isinstance(value, int) and not isinstance(value, bool) and name not in _NON_ADDITIVE:
+            total[name] = total.get(name, 0) + value
+
+
+class ShardedConsumerRuntime:
+    """
+    Supervises consumer worker processes and aggregates their metrics.
+
+    Counters from a worker that was restarted are kept, so totals stay
+    monotonic across restarts. Latency quantiles are merged from the workers'
+    histograms rather than averaged.
+    """
+
+    def __init__(self, config: Optional[ProcessRuntimeConfig] = None):
+        self.config = config or ProcessRuntimeConfig()
+        if self.config.workers < 1:
+            raise ValueError("A process runtime needs at least one worker")
+        if self.config.backend == StreamBackend.MEMORY.value:
+            logger.warning("The memory backend is per process; workers will not share streams")
+        self._context = multiprocessing.get_context(self.config.start_method)
+        self._stop_event = self._context.Event()
+        self._metrics_queue = self._context.Queue()
+        self.processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self.restarts: Dict[int, int] = {}
+        self.reports: Dict[int, Dict[str, Any]] = {}
+        self._retired_counters: Dict[str, Any] = {}
+        self._retired_histograms = StreamHistograms()
+        self._supervisor: Optional[asyncio.Task] = None
+        self.running = False
+
+    async def start(self) -> bool:
+        """Launch every worker and the supervision loop."""
+        if self.running:
+            return True
+        self._stop_event.clear()
+        for index in range(self.config.workers):
+            self._spawn(index)
+        self.running = True
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info(f"Started {self.config.workers} consumer worker processes ({self.config.backend})")
+        return True
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=_run_worker,
+            args=(index, self.config, self._stop_event, self._metrics_queue),
+            name=f"{self.config.consumer_prefix}_{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    async def _supervise(self):
+        while self.running:
+            self.collect_metrics()
+            for index, process in list(self.processes.items()):
+                if process.is_alive() or not self.running:
+                    continue
+                restarts = self.restarts.get(index, 0)
+                if restarts >= self.config.max_restarts:
+                    logger.error(f"Worker {index} exited with code {process.exitcode}; restart limit reached")
+                    del self.processes[index]
+                    self._retire(index)
+                    continue
+                logger.warning(f"Worker {index} exited with code {process.exitcode}; restarting")
+                self.restarts[index] = restarts + 1
+                self._retire(index)
+                self._spawn(index)
+            await asyncio.sleep(0.5)
+
+    def _retire(self, index: int):
+        """Fold a dead worker's last report into the retired totals."""
+        report = self.reports.pop(index, None)
+        if report:
+            _sum_counters(self._retired_counters, report["metrics"])
+            self._retired_histograms.merge(report["histograms"])
+
+    def collect_metrics(self) -> int:
+        """Drain worker reports from the queue; returns how many were read."""
+        received = 0
+        while True:
+            try:
+                report = self._metrics_queue.get_nowait()
+            except queue.Empty:
+                return received
+            received += 1
+            # A report can arrive after the supervisor already replaced its worker
+            process = self.processes.get(report["worker"])
+            if process is not None and process.pid == report["pid"]:
+                self.reports[report["worker"]] = report
+
+    async def stop(self, timeout_seconds: float = 30.0):
+        """Ask every worker to drain and stop; terminate those that do not exit in time."""
+        self.running = False
+        if self._supervisor:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+
+        self._stop_event.set()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout_seconds
+        for index, process in self.processes.items():
+            await loop.run_in_executor(None, process.join, max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in time; terminating")
+                process.terminate()
+                await loop.run_in_executor(None, process.join, 5)
+        self.collect_metrics()
+        logger.info("Consumer worker processes stopped")
+
+    def _histograms(self) -> StreamHistograms:
+        merged = StreamHistograms()
+        merged.merge(self._retired_histograms)
+        for report in self.reports.values():
+            merged.merge(report["histograms"])
+        return merged
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Integer counters summed across workers, merged histograms and per-worker detail."""
+        totals = dict(self._retired_counters)
+        for report in self.reports.values():
+            _sum_counters(totals, report["metrics"])
+        return {
+            "workers": self.config.workers,
+            "workers_alive": sum(1 for process in self.processes.values() if process.is_alive()),
+            "restarts": sum(self.restarts.values()),
+            "totals": totals,
+            "histograms": self._histograms().snapshot(),
+            "per_worker": {
+                index: {"pid": report["pid"], "reported_at": report["reported_at"], **report["metrics"]}
+                for index, report in sorted(self.reports.items())
+            }
+        }
+
+    def prometheus_metrics(self) -> str:
+        """Aggregated counters and merged histograms in Prometheus text format."""
+        return render_prometheus(
+            self._histograms(),
+            counters=self.get_metrics()["totals"],
+            labels={"backend": self.config.backend, "runtime": "processes"}
+        )
+
+
+async def run_runtime(config: ProcessRuntimeConfig, metrics_port: Optional[int] = None):
+    """Run workers until interrupted, optionally serving aggregated metrics."""
+    runtime = ShardedConsumerRuntime(config)
+    await runtime.start()
+    server = await serve_metrics(runtime.prometheus_metrics, port=metrics_port) if metrics_port else None
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        if server:
+            server.close()
+        await runtime.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = ProcessRuntimeConfig()
+    parser = argparse.ArgumentParser(description="Run Redaptive stream consumers across worker processes")
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument("--backend", default="auto", choices=["auto", "redis", "kafka"])
+    parser.add_argument("--meter-consumers", type=int, default=DEFAULT_WORKER_STREAMS["energy_meter_readings"],
+                        help="Meter reading consumers per worker")
+    parser.add_argument("--metrics-port", type=int, help="Serve aggregated Prometheus metrics on this port")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()))
+    logging.getLogger("redaptive").setLevel(getattr(logging, args.log_level.upper()))
+    streams = dict(DEFAULT_WORKER_STREAMS, energy_meter_readings=args.meter_consumers)
+    config = ProcessRuntimeConfig(
+        workers=args.workers, backend=args.backend, streams=streams, log_level=args.log_level
+    )
+    try:
+        asyncio.run(run_runtime(config, args.metrics_port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,7 @@ Supports 12k+ energy meters with 48k+ data points per hour.
 import asyncio
 import logging
 import json
-from typing import Dict, List, Optional, Callable, Any
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Callable, Any
 from datetime import datetime, timedelta
 import time
 import uuid
@@ -22,10 +22,41 @@ except ImportError:
     REDIS_AVAILABLE = False
 
 from redaptive.config import settings
-from .data_models import StreamMessage, ProcessingResult, ProcessingStatus, StreamConfig
+from .data_models import StreamMessage, ProcessingResult, ProcessingStatus, StreamConfig, MessageType
+from .codecs import JSON_CODEC, decode_message, get_codec
+from .concurrency import HeldAcks, held_until, ordering_key, process_keyed, run_commit_hooks, stop_consumer_task
+from .metrics import StreamHistograms
+from .priority import LaneScheduler, field_priority
+from .replay import ReplayBound, ReplayEntry, entry_key, id_range, next_entry_id
+from .retry import (
+    dead_letter_fields, dead_letter_name, failure_result, process_with_timeout,
+    redeliveries_exhausted, redelivery_result, retry_message
+)
 
 logger = logging.getLogger(__name__)
 
+# Connections reserved for streams in lanes with dedicated connections
+PRIORITY_POOL_SIZE = 8
+
+# Most entries counted when Redis cannot report a group's lag itself
+LAG_SCAN_LIMIT = 10000
+
+# Moves due members of a retry sorted set (JSON-encoded entry fields) back onto
+# their stream in one atomic step, so a crash can neither lose nor duplicate them
+PROMOTE_RETRIES_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    local args = {KEYS[2], '*'}
+    for field, value in pairs(cjson.decode(member)) do
+        table.insert(args, field)
+        table.insert(args, value)
+    end
+    redis.call('XADD', unpack(args))
+end
+return #due
+"""
+
 
 class RedisStreamProcessor:
     """
@@ -45,12 +76,29 @@ class RedisStreamProcessor:
         
         self.redis_url = redis_url or f"redis://{settings.database.host}:6379"
         self.redis_client: Optional[aioredis.Redis] = None
+        # Separate pool for streams in lanes with dedicated connections (e.g. critical alerts)
+        self.priority_client: Optional[aioredis.Redis] = None
+        self.lanes = LaneScheduler()
+        # Awaited with the stream name before a processed batch is acknowledged/committed
+        self.commit_hooks: List[Callable[[str], Awaitable[Any]]] = []
+        # Event time before which buffered effects are written; later entries are held (see HeldAcks)
+        self.ack_gate: Optional[Callable[[], Optional[int]]] = None
         self.consumers: Dict[str, Dict[str, Any]] = {}
         self.running = False
         self.message_processors: Dict[str, Callable] = {}
+        self.stream_configs: Dict[str, StreamConfig] = {}
+        self._promote_retries_script = None
+        # Processing/queue time and batch size distributions (see streaming.metrics)
+        self.histograms = StreamHistograms()
         self.metrics = {
+            "messages_published": 0,
+            "publish_batches": 0,
             "messages_processed": 0,
             "messages_failed": 0,
+            "messages_retrying": 0,
+            "messages_retried": 0,
+            "messages_dead_lettered": 0,
+            "messages_claimed": 0,
             "processing_time_total": 0.0,
             "last_processed": None
         }
@@ -61,8 +109,16 @@ class RedisStreamProcessor:
             self.redis_client = aioredis.from_url(
                 self.redis_url,
                 decode_responses=True,
+                # Binary-codec entries survive the str round trip and are re-encoded losslessly
+                encoding_errors="surrogateescape",
                 max_connections=20
             )
+            self.priority_client = aioredis.from_url(
+                self.redis_url,
+                decode_responses=True,
+                encoding_errors="surrogateescape",
+                max_connections=PRIORITY_POOL_SIZE
+            )
             
             # Test connection
             await self.redis_client.ping()
@@ -75,6 +131,8 @@ class RedisStreamProcessor:
     
     async def disconnect(self):
         """Disconnect from Redis."""
+        if self.priority_client:
+            await self.priority_client.close()
         if self.redis_client:
             await self.redis_client.close()
             logger.info("Disconnected from Redis stream processor")
@@ -97,8 +155,12 @@ class RedisStreamProcessor:
                         logger.warning(f"Failed to create consumer group: {e}")
             
             # Store stream configuration
+            self.stream_configs[stream_name] = config
             config_key = f"stream_config:{stream_name}"
-            await self.redis_client.hset(config_key, mapping=config.to_dict())
+            # Redis hashes only hold scalars; None fields are omitted
+            await self.redis_client.hset(config_key, mapping={
+                key: str(value) for key, value in config.to_dict().items() if value is not None
+            })
             
             logger.info(f"Created stream '{stream_name}' with config: {config.to_dict()}")
             return True
@@ -107,19 +169,54 @@ class RedisStreamProcessor:
             logger.error(f"Failed to create stream '{stream_name}': {e}")
             return False
     
+    @staticmethod
+    def _message_fields(message: StreamMessage, codec=JSON_CODEC) -> Dict[str, Any]:
+        """Stream entry fields for a message."""
+        if codec is not JSON_CODEC:
+            # Binary entries carry everything in ``data``; priority is only copied out when set
+            fields = {"data": codec.encode(message), "key": ordering_key(message)}
+            if message.priority:
+                fields["priority"] = message.priority
+            return fields
+        return {
+            "data": message.to_json(),
+            "timestamp": message.timestamp.isoformat(),
+            "priority": message.priority,
+            # Lets consumers keep per-meter ordering without parsing every entry first
+            "key": ordering_key(message)
+        }
+    
+    def _codec(self, stream_name: str):
+        """Wire codec configured for a stream."""
+        config = self.stream_configs.get(stream_name)
+        return get_codec(config.codec) if config else JSON_CODEC
+    
+    def _client(self, stream_name: str) -> "aioredis.Redis":
+        """Connection pool for a stream: the priority pool when its lane has dedicated connections."""
+        if self.priority_client is not None and self.lanes.dedicated(self._stream_config(stream_name)):
+            return self.priority_client
+        return self.redis_client
+    
+    def _max_length(self, stream_name: str, max_length: Optional[int]) -> Optional[int]:
+        """Resolve the MAXLEN cap for a stream, preferring an explicit value."""
+        if max_length is not None:
+            return max_length
+        config = self.stream_configs.get(stream_name)
+        return config.max_length if config else None
+    
     async def publish_message(self, stream_name: str, message: StreamMessage) -> bool:
         """Publish a message to a stream."""
         try:
             # Add message to stream
-            message_id = await self.redis_client.xadd(
+            max_length = self._max_length(stream_name, None)
+            message_id = await self._client(stream_name).xadd(
                 stream_name,
-                {
-                    "data": message.to_json(),
-                    "timestamp": message.timestamp.isoformat(),
-                    "priority": message.priority
-                }
+                self._message_fields(message, self._codec(stream_name)),
+                maxlen=max_length,
+                approximate=True
             )
             
+            self.metrics["messages_published"] += 1
             logger.debug(f"Published message {message.message_id} to stream {stream_name} with ID {message_id}")
             return True
             
@@ -127,6 +224,48 @@ class RedisStreamProcessor:
             logger.error(f"Failed to publish message to stream '{stream_name}': {e}")
             return False
     
+    async def publish_batch(self, stream_name: str, messages: List[StreamMessage],
+                            batch_size: Optional[int] = None,
+                            max_length: Optional[int] = None) -> List[Optional[str]]:
+        """
+        Publish messages with pipelined XADDs.
+        
+        Pipelines are non-transactional, so each chunk of ``batch_size`` messages
+        costs one round trip and a failed entry does not affect its neighbours.
+        
+        Returns:
+            Stream entry id per message, in order; ``None`` where the XADD failed
+        """
+        config = self.stream_configs.get(stream_name)
+        batch_size = batch_size or (config.publish_batch_size if config else 500)
+        max_length = self._max_length(stream_name, max_length)
+        codec = self._codec(stream_name)
+        message_ids: List[Optional[str]] = []
+        
+        for start in range(0, len(messages), batch_size):
+            chunk = messages[start:start + batch_size]
+            pipe = self._client(stream_name).pipeline(transaction=False)
+            for message in chunk:
+                pipe.xadd(stream_name, self._message_fields(message, codec), maxlen=max_length, approximate=True)
+            
+            try:
+                results = await pipe.execute(raise_on_error=False)
+            except Exception as e:
+                logger.error(f"Failed to publish batch of {len(chunk)} to stream '{stream_name}': {e}")
+                message_ids.extend([None] * len(chunk))
+                continue
+            
+            for message, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to publish message {message.message_id} to stream '{stream_name}': {result}")
+                    message_ids.append(None)
+                else:
+                    message_ids.append(result.decode() if isinstance(result, bytes) else result)
+            self.metrics["publish_batches"] += 1
+        
+        self.metrics["messages_published"] += sum(1 for message_id in message_ids if message_id is not None)
+        return message_ids
+    
     async def publish_meter_reading(self, stream_name: str, meter_reading: Dict[str, Any]) -> bool:
         """Publish a meter reading to the stream."""
         message = StreamMessage(
@@ -140,6 +279,23 @@ class RedisStreamProcessor:
         
         return await self.publish_message(stream_name, message)
     
+    async def publish_meter_readings(self, stream_name: str,
+                                     meter_readings: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Publish many meter readings in pipelined batches."""
+        timestamp = datetime.now()
+        messages = [
+            StreamMessage(
+                message_id=str(uuid.uuid4()),
+                message_type=MessageType.METER_READING,
+                source="energy_meter",
+                timestamp=timestamp,
+                payload=meter_reading,
+                priority=0
+            )
+            for meter_reading in meter_readings
+        ]
+        return await self.publish_batch(stream_name, messages)
+    
     def register_processor(self, message_type: str, processor: Callable):
         """Register a message processor function."""
         self.message_processors[message_type] = processor
@@ -147,14 +303,25 @@ class RedisStreamProcessor:
     
     async def start_consumer(self, stream_name: str, consumer_name: str, 
                            consumer_group: Optional[str] = None,
-                           batch_size: int = 100) -> bool:
-        """Start a consumer for a stream."""
+                           batch_size: int = 100, max_concurrency: int = 16,
+                           processors: Optional[Dict[str, Callable]] = None) -> bool:
+        """
+        Start a consumer for a stream.
+        
+        Each fetched batch is processed with up to ``max_concurrency`` messages in
+        flight; entries for the same meter stay in stream order. ``processors``
+        replaces the registered processors for this consumer.
+        """
         try:
             consumer_info = {
                 "stream_name": stream_name,
                 "consumer_name": consumer_name,
                 "consumer_group": consumer_group,
                 "batch_size": batch_size,
+                "max_concurrency": max_concurrency,
+                "processors": processors,
+                "held": HeldAcks(),
+                "held_refreshed": 0.0,
                 "running": True,
                 "task": None
             }
@@ -172,8 +339,15 @@ class RedisStreamProcessor:
             logger.error(f"Failed to start consumer: {e}")
             return False
     
-    async def stop_consumer(self, stream_name: str, consumer_name: str):
-        """Stop a consumer."""
+    async def stop_consumer(self, stream_name: str, consumer_name: str,
+                            drain_timeout_seconds: Optional[float] = None):
+        """
+        Stop a consumer.
+        
+        With ``drain_timeout_seconds`` the consumer first finishes and acknowledges
+        the batch it is processing; anything left pending is claimed by the rest
+        of its group after the processing timeout.
+        """
         consumer_key = f"{stream_name}:{consumer_name}"
         
         if consumer_key in self.consumers:
@@ -181,11 +355,7 @@ class RedisStreamProcessor:
             consumer_info["running"] = False
             
             if consumer_info["task"]:
-                consumer_info["task"].cancel()
-                try:
-                    await consumer_info["task"]
-                except asyncio.CancelledError:
-                    pass
+                await stop_consumer_task(consumer_info["task"], drain_timeout_seconds)
             
             del self.consumers[consumer_key]
             logger.info(f"Stopped consumer '{consumer_name}' for stream '{stream_name}'")
@@ -196,15 +366,35 @@ class RedisStreamProcessor:
         consumer_name = consumer_info["consumer_name"]
         consumer_group = consumer_info["consumer_group"]
         batch_size = consumer_info["batch_size"]
+        max_concurrency = consumer_info.get("max_concurrency", 16)
+        config = self._stream_config(stream_name)
+        last_claim = 0.0
         
         logger.info(f"Starting message consumption for {stream_name}:{consumer_name}")
         
         while consumer_info["running"]:
             try:
+                # Move retries whose backoff has elapsed back onto the stream
+                await self._promote_due_retries(stream_name, batch_size)
+                
+                # Acknowledge held entries once flushed and keep the rest from going stale
+                if consumer_group:
+                    await self._settle_held(consumer_info)
+                
+                # Take over entries left pending by dead or stuck consumers
+                if consumer_group and time.time() - last_claim >= config.processing_timeout_seconds:
+                    last_claim = time.time()
+                    claimed = await self._claim_stale_entries(consumer_info, batch_size)
+                    if claimed:
+                        await self._process_batch(
+                            stream_name, claimed, consumer_group, consumer_name, max_concurrency,
+                            consumer_info.get("processors"), consumer_info.get("held")
+                        )
+                
                 # Read messages from stream
                 if consumer_group:
                     # Use consumer group
-                    messages = await self.redis_client.xreadgroup(
+                    messages = await self._client(stream_name).xreadgroup(
                         consumer_group,
                         consumer_name,
                         {stream_name: ">"},
@@ -213,18 +403,18 @@ class RedisStreamProcessor:
                     )
                 else:
                     # Read from stream without consumer group
-                    messages = await self.redis_client.xread(
+                    messages = await self._client(stream_name).xread(
                         {stream_name: "$"},
                         count=batch_size,
                         block=1000
                     )
                 
-                # Process messages
-                for stream, stream_messages in messages:
-                    for message_id, fields in stream_messages:
-                        await self._process_message(
-                            stream_name, message_id, fields, consumer_group, consumer_name
-                        )
+                entries = [entry for _, stream_messages in messages for entry in stream_messages]
+                if entries:
+                    await self._process_batch(
+                        stream_name, entries, consumer_group, consumer_name, max_concurrency,
+                        consumer_info.get("processors"), consumer_info.get("held")
+                    )
                 
             except asyncio.CancelledError:
                 logger.info(f"Consumer {consumer_name} for stream {stream_name} cancelled")
@@ -233,42 +423,315 @@ class RedisStreamProcessor:
                 logger.error(f"Error in consumer {consumer_name}: {e}")
                 await asyncio.sleep(1)  # Brief pause before retrying
     
+    def _stream_config(self, stream_name: str) -> StreamConfig:
+        """Configuration for a stream, falling back to defaults for unconfigured streams."""
+        return self.stream_configs.get(stream_name) or StreamConfig(stream_name=stream_name)
+    
+    def _lane_name(self, stream_name: str) -> str:
+        """Priority lane of a stream, for lane latency tracking."""
+        return self.lanes.lane(self._stream_config(stream_name)).name
+    
+    @staticmethod
+    def _retry_key(stream_name: str) -> str:
+        """Sorted set of delayed retries for a stream, scored by due time."""
+        return f"{stream_name}:retry"
+    
+    async def _promote_due_retries(self, stream_name: str, limit: int = 100) -> int:
+        """Atomically move due retries from the retry set back onto the stream."""
+        if self._promote_retries_script is None:
+            self._promote_retries_script = self.redis_client.register_script(PROMOTE_RETRIES_SCRIPT)
+        promoted = await self._promote_retries_script(
+            keys=[self._retry_key(stream_name), stream_name],
+            args=[time.time(), limit]
+        )
+        if promoted:
+            self.metrics["messages_retried"] += int(promoted)
+        return int(promoted or 0)
+    
+    async def _claim_stale_entries(self, consumer_info: Dict[str, Any], count: int) -> List[Any]:
+        """
+        XAUTOCLAIM entries idle longer than the processing timeout.
+        
+        Walks the pending entries list with a cursor kept on the consumer, so
+        repeated calls cover the whole PEL instead of rescanning its head.
+        Entries redelivered more than ``max_retries`` times are dead-lettered
+        and acknowledged instead of being returned.
+        """
+        stream_name = consumer_info["stream_name"]
+        config = self._stream_config(stream_name)
+        result = await self._client(stream_name).xautoclaim(
+            stream_name,
+            consumer_info["consumer_group"],
+            consumer_info["consumer_name"],
+            min_idle_time=config.processing_timeout_seconds * 1000,
+            start_id=consumer_info.get("claim_cursor", "0-0"),
+            count=count
+        )
+        consumer_info["claim_cursor"] = result[0]
+        # Entries trimmed from the stream come back without fields
+        claimed = [(message_id, fields) for message_id, fields in result[1] if fields]
+        if claimed:
+            self.metrics["messages_claimed"] += len(claimed)
+            logger.info(f"Claimed {len(claimed)} stale entries on stream '{stream_name}'")
+            claimed = await self._dead_letter_redelivered(stream_name, consumer_info["consumer_group"], claimed)
+        return claimed
+    
+    async def _dead_letter_redelivered(self, stream_name: str, consumer_group: str,
+                                       claimed: List[Any]) -> List[Any]:
+        """Dead-letter and XACK claimed entries whose XPENDING delivery count exceeds the retries."""
+        config = self._stream_config(stream_name)
+        client = self._client(stream_name)
+        pipe = client.pipeline(transaction=False)
+        for message_id, _ in claimed:
+            pipe.xpending_range(stream_name, consumer_group, min=message_id, max=message_id, count=1)
+        deliveries = {
+            entry["message_id"]: int(entry["times_delivered"])
+            for entries in await pipe.execute() for entry in entries
+        }
+        exhausted = [
+            (message_id, fields) for message_id, fields in claimed
+            if redeliveries_exhausted(config, deliveries.get(message_id, 1))
+        ]
+        if not exhausted:
+            return claimed
+        
+        pipe = client.pipeline(transaction=True)
+        for message_id, fields in exhausted:
+            pipe.xadd(
+                dead_letter_name(stream_name, config),
+                dead_letter_fields(stream_name, message_id, fields.get("data"),
+                                   redelivery_result(message_id, deliveries[message_id]))
+            )
+        pipe.xack(stream_name, consumer_group, *[message_id for message_id, _ in exhausted])
+        await pipe.execute()
+        self.metrics["messages_dead_lettered"] += len(exhausted)
+        logger.warning(f"Dead-lettered {len(exhausted)} entries redelivered too often on stream '{stream_name}'")
+        exhausted_ids = {message_id for message_id, _ in exhausted}
+        return [entry for entry in claimed if entry[0] not in exhausted_ids]
+    
+    async def settle_held(self) -> int:
+        """Acknowledge every held entry whose effects were flushed since, e.g. on shutdown."""
+        settled = 0
+        for consumer_info in list(self.consumers.values()):
+            if consumer_info["consumer_group"]:
+                settled += await self._settle_held(consumer_info)
+        return settled
+    
+    async def _settle_held(self, consumer_info: Dict[str, Any]) -> int:
+        """
+        XACK held entries whose effects are now flushed, and XCLAIM the rest to
+        this consumer again (JUSTID, so their delivery count stays) before they
+        idle past the processing timeout and look stale.
+        
+        Returns:
+            Number of entries acknowledged
+        """
+        held = consumer_info.get("held")
+        if not held:
+            return 0
+        stream_name = consumer_info["stream_name"]
+        consumer_group = consumer_info["consumer_group"]
+        client = self._client(stream_name)
+        released = held.release(self.ack_gate() if self.ack_gate else None)
+        if released:
+            await client.xack(stream_name, consumer_group, *released)
+        
+        timeout = self._stream_config(stream_name).processing_timeout_seconds
+        if len(held) and time.time() - consumer_info["held_refreshed"] >= timeout / 2:
+            consumer_info["held_refreshed"] = time.time()
+            refreshed = await client.xclaim(
+                stream_name, consumer_group, consumer_info["consumer_name"],
+                min_idle_time=0, message_ids=held.entries(), justid=True
+            )
+            # Entries no longer pending were acknowledged elsewhere, e.g. dead-lettered
+            still_pending = set(refreshed)
+            held.discard(lambda entry_id: entry_id in still_pending)
+        return len(released)
+    
+    async def _process_batch(self, stream_name: str, entries: List[Any],
+                             consumer_group: Optional[str], consumer_name: str,
+                             max_concurrency: int = 16,
+                             processors: Optional[Dict[str, Callable]] = None,
+                             held: Optional[HeldAcks] = None) -> List[str]:
+        """
+        Process fetched entries concurrently, then settle the batch in one transaction.
+        
+        Failures are scheduled for a delayed retry or written to the dead-letter
+        stream, and acknowledged together with the successes, so the pending
+        entries list only ever holds in-flight work and entries in ``held``:
+        successes whose effects are not flushed yet. Nothing is acknowledged
+        when a commit hook fails.
+        
+        Returns:
+            Ids of the entries that were acknowledged
+        """
+        self.histograms.record_batch(stream_name, len(entries))
+        config = self._stream_config(stream_name)
+        results = await process_keyed(
+            entries,
+            lambda entry: entry[1].get("key") or entry[0],
+            lambda entry: self._process_message(
+                stream_name, entry[0], entry[1], consumer_group, consumer_name, processors
+            ),
+            max_concurrency,
+            priority=lambda entry: field_priority(entry[1]),
+            budget=self.lanes.budget(config)
+        )
+        
+        if not await run_commit_hooks(self.commit_hooks, stream_name):
+            # Left pending: claimed and redelivered once idle past the processing timeout
+            return []
+        
+        pipe = self._client(stream_name).pipeline(transaction=True)
+        ack_ids = []
+        for (message_id, fields), result in zip(entries, results):
+            if result is None:
+                continue
+            if result.status == ProcessingStatus.RETRYING:
+                retry = retry_message(decode_message(fields["data"]), result)
+                # Retry members are always JSON so the promotion script can rebuild the entry
+                member = json.dumps({key: str(value) for key, value in self._message_fields(retry).items()})
+                pipe.zadd(self._retry_key(stream_name), {member: result.retry_after.timestamp()})
+                self.metrics["messages_retrying"] += 1
+            elif result.status == ProcessingStatus.FAILED:
+                pipe.xadd(
+                    dead_letter_name(stream_name, config),
+                    dead_letter_fields(stream_name, message_id, fields.get("data"), result)
+                )
+                self.metrics["messages_dead_lettered"] += 1
+            elif held is not None and consumer_group:
+                event_micros = held_until(result, self.ack_gate)
+                if event_micros is not None:
+                    held.hold(message_id, event_micros)
+                    continue
+            ack_ids.append(message_id)
+        
+        if consumer_group and ack_ids:
+            pipe.xack(stream_name, consumer_group, *ack_ids)
+        if ack_ids:
+            await pipe.execute()
+        return ack_ids
+    
     async def _process_message(self, stream_name: str, message_id: str, 
                               fields: Dict[str, Any], consumer_group: Optional[str],
-                              consumer_name: str):
-        """Process a single message."""
+                              consumer_name: str,
+                              processors: Optional[Dict[str, Callable]] = None) -> ProcessingResult:
+        """
+        Process a single message.
+        
+        Returns:
+            COMPLETED, RETRYING (with ``retry_after``) or FAILED for the dead-letter stream
+        """
         start_time = time.time()
+        processor = None
+        message = None
         
         try:
             # Parse message data
-            message = StreamMessage.from_json(fields["data"])
+            message = decode_message(fields["data"])
             
             # Find appropriate processor
-            processor = self.message_processors.get(message.message_type.value)
+            if processors is None:
+                processors = self.message_processors
+            processor = processors.get(message.message_type.value)
             if not processor:
                 logger.warning(f"No processor found for message type: {message.message_type}")
-                return
+                self.metrics["messages_failed"] += 1
+                return failure_result(
+                    message_id, message, self._stream_config(stream_name),
+                    f"No processor for message type '{message.message_type.value}'",
+                    (time.time() - start_time) * 1000, retryable=False
+                )
             
             # Process message
-            result = await processor(message)
-            
-            # Acknowledge message if using consumer group
-            if consumer_group:
-                await self.redis_client.xack(stream_name, consumer_group, message_id)
+            result = await process_with_timeout(processor, message, self._stream_config(stream_name))
             
             # Update metrics
             processing_time = (time.time() - start_time) * 1000
+            self.histograms.record_processing(
+                stream_name, message, processor, processing_time, self._lane_name(stream_name)
+            )
             self.metrics["messages_processed"] += 1
             self.metrics["processing_time_total"] += processing_time
             self.metrics["last_processed"] = datetime.now()
             
             logger.debug(f"Processed message {message.message_id} in {processing_time:.2f}ms")
+            return ProcessingResult(
+                message_id=message_id,
+                status=ProcessingStatus.COMPLETED,
+                processed_at=datetime.now(),
+                processing_time_ms=processing_time,
+                result_data=result if isinstance(result, dict) else None
+            )
             
         except Exception as e:
             logger.error(f"Failed to process message {message_id}: {e}")
             self.metrics["messages_failed"] += 1
-            
-            # TODO: Implement retry logic and dead letter queue
+            if processor:
+                self.histograms.record_processing(
+                    stream_name, message, processor, (time.time() - start_time) * 1000,
+                    self._lane_name(stream_name)
+                )
+            # Unparseable entries are poison and go straight to the dead-letter stream
+            return failure_result(
+                message_id, message, self._stream_config(stream_name), str(e),
+                (time.time() - start_time) * 1000, retryable=message is not None
+            )
+    
+    async def read_range(self, stream_name: str, start: ReplayBound = None, end: ReplayBound = None,
+                         batch_size: int = 1000) -> AsyncIterator[List[ReplayEntry]]:
+        """
+        Read a stream's history in id order with ``XRANGE``, outside any consumer group.
+        
+        ``start`` and ``end`` are entry ids or publish times; the start is inclusive
+        and the end exclusive. Entries that cannot be decoded are logged and skipped.
+        """
+        first, last = id_range(start, end)
+        if last == "+":
+            # Stop at the stream's current end rather than chasing live publishes
+            info = await self.redis_client.xinfo_stream(stream_name)
+            last = info.get("last-generated-id") or "+"
+        while True:
+            entries = await self.redis_client.xrange(stream_name, first, last, count=batch_size)
+            batch = []
+            for entry_id, fields in entries:
+                try:
+                    batch.append((entry_id, decode_message(fields["data"])))
+                except Exception as e:
+                    logger.warning(f"Skipping undecodable entry {entry_id} in replay of '{stream_name}': {e}")
+            if batch:
+                yield batch
+            if len(entries) < batch_size:
+                return
+            first = f"({entries[-1][0]}"
+    
+    async def retention_floor(self, stream_name: str) -> Optional[str]:
+        """
+        Smallest entry id a consumer group still needs (its oldest pending or first
+        undelivered entry); None when the stream has no groups.
+        """
+        floor = None
+        for group in await self.redis_client.xinfo_groups(stream_name):
+            pending = await self.redis_client.xpending(stream_name, group["name"])
+            if pending.get("pending"):
+                needed = pending["min"]
+            else:
+                needed = next_entry_id(group.get("last-delivered-id") or "0-0")
+            if floor is None or entry_key(needed) < entry_key(floor):
+                floor = needed
+        return floor
+    
+    async def trim_stream(self, stream_name: str, min_id: str, approximate: bool = True) -> int:
+        """
+        Delete entries older than ``min_id`` (``XTRIM MINID``).
+        
+        Approximate trimming only drops whole radix tree nodes, which is much
+        cheaper but may keep some older entries until a later trim.
+        
+        Returns:
+            Number of entries deleted
+        """
+        return await self.redis_client.xtrim(stream_name, minid=min_id, approximate=approximate)
     
     async def get_stream_info(self, stream_name: str) -> Dict[str, Any]:
         """Get information about a stream."""
@@ -303,6 +766,38 @@ class RedisStreamProcessor:
             logger.error(f"Failed to get consumer info: {e}")
             return []
     
+    async def get_consumer_lag(self, stream_name: str, consumer_group: str) -> Dict[str, Any]:
+        """
+        Backlog of a consumer group from ``XINFO GROUPS``.
+        
+        ``lag`` counts entries not yet delivered to the group and ``pending``
+        entries delivered but not acknowledged (the ``XPENDING`` total). Redis
+        reports no lag before 7.0 or after entries were deleted mid-stream; it is
+        then counted from the group's last delivered id, up to ``LAG_SCAN_LIMIT``.
+        Empty (lag unknown) if the group does not exist.
+        """
+        try:
+            groups = await self.redis_client.xinfo_groups(stream_name)
+            group = next((g for g in groups if g.get("name") == consumer_group), None)
+            if group is None:
+                return {}
+            lag = group.get("lag")
+            if lag is None:
+                undelivered = await self.redis_client.xrange(
+                    stream_name, f"({group.get('last-delivered-id', '0-0')}", "+", count=LAG_SCAN_LIMIT
+                )
+                lag = len(undelivered)
+            return {
+                "stream": stream_name,
+                "consumer_group": consumer_group,
+                "lag": int(lag),
+                "pending": int(group.get("pending", 0)),
+                "consumers": int(group.get("consumers", 0))
+            }
+        except Exception as e:
+            logger.error(f"Failed to get lag for group '{consumer_group}' on '{stream_name}': {e}")
+            return {}
+    
     def get_metrics(self) -> Dict[str, Any]:
         """Get processing metrics."""
         total_messages = self.metrics["messages_processed"] + self.metrics["messages_failed"]
@@ -312,14 +807,22 @@ class RedisStreamProcessor:
         )
         
         return {
+            "messages_published": self.metrics["messages_published"],
+            "publish_batches": self.metrics["publish_batches"],
             "messages_processed": self.metrics["messages_processed"],
             "messages_failed": self.metrics["messages_failed"],
+            "messages_retrying": self.metrics["messages_retrying"],
+            "messages_retried": self.metrics["messages_retried"],
+            "messages_dead_lettered": self.metrics["messages_dead_lettered"],
+            "messages_claimed": self.metrics["messages_claimed"],
+            "messages_held": sum(len(consumer.get("held") or ()) for consumer in self.consumers.values()),
             "success_rate": (
                 self.metrics["messages_processed"] / total_messages * 100
                 if total_messages > 0 else 0
             ),
             "average_processing_time_ms": avg_processing_time,
             "last_processed": self.metrics["last_processed"],
+            "histograms": self.histograms.snapshot(),
             "active_consumers": len(self.consumers)
         }
     
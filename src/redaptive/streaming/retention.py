@@ -0,0 +1,185 @@
+"""
+Stream retention and trimming.
+==============================
+
+Redis keeps every stream entry in memory until it is trimmed. Acknowledging an
+entry removes it from the group's pending list, but the entry stays in the
+stream. Two limits keep a stream's memory flat under sustained ingest:
+
+- ``StreamConfig.max_length``: a hard cap applied on every publish
+  (``XADD MAXLEN ~``). It protects Redis when consumers fall far behind, at
+  the price of dropping entries nobody has read yet.
+- ``StreamConfig.retention_seconds``: the age after which ``StreamTrimmer``
+  removes entries in the background (``XTRIM MINID``). The trimmer never
+  removes an entry that a consumer group still needs, i.e. one that is
+  pending or not yet delivered. A stalled group therefore holds retention
+  back until ``max_length`` takes over.
+
+Trimmed ranges can be archived first. ``archive(stream_name, entries)`` is
+called with each batch of decoded ``(entry id, message)`` pairs, oldest first,
+and a batch is trimmed only after its archive call returned. An archive failure
+stops that stream's trim until the next run. ``PostgresStreamArchive`` writes
+to the ``stream_archive`` table; any other async callable works too, e.g. a
+Parquet writer.
+
+Kafka topics are retained by the broker (``retention.ms``), so there is no
+trimmer for the Kafka backend.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .data_models import StreamConfig
+from .replay import ReplayEntry, entry_key, epoch_millis, next_entry_id
+
+logger = logging.getLogger(__name__)
+
+# archive(stream_name, entries) -> awaitable
+StreamArchive = Callable[[str, List[ReplayEntry]], Awaitable[Any]]
+
+
+class StreamTrimmer:
+    """
+    Background trimmer for streams with ``retention_seconds`` set.
+
+    Each run trims every configured stream up to the older of its retention
+    cutoff and the oldest entry its consumer groups still need.
+    """
+
+    def __init__(self, manager, interval_seconds: float = 60.0, archive: Optional[StreamArchive] = None,
+                 batch_size: int = 1000):
+        self.manager = manager
+        self.interval_seconds = interval_seconds
+        self.archive = archive
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "runs": 0,
+            "trims": 0,
+            "entries_trimmed": 0,
+            "entries_archived": 0,
+            "archive_failures": 0,
+            "trim_failures": 0,
+            "last_run_seconds": 0.0
+        }
+
+    async def trim_point(self, config: StreamConfig, now: Optional[datetime] = None) -> str:
+        """Entry id before which a stream's entries may be removed."""
+        cutoff = (now or datetime.now()) - timedelta(seconds=config.retention_seconds)
+        min_id = f"{epoch_millis(cutoff)}-0"
+        floor = await self.manager.processor.retention_floor(config.stream_name)
+        if floor is not None and entry_key(floor) < entry_key(min_id):
+            min_id = floor
+        return min_id
+
+    async def trim(self, config: StreamConfig, now: Optional[datetime] = None) -> int:
+        """
+        Trim one stream, archiving the trimmed range first if an archive is set.
+
+        Returns:
+            Number of entries removed
+        """
+        processor = self.manager.processor
+        stream_name = config.stream_name
+        min_id = await self.trim_point(config, now)
+
+        if self.archive is None:
+            # Approximate trimming drops whole nodes and is much cheaper; leftovers go next run
+            removed = await processor.trim_stream(stream_name, min_id, approximate=True)
+        else:
+            removed = 0
+            async for batch in processor.read_range(stream_name, end=min_id, batch_size=self.batch_size):
+                try:
+                    await self.archive(stream_name, batch)
+                except Exception as e:
+                    self.metrics["archive_failures"] += 1
+                    logger.error(f"Archiving '{stream_name}' failed, not trimming past {batch[0][0]}: {e}")
+                    break
+                self.metrics["entries_archived"] += len(batch)
+                # Trim exactly what was archived, so a failure later on loses nothing
+                removed += await processor.trim_stream(stream_name, next_entry_id(batch[-1][0]), approximate=False)
+            else:
+                # Undecodable entries are skipped by read_range and cannot be archived
+                removed += await processor.trim_stream(stream_name, min_id, approximate=False)
+
+        if removed:
+            self.metrics["trims"] += 1
+            self.metrics["entries_trimmed"] += removed
+            logger.info(f"Trimmed {removed} entries from '{stream_name}' before {min_id}")
+        return removed
+
+    async def run_once(self) -> int:
+        """Trim every stream with a retention policy; returns the entries removed."""
+        started = time.monotonic()
+        removed = 0
+        for config in list(self.manager.streams.values()):
+            if config.retention_seconds is None:
+                continue
+            try:
+                removed += await self.trim(config)
+            except Exception as e:
+                self.metrics["trim_failures"] += 1
+                logger.error(f"Failed to trim stream '{config.stream_name}': {e}")
+        self.metrics["runs"] += 1
+        self.metrics["last_run_seconds"] = time.monotonic() - started
+        return removed
+
+    async def _run(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {**self.metrics, "running": self._task is not None and not self._task.done()}
+
+
+STREAM_ARCHIVE_INSERT_SQL = """
+INSERT INTO stream_archive (
+    stream_name, entry_id, message_id, message_type, source, published_at, message
+) VALUES (%s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (stream_name, entry_id) DO NOTHING
+"""
+
+
+class PostgresStreamArchive:
+    """
+    Archives trimmed stream entries into ``stream_archive``.
+
+    Entries already archived (e.g. by a run that failed before trimming) are
+    skipped on conflict. The blocking database call runs in the default executor.
+    """
+
+    def __init__(self, database=None):
+        if database is None:
+            from redaptive.config.database import db as database
+        self.database = database
+
+    async def __call__(self, stream_name: str, entries: List[ReplayEntry]):
+        rows = [
+            (stream_name, entry_id, message.message_id, message.message_type.value, message.source,
+             message.timestamp, message.to_json())
+            for entry_id, message in entries
+        ]
+        if rows:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write, rows)
+
+    def _write(self, rows: List[tuple]):
+        with self.database.get_cursor() as cursor:
+            cursor.executemany(STREAM_ARCHIVE_INSERT_SQL, rows)
@@ -0,0 +1,123 @@
+"""
+Retry and dead-letter policy for stream processing.
+====================================================
+
+Shared by the Redis and Kafka processors: failed messages are retried with
+exponential backoff up to ``StreamConfig.max_retries`` and then isolated in a
+dead-letter stream/topic so they never block healthy traffic. Handlers are cut
+off after ``processing_timeout_seconds``, and entries that keep getting
+reclaimed without an acknowledgement (a handler that kills its worker) are
+dead-lettered once their redeliveries exceed ``max_retries``.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .data_models import ProcessingResult, ProcessingStatus, StreamConfig, StreamMessage
+
+# Upper bound on a single backoff step
+MAX_RETRY_DELAY_SECONDS = 3600
+
+
+def retry_delay_seconds(config: StreamConfig, retry_count: int) -> float:
+    """Exponential backoff: ``retry_delay_seconds`` doubled for every earlier attempt."""
+    delay = config.retry_delay_seconds * (2 ** max(retry_count - 1, 0))
+    return float(min(delay, MAX_RETRY_DELAY_SECONDS))
+
+
+def dead_letter_name(stream_name: str, config: StreamConfig) -> str:
+    """Dead-letter stream/topic for a stream, defaulting to ``<stream>_dlq``."""
+    return config.dead_letter_queue or f"{stream_name}_dlq"
+
+
+def retry_topic_name(topic_name: str) -> str:
+    """Kafka topic holding delayed retries for a topic."""
+    return f"{topic_name}_retry"
+
+
+def failure_result(message_id: str, message: Optional[StreamMessage], config: StreamConfig,
+                   error: str, processing_time_ms: float, retryable: bool = True) -> ProcessingResult:
+    """
+    Decide what happens to a failed message.
+
+    Returns:
+        RETRYING with ``retry_after`` while attempts remain, otherwise FAILED
+        (the message belongs in the dead-letter queue)
+    """
+    now = datetime.now()
+    if retryable and message is not None and message.retry_count < config.max_retries:
+        delay = retry_delay_seconds(config, message.retry_count + 1)
+        return ProcessingResult(
+            message_id=message_id,
+            status=ProcessingStatus.RETRYING,
+            processed_at=now,
+            processing_time_ms=processing_time_ms,
+            error_message=error,
+            retry_after=now + timedelta(seconds=delay)
+        )
+    return ProcessingResult(
+        message_id=message_id,
+        status=ProcessingStatus.FAILED,
+        processed_at=now,
+        processing_time_ms=processing_time_ms,
+        error_message=error
+    )
+
+
+async def process_with_timeout(processor: Callable[[StreamMessage], Awaitable[Any]],
+                               message: StreamMessage, config: StreamConfig) -> Any:
+    """Run a handler, failing it once it exceeds ``processing_timeout_seconds`` (0 disables)."""
+    timeout = config.processing_timeout_seconds
+    if not timeout or timeout <= 0:
+        return await processor(message)
+    try:
+        return await asyncio.wait_for(processor(message), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Processing exceeded {timeout}s") from None
+
+
+def redeliveries_exhausted(config: StreamConfig, deliveries: int) -> bool:
+    """Whether an unacknowledged entry was redelivered more than ``max_retries`` times."""
+    return deliveries - 1 > config.max_retries
+
+
+def redelivery_result(message_id: str, deliveries: int) -> ProcessingResult:
+    """FAILED result for an entry reclaimed too often, e.g. one that hangs or kills its consumer."""
+    return ProcessingResult(
+        message_id=message_id,
+        status=ProcessingStatus.FAILED,
+        processed_at=datetime.now(),
+        processing_time_ms=0.0,
+        error_message=f"Delivered {deliveries} times without being acknowledged"
+    )
+
+
+def retry_message(message: StreamMessage, result: ProcessingResult) -> StreamMessage:
+    """Copy of a message for its next attempt."""
+    return StreamMessage(
+        message_id=message.message_id,
+        message_type=message.message_type,
+        source=message.source,
+        timestamp=message.timestamp,
+        payload=message.payload,
+        priority=message.priority,
+        retry_count=message.retry_count + 1,
+        metadata={
+            **message.metadata,
+            "last_error": result.error_message,
+            "retry_after": result.retry_after.isoformat() if result.retry_after else None
+        }
+    )
+
+
+def dead_letter_fields(source_name: str, source_id: str, data: Optional[str],
+                       result: ProcessingResult) -> Dict[str, Any]:
+    """Entry recorded in a dead-letter stream/topic for a poison message."""
+    return {
+        "data": data or "",
+        "original_stream": source_name,
+        "original_id": source_id,
+        "error": result.error_message or "",
+        "failed_at": result.processed_at.isoformat()
+    }
@@ -8,22 +8,59 @@ Handles 12k+ energy meters with 48k+ data points per hour.
 
 import asyncio
 import logging
-from typing import Dict, Optional, Callable, Any, List
+import time
+import uuid
+from dataclasses import replace
+from typing import Dict, Optional, Callable, Any, List, Sequence
 from datetime import datetime
 from enum import Enum
 
 from redaptive.config import settings
-from .data_models import StreamMessage, StreamConfig, MessageType, MeterReading
+from .data_models import (
+    StreamMessage, StreamConfig, MessageType, MeterReading, MeterReadingBatch, from_epoch_micros,
+    to_epoch_micros
+)
+from .anomaly import StreamingAnomalyDetector, read_checkpoint, write_checkpoint
+from .autoscaler import AutoscalePolicy, ConsumerAutoscaler
+from .batching import BatchPublisher
+from .codecs import MSGPACK_AVAILABLE
+from .concurrency import FLUSH_EVENT_FIELD
+from .idempotency import IdempotencyGuard, MemoryTTLStore, RedisTTLStore, reading_key, window_key
 from .redis_client import RedisStreamProcessor, REDIS_AVAILABLE
 from .kafka_client import KafkaStreamProcessor, KAFKA_AVAILABLE
+from .memory_client import MemoryStreamProcessor
+from .metrics import render_prometheus, serve_metrics
+from .priority import BULK_LANE, CRITICAL_LANE, STANDARD_LANE, LaneScheduler, PriorityLane, alert_priority
+from .replay import ReplayBound, StreamReplay
+from .retention import StreamArchive, StreamTrimmer
+from .windowing import DEFAULT_WINDOWS, WindowAggregate, WindowAggregator, WindowRef, WindowSpec
 
 logger = logging.getLogger(__name__)
 
+# Meter readings arrive in bursts when sites reconnect; the other streams stay small
+ENERGY_AUTOSCALE_POLICIES = {
+    "meter_readings": AutoscalePolicy(min_consumers=1, max_consumers=8, target_lag_per_consumer=2000),
+    "alerts": AutoscalePolicy(min_consumers=1, max_consumers=2, target_lag_per_consumer=100),
+    "anomalies": AutoscalePolicy(min_consumers=1, max_consumers=2, target_lag_per_consumer=500),
+    "diagnostics": AutoscalePolicy(min_consumers=1, max_consumers=2, target_lag_per_consumer=500)
+}
+
+ENERGY_CONSUMER_PREFIXES = {
+    "meter_readings": "meter_consumer",
+    "alerts": "alert_consumer",
+    "anomalies": "anomaly_consumer",
+    "diagnostics": "diagnostic_consumer"
+}
+
+# Columns kept per meter by enable_meter_store
+METER_STORE_COLUMNS = ("value", "quality_score")
+
 
 class StreamBackend(Enum):
     """Supported streaming backends."""
     REDIS = "redis"
     KAFKA = "kafka"
+    MEMORY = "memory"  # in-process, for tests and local benchmarks
     AUTO = "auto"
 
 
@@ -39,12 +76,44 @@ class StreamManager:
     - Monitoring and metrics
     """
     
-    def __init__(self, backend: StreamBackend = StreamBackend.AUTO):
+    def __init__(self, backend: StreamBackend = StreamBackend.AUTO, high_throughput: bool = False,
+                 memory_latency_ms: float = 0.0):
         self.backend = backend
+        # Kafka only: larger lingered, compressed producer batches with tracked deliveries
+        self.high_throughput = high_throughput
+        # Memory only: simulated round trip added to every publish, fetch and ack
+        self.memory_latency_ms = memory_latency_ms
         self.processor: Optional[Any] = None
         self.running = False
         self.streams: Dict[str, StreamConfig] = {}
         self.message_processors: Dict[str, Callable] = {}
+        self.batch_publishers: Dict[str, BatchPublisher] = {}
+        # Event-time window rollups of meter readings (see enable_window_aggregation)
+        self.window_aggregator: Optional[WindowAggregator] = None
+        self.aggregate_stream: Optional[str] = None
+        self.aggregate_sinks: List[Callable] = []
+        # Closed windows a destination failed to take, written ahead of the next ones
+        self._aggregate_backlogs: Dict[Any, List[WindowAggregate]] = {}
+        # Claimed (reading, window) idempotency keys by window end, settled once it is written
+        self._window_claims: Dict[int, List[str]] = {}
+        # Event time before which every aggregated reading's windows are written
+        self._aggregated_written_before: Optional[int] = None
+        # Inline per-meter anomaly detection (see enable_anomaly_detection)
+        self.anomaly_detector: Optional[StreamingAnomalyDetector] = None
+        self.anomaly_checkpoint_path: Optional[str] = None
+        self.anomaly_checkpoint_interval_seconds = 60.0
+        self._last_anomaly_checkpoint = 0.0
+        # Consumer group of a dedicated detector consumer; inline detection is then off
+        self.anomaly_consumer_group: Optional[str] = None
+        self.metrics_server: Optional[asyncio.AbstractServer] = None
+        # Lag-driven consumer supervisors by stream (see autoscale_consumers)
+        self.autoscalers: Dict[str, ConsumerAutoscaler] = {}
+        # Duplicate suppression for redeliveries and replays (see enable_idempotency)
+        self.idempotency: Optional[IdempotencyGuard] = None
+        # Background retention trimming (see streaming.retention)
+        self.trimmer: Optional[StreamTrimmer] = None
+        # Memory-mapped recent history for local analytics (see enable_meter_store)
+        self.meter_store: Optional[Any] = None
         
         # Initialize processor based on backend
         self._initialize_processor()
@@ -59,12 +128,15 @@ class StreamManager:
         elif self.backend == StreamBackend.KAFKA:
             if not KAFKA_AVAILABLE:
                 raise ImportError("Kafka not available. Install with: pip install aiokafka")
-            self.processor = KafkaStreamProcessor()
+            self.processor = KafkaStreamProcessor(high_throughput=self.high_throughput)
+            
+        elif self.backend == StreamBackend.MEMORY:
+            self.processor = MemoryStreamProcessor(latency_ms=self.memory_latency_ms)
             
         elif self.backend == StreamBackend.AUTO:
             # Prefer Kafka for production, fallback to Redis
             if KAFKA_AVAILABLE:
-                self.processor = KafkaStreamProcessor()
+                self.processor = KafkaStreamProcessor(high_throughput=self.high_throughput)
                 self.backend = StreamBackend.KAFKA
                 logger.info("Auto-selected Kafka backend")
             elif REDIS_AVAILABLE:
@@ -96,8 +168,59 @@ class StreamManager:
             logger.error(f"Error starting stream manager: {e}")
             return False
     
+    async def flush(self) -> Dict[str, int]:
+        """
+        Delivery barrier: drain batch publishers and the backend producer.
+        
+        Returns:
+            Counts of deliveries settled and failed (Kafka); empty counts for Redis,
+            whose publishes are acknowledged synchronously
+        """
+        for publisher in self.batch_publishers.values():
+            await publisher.flush()
+        
+        if self.backend == StreamBackend.KAFKA:
+            return await self.processor.flush()
+        return {"delivered": 0, "failed": 0}
+    
+    def on_delivery_failure(self, callback: Callable):
+        """Register ``callback(stream_name, message, exception)`` for failed Kafka deliveries."""
+        if self.backend == StreamBackend.KAFKA:
+            self.processor.on_delivery_failure(callback)
+    
     async def stop(self):
         """Stop the stream manager."""
+        if self.metrics_server:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+            self.metrics_server = None
+        
+        for autoscaler in self.autoscalers.values():
+            await autoscaler.stop()
+        self.autoscalers.clear()
+        
+        if self.trimmer:
+            await self.trimmer.stop()
+        
+        await self.flush_aggregates()
+        if self.idempotency:
+            try:
+                await self.idempotency.commit()
+            except Exception as e:
+                logger.error(f"Failed to record idempotency keys on stop: {e}")
+        if self.window_aggregator:
+            try:
+                # The flush wrote every window, so held messages can be acknowledged
+                await self.processor.settle_held()
+            except Exception as e:
+                logger.error(f"Failed to acknowledge held messages on stop: {e}")
+        if self.anomaly_detector and self.anomaly_checkpoint_path:
+            await self.checkpoint_anomaly_state()
+        
+        for publisher in self.batch_publishers.values():
+            await publisher.close()
+        self.batch_publishers.clear()
+        
         if self.processor:
             await self.processor.disconnect()
             self.running = False
@@ -106,6 +229,7 @@ class StreamManager:
     def _register_default_processors(self):
         """Register default message processors."""
         self.register_processor(MessageType.METER_READING.value, self._process_meter_reading)
+        self.register_processor(MessageType.METER_READING_BATCH.value, self._process_meter_reading_batch)
         self.register_processor(MessageType.ALERT.value, self._process_alert)
         self.register_processor(MessageType.ANOMALY.value, self._process_anomaly)
     
@@ -121,7 +245,7 @@ class StreamManager:
         
         self.streams[stream_name] = config
         
-        if self.backend == StreamBackend.REDIS:
+        if self.backend in (StreamBackend.REDIS, StreamBackend.MEMORY):
             return await self.processor.create_stream(stream_name, config)
         elif self.backend == StreamBackend.KAFKA:
             return await self.processor.create_topic(stream_name, config)
@@ -132,30 +256,420 @@ class StreamManager:
         """Publish a meter reading to the stream."""
         return await self.processor.publish_meter_reading(stream_name, meter_reading.to_dict())
     
+    async def publish_meter_reading_batch(self, stream_name: str, batch: MeterReadingBatch) -> bool:
+        """Publish a columnar batch of readings as a single stream message."""
+        message = StreamMessage(
+            message_id=str(uuid.uuid4()),
+            message_type=MessageType.METER_READING_BATCH,
+            source="energy_meter",
+            timestamp=datetime.now(),
+            payload=batch.to_dict()
+        )
+        return await self.processor.publish_message(stream_name, message)
+    
     async def publish_message(self, stream_name: str, message: StreamMessage) -> bool:
         """Publish a message to the stream."""
         return await self.processor.publish_message(stream_name, message)
     
+    async def publish_batch(self, stream_name: str, messages: List[StreamMessage],
+                            batch_size: Optional[int] = None,
+                            max_length: Optional[int] = None) -> List[Optional[str]]:
+        """Publish messages in backend batches; returns an id (or None on failure) per message."""
+        return await self.processor.publish_batch(
+            stream_name, messages, batch_size=batch_size, max_length=max_length
+        )
+    
+    async def publish_meter_readings(self, stream_name: str, meter_readings: List[MeterReading],
+                                     wait_for_delivery: bool = True) -> List[Optional[str]]:
+        """
+        Publish many meter readings in backend batches.
+        
+        ``wait_for_delivery=False`` only enqueues on Kafka (use ``flush()`` as the
+        barrier); Redis pipelines are always acknowledged before returning.
+        """
+        readings = [meter_reading.to_dict() for meter_reading in meter_readings]
+        if not wait_for_delivery and self.backend == StreamBackend.KAFKA:
+            return await self.processor.publish_meter_readings(stream_name, readings, wait_for_delivery=False)
+        return await self.processor.publish_meter_readings(stream_name, readings)
+    
+    def get_batch_publisher(self, stream_name: str) -> BatchPublisher:
+        """Get the linger-based batch publisher for a stream, sized from its StreamConfig."""
+        if stream_name not in self.batch_publishers:
+            config = self.streams.get(stream_name) or StreamConfig(stream_name=stream_name)
+            self.batch_publishers[stream_name] = BatchPublisher(
+                lambda messages: self.publish_batch(stream_name, messages),
+                batch_size=config.publish_batch_size,
+                linger_ms=config.publish_linger_ms
+            )
+        return self.batch_publishers[stream_name]
+    
+    def enable_window_aggregation(self, output_stream: Optional[str] = None,
+                                  windows: Sequence[WindowSpec] = DEFAULT_WINDOWS,
+                                  allowed_lateness_seconds: float = 60,
+                                  sink: Optional[Callable] = None) -> WindowAggregator:
+        """
+        Roll consumed meter readings up into event-time windows.
+        
+        Closed windows are published as METER_AGGREGATE messages to ``output_stream``
+        and passed to ``sink`` (an async callable taking a list of WindowAggregate,
+        e.g. ``RollupTableSink``) when given.
+        
+        Consumers hold back the acknowledgement (Redis) or commit (Kafka) of a
+        message until the windows of its readings are written, so a crash
+        redelivers what the open windows lost.
+        """
+        self.window_aggregator = WindowAggregator(windows, allowed_lateness_seconds=allowed_lateness_seconds)
+        self.aggregate_stream = output_stream
+        self.aggregate_sinks = [sink] if sink else []
+        self.processor.ack_gate = self._aggregates_written_before
+        return self.window_aggregator
+    
+    def _aggregates_written_before(self) -> Optional[int]:
+        """Ack gate: event time before which every aggregated reading's windows are written."""
+        return self._aggregated_written_before
+    
+    async def flush_aggregates(self) -> int:
+        """Close and emit every open window, regardless of the watermark."""
+        if not self.window_aggregator:
+            return 0
+        aggregates = self.window_aggregator.flush()
+        await self._emit_aggregates(aggregates)
+        self._settle_written_windows(2 ** 63)
+        return len(aggregates)
+    
+    async def _emit_aggregates(self, aggregates: List[WindowAggregate]):
+        """
+        Publish closed windows to the aggregate stream and write them to the sinks.
+        
+        Windows a destination fails to take stay in its backlog and go out
+        ahead of the next windows to close. Their readings stay claimed and
+        their messages unacknowledged meanwhile, so nothing is dropped and no
+        window is written twice.
+        """
+        destinations = ([self.aggregate_stream] if self.aggregate_stream else []) + self.aggregate_sinks
+        for destination in destinations:
+            pending = self._aggregate_backlogs.pop(destination, []) + aggregates
+            if not pending:
+                continue
+            try:
+                if isinstance(destination, str):
+                    unwritten = await self._publish_aggregates(pending)
+                else:
+                    await destination(pending)
+                    unwritten = []
+            except Exception as e:
+                unwritten = pending
+                logger.error(f"Window aggregate sink failed: {e}")
+            if unwritten:
+                self._aggregate_backlogs[destination] = unwritten
+    
+    async def _publish_aggregates(self, aggregates: List[WindowAggregate]) -> List[WindowAggregate]:
+        """Publish windows as METER_AGGREGATE messages; returns those that failed."""
+        now = datetime.now()
+        messages = [
+            StreamMessage(
+                message_id=str(uuid.uuid4()),
+                message_type=MessageType.METER_AGGREGATE,
+                source="window_aggregator",
+                timestamp=now,
+                payload=aggregate.to_dict()
+            )
+            for aggregate in aggregates
+        ]
+        results = await self.publish_batch(self.aggregate_stream, messages)
+        failed = [aggregate for aggregate, result in zip(aggregates, results) if result is None]
+        if failed:
+            logger.error(f"Failed to publish {len(failed)} window aggregates to {self.aggregate_stream}")
+        return failed
+    
+    async def _advance_windows(self):
+        """Emit windows the watermark has passed and settle the readings they completed."""
+        closed = self.window_aggregator.advance()
+        if closed:
+            await self._emit_aggregates(closed)
+            self._settle_written_windows(self.window_aggregator.watermark_micros)
+    
+    def _settle_written_windows(self, closed_through_micros: int):
+        """
+        Settle the window keys of every written window ending by ``closed_through_micros``,
+        and the readings whose windows are now all written.
+        
+        The sinks are the record: without sinks it is the aggregate stream. A
+        window stuck in the aggregate stream's backlog behind a working sink is
+        still settled, so a crash may lose its message but never double-counts
+        the rollup table.
+        """
+        record = self.aggregate_sinks or ([self.aggregate_stream] if self.aggregate_stream else [])
+        unwritten = [to_epoch_micros(aggregate.window_end)
+                     for destination in record for aggregate in self._aggregate_backlogs.get(destination, ())]
+        written_through = min(closed_through_micros, min(unwritten) - 1) if unwritten else closed_through_micros
+        
+        for end in [end for end in self._window_claims if end <= written_through]:
+            self._settle_processed(self._window_claims.pop(end))
+        complete_before = self.window_aggregator.complete_before(written_through)
+        if self.idempotency:
+            self.idempotency.settle_before(complete_before)
+        if self._aggregated_written_before is None or complete_before > self._aggregated_written_before:
+            self._aggregated_written_before = complete_before
+    
+    async def _claim_windows(self, keys: List[str], timestamps: Sequence[int]) -> Optional[List[List[WindowRef]]]:
+        """
+        Claim every still-open window of each reading.
+        
+        Returns:
+            Per reading, the windows it was not yet written to (e.g. before a
+            crash) and should be added to; None when idempotency is off
+        """
+        if not self.idempotency:
+            return None
+        refs = [self.window_aggregator.windows_for(timestamp) for timestamp in timestamps]
+        claims = [(window_key(key, *ref), ref) for key, reading_refs in zip(keys, refs) for ref in reading_refs]
+        fresh = iter(await self.idempotency.claim([claim for claim, _ in claims]))
+        claimed = iter(claims)
+        windows = []
+        for reading_refs in refs:
+            open_refs = []
+            for _ in reading_refs:
+                claim, ref = next(claimed)
+                if next(fresh):
+                    open_refs.append(ref)
+                    self._window_claims.setdefault(ref[2], []).append(claim)
+            windows.append(open_refs)
+        return windows
+    
+    def enable_anomaly_detection(self, shard_index: int = 0, shard_count: int = 1,
+                                 checkpoint_path: Optional[str] = None,
+                                 checkpoint_interval_seconds: float = 60.0,
+                                 **detector_options) -> StreamingAnomalyDetector:
+        """
+        Score consumed meter readings inline against per-meter rolling baselines.
+        
+        With ``shard_count > 1`` only meters hashing to ``shard_index`` are tracked.
+        When ``checkpoint_path`` is set, state is restored from it now and written
+        back every ``checkpoint_interval_seconds`` and on ``stop()``.
+        """
+        detector = StreamingAnomalyDetector(shard_index=shard_index, shard_count=shard_count, **detector_options)
+        if checkpoint_path:
+            try:
+                snapshot = read_checkpoint(checkpoint_path)
+                if snapshot:
+                    restored = detector.restore(snapshot)
+                    logger.info(f"Restored anomaly baselines for {restored} meters from {checkpoint_path}")
+            except Exception as e:
+                logger.error(f"Failed to restore anomaly checkpoint {checkpoint_path}: {e}")
+        
+        self.anomaly_detector = detector
+        self.anomaly_checkpoint_path = checkpoint_path
+        self.anomaly_checkpoint_interval_seconds = checkpoint_interval_seconds
+        self._last_anomaly_checkpoint = time.monotonic()
+        return detector
+    
+    def enable_meter_store(self, path: str, max_points: int = 65536,
+                           initial_capacity: int = 1024, max_open_files: int = 256):
+        """
+        Append consumed meter readings (value and quality score) to the
+        memory-mapped series store at ``path``.
+        
+        Agent processes on the same host open the store read-only and read
+        windows of recent history from the shared mapping, e.g. with
+        ``MeterSeriesStore(path, readonly=True).window(meter_id, start)``.
+        Each meter keeps at most ``max_points`` readings, and at most
+        ``max_open_files`` meters stay mapped at once. Requires numpy.
+        """
+        from redaptive.tools.timeseries_store import MeterSeriesStore
+        self.meter_store = MeterSeriesStore(
+            path, columns=METER_STORE_COLUMNS, max_points=max_points, initial_capacity=initial_capacity,
+            max_open_files=max_open_files
+        )
+        return self.meter_store
+    
+    async def checkpoint_anomaly_state(self) -> bool:
+        """Write the anomaly detector state to its checkpoint file."""
+        if not self.anomaly_detector or not self.anomaly_checkpoint_path:
+            return False
+        
+        # Snapshot on the loop so it is consistent; write off the loop
+        snapshot = self.anomaly_detector.snapshot()
+        self._last_anomaly_checkpoint = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, write_checkpoint, self.anomaly_checkpoint_path, snapshot)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to checkpoint anomaly state: {e}")
+            return False
+    
+    async def _handle_anomalies(self, anomalies: List[Dict[str, Any]]):
+        """Report detected anomalies and checkpoint detector state when due."""
+        for anomaly in anomalies:
+            try:
+                await self._report_anomaly(anomaly)
+            except Exception as e:
+                logger.error(f"Failed to report anomaly for {anomaly.get('meter_id')}: {e}")
+        
+        if (self.anomaly_checkpoint_path and
+                time.monotonic() - self._last_anomaly_checkpoint >= self.anomaly_checkpoint_interval_seconds):
+            await self.checkpoint_anomaly_state()
+    
+    async def _report_anomaly(self, anomaly: Dict[str, Any]):
+        """Report one detected anomaly (logged here; published by EnergyStreamManager)."""
+        logger.warning(f"Energy anomaly detected: {anomaly['description']}")
+    
+    def enable_idempotency(self, ttl_seconds: float = 86400.0, store: Optional[Any] = None,
+                           bloom_capacity: int = 1_000_000,
+                           bloom_error_rate: float = 1e-5) -> IdempotencyGuard:
+        """
+        Skip readings and messages that were already processed, so redeliveries
+        after a crash and replays do not count energy twice.
+        
+        Readings are keyed by ``(meter_id, timestamp)``, alerts and anomalies by
+        message id. Keys are recorded in ``store`` once their effects reached the
+        sinks (with window aggregation: once their windows were written), and
+        consumers only acknowledge or commit a batch after that record succeeded.
+        The default store is Redis, shared by all consumers, on the Redis
+        backend, and per process otherwise. Call after ``start()``.
+        """
+        if store is None:
+            if self.backend == StreamBackend.REDIS and self.processor.redis_client is not None:
+                store = RedisTTLStore(self.processor.redis_client, ttl_seconds)
+            else:
+                store = MemoryTTLStore(ttl_seconds)
+        self.idempotency = IdempotencyGuard(
+            store, ttl_seconds=ttl_seconds, bloom_capacity=bloom_capacity, bloom_error_rate=bloom_error_rate
+        )
+        if self._commit_idempotency_keys not in self.processor.commit_hooks:
+            self.processor.commit_hooks.append(self._commit_idempotency_keys)
+        return self.idempotency
+    
+    async def _commit_idempotency_keys(self, stream_name: str):
+        """Pre-commit hook: record settled keys before the consumer acknowledges its batch."""
+        if self.idempotency:
+            await self.idempotency.commit()
+    
+    async def _claim(self, keys: List[str], event_micros: Optional[List[int]] = None) -> List[bool]:
+        """Which keys are new; everything is new when idempotency is off."""
+        if not self.idempotency:
+            return [True] * len(keys)
+        return await self.idempotency.claim(keys, event_micros)
+    
+    def _settle_processed(self, keys: List[str]):
+        """Mark processed keys whose effects are complete."""
+        if self.idempotency:
+            self.idempotency.settle(keys)
+    
+    def _release_claims(self, keys: List[str]):
+        """Give up claims of a message that failed, so its redelivery is processed."""
+        if self.idempotency and keys:
+            self.idempotency.release(keys)
+    
     def register_processor(self, message_type: str, processor: Callable):
         """Register a message processor."""
         self.message_processors[message_type] = processor
         self.processor.register_processor(message_type, processor)
     
     async def start_consumer(self, stream_name: str, consumer_id: str,
-                           consumer_group: Optional[str] = None) -> bool:
-        """Start a consumer for a stream."""
-        if not consumer_group:
-            consumer_group = f"{stream_name}_processors"
+                           consumer_group: Optional[str] = None,
+                           processors: Optional[Dict[str, Callable]] = None) -> bool:
+        """
+        Start a consumer for a stream.
+        
+        ``processors`` (message type -> handler) replaces the registered
+        processors for this consumer, e.g. for a group with its own purpose.
+        ``consumer_group`` defaults to the group the stream was created with.
+        """
+        consumer_group = consumer_group or self.default_consumer_group(stream_name)
+        
+        config = self.streams.get(stream_name)
+        if config:
+            return await self.processor.start_consumer(
+                stream_name, consumer_id, consumer_group,
+                batch_size=config.batch_size, max_concurrency=config.max_concurrency, processors=processors
+            )
+        return await self.processor.start_consumer(stream_name, consumer_id, consumer_group, processors=processors)
+    
+    async def stop_consumer(self, stream_name: str, consumer_id: str,
+                            drain_timeout_seconds: Optional[float] = None):
+        """Stop a consumer, optionally letting it finish its current batch first."""
+        await self.processor.stop_consumer(stream_name, consumer_id, drain_timeout_seconds)
+    
+    def default_consumer_group(self, stream_name: str) -> str:
+        """Consumer group from the stream's config, or ``"<stream>_processors"`` for unknown streams."""
+        config = self.streams.get(stream_name)
+        if config and config.consumer_group:
+            return config.consumer_group
+        return f"{stream_name}_processors"
+    
+    async def get_consumer_lag(self, stream_name: str, consumer_group: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Backlog of a consumer group: ``lag`` (not yet delivered) and ``pending``
+        (delivered, not acknowledged). Empty if it could not be read or the
+        group does not exist.
+        """
+        return await self.processor.get_consumer_lag(
+            stream_name, consumer_group or self.default_consumer_group(stream_name)
+        )
+    
+    async def autoscale_consumers(self, stream_name: str, policy: Optional[AutoscalePolicy] = None,
+                                  consumer_group: Optional[str] = None,
+                                  consumer_prefix: Optional[str] = None) -> ConsumerAutoscaler:
+        """
+        Run a stream's consumers under a lag-driven autoscaler until ``stop()``.
         
-        return await self.processor.start_consumer(stream_name, consumer_id, consumer_group)
+        Starts ``policy.min_consumers`` consumers right away; see
+        ``ConsumerAutoscaler`` for how the group grows and shrinks.
+        """
+        autoscaler = self.autoscalers.get(stream_name)
+        if autoscaler is None:
+            autoscaler = ConsumerAutoscaler(
+                self, stream_name, consumer_group or self.default_consumer_group(stream_name), policy, consumer_prefix
+            )
+            self.autoscalers[stream_name] = autoscaler
+        await autoscaler.start()
+        return autoscaler
     
-    async def stop_consumer(self, stream_name: str, consumer_id: str):
-        """Stop a consumer."""
-        await self.processor.stop_consumer(stream_name, consumer_id)
+    async def replay(self, stream_name: str, start: ReplayBound = None, end: ReplayBound = None,
+                     processors: Optional[Dict[str, Callable]] = None,
+                     rate_limit_per_second: Optional[float] = None,
+                     batch_size: int = 1000, max_concurrency: int = 64) -> Dict[str, Any]:
+        """
+        Re-process a range of a stream's history without touching live consumer groups.
+        
+        ``processors`` maps message types to handlers and defaults to the registered
+        ones. With idempotency enabled those skip readings that were already
+        recorded, so pass a dedicated set (e.g. over a fresh WindowAggregator) to
+        recompute results from scratch. See ``streaming.replay`` for range bounds.
+        
+        Returns:
+            Replay counts, the first and last ids replayed and the achieved rate
+        """
+        replay = StreamReplay(
+            self.processor, stream_name,
+            processors if processors is not None else self.message_processors,
+            start=start, end=end, rate_limit_per_second=rate_limit_per_second,
+            batch_size=batch_size, max_concurrency=max_concurrency
+        )
+        return await replay.run()
+    
+    def start_stream_trimmer(self, interval_seconds: float = 60.0,
+                             archive: Optional[StreamArchive] = None) -> Optional[StreamTrimmer]:
+        """
+        Trim streams with ``retention_seconds`` set every ``interval_seconds`` until ``stop()``.
+        
+        ``archive(stream_name, entries)`` receives each trimmed range first, e.g.
+        a ``PostgresStreamArchive``. Kafka topics are retained by the broker, so
+        there is no trimmer on that backend.
+        """
+        if self.backend == StreamBackend.KAFKA:
+            logger.warning("Stream trimming is not available on Kafka; configure topic retention.ms instead")
+            return None
+        if self.trimmer is None:
+            self.trimmer = StreamTrimmer(self, interval_seconds, archive)
+        self.trimmer.start()
+        return self.trimmer
     
     async def get_stream_info(self, stream_name: str) -> Dict[str, Any]:
         """Get stream information."""
-        if self.backend == StreamBackend.REDIS:
+        if self.backend in (StreamBackend.REDIS, StreamBackend.MEMORY):
             return await self.processor.get_stream_info(stream_name)
         elif self.backend == StreamBackend.KAFKA:
             return await self.processor.get_topic_info(stream_name)
@@ -171,8 +685,62 @@ class StreamManager:
             "processors_registered": len(self.message_processors),
             "running": self.running
         })
+        if self.window_aggregator:
+            base_metrics["window_aggregation"] = {
+                **self.window_aggregator.metrics,
+                "open_windows": self.window_aggregator.open_windows(),
+                "aggregates_backlogged": sum(len(backlog) for backlog in self._aggregate_backlogs.values())
+            }
+        if self.idempotency:
+            base_metrics["idempotency"] = self.idempotency.status()
+        if self.trimmer:
+            base_metrics["retention"] = self.trimmer.status()
+        if self.meter_store:
+            base_metrics["meter_store"] = dict(self.meter_store.metrics)
+        if self.anomaly_detector:
+            base_metrics["anomaly_detection"] = {
+                **self.anomaly_detector.metrics,
+                "meters_tracked": len(self.anomaly_detector.baselines),
+                "shard": f"{self.anomaly_detector.shard_index}/{self.anomaly_detector.shard_count}"
+            }
+        base_metrics["lanes"] = self.lane_status()
+        if self.autoscalers:
+            base_metrics["autoscaling"] = {
+                stream_name: autoscaler.status() for stream_name, autoscaler in self.autoscalers.items()
+            }
         return base_metrics
     
+    def configure_lanes(self, lanes: Dict[str, PriorityLane]):
+        """
+        Replace the priority lane definitions (SLOs, in-flight budgets, dedicated
+        connections). Streams name their lane in ``StreamConfig.lane``; call before
+        starting consumers, as connections and budgets are resolved per stream.
+        """
+        self.processor.lanes = LaneScheduler(lanes)
+    
+    def lane_status(self) -> List[Dict[str, Any]]:
+        """Per priority lane: end-to-end p99 latency against its SLO and SLO violations."""
+        return self.processor.lanes.slo_report(self.processor.histograms)
+    
+    def prometheus_metrics(self) -> str:
+        """Processor counters and latency/batch-size histograms in Prometheus text format."""
+        return render_prometheus(
+            self.processor.histograms,
+            counters=self.processor.get_metrics(),
+            labels={"backend": self.backend.value}
+        )
+    
+    async def start_metrics_server(self, host: str = "0.0.0.0", port: int = 9108) -> bool:
+        """Serve ``prometheus_metrics()`` at ``http://host:port/metrics`` until ``stop()``."""
+        if self.metrics_server:
+            return True
+        try:
+            self.metrics_server = await serve_metrics(self.prometheus_metrics, host, port)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start metrics server on {host}:{port}: {e}")
+            return False
+    
     async def health_check(self) -> Dict[str, Any]:
         """Perform health check."""
         processor_health = await self.processor.health_check()
@@ -189,6 +757,7 @@ class StreamManager:
     # Default message processors
     async def _process_meter_reading(self, message: StreamMessage) -> Dict[str, Any]:
         """Process meter reading messages."""
+        keys: List[str] = []
         try:
             meter_data = message.payload
             
@@ -200,31 +769,133 @@ class StreamManager:
             # Convert to MeterReading object
             meter_reading = MeterReading.from_dict(meter_data)
             
+            timestamp = to_epoch_micros(meter_reading.timestamp)
+            key = reading_key(meter_reading.meter_id, timestamp)
+            if not (await self._claim([key], [timestamp]))[0]:
+                return {"status": "duplicate", "meter_id": meter_reading.meter_id,
+                        "timestamp": meter_reading.timestamp.isoformat()}
+            keys = [key]
+            
+            if self.meter_store:
+                self.meter_store.append(meter_reading.meter_id, [timestamp], {
+                    "value": [meter_reading.value], "quality_score": [meter_reading.quality_score]
+                })
+            
+            aggregated = False
+            if self.window_aggregator:
+                windows = await self._claim_windows([key], [timestamp])
+                aggregated = self.window_aggregator.add_reading(
+                    meter_reading, windows[0] if windows is not None else None
+                )
+                # The windows hold the reading now; a failure below must not release it
+                keys = []
+                await self._advance_windows()
+            else:
+                self._settle_processed([key])
+            
+            if self.anomaly_detector and not self.anomaly_consumer_group:
+                anomaly = self.anomaly_detector.observe_reading(meter_reading)
+                await self._handle_anomalies([anomaly] if anomaly else [])
+            
             # Store in database (integration with energy monitoring agent)
             # This would typically call the energy monitoring agent
             logger.info(f"Processed meter reading: {meter_reading.meter_id} = {meter_reading.value} {meter_reading.unit}")
             
-            return {
+            result = {
                 "status": "processed",
                 "meter_id": meter_reading.meter_id,
                 "value": meter_reading.value,
                 "timestamp": meter_reading.timestamp.isoformat()
             }
+            if aggregated:
+                # Acknowledged once its windows are written
+                result[FLUSH_EVENT_FIELD] = timestamp
+            return result
             
         except Exception as e:
             logger.error(f"Failed to process meter reading: {e}")
+            self._release_claims(keys)
+            raise
+    
+    async def _process_meter_reading_batch(self, message: StreamMessage) -> Dict[str, Any]:
+        """Process a columnar batch of meter readings without materializing each reading."""
+        keys: List[str] = []
+        try:
+            batch = MeterReadingBatch.from_dict(message.payload)
+            
+            # Basic validation, whole columns at a time
+            size = len(batch)
+            if not len(batch.meter_index) == len(batch.timestamps) == len(batch.quality_scores) == size:
+                raise ValueError("Meter reading batch columns have different lengths")
+            if size and max(batch.meter_index) >= len(batch.meter_ids):
+                raise ValueError("Meter reading batch references an unknown meter")
+            
+            if self.idempotency and size:
+                batch_keys = [reading_key(batch.meter_ids[index], timestamp)
+                              for index, timestamp in zip(batch.meter_index, batch.timestamps)]
+                fresh = await self.idempotency.claim(batch_keys, batch.timestamps)
+                keys = [key for key, new in zip(batch_keys, fresh) if new]
+                if not all(fresh):
+                    batch = batch.select(position for position, new in enumerate(fresh) if new)
+                duplicates = size - len(batch)
+                size = len(batch)
+            else:
+                keys, duplicates = [], 0
+            
+            if self.meter_store and size:
+                self.meter_store.append_batch(batch.meter_ids, batch.meter_index, batch.timestamps, {
+                    "value": batch.values, "quality_score": batch.quality_scores
+                })
+            
+            aggregated = 0
+            if self.window_aggregator:
+                windows = await self._claim_windows(keys, batch.timestamps) if keys else None
+                aggregated = self.window_aggregator.add_batch(batch, windows)
+                # The windows hold the readings now; a failure below must not release them
+                keys = []
+                await self._advance_windows()
+            else:
+                self._settle_processed(keys)
+            
+            if self.anomaly_detector and not self.anomaly_consumer_group:
+                await self._handle_anomalies(self.anomaly_detector.observe_batch(batch))
+            
+            logger.info(f"Processed meter reading batch: {size} readings from {len(batch.meter_ids)} meters")
+            
+            result = {
+                "status": "processed",
+                "readings": size,
+                "duplicates": duplicates,
+                "meters": len(batch.meter_ids),
+                "start": from_epoch_micros(min(batch.timestamps)).isoformat() if size else None,
+                "end": from_epoch_micros(max(batch.timestamps)).isoformat() if size else None,
+                "total_value": sum(batch.values)
+            }
+            if aggregated:
+                # Acknowledged once the windows of its latest reading are written
+                result[FLUSH_EVENT_FIELD] = max(batch.timestamps)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Failed to process meter reading batch: {e}")
+            self._release_claims(keys)
             raise
     
     async def _process_alert(self, message: StreamMessage) -> Dict[str, Any]:
         """Process alert messages."""
+        keys: List[str] = []
         try:
             alert_data = message.payload
+            if not (await self._claim([message.message_id]))[0]:
+                return {"status": "duplicate", "message_id": message.message_id}
+            keys = [message.message_id]
             
             # Log alert
             logger.warning(f"Energy alert: {alert_data.get('message', 'Unknown alert')}")
             
             # Forward to appropriate handlers
             # This would typically integrate with monitoring systems
+            self._settle_processed([message.message_id])
             
             return {
                 "status": "processed",
@@ -234,18 +905,24 @@ class StreamManager:
             
         except Exception as e:
             logger.error(f"Failed to process alert: {e}")
+            self._release_claims(keys)
             raise
     
     async def _process_anomaly(self, message: StreamMessage) -> Dict[str, Any]:
         """Process anomaly detection messages."""
+        keys: List[str] = []
         try:
             anomaly_data = message.payload
+            if not (await self._claim([message.message_id]))[0]:
+                return {"status": "duplicate", "message_id": message.message_id}
+            keys = [message.message_id]
             
             # Log anomaly
             logger.warning(f"Energy anomaly detected: {anomaly_data.get('description', 'Unknown anomaly')}")
             
             # Forward to anomaly analysis systems
             # This would typically integrate with ML pipelines
+            self._settle_processed([message.message_id])
             
             return {
                 "status": "processed",
@@ -256,6 +933,7 @@ class StreamManager:
             
         except Exception as e:
             logger.error(f"Failed to process anomaly: {e}")
+            self._release_claims(keys)
             raise
 
 
@@ -266,13 +944,17 @@ class EnergyStreamManager(StreamManager):
     Pre-configured for Redaptive's energy monitoring requirements.
     """
     
-    def __init__(self, backend: StreamBackend = StreamBackend.AUTO):
-        super().__init__(backend)
+    def __init__(self, backend: StreamBackend = StreamBackend.AUTO, batch_publishing: bool = False,
+                 high_throughput: bool = False, memory_latency_ms: float = 0.0):
+        super().__init__(backend, high_throughput=high_throughput, memory_latency_ms=memory_latency_ms)
+        # Coalesce concurrent publish_meter_reading calls into pipelined batches
+        self.batch_publishing = batch_publishing
         self.energy_streams = {
             "meter_readings": "energy_meter_readings",
             "alerts": "energy_alerts", 
             "anomalies": "energy_anomalies",
-            "diagnostics": "energy_diagnostics"
+            "diagnostics": "energy_diagnostics",
+            "aggregates": "energy_meter_aggregates"
         }
     
     async def setup_energy_streams(self) -> bool:
@@ -284,7 +966,12 @@ class EnergyStreamManager(StreamManager):
             stream_name=self.energy_streams["meter_readings"],
             batch_size=500,  # Higher batch size for meter readings
             max_retries=3,
-            consumer_group="meter_processors"
+            consumer_group="meter_processors",
+            publish_batch_size=1000,
+            codec="msgpack" if MSGPACK_AVAILABLE else "json",  # compact binary readings
+            lane=BULK_LANE,
+            max_length=2_000_000,  # about a day of readings at peak ingest
+            retention_seconds=6 * 3600  # rollups and the archive hold older history
         )
         success &= await self.create_stream(self.energy_streams["meter_readings"], meter_config)
         
@@ -293,7 +980,9 @@ class EnergyStreamManager(StreamManager):
             stream_name=self.energy_streams["alerts"],
             batch_size=50,  # Lower batch size for alerts
             max_retries=5,
-            consumer_group="alert_processors"
+            consumer_group="alert_processors",
+            lane=CRITICAL_LANE,  # own connections, sub-second SLO
+            retention_seconds=7 * 86400
         )
         success &= await self.create_stream(self.energy_streams["alerts"], alert_config)
         
@@ -302,7 +991,9 @@ class EnergyStreamManager(StreamManager):
             stream_name=self.energy_streams["anomalies"],
             batch_size=100,
             max_retries=3,
-            consumer_group="anomaly_processors"
+            consumer_group="anomaly_processors",
+            lane=STANDARD_LANE,
+            retention_seconds=7 * 86400
         )
         success &= await self.create_stream(self.energy_streams["anomalies"], anomaly_config)
         
@@ -311,10 +1002,25 @@ class EnergyStreamManager(StreamManager):
             stream_name=self.energy_streams["diagnostics"],
             batch_size=100,
             max_retries=3,
-            consumer_group="diagnostic_processors"
+            consumer_group="diagnostic_processors",
+            lane=STANDARD_LANE,
+            retention_seconds=7 * 86400
         )
         success &= await self.create_stream(self.energy_streams["diagnostics"], diagnostic_config)
         
+        # Setup window aggregates stream (only when rollups are enabled)
+        if self.window_aggregator:
+            aggregate_config = StreamConfig(
+                stream_name=self.energy_streams["aggregates"],
+                batch_size=500,
+                max_retries=3,
+                consumer_group="aggregate_processors",
+                codec="msgpack" if MSGPACK_AVAILABLE else "json",
+                lane=BULK_LANE,
+                retention_seconds=86400
+            )
+            success &= await self.create_stream(self.energy_streams["aggregates"], aggregate_config)
+        
         if success:
             logger.info("Energy streams setup completed successfully")
         else:
@@ -322,13 +1028,52 @@ class EnergyStreamManager(StreamManager):
         
         return success
     
+    def enable_window_aggregation(self, output_stream: Optional[str] = None,
+                                  windows: Sequence[WindowSpec] = DEFAULT_WINDOWS,
+                                  allowed_lateness_seconds: float = 60,
+                                  sink: Optional[Callable] = None) -> WindowAggregator:
+        """Roll meter readings up into windows, published to the aggregates stream by default."""
+        return super().enable_window_aggregation(
+            output_stream or self.energy_streams["aggregates"],
+            windows=windows,
+            allowed_lateness_seconds=allowed_lateness_seconds,
+            sink=sink
+        )
+    
     async def publish_meter_reading(self, meter_reading: MeterReading) -> bool:
         """Publish a meter reading to the appropriate stream."""
+        if self.batch_publishing:
+            message = StreamMessage(
+                message_id=str(uuid.uuid4()),
+                message_type=MessageType.METER_READING,
+                source="energy_meter",
+                timestamp=datetime.now(),
+                payload=meter_reading.to_dict()
+            )
+            publisher = self.get_batch_publisher(self.energy_streams["meter_readings"])
+            try:
+                return await publisher.publish(message) is not None
+            except Exception:
+                return False
+        
         return await super().publish_meter_reading(
             self.energy_streams["meter_readings"], 
             meter_reading
         )
     
+    async def publish_meter_readings(self, meter_readings: List[MeterReading],
+                                     wait_for_delivery: bool = True) -> List[Optional[str]]:
+        """Publish many meter readings to the meter readings stream."""
+        return await super().publish_meter_readings(
+            self.energy_streams["meter_readings"],
+            meter_readings,
+            wait_for_delivery=wait_for_delivery
+        )
+    
+    async def publish_meter_reading_batch(self, batch: MeterReadingBatch) -> bool:
+        """Publish a columnar batch of readings to the meter readings stream."""
+        return await super().publish_meter_reading_batch(self.energy_streams["meter_readings"], batch)
+    
     async def publish_alert(self, alert_data: Dict[str, Any]) -> bool:
         """Publish an energy alert."""
         message = StreamMessage(
@@ -336,7 +1081,8 @@ class EnergyStreamManager(StreamManager):
             message_type=MessageType.ALERT,
             source="energy_monitor",
             timestamp=datetime.now(),
-            payload=alert_data
+            payload=alert_data,
+            priority=alert_priority(alert_data)
         )
         
         return await self.publish_message(self.energy_streams["alerts"], message)
@@ -348,13 +1094,85 @@ class EnergyStreamManager(StreamManager):
             message_type=MessageType.ANOMALY,
             source="anomaly_detector",
             timestamp=datetime.now(),
-            payload=anomaly_data
+            payload=anomaly_data,
+            priority=alert_priority(anomaly_data)
         )
         
         return await self.publish_message(self.energy_streams["anomalies"], message)
     
-    async def start_energy_consumers(self) -> bool:
-        """Start consumers for all energy streams."""
+    async def _report_anomaly(self, anomaly: Dict[str, Any]):
+        """Publish a detected anomaly, alerting on high severity."""
+        await self.publish_anomaly(anomaly)
+        if anomaly["severity"] in ("high", "critical"):
+            await self.publish_alert({
+                "type": "consumption_anomaly",
+                "meter_id": anomaly["meter_id"],
+                "building_id": anomaly["building_id"],
+                "message": anomaly["description"],
+                "priority": "high",
+                "created_at": datetime.now().isoformat()
+            })
+    
+    async def start_anomaly_detector(self, consumer_id: Optional[str] = None) -> bool:
+        """
+        Consume meter readings for this process's anomaly detection shard.
+        
+        Each shard reads the full readings stream through its own consumer group
+        and keeps state only for the meters it owns, so every meter's baseline
+        lives in exactly one detector however the stream is partitioned.
+        
+        The group only scores readings: windowing, the meter store and duplicate
+        claims stay with the regular readings consumers, which stop scoring
+        readings inline.
+        """
+        if not self.anomaly_detector:
+            self.enable_anomaly_detection()
+        
+        stream_name = self.energy_streams["meter_readings"]
+        shard_index = self.anomaly_detector.shard_index
+        consumer_group = f"anomaly_detectors_shard_{shard_index}"
+        if self.backend == StreamBackend.REDIS:
+            # Redis consumer groups must exist before reading; Kafka creates them on join
+            config = self.streams.get(stream_name) or StreamConfig(stream_name=stream_name)
+            await self.processor.create_stream(stream_name, replace(config, consumer_group=consumer_group))
+        
+        self.anomaly_consumer_group = consumer_group
+        return await self.start_consumer(
+            stream_name,
+            consumer_id or f"anomaly_detector_{shard_index}",
+            consumer_group=consumer_group,
+            processors={
+                MessageType.METER_READING.value: self._detect_meter_reading,
+                MessageType.METER_READING_BATCH.value: self._detect_meter_reading_batch
+            }
+        )
+    
+    async def _detect_meter_reading(self, message: StreamMessage) -> Dict[str, Any]:
+        """Score a meter reading for the anomaly detection shard."""
+        meter_reading = MeterReading.from_dict(message.payload)
+        anomaly = self.anomaly_detector.observe_reading(meter_reading)
+        await self._handle_anomalies([anomaly] if anomaly else [])
+        return {"status": "scored", "meter_id": meter_reading.meter_id, "anomalies": 1 if anomaly else 0}
+    
+    async def _detect_meter_reading_batch(self, message: StreamMessage) -> Dict[str, Any]:
+        """Score a batch of meter readings for the anomaly detection shard."""
+        batch = MeterReadingBatch.from_dict(message.payload)
+        anomalies = self.anomaly_detector.observe_batch(batch)
+        await self._handle_anomalies(anomalies)
+        return {"status": "scored", "readings": len(batch), "anomalies": len(anomalies)}
+    
+    async def start_energy_consumers(self, autoscale: bool = False,
+                                     policies: Optional[Dict[str, AutoscalePolicy]] = None) -> bool:
+        """
+        Start consumers for all energy streams.
+        
+        With ``autoscale`` each stream gets a lag-driven autoscaler instead of a
+        fixed consumer count; ``policies`` overrides ``ENERGY_AUTOSCALE_POLICIES``
+        per stream key (e.g. ``"meter_readings"``).
+        """
+        if autoscale:
+            return await self._autoscale_energy_consumers(policies or {})
+        
         success = True
         
         # Start meter reading consumers (multiple for high throughput)
@@ -383,4 +1201,17 @@ class EnergyStreamManager(StreamManager):
         )
         
         logger.info(f"Energy consumers started: {'success' if success else 'with errors'}")
+        return success
+    
+    async def _autoscale_energy_consumers(self, policies: Dict[str, AutoscalePolicy]) -> bool:
+        success = True
+        for key, consumer_prefix in ENERGY_CONSUMER_PREFIXES.items():
+            autoscaler = await self.autoscale_consumers(
+                self.energy_streams[key],
+                policy=policies.get(key) or ENERGY_AUTOSCALE_POLICIES[key],
+                consumer_prefix=consumer_prefix
+            )
+            success &= len(autoscaler.consumers) >= autoscaler.policy.min_consumers
+        
+        logger.info(f"Autoscaled energy consumers started: {'success' if success else 'with errors'}")
         return success
\ No newline at end of file
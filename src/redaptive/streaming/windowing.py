@@ -0,0 +1,328 @@
+"""
+Event-time window aggregation for meter streams.
+================================================
+
+Rolls meter readings up into per-meter and per-building windows (1 minute,
+15 minutes and 1 hour by default) with count/sum/min/max/avg. Windows are
+tumbling, or sliding when a ``slide`` shorter than the window is given.
+
+Windows close on a watermark: the latest event time seen minus the allowed
+lateness. Readings that arrive for windows the watermark has already passed
+are counted and dropped. Closed windows are returned by ``advance()`` so the
+stream manager can publish them downstream and upsert them into the
+``meter_window_rollups`` table (see ``RollupTableSink``).
+"""
+
+import asyncio
+import heapq
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .data_models import MeterReading, MeterReadingBatch, from_epoch_micros, slotted, to_epoch_micros
+
+logger = logging.getLogger(__name__)
+
+METER_SCOPE = "meter"
+BUILDING_SCOPE = "building"
+
+_MICROS_PER_SECOND = 1_000_000
+
+# (scope, entity_id, unit, window_seconds, slide_seconds)
+_AggregateKey = Tuple[str, str, str, int, int]
+
+# (window_seconds, slide_seconds, window end in epoch micros)
+WindowRef = Tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class WindowSpec:
+    """Window length and slide in seconds; tumbling when ``slide_seconds`` is None."""
+    size_seconds: int
+    slide_seconds: Optional[int] = None
+
+    def __post_init__(self):
+        slide = self.slide_seconds or self.size_seconds
+        if self.size_seconds <= 0 or slide <= 0 or self.size_seconds % slide:
+            raise ValueError(
+                f"Window of {self.size_seconds}s needs a positive slide that divides it, got {slide}s"
+            )
+
+    @property
+    def slide(self) -> int:
+        return self.slide_seconds or self.size_seconds
+
+
+DEFAULT_WINDOWS = (WindowSpec(60), WindowSpec(900), WindowSpec(3600))
+
+
+@slotted
+@dataclass
+class WindowAggregate:
+    """Aggregate of the readings in one closed window for a meter or building."""
+    scope: str
+    entity_id: str
+    unit: str
+    window_seconds: int
+    slide_seconds: int
+    window_start: datetime
+    window_end: datetime
+    count: int
+    sum: float
+    min: float
+    max: float
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for serialization."""
+        return {
+            "scope": self.scope,
+            "entity_id": self.entity_id,
+            "unit": self.unit,
+            "window_seconds": self.window_seconds,
+            "slide_seconds": self.slide_seconds,
+            "window_start": self.window_start.isoformat(),
+            "window_end": self.window_end.isoformat(),
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.avg
+        }
+
+
+class WindowAggregator:
+    """
+    Incremental event-time window aggregation.
+
+    Open windows are grouped by their end time, so closing them on a watermark
+    pops a heap instead of scanning every open window. Each window keeps four
+    running values (count, sum, min, max) per meter and per building; building
+    windows are further split by unit so kWh and therms never mix.
+
+    The watermark is shared by all meters: meters report on common intervals,
+    and one global watermark bounds state even when a meter goes quiet.
+    Not thread-safe; use one aggregator per consumer task or event loop.
+    """
+
+    def __init__(self, windows: Sequence[WindowSpec] = DEFAULT_WINDOWS,
+                 allowed_lateness_seconds: float = 60, per_building: bool = True):
+        self.windows = tuple(windows)
+        self.allowed_lateness_micros = int(allowed_lateness_seconds * _MICROS_PER_SECOND)
+        self.per_building = per_building
+        self._specs = [(spec.size_seconds * _MICROS_PER_SECOND, spec.slide * _MICROS_PER_SECOND,
+                        spec.size_seconds, spec.slide) for spec in self.windows]
+        self._open: Dict[int, Dict[_AggregateKey, List[float]]] = {}
+        self._ends: List[int] = []
+        self.max_event_micros: Optional[int] = None
+        self.metrics = {
+            "readings_aggregated": 0,
+            "readings_late": 0,
+            "windows_closed": 0
+        }
+
+    @property
+    def watermark_micros(self) -> Optional[int]:
+        if self.max_event_micros is None:
+            return None
+        return self.max_event_micros - self.allowed_lateness_micros
+
+    @property
+    def complete_before_micros(self) -> Optional[int]:
+        """Event time before which every window a reading falls in has closed."""
+        return self.complete_before(self.watermark_micros)
+
+    def complete_before(self, written_through_micros: Optional[int]) -> Optional[int]:
+        """Event time before which every window a reading falls in ends by ``written_through_micros``."""
+        if written_through_micros is None:
+            return None
+        return written_through_micros - max(size for size, _, _, _ in self._specs)
+
+    @property
+    def watermark(self) -> Optional[datetime]:
+        """Event time up to which all windows are considered complete."""
+        watermark = self.watermark_micros
+        return from_epoch_micros(watermark) if watermark is not None else None
+
+    def windows_for(self, timestamp_micros: int) -> List[WindowRef]:
+        """The still-open windows a reading at this event time would be added to."""
+        watermark = self.watermark_micros
+        refs = []
+        for size, slide, size_seconds, slide_seconds in self._specs:
+            end = timestamp_micros - timestamp_micros % slide + size
+            while end > timestamp_micros and (watermark is None or end > watermark):
+                refs.append((size_seconds, slide_seconds, end))
+                end -= slide
+        return refs
+
+    def add(self, meter_id: str, building_id: str, unit: str, timestamp_micros: int, value: float,
+            windows: Optional[Collection[WindowRef]] = None) -> bool:
+        """
+        Add one reading by epoch-microsecond event time.
+
+        With ``windows`` (see ``windows_for``) the reading only goes into those,
+        e.g. when the others were already written before a restart.
+
+        Returns:
+            False when the reading was too late for any of its windows, or
+            none of its open windows is in ``windows``
+        """
+        watermark = self.watermark_micros
+        keys = [(METER_SCOPE, meter_id, unit)]
+        if self.per_building:
+            keys.append((BUILDING_SCOPE, building_id, unit))
+
+        accepted, late = False, True
+        for size, slide, size_seconds, slide_seconds in self._specs:
+            # Windows [end - size, end) containing the reading, latest first
+            end = timestamp_micros - timestamp_micros % slide + size
+            while end > timestamp_micros:
+                if watermark is not None and end <= watermark:
+                    break
+                late = False
+                if windows is not None and (size_seconds, slide_seconds, end) not in windows:
+                    end -= slide
+                    continue
+                accepted = True
+                window = self._open.get(end)
+                if window is None:
+                    window = self._open[end] = {}
+                    heapq.heappush(self._ends, end)
+                for scope, entity_id, entity_unit in keys:
+                    key = (scope, entity_id, entity_unit, size_seconds, slide_seconds)
+                    state = window.get(key)
+                    if state is None:
+                        window[key] = [1, value, value, value]
+                    else:
+                        state[0] += 1
+                        state[1] += value
+                        if value < state[2]:
+                            state[2] = value
+                        if value > state[3]:
+                            state[3] = value
+                end -= slide
+
+        if late:
+            self.metrics["readings_late"] += 1
+            return False
+        if self.max_event_micros is None or timestamp_micros > self.max_event_micros:
+            self.max_event_micros = timestamp_micros
+        if not accepted:
+            return False
+        self.metrics["readings_aggregated"] += 1
+        return True
+
+    def add_reading(self, reading: MeterReading, windows: Optional[Collection[WindowRef]] = None) -> bool:
+        """Add a MeterReading, optionally only to ``windows`` as in ``add``."""
+        return self.add(
+            reading.meter_id, reading.building_id, reading.unit,
+            to_epoch_micros(reading.timestamp), reading.value, windows
+        )
+
+    def add_batch(self, batch: MeterReadingBatch,
+                  windows: Optional[Sequence[Collection[WindowRef]]] = None) -> int:
+        """
+        Add every reading of a columnar batch; returns how many were accepted.
+
+        ``windows`` optionally restricts each reading, as in ``add``.
+        """
+        meter_ids, building_ids, units = batch.meter_ids, batch.building_ids, batch.units
+        accepted = 0
+        if windows is None:
+            for index, timestamp, value in zip(batch.meter_index, batch.timestamps, batch.values):
+                accepted += self.add(meter_ids[index], building_ids[index], units[index], timestamp, value)
+            return accepted
+        for index, timestamp, value, refs in zip(batch.meter_index, batch.timestamps, batch.values, windows):
+            accepted += self.add(meter_ids[index], building_ids[index], units[index], timestamp, value, refs)
+        return accepted
+
+    def advance(self) -> List[WindowAggregate]:
+        """Close and return every window that ends at or before the watermark."""
+        watermark = self.watermark_micros
+        if watermark is None:
+            return []
+        return self._close(lambda end: end <= watermark)
+
+    def flush(self) -> List[WindowAggregate]:
+        """Close every open window regardless of the watermark (e.g. on shutdown)."""
+        return self._close(lambda end: True)
+
+    def open_windows(self) -> int:
+        """Number of open (window, entity) aggregates held in memory."""
+        return sum(len(window) for window in self._open.values())
+
+    def _close(self, due) -> List[WindowAggregate]:
+        closed = []
+        while self._ends and due(self._ends[0]):
+            end = heapq.heappop(self._ends)
+            window_end = from_epoch_micros(end)
+            for (scope, entity_id, unit, size_seconds, slide_seconds), state in self._open.pop(end).items():
+                count, total, minimum, maximum = state
+                closed.append(WindowAggregate(
+                    scope=scope,
+                    entity_id=entity_id,
+                    unit=unit,
+                    window_seconds=size_seconds,
+                    slide_seconds=slide_seconds,
+                    window_start=from_epoch_micros(end - size_seconds * _MICROS_PER_SECOND),
+                    window_end=window_end,
+                    count=int(count),
+                    sum=total,
+                    min=minimum,
+                    max=maximum
+                ))
+        self.metrics["windows_closed"] += len(closed)
+        return closed
+
+
+ROLLUP_UPSERT_SQL = """
+INSERT INTO meter_window_rollups (
+    scope, entity_id, unit, window_seconds, slide_seconds, window_start, window_end,
+    reading_count, value_sum, value_min, value_max
+) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (scope, entity_id, unit, window_seconds, slide_seconds, window_start) DO UPDATE SET
+    reading_count = meter_window_rollups.reading_count + EXCLUDED.reading_count,
+    value_sum = meter_window_rollups.value_sum + EXCLUDED.value_sum,
+    value_min = LEAST(meter_window_rollups.value_min, EXCLUDED.value_min),
+    value_max = GREATEST(meter_window_rollups.value_max, EXCLUDED.value_max),
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def rollup_rows(aggregates: Iterable[WindowAggregate]) -> List[tuple]:
+    """Parameter rows for ``ROLLUP_UPSERT_SQL``."""
+    return [
+        (a.scope, a.entity_id, a.unit, a.window_seconds, a.slide_seconds, a.window_start, a.window_end,
+         a.count, a.sum, a.min, a.max)
+        for a in aggregates
+    ]
+
+
+class RollupTableSink:
+    """
+    Upserts closed windows into ``meter_window_rollups``.
+
+    Rows merge on conflict (counts and sums add, min/max combine), so partial
+    windows from several consumers combine into one row. With idempotency
+    enabled a reading is never added to a written window again, also after a
+    restart. The blocking database call runs in the default executor.
+    """
+
+    def __init__(self, database=None):
+        if database is None:
+            from redaptive.config.database import db as database
+        self.database = database
+
+    async def __call__(self, aggregates: List[WindowAggregate]):
+        rows = rollup_rows(aggregates)
+        if rows:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write, rows)
+
+    def _write(self, rows: List[tuple]):
+        with self.database.get_cursor() as cursor:
+            cursor.executemany(ROLLUP_UPSERT_SQL, rows)
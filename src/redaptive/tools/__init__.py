@@ -5,9 +5,18 @@ Shared tools and utilities for the Redaptive Agentic Platform.
 from .database import DatabaseTool
 from .mcp_client import ProductionMCPClient as MCPClient
 from .data_processing import DataProcessor
+from .cache import LRUCache, canonical_hash
+from .parquet_archive import ParquetArchive, PYARROW_AVAILABLE
+from .timeseries_store import MeterSeriesStore, open_meter_store
 
 __all__ = [
     "DatabaseTool",
     "MCPClient", 
-    "DataProcessor"
+    "DataProcessor",
+    "LRUCache",
+    "canonical_hash",
+    "ParquetArchive",
+    "PYARROW_AVAILABLE",
+    "MeterSeriesStore",
+    "open_meter_store"
 ]
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+In-process caching utilities for the Redaptive platform.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    """Normalize JSON-like values so equal inputs serialize identically."""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        # 15, 15.0 and Decimal("15.00") describe the same input
+        return float(value)
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def canonical_hash(*parts: Any) -> str:
+    """Content hash of JSON-like values, independent of key order and number formatting."""
+    payload = json.dumps(_normalize(parts), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss metrics."""
+
+    def __init__(self, max_size: int = 256):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return a cached value and mark it most recently used."""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            self.metrics["misses"] += 1
+            return default
+
+        self.metrics["hits"] += 1
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: Any):
+        """Insert a value, evicting the least recently used entry when full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop a single entry."""
+        if self._entries.pop(key, None) is None:
+            return False
+        self.metrics["invalidations"] += 1
+        return True
+
+    def clear(self):
+        """Drop every entry."""
+        if self._entries:
+            self.metrics["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cache metrics."""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_rate": self.metrics["hits"] / lookups if lookups > 0 else 0.0
+        }
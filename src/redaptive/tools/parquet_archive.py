@@ -0,0 +1,411 @@
+"""
+Columnar cold storage for meter history.
+
+``energy_usage`` is row-oriented, so analytics over years of 15-minute data
+fetch every row and column. ``ParquetArchive`` exports closed days (every day
+before today) into zstd-compressed Parquet files partitioned by day and building:
+
+    <root>/reading_day=2024-03-01/building_id=BLDG-001/part-0.parquet
+
+Queries open the files memory-mapped, skip partitions outside the requested
+days and buildings, and push the remaining predicates down to row-group
+statistics, so a multi-year scan reads only the matching compressed columns.
+
+Requires pyarrow (``pip install redaptive-agentic-platform[archive]``).
+"""
+
+import argparse
+import calendar
+import logging
+import os
+import shutil
+import sys
+import uuid
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pc = None
+    ds = None
+    pafs = None
+    pq = None
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# energy_usage columns kept in the archive; reading_day and building_id are partition keys
+FLOAT_COLUMNS = (
+    "energy_consumption", "energy_cost", "demand_kw", "power_factor",
+    "weather_temp_f", "occupancy_percentage"
+)
+
+EXPORT_DAY_SQL = """
+SELECT meter_id, building_id, reading_date, energy_type, energy_consumption, energy_cost,
+       demand_kw, power_factor, weather_temp_f, occupancy_percentage
+FROM energy_usage
+WHERE reading_date >= %s AND reading_date < %s
+ORDER BY building_id, meter_id, reading_date
+"""
+
+FIRST_READING_SQL = "SELECT MIN(reading_date) AS first_reading FROM energy_usage"
+
+# Degree days are relative to 65°F, as in the forecasting rollups
+DEGREE_DAY_BASE_F = 65.0
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _file_schema() -> "pa.Schema":
+    return pa.schema(
+        [("meter_id", pa.string()), ("reading_date", pa.timestamp("us")), ("energy_type", pa.string())]
+        + [(name, pa.float64()) for name in FLOAT_COLUMNS]
+    )
+
+
+def _float(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class ParquetArchive:
+    """Day- and building-partitioned Parquet copy of ``energy_usage``."""
+
+    def __init__(self, root: str, compression: str = "zstd", row_group_size: int = 128 * 1024):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required for ParquetArchive. Install with: pip install pyarrow")
+        self.root = os.path.abspath(root)
+        self.compression = compression
+        self.row_group_size = row_group_size
+        os.makedirs(self.root, exist_ok=True)
+        self._partitioning = ds.partitioning(
+            pa.schema([("reading_day", pa.date32()), ("building_id", pa.string())]), flavor="hive"
+        )
+        # Files are read through memory maps instead of buffered reads
+        self._filesystem = pafs.LocalFileSystem(use_mmap=True)
+
+    # Writing
+
+    def archived_days(self) -> List[date]:
+        """Days present in the archive, oldest first."""
+        days = []
+        for name in os.listdir(self.root):
+            if name.startswith("reading_day="):
+                try:
+                    days.append(date.fromisoformat(name.split("=", 1)[1]))
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    def archived_through(self) -> Optional[date]:
+        """Last archived day, or None for an empty archive."""
+        days = self.archived_days()
+        return days[-1] if days else None
+
+    def complete_months(self) -> Optional[Tuple[date, date]]:
+        """
+        Months held in full, as ``(first month, end)`` with the end exclusive;
+        None when no month is complete. Days are exported contiguously, so only
+        the first and last months can be partial.
+        """
+        days = self.archived_days()
+        if not days:
+            return None
+        start = days[0] if days[0].day == 1 else _next_month(days[0])
+        end = _month_start(days[-1] + timedelta(days=1))
+        return (start, end) if start < end else None
+
+    def write_day(self, day: date, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Write one day's ``energy_usage`` rows, replacing the day if it was archived before.
+
+        Returns:
+            Rows written
+        """
+        columns: Dict[str, Dict[str, list]] = {}
+        for row in rows:
+            building = columns.get(row["building_id"])
+            if building is None:
+                building = columns[row["building_id"]] = {name: [] for name in _file_schema().names}
+            building["meter_id"].append(row["meter_id"])
+            building["reading_date"].append(row["reading_date"])
+            building["energy_type"].append(row["energy_type"])
+            for name in FLOAT_COLUMNS:
+                building[name].append(_float(row.get(name)))
+
+        final = os.path.join(self.root, f"reading_day={day.isoformat()}")
+        # Dot-prefixed directories are invisible to queries until renamed into place
+        staging = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        schema = _file_schema()
+        written = 0
+        try:
+            for building_id, data in columns.items():
+                table = pa.Table.from_pydict(data, schema=schema).sort_by(
+                    [("meter_id", "ascending"), ("reading_date", "ascending")]
+                )
+                directory = os.path.join(staging, f"building_id={building_id}")
+                os.makedirs(directory)
+                pq.write_table(table, os.path.join(directory, "part-0.parquet"),
+                               compression=self.compression, row_group_size=self.row_group_size)
+                written += table.num_rows
+            if not columns:
+                os.makedirs(staging)
+
+            replaced = None
+            if os.path.exists(final):
+                replaced = os.path.join(self.root, f".replaced-{uuid.uuid4().hex}")
+                os.rename(final, replaced)
+            os.rename(staging, final)
+            if replaced:
+                shutil.rmtree(replaced, ignore_errors=True)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return written
+
+    def export_closed_days(self, database=None, start: Optional[date] = None,
+                           through: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Copy days from ``energy_usage`` into the archive, one day per query.
+
+        ``start`` defaults to the day after the last archived one (or the first
+        reading) and ``through`` to yesterday, the last closed day.
+
+        Returns:
+            Days and rows exported, and the last archived day
+        """
+        if database is None:
+            from redaptive.config.database import db as database
+        through = through or date.today() - timedelta(days=1)
+        if start is None:
+            last = self.archived_through()
+            if last is not None:
+                start = last + timedelta(days=1)
+            else:
+                with database.get_cursor() as cursor:
+                    cursor.execute(FIRST_READING_SQL)
+                    first = cursor.fetchone()["first_reading"]
+                if first is None:
+                    return {"days_exported": 0, "rows_exported": 0, "archived_through": None}
+                start = first.date() if isinstance(first, datetime) else first
+
+        days_exported = rows_exported = 0
+        day = start
+        while day <= through:
+            with database.get_cursor() as cursor:
+                cursor.execute(EXPORT_DAY_SQL, [datetime.combine(day, time()),
+                                                datetime.combine(day + timedelta(days=1), time())])
+                rows_exported += self.write_day(day, cursor.fetchall())
+            days_exported += 1
+            day += timedelta(days=1)
+
+        logger.info(f"Archived {rows_exported} readings over {days_exported} days to {self.root}")
+        return {"days_exported": days_exported, "rows_exported": rows_exported,
+                "archived_through": self.archived_through()}
+
+    # Reading
+
+    def query(self, start: Optional[date] = None, end: Optional[date] = None,
+              building_ids: Optional[Sequence[str]] = None, meter_ids: Optional[Sequence[str]] = None,
+              energy_type: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> "pa.Table":
+        """
+        Archived readings with ``start <= reading_date < end``.
+
+        Day and building filters prune partitions; meter, energy type and the
+        exact time bounds are checked against row-group statistics before rows
+        are decoded.
+        """
+        dataset = ds.dataset(self.root, format="parquet", partitioning=self._partitioning,
+                             filesystem=self._filesystem)
+        conditions = []
+        if start is not None:
+            start = _as_datetime(start)
+            conditions.append(ds.field("reading_day") >= start.date())
+            conditions.append(ds.field("reading_date") >= pa.scalar(start, pa.timestamp("us")))
+        if end is not None:
+            end = _as_datetime(end)
+            conditions.append(ds.field("reading_day") <= (end - timedelta(microseconds=1)).date())
+            conditions.append(ds.field("reading_date") < pa.scalar(end, pa.timestamp("us")))
+        if building_ids is not None:
+            conditions.append(ds.field("building_id").isin(list(building_ids)))
+        if meter_ids is not None:
+            conditions.append(ds.field("meter_id").isin(list(meter_ids)))
+        if energy_type is not None:
+            conditions.append(ds.field("energy_type") == energy_type)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return dataset.to_table(columns=list(columns) if columns else None, filter=expression)
+
+    def monthly_rollups(self, building_ids: Sequence[str], start: date, end: date,
+                        energy_type: str = "electricity") -> List[Dict[str, Any]]:
+        """
+        Monthly consumption, mean occupancy and meter-derived heating/cooling
+        degree days per building, in the row format of the forecasting rollups.
+        """
+        table = self.query(
+            start, end, building_ids=building_ids, energy_type=energy_type,
+            columns=["building_id", "reading_date", "energy_consumption", "weather_temp_f", "occupancy_percentage"]
+        )
+        if not table.num_rows:
+            return []
+        table = table.append_column("month", pc.floor_temporal(table["reading_date"], unit="month"))
+        monthly = table.group_by(["building_id", "month"]).aggregate([
+            ("energy_consumption", "sum"), ("occupancy_percentage", "mean")
+        ])
+
+        # Degree days: mean daily temperature against the base, averaged and scaled to the month
+        daily = table.append_column("day", pc.floor_temporal(table["reading_date"], unit="day")).group_by(
+            ["building_id", "day"]
+        ).aggregate([("weather_temp_f", "mean")])
+        daily = daily.filter(pc.is_valid(daily["weather_temp_f_mean"]))
+        temperature = daily["weather_temp_f_mean"]
+        daily = daily.append_column("hdd", pc.max_element_wise(pc.subtract(DEGREE_DAY_BASE_F, temperature), 0.0))
+        daily = daily.append_column("cdd", pc.max_element_wise(pc.subtract(temperature, DEGREE_DAY_BASE_F), 0.0))
+        daily = daily.append_column("month", pc.floor_temporal(daily["day"], unit="month"))
+        degree_days = {
+            (row["building_id"], row["month"]): (row["hdd_mean"], row["cdd_mean"])
+            for row in daily.group_by(["building_id", "month"]).aggregate([("hdd", "mean"), ("cdd", "mean")]).to_pylist()
+        }
+
+        rows = []
+        for row in monthly.to_pylist():
+            month = row["month"]
+            days_in_month = calendar.monthrange(month.year, month.month)[1]
+            hdd, cdd = degree_days.get((row["building_id"], month), (None, None))
+            rows.append({
+                "building_id": row["building_id"],
+                "month": month,
+                "consumption": row["energy_consumption_sum"],
+                "occupancy": row["occupancy_percentage_mean"],
+                "hdd": hdd * days_in_month if hdd is not None else None,
+                "cdd": cdd * days_in_month if cdd is not None else None
+            })
+        rows.sort(key=lambda row: (row["building_id"], row["month"]))
+        return rows
+
+    def usage_profiles(self, start: datetime, end: datetime, building_ids: Optional[Sequence[str]] = None,
+                       meter_ids: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Daily, weekly and peak-demand profiles of the combined load of the
+        selected buildings or meters. Empty if nothing was archived in the range.
+        """
+        table = self.query(start, end, building_ids=building_ids, meter_ids=meter_ids,
+                           columns=["reading_date", "energy_consumption", "demand_kw"])
+        if not table.num_rows:
+            return {}
+
+        # Hourly kWh equals the average kW over the hour
+        hours = table.append_column("hour", pc.floor_temporal(table["reading_date"], unit="hour")).group_by(
+            "hour"
+        ).aggregate([("energy_consumption", "sum")])
+        hourly = hours.append_column("hour_of_day", pc.hour(hours["hour"])).group_by("hour_of_day").aggregate([
+            ("energy_consumption_sum", "mean")
+        ])
+        load_by_hour = dict(zip(hourly["hour_of_day"].to_pylist(), hourly["energy_consumption_sum_mean"].to_pylist()))
+        peak_hours = sorted(load_by_hour, key=load_by_hour.get, reverse=True)[:3]
+
+        days = table.append_column("day", pc.floor_temporal(table["reading_date"], unit="day")).group_by(
+            "day"
+        ).aggregate([("energy_consumption", "sum")])
+        daily_totals = days["energy_consumption_sum"]
+        daily_mean = pc.mean(daily_totals).as_py()
+        weekly = days.append_column("weekday", pc.day_of_week(days["day"])).group_by("weekday").aggregate([
+            ("energy_consumption_sum", "mean")
+        ])
+        by_weekday = dict(zip(weekly["weekday"].to_pylist(), weekly["energy_consumption_sum_mean"].to_pylist()))
+        weekday_loads = [by_weekday[day] for day in range(5) if day in by_weekday]
+        weekend_loads = [by_weekday[day] for day in (5, 6) if day in by_weekday]
+
+        # Coincident peak: the interval with the highest combined demand
+        demand = table.filter(pc.is_valid(table["demand_kw"]))
+        if demand.num_rows:
+            coincident = demand.group_by("reading_date").aggregate([("demand_kw", "sum")])
+            peak_index = pc.index(coincident["demand_kw_sum"], pc.max(coincident["demand_kw_sum"])).as_py()
+            max_demand = coincident["demand_kw_sum"][peak_index].as_py()
+            peak_time = coincident["reading_date"][peak_index].as_py()
+        else:
+            peak_index = pc.index(hours["energy_consumption_sum"], pc.max(hours["energy_consumption_sum"])).as_py()
+            max_demand = hours["energy_consumption_sum"][peak_index].as_py()
+            peak_time = hours["hour"][peak_index].as_py()
+
+        return {
+            "daily_profile": {
+                "peak_hours": [f"{hour:02d}:00" for hour in sorted(peak_hours)],
+                "base_load": min(load_by_hour.values()),
+                "peak_load": max(load_by_hour.values()),
+                "variability": pc.stddev(daily_totals).as_py() / daily_mean if daily_mean else 0.0,
+                "hourly_load_kw": [load_by_hour.get(hour) for hour in range(24)]
+            },
+            "weekly_profile": {
+                "weekday_average": sum(weekday_loads) / len(weekday_loads) if weekday_loads else 0.0,
+                "weekend_average": sum(weekend_loads) / len(weekend_loads) if weekend_loads else 0.0,
+                "highest_day": WEEKDAYS[max(by_weekday, key=by_weekday.get)],
+                "lowest_day": WEEKDAYS[min(by_weekday, key=by_weekday.get)],
+                "days_analyzed": days.num_rows
+            },
+            "peak_demand": {
+                "max_demand_kw": max_demand,
+                "coincident_peak": peak_time.strftime("%H:%M"),
+                "peak_date": peak_time.date().isoformat()
+            }
+        }
+
+
+def open_history_archive(path: Optional[str] = None) -> Optional[ParquetArchive]:
+    """
+    The configured archive (``HISTORY_ARCHIVE_PATH``), or None when no path is
+    set or pyarrow is missing, in which case agents read Postgres only.
+    """
+    if path is None:
+        from redaptive.config import settings
+        path = settings.storage.history_archive_path
+    if not path:
+        return None
+    if not PYARROW_AVAILABLE:
+        logger.warning("pyarrow not available - history archive disabled")
+        return None
+    return ParquetArchive(path)
+
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.combine(value, time())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export closed days of energy_usage to the Parquet history archive")
+    parser.add_argument("--path", help="Archive directory (default: HISTORY_ARCHIVE_PATH)")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to export (YYYY-MM-DD)")
+    parser.add_argument("--through", type=date.fromisoformat, help="Last day to export (default: yesterday)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()))
+    if not PYARROW_AVAILABLE:
+        logger.error("pyarrow is required for the history archive. Install with: pip install pyarrow")
+        return 1
+    from redaptive.config import settings
+    path = args.path or settings.storage.history_archive_path
+    if not path:
+        logger.error("No archive path: pass --path or set HISTORY_ARCHIVE_PATH")
+        return 1
+    ParquetArchive(path).export_closed_days(start=args.start, through=args.through)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
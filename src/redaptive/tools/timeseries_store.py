@@ -0,0 +1,406 @@
+"""
+Memory-mapped time-series store for recent meter history.
+
+Each meter's series is one file of fixed-width columns: a 64-byte header, the
+reading timestamps (int64 epoch microseconds, strictly increasing) and one
+float64 column per configured field, each preallocated to the file's capacity:
+
+    <root>/store.json               column names
+    <root>/series/<quoted meter id> header | timestamps | column 1 | column 2 | ...
+
+Files are mapped with ``numpy.memmap``. ``window()`` binary-searches the
+timestamp column and returns read-only NumPy views into the mapping, so a
+window costs no copy or deserialization. Every process that opens the store
+shares the same pages through the OS page cache instead of holding its own copy.
+
+Appends hold an exclusive lock on ``<root>/append.lock``, so several processes
+may write. Values are written before the header's row count, and readers take
+no lock and only see rows up to that count. A full file is doubled, or
+compacted to its newest points once it reaches ``max_points``, by writing a
+replacement and renaming it over the old file. Readers switch to the new file
+on their next call; views taken earlier stay valid and keep the old data.
+
+Each mapping holds a file descriptor, so at most ``max_open_files`` meters stay
+mapped; the least recently used mapping is dropped and reopened on demand.
+Views already handed out keep their own mapping open until they are released.
+
+Readings at or before a meter's last timestamp are dropped, as the series must
+stay sorted; replayed readings are therefore skipped too.
+
+Requires numpy (``pip install redaptive-agentic-platform[analytics]``).
+"""
+
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+from urllib.parse import quote, unquote
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writing process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x3153_544D_5244  # "RDMTS1"
+HEADER_BYTES = 64
+# Header words (int64)
+_MAGIC, _CAPACITY, _COUNT = 0, 1, 2
+
+EPOCH = datetime(1970, 1, 1)
+
+Timestamp = Union[datetime, int]
+
+
+def epoch_micros(value: Timestamp) -> int:
+    """Epoch microseconds as in the stream models: naive datetimes as-is, aware ones as UTC."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return (value - EPOCH) // timedelta(microseconds=1)
+    return int(value)
+
+
+class SeriesWindow(NamedTuple):
+    """Read-only views of a meter's rows: timestamps (epoch micros) and one array per column."""
+    timestamps: "np.ndarray"
+    columns: Dict[str, "np.ndarray"]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def _readonly(view: "np.ndarray") -> "np.ndarray":
+    view = view.view()
+    view.flags.writeable = False
+    return view
+
+
+class _Series:
+    """Mapping of one meter's file."""
+
+    __slots__ = ("identity", "header", "capacity", "timestamps", "columns")
+
+    def __init__(self, path: str, column_names: Sequence[str], writable: bool):
+        stat = os.stat(path)
+        self.identity = (stat.st_dev, stat.st_ino)
+        mapping = np.memmap(path, dtype=np.uint8, mode="r+" if writable else "r")
+        self.header = mapping[:HEADER_BYTES].view(np.int64)
+        if int(self.header[_MAGIC]) != MAGIC:
+            raise ValueError(f"Not a meter series file: {path}")
+        self.capacity = capacity = int(self.header[_CAPACITY])
+        width = 8 * capacity
+        self.timestamps = mapping[HEADER_BYTES:HEADER_BYTES + width].view(np.int64)
+        self.columns = {}
+        for position, name in enumerate(column_names, start=1):
+            start = HEADER_BYTES + position * width
+            self.columns[name] = mapping[start:start + width].view(np.float64)
+
+    @property
+    def count(self) -> int:
+        return int(self.header[_COUNT])
+
+
+class MeterSeriesStore:
+    """
+    Per-meter fixed-width column files, memory-mapped and shared across processes.
+
+    Open with ``readonly=True`` in processes that only analyse; the column names
+    are read from the store. A writer creates the store with ``columns``.
+    ``max_open_files`` bounds the mappings (one descriptor each) kept open.
+    """
+
+    def __init__(self, root: str, columns: Optional[Sequence[str]] = None, readonly: bool = False,
+                 initial_capacity: int = 1024, max_points: int = 65536, max_open_files: int = 256):
+        if not NUMPY_AVAILABLE:
+            raise ImportError(
+                "numpy is required for MeterSeriesStore. "
+                "Install with: pip install redaptive-agentic-platform[analytics]"
+            )
+        if max_points < 4 or initial_capacity < 1 or max_open_files < 1:
+            raise ValueError("max_points must be at least 4, initial_capacity and max_open_files positive")
+        self.root = os.path.abspath(root)
+        self.readonly = readonly
+        self.initial_capacity = min(initial_capacity, max_points)
+        self.max_points = max_points
+        self.max_open_files = max_open_files
+        self._series_dir = os.path.join(self.root, "series")
+        self.column_names = self._load_columns(columns)
+        # Least recently used first
+        self._series: "OrderedDict[str, _Series]" = OrderedDict()
+        self._lock_file = None if readonly else open(os.path.join(self.root, "append.lock"), "a+b")
+        self.metrics = {
+            "points_appended": 0,
+            "points_dropped": 0,
+            "files_grown": 0,
+            "files_compacted": 0,
+            "mappings_evicted": 0
+        }
+
+    def _load_columns(self, columns: Optional[Sequence[str]]) -> Tuple[str, ...]:
+        meta_path = os.path.join(self.root, "store.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as handle:
+                stored = tuple(json.load(handle)["columns"])
+            if columns is not None and tuple(columns) != stored:
+                raise ValueError(f"Store at {self.root} has columns {list(stored)}, not {list(columns)}")
+            return stored
+        if self.readonly:
+            raise FileNotFoundError(f"No meter series store at {self.root}")
+        if not columns:
+            raise ValueError("columns are required to create a meter series store")
+        os.makedirs(self._series_dir, exist_ok=True)
+        staging = f"{meta_path}.{uuid.uuid4().hex}"
+        with open(staging, "w") as handle:
+            json.dump({"columns": list(columns)}, handle)
+        os.replace(staging, meta_path)
+        return tuple(columns)
+
+    def close(self):
+        self._series.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # Files
+
+    def _path(self, meter_id: str) -> str:
+        return os.path.join(self._series_dir, quote(meter_id, safe=""))
+
+    def _open(self, meter_id: str) -> Optional[_Series]:
+        """Current mapping of a meter's file, remapped if another writer replaced it."""
+        path = self._path(meter_id)
+        series = self._series.get(meter_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._series.pop(meter_id, None)
+            return None
+        if series is None or series.identity != (stat.st_dev, stat.st_ino):
+            series = self._series[meter_id] = _Series(path, self.column_names, writable=not self.readonly)
+            while len(self._series) > self.max_open_files:
+                # Dropping the last reference unmaps the file and closes its descriptor
+                self._series.popitem(last=False)
+                self.metrics["mappings_evicted"] += 1
+        self._series.move_to_end(meter_id)
+        return series
+
+    def _write_file(self, meter_id: str, capacity: int, timestamps: "np.ndarray",
+                    columns: Mapping[str, "np.ndarray"]) -> _Series:
+        """Write a complete file next to the meter's and rename it into place."""
+        path = self._path(meter_id)
+        staging = os.path.join(self._series_dir, f".{uuid.uuid4().hex}")
+        size = HEADER_BYTES + 8 * capacity * (1 + len(self.column_names))
+        with open(staging, "wb") as handle:
+            handle.truncate(size)
+        try:
+            mapping = np.memmap(staging, dtype=np.uint8, mode="r+")
+            count = len(timestamps)
+            width = 8 * capacity
+            mapping[:HEADER_BYTES].view(np.int64)[[_MAGIC, _CAPACITY, _COUNT]] = (MAGIC, capacity, count)
+            mapping[HEADER_BYTES:HEADER_BYTES + width].view(np.int64)[:count] = timestamps
+            for position, name in enumerate(self.column_names, start=1):
+                start = HEADER_BYTES + position * width
+                mapping[start:start + width].view(np.float64)[:count] = columns[name]
+            mapping.flush()
+            del mapping
+            os.replace(staging, path)
+        except BaseException:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+        return self._open(meter_id)
+
+    @contextmanager
+    def _append_lock(self) -> Iterator[None]:
+        if self.readonly:
+            raise PermissionError("Meter series store is open read-only")
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    # Writing
+
+    def append(self, meter_id: str, timestamps: Sequence[Timestamp],
+               columns: Mapping[str, Sequence[Optional[float]]]) -> int:
+        """
+        Append one meter's readings; missing columns and None values are stored as NaN.
+
+        Returns:
+            Readings appended (readings at or before the last stored one are dropped)
+        """
+        with self._append_lock():
+            return self._append(meter_id, timestamps, columns)
+
+    def append_batch(self, meter_ids: Sequence[str], meter_index: Sequence[int], timestamps: Sequence[int],
+                     columns: Mapping[str, Sequence[Optional[float]]]) -> int:
+        """
+        Append a columnar batch (``MeterReadingBatch`` layout: per-reading
+        meter indices into ``meter_ids``) under a single lock.
+
+        Returns:
+            Readings appended
+        """
+        if not len(timestamps):
+            return 0
+        index = np.asarray(meter_index, dtype=np.int64)
+        times = np.asarray(timestamps, dtype=np.int64)
+        values = {name: np.asarray(column, dtype=np.float64) for name, column in columns.items()}
+        # Stable sort keeps each meter's readings in arrival order
+        order = np.argsort(index, kind="stable")
+        bounds = np.flatnonzero(np.diff(index[order])) + 1
+        appended = 0
+        with self._append_lock():
+            for group in np.split(order, bounds):
+                meter_id = meter_ids[int(index[group[0]])]
+                appended += self._append(meter_id, times[group], {name: column[group] for name, column in values.items()})
+        return appended
+
+    def _append(self, meter_id: str, timestamps: Sequence[Timestamp],
+                columns: Mapping[str, Sequence[Optional[float]]]) -> int:
+        times = np.fromiter((epoch_micros(value) for value in timestamps), dtype=np.int64, count=len(timestamps)) \
+            if not isinstance(timestamps, np.ndarray) else timestamps.astype(np.int64, copy=False)
+        received = len(times)
+        values = {}
+        for name in self.column_names:
+            column = columns.get(name)
+            if column is None:
+                values[name] = np.full(received, np.nan)
+            else:
+                values[name] = np.array([np.nan if value is None else value for value in column], dtype=np.float64) \
+                    if not isinstance(column, np.ndarray) else column.astype(np.float64, copy=False)
+
+        if received > 1 and not (np.diff(times) > 0).all():
+            times, first = np.unique(times, return_index=True)
+            values = {name: column[first] for name, column in values.items()}
+
+        series = self._open(meter_id)
+        count = series.count if series is not None else 0
+        if count:
+            newer = times > series.timestamps[count - 1]
+            if not newer.all():
+                times = times[newer]
+                values = {name: column[newer] for name, column in values.items()}
+        if len(times) > self.max_points:
+            times = times[-self.max_points:]
+            values = {name: column[-self.max_points:] for name, column in values.items()}
+
+        added = len(times)
+        self.metrics["points_dropped"] += received - added
+        if not added:
+            return 0
+
+        if series is None or count + added > series.capacity:
+            series, count = self._resize(meter_id, series, count, added)
+        series.timestamps[count:count + added] = times
+        for name, column in values.items():
+            series.columns[name][count:count + added] = column
+        # Publish the rows only after they are written
+        series.header[_COUNT] = count + added
+        self.metrics["points_appended"] += added
+        return added
+
+    def _resize(self, meter_id: str, series: Optional[_Series], count: int, adding: int) -> Tuple[_Series, int]:
+        """Grow a meter's file, or compact it to its newest points at ``max_points``."""
+        needed = count + adding
+        if needed <= self.max_points:
+            capacity = self.initial_capacity
+            while capacity < needed:
+                capacity *= 2
+            capacity = min(capacity, self.max_points)
+            keep_from = 0
+            if series is not None:
+                self.metrics["files_grown"] += 1
+        else:
+            capacity = self.max_points
+            # Keep a quarter of the file free so compactions stay rare
+            keep = max(min(self.max_points * 3 // 4, self.max_points - adding), 0)
+            keep_from = count - min(keep, count)
+            self.metrics["files_compacted"] += 1
+
+        if series is None:
+            timestamps = np.empty(0, dtype=np.int64)
+            columns = {name: np.empty(0) for name in self.column_names}
+        else:
+            timestamps = series.timestamps[keep_from:count]
+            columns = {name: series.columns[name][keep_from:count] for name in self.column_names}
+        series = self._write_file(meter_id, capacity, timestamps, columns)
+        return series, count - keep_from
+
+    # Reading
+
+    def meters(self) -> List[str]:
+        """Meters with a series in the store."""
+        return sorted(unquote(name) for name in os.listdir(self._series_dir) if not name.startswith("."))
+
+    def count(self, meter_id: str) -> int:
+        series = self._open(meter_id)
+        return series.count if series is not None else 0
+
+    def window(self, meter_id: str, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None,
+               columns: Optional[Sequence[str]] = None) -> SeriesWindow:
+        """Zero-copy views of a meter's readings with ``start <= timestamp < end``."""
+        names = tuple(columns) if columns is not None else self.column_names
+        series = self._open(meter_id)
+        if series is None:
+            return SeriesWindow(np.empty(0, dtype=np.int64), {name: np.empty(0) for name in names})
+        count = series.count
+        stored = series.timestamps[:count]
+        low = int(np.searchsorted(stored, epoch_micros(start), "left")) if start is not None else 0
+        high = int(np.searchsorted(stored, epoch_micros(end), "left")) if end is not None else count
+        high = max(high, low)
+        return SeriesWindow(
+            _readonly(stored[low:high]),
+            {name: _readonly(series.columns[name][low:high]) for name in names}
+        )
+
+    def latest(self, meter_id: str, points: int, columns: Optional[Sequence[str]] = None) -> SeriesWindow:
+        """Zero-copy views of a meter's newest ``points`` readings."""
+        names = tuple(columns) if columns is not None else self.column_names
+        series = self._open(meter_id)
+        if series is None:
+            return SeriesWindow(np.empty(0, dtype=np.int64), {name: np.empty(0) for name in names})
+        count = series.count
+        low = max(count - points, 0)
+        return SeriesWindow(
+            _readonly(series.timestamps[low:count]),
+            {name: _readonly(series.columns[name][low:count]) for name in names}
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {**self.metrics, "meters": len(self.meters()), "columns": list(self.column_names),
+                "open_mappings": len(self._series), "readonly": self.readonly}
+
+
+def open_meter_store(path: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+                     readonly: bool = False, **options) -> Optional[MeterSeriesStore]:
+    """
+    The store at ``path`` (default ``METER_STORE_PATH``), or None when no path is
+    set or numpy is missing, in which case callers keep their in-process caches.
+    """
+    if path is None:
+        from redaptive.config import settings
+        path = settings.storage.meter_store_path
+    if not path:
+        return None
+    if not NUMPY_AVAILABLE:
+        logger.warning("numpy not available - meter series store disabled")
+        return None
+    return MeterSeriesStore(path, columns=columns, readonly=readonly, **options)
@@ -103,4 +103,459 @@ class TestAgentBase:
         
         agent = EnergyFinanceAgent()
         assert agent.name == "energy-finance-agent"
-        assert len(agent.tools) > 0
\ No newline at end of file
+        assert len(agent.tools) > 0
+
+class TestEnergyFinanceContractSearch:
+    """Test grid search mode of the EaaS contract optimizer."""
+    
+    @pytest.fixture
+    def agent(self):
+        pytest.importorskip("numpy")
+        from redaptive.agents.energy import EnergyFinanceAgent
+        return EnergyFinanceAgent()
+    
+    @pytest.mark.asyncio
+    async def test_grid_search_matches_scalar_helpers(self, agent):
+        """Test grid results agree with the scalar NPV/IRR/payback helpers."""
+        result = await agent.optimize_eaas_contract(
+            {"contract_term": 10, "guaranteed_savings": 400000, "base_year_consumption": 1e6},
+            {"capital_cost": 1000000, "operating_costs": 30000, "maintenance_costs": 20000},
+            constraints={"min_irr": 0.12, "max_payback": 8},
+            search_mode="grid",
+            top_k=5
+        )
+        
+        assert result["status"] == "success"
+        assert len(result["top_contracts"]) == 5
+        scores = [c["optimization_score"] for c in result["top_contracts"]]
+        assert scores == sorted(scores, reverse=True)
+        
+        best = result["optimized_contract"]
+        escalation = agent.market_rates["electricity_escalation"]
+        cash_flows = [-1000000] + [
+            400000 * best["sharing_percentage"] * best["savings_guarantee"] * (1 + escalation) ** (year - 1) - 50000
+            for year in range(1, best["contract_term"] + 1)
+        ]
+        assert best["npv"] == pytest.approx(agent._calculate_npv(cash_flows, 0.08), abs=0.01)
+        assert best["irr"] == pytest.approx(agent._calculate_irr(cash_flows), abs=1e-4)
+        assert best["payback_period"] == pytest.approx(agent._calculate_payback_period(cash_flows), abs=0.01)
+    
+    @pytest.mark.asyncio
+    async def test_grid_search_prunes_and_builds_frontier(self, agent):
+        """Test constraint pruning and the NPV/risk efficient frontier."""
+        result = await agent.optimize_eaas_contract(
+            {"contract_term": 10, "guaranteed_savings": 400000, "base_year_consumption": 1e6},
+            {"capital_cost": 1000000},
+            constraints={"min_irr": 0.15, "max_payback": 6, "min_savings_guarantee": 0.85},
+            search_mode="grid",
+            search_space={"contract_terms": [8, 10, 12], "performance_thresholds": [0.8, 0.9]}
+        )
+        
+        summary = result["search_summary"]
+        assert summary["structures_evaluated"] == 3 * 41 * 26 * 2
+        assert summary["pruned"]["savings_guarantee"] > 0
+        assert all(c["savings_guarantee"] >= 0.85 for c in result["top_contracts"])
+        assert all(c["payback_period"] <= 6 for c in result["top_contracts"])
+        
+        frontier = result["efficient_frontier"]
+        assert frontier
+        risks = [point["risk_score"] for point in frontier]
+        npvs = [point["npv"] for point in frontier]
+        assert risks == sorted(risks)
+        assert npvs == sorted(npvs)
+    
+    @pytest.mark.asyncio
+    async def test_grid_search_no_feasible_solution(self, agent):
+        """Test infeasible constraints are reported without raising."""
+        result = await agent.optimize_eaas_contract(
+            {"contract_term": 10, "guaranteed_savings": 10000, "base_year_consumption": 1e6},
+            {"capital_cost": 1000000},
+            search_mode="grid"
+        )
+        
+        assert result["status"] == "no_feasible_solution"
+        assert result["search_summary"]["feasible_structures"] == 0
+
+
+class TestEnergyFinanceMemoization:
+    """Test memoization of deterministic finance computations."""
+    
+    PROJECT = {"project_name": "HQ Lighting", "technology_type": "LED", "total_investment": 250000, "project_lifetime": 15}
+    SAVINGS = {"annual_kwh_savings": 400000, "baseline_energy_cost": 120000}
+    
+    @pytest.fixture
+    def agent(self):
+        from redaptive.agents.energy import EnergyFinanceAgent
+        return EnergyFinanceAgent(memo_cache_size=2)
+    
+    @pytest.mark.asyncio
+    async def test_equivalent_inputs_hit_cache(self, agent):
+        """Test reordered keys and int/float variants share a cache entry."""
+        first = await agent.calculate_project_roi(self.PROJECT, self.SAVINGS)
+        second = await agent.calculate_project_roi(
+            {"project_lifetime": 15, "total_investment": 250000.0, "technology_type": "LED", "project_name": "HQ Lighting"},
+            {"baseline_energy_cost": 120000.0, "annual_kwh_savings": 400000},
+            financial_parameters={}
+        )
+        
+        assert first["status"] == "success"
+        assert "cached" not in first
+        assert second["cached"] is True
+        assert second["financial_metrics"] == first["financial_metrics"]
+        assert agent.get_cache_metrics()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_market_rate_change_invalidates(self, agent):
+        """Test updating market rates drops stale results."""
+        first = await agent.calculate_project_roi(self.PROJECT, self.SAVINGS)
+        agent.update_market_rates(discount_rate=0.12)
+        second = await agent.calculate_project_roi(self.PROJECT, self.SAVINGS)
+        
+        assert "cached" not in second
+        assert second["financial_metrics"]["npv"] < first["financial_metrics"]["npv"]
+        
+        # In-place edits are detected through the market fingerprint
+        agent.market_rates["discount_rate"] = 0.05
+        third = await agent.calculate_project_roi(self.PROJECT, self.SAVINGS)
+        assert "cached" not in third
+        assert agent.get_cache_metrics()["invalidations"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_isolation(self, agent):
+        """Test the cache is bounded and cached results cannot be mutated."""
+        for investment in (100000, 200000, 300000):
+            result = await agent.calculate_project_roi({**self.PROJECT, "total_investment": investment}, self.SAVINGS)
+            result["financial_metrics"]["npv"] = None
+        
+        metrics = agent.get_cache_metrics()
+        assert metrics["size"] == 2
+        assert metrics["evictions"] == 1
+        
+        cached = await agent.calculate_project_roi({**self.PROJECT, "total_investment": 300000}, self.SAVINGS)
+        assert cached["cached"] is True
+        assert cached["financial_metrics"]["npv"] is not None
+
+
+class TestDemandForecasting:
+    """Test the batched demand forecaster behind forecast_energy_demand."""
+    
+    @staticmethod
+    def monthly_rows(buildings=3, months=36, start=(2022, 1)):
+        import math
+        from datetime import date
+        rows = []
+        for building in range(buildings):
+            for offset in range(months):
+                ordinal = start[0] * 12 + start[1] - 1 + offset
+                season = math.cos(2 * math.pi * (ordinal % 12) / 12)
+                hdd, cdd = max(0.0, 600 * season), max(0.0, -400 * season)
+                occupancy = 70 + 20 * ((offset * 7 + building) % 5) / 4
+                rows.append({
+                    "building_id": f"BLDG-{building}",
+                    "month": date(ordinal // 12, ordinal % 12 + 1, 1),
+                    "consumption": 50000 * (building + 1) + 100 * offset + 30 * hdd + 45 * cdd + 200 * occupancy,
+                    "hdd": hdd,
+                    "cdd": cdd,
+                    "occupancy": occupancy
+                })
+        return rows
+    
+    def test_batched_fit_recovers_drivers(self):
+        """Test one batched fit recovers each building's weather and occupancy response."""
+        np = pytest.importorskip("numpy")
+        from redaptive.agents.energy.forecasting import DemandForecaster
+        
+        forecaster = DemandForecaster()
+        assert forecaster.update(self.monthly_rows()) == 108
+        assert forecaster.fit() == 3
+        
+        hdd = forecaster.feature_names.index("heating_degree_days")
+        occupancy = forecaster.feature_names.index("occupancy")
+        assert np.allclose(forecaster.coefficients[:, hdd], 3000, rtol=0.05)
+        assert np.allclose(forecaster.coefficients[:, occupancy], 20000, rtol=0.05)
+        
+        forecast = forecaster.forecast(6)
+        assert forecast["predictions"].shape == (3, 6)
+        assert forecast["months"][0].isoformat() == "2025-01-01"
+        assert forecast["predictions"][2].mean() > forecast["predictions"][0].mean()
+    
+    def test_incremental_refit_matches_full_fit(self):
+        """Test folding in new months equals fitting the full history at once."""
+        np = pytest.importorskip("numpy")
+        from redaptive.agents.energy.forecasting import DemandForecaster
+        
+        rows = self.monthly_rows()
+        full = DemandForecaster()
+        full.update(rows)
+        full.fit()
+        
+        incremental = DemandForecaster()
+        incremental.update(rows[:24] + rows[36:60] + rows[72:96])
+        incremental.fit()
+        # Overlapping reloads only ingest months past each building's watermark
+        assert incremental.update(rows) == 36
+        assert incremental.fit() == 3
+        assert np.allclose(incremental.coefficients, full.coefficients)
+        assert np.allclose(incremental.residual_std, full.residual_std, atol=1e-3)
+    
+    @pytest.mark.asyncio
+    async def test_agent_caches_model_and_loads_incrementally(self):
+        """Test the agent reuses its fitted model and queries from the watermark."""
+        pytest.importorskip("numpy")
+        from redaptive.agents.energy import PortfolioIntelligenceAgent
+        
+        agent = PortfolioIntelligenceAgent()
+        agent.connection = MagicMock()
+        cursor = agent.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = self.monthly_rows()
+        
+        result = await agent.forecast_energy_demand("PORTFOLIO-1", forecast_horizon=12)
+        assert result["model"]["type"] == "ridge_regression"
+        assert result["model"]["buildings_modeled"] == 3
+        assert len(result["monthly_forecasts"]) == 12
+        assert len(result["building_forecasts"]) == 3
+        first = result["monthly_forecasts"][0]
+        assert first["confidence_interval"]["lower"] < first["forecasted_consumption"] < first["confidence_interval"]["upper"]
+        
+        cursor.fetchall.return_value = []
+        second = await agent.forecast_energy_demand("PORTFOLIO-1", forecast_horizon=12)
+        assert second["model"]["buildings_refitted"] == 0
+        assert second["monthly_forecasts"] == result["monthly_forecasts"]
+        assert str(cursor.execute.call_args[0][1][1]) == "2024-12-01"
+    
+    def test_archived_months_replace_usage_rows(self):
+        """Test complete archived months come from the history archive and are excluded from SQL."""
+        from datetime import date
+        from redaptive.agents.energy import PortfolioIntelligenceAgent
+        
+        rows = self.monthly_rows(buildings=1, months=24)
+        archive = Mock()
+        archive.complete_months.return_value = (date(2021, 6, 1), date(2023, 1, 1))
+        archive.monthly_rollups.return_value = [dict(row) for row in rows[:12]]
+        agent = PortfolioIntelligenceAgent(history_archive=archive)
+        agent.connection = MagicMock()
+        agent._weather_table_available = False
+        cursor = agent.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [[{"building_id": "BLDG-0"}], rows[12:]]
+        
+        loaded = agent._load_monthly_rollups("PORTFOLIO-1", date(2022, 1, 1))
+        assert [row["month"] for row in loaded] == [row["month"] for row in rows]
+        archive.monthly_rollups.assert_called_once_with(["BLDG-0"], date(2022, 1, 1), date(2023, 1, 1))
+        assert cursor.execute.call_args[0][1] == ["PORTFOLIO-1", date(2022, 1, 1), date(2022, 1, 1), date(2023, 1, 1)]
+
+
+class TestBenchmarkIndex:
+    """Test the precomputed benchmark percentile index."""
+    
+    REFERENCE = [
+        {"building_type": "office", "region": "West", "benchmark_type": "energy_star", "energy_use_intensity": 90.0,
+         "cost_per_sqft": 3.0, "percentile_25": 75.0, "percentile_50": 90.0, "percentile_75": 105.0, "sample_size": 3200},
+        {"building_type": "office", "region": "National", "benchmark_type": "energy_star", "energy_use_intensity": 100.0,
+         "cost_per_sqft": 3.5, "percentile_25": 80.0, "percentile_50": 100.0, "percentile_75": 120.0, "sample_size": 15000}
+    ]
+    
+    @staticmethod
+    def building_rows():
+        rows = []
+        for position in range(10):
+            rows.append({
+                "building_id": f"BLDG-{position}",
+                "portfolio_id": "PORTFOLIO-A" if position < 5 else "PORTFOLIO-B",
+                "building_type": "office",
+                "location": "Seattle, WA" if position % 2 == 0 else "Boston, MA",
+                "floor_area": 100000,
+                "annual_kwh": 6000000 + 1000000 * position,
+                "annual_cost": 300000
+            })
+        return rows
+    
+    def test_reference_ranking_with_region_fallback(self):
+        """Test buildings rank against their region, falling back to national benchmarks."""
+        pytest.importorskip("numpy")
+        from redaptive.agents.energy.benchmarking import BenchmarkIndex
+        
+        index = BenchmarkIndex()
+        summary = index.refresh(self.building_rows(), self.REFERENCE)
+        assert summary["buildings_indexed"] == 10
+        assert summary["reference_groups"] == {"energy_star": 2}
+        
+        # BLDG-2: Seattle, EUI 80 against West (p25=75, p50=90); BLDG-3: Boston, EUI 90 against National p25=80/p50=100
+        seattle, boston = index.rank(["BLDG-2", "BLDG-3"], source="energy_star")
+        assert seattle["peer_group"] == {"building_type": "office", "region": "West", "size_bucket": "all"}
+        assert seattle["energy_efficiency_percentile"] == pytest.approx(100 - (25 + 25 * 5 / 15), abs=0.1)
+        assert boston["peer_group"]["region"] == "all"
+        assert boston["energy_efficiency_percentile"] == pytest.approx(62.5, abs=0.1)
+        assert boston["benchmark_median"]["cost_per_sqft"] == pytest.approx(3.5)
+    
+    def test_reference_types_climate_zones_and_floor_area_stay_separate(self):
+        """Test each benchmark_type ranks alone, by climate zone and floor-area bucket."""
+        pytest.importorskip("numpy")
+        from redaptive.agents.energy.benchmarking import BenchmarkIndex
+        
+        rows = self.building_rows()
+        rows[2]["climate_zone"] = "4c"
+        reference = [
+            {"building_type": "office", "climate_zone": "4C", "region": "Pacific", "benchmark_type": "cbecs",
+             "energy_use_intensity": 60.0, "percentile_50": 60.0, "floor_area_min": 100000, "floor_area_max": 500000},
+            {"building_type": "office", "climate_zone": "4C", "region": "Pacific", "benchmark_type": "cbecs",
+             "energy_use_intensity": 200.0, "percentile_50": 200.0, "floor_area_min": 0, "floor_area_max": 25000},
+            {"building_type": "office", "region": "National", "benchmark_type": "boma",
+             "energy_use_intensity": 150.0, "percentile_50": 150.0, "floor_area_min": 0, "floor_area_max": 1000000},
+        ] + self.REFERENCE
+        index = BenchmarkIndex()
+        summary = index.refresh(rows, reference)
+        assert summary["reference_groups"] == {"cbecs": 2, "boma": 1, "energy_star": 2}
+        assert index.reference_source("industry") == "cbecs"
+        assert index.reference_source("custom") == "peer"
+        
+        # The 100k sqft building in zone 4C ranks against the large-office cbecs row only
+        zoned, unzoned = index.rank(["BLDG-2", "BLDG-4"], source="cbecs")
+        assert zoned["peer_group"] == {"building_type": "office", "region": "4C", "size_bucket": "large"}
+        assert zoned["benchmark_median"]["energy_use_intensity"] == pytest.approx(60.0)
+        assert zoned["benchmark_source"] == "cbecs"
+        # No cbecs row covers Seattle without a zone, so it falls back to peers rather than another type
+        assert unzoned["benchmark_source"] == "peer"
+        assert index.rank(["BLDG-4"], source="boma")[0]["benchmark_median"]["energy_use_intensity"] == pytest.approx(150.0)
+    
+    def test_peer_ranking_is_vectorized_against_peer_tables(self):
+        """Test peer percentiles come from the platform's own distribution."""
+        pytest.importorskip("numpy")
+        from redaptive.agents.energy.benchmarking import BenchmarkIndex
+        
+        index = BenchmarkIndex(min_sample_size=6)
+        index.refresh(self.building_rows())
+        rankings = index.rank([f"BLDG-{position}" for position in range(10)], source="peer")
+        
+        # Regional groups are too small, so everything ranks within all offices
+        assert all(r["peer_group"]["region"] == "all" for r in rankings)
+        percentiles = [r["energy_efficiency_percentile"] for r in rankings]
+        assert percentiles[0] == 100.0 and percentiles[-1] == 0.0
+        assert percentiles == sorted(percentiles, reverse=True)
+        assert index.is_stale() is False
+    
+    @pytest.mark.asyncio
+    async def test_agent_benchmarks_portfolio_from_index(self):
+        """Test the agent refreshes the index once and ranks only its portfolio."""
+        pytest.importorskip("numpy")
+        from redaptive.agents.energy import PortfolioIntelligenceAgent
+        
+        agent = PortfolioIntelligenceAgent()
+        agent.connection = MagicMock()
+        cursor = agent.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [self.building_rows(), self.REFERENCE]
+        
+        result = await agent.benchmark_portfolio_performance("PORTFOLIO-A", benchmark_type="energy_star")
+        assert result["index"]["benchmark_source"] == "energy_star"
+        assert {r["benchmark_source"] for r in result["building_rankings"]} == {"energy_star"}
+        assert [r["building_id"] for r in result["building_rankings"]] == [f"BLDG-{p}" for p in range(5)]
+        assert result["portfolio_performance"]["energy_use_intensity"] == pytest.approx(80.0)
+        assert 0 < result["percentile_ranking"]["energy_efficiency"] < 100
+        
+        await agent.benchmark_portfolio_performance("PORTFOLIO-B", benchmark_type="custom")
+        assert cursor.execute.call_count == 2
+
+
+class TestFacilitySearch:
+    """Test the in-process facility search index and its fallbacks."""
+    
+    @staticmethod
+    def facility_rows():
+        from datetime import datetime
+        return [
+            {"facility_id": "BLDG-1", "facility_name": "Dallas HQ", "facility_type": "office", "capacity_sqft": 200000,
+             "location": "Dallas, TX", "energy_star_score": 80, "company_name": "Acme Corp",
+             "last_updated": datetime(2024, 1, 1)},
+            {"facility_id": "BLDG-2", "facility_name": "Dallas DC", "facility_type": "warehouse", "capacity_sqft": 500000,
+             "location": "Dallas, TX", "energy_star_score": 60, "company_name": "Globex",
+             "last_updated": datetime(2024, 1, 2)},
+            {"facility_id": "BLDG-3", "facility_name": "Palo Alto Lab", "facility_type": "office", "capacity_sqft": 90000,
+             "location": "Palo Alto, CA", "energy_star_score": 90, "company_name": "Dallasite Holdings",
+             "last_updated": datetime(2024, 1, 3)}
+        ]
+    
+    def test_ranked_prefix_substring_and_fuzzy_matches(self):
+        """Test ranking, filters and typo tolerance."""
+        from redaptive.agents.energy.facility_search import FacilityIndex
+        
+        index = FacilityIndex()
+        assert index.load(self.facility_rows(), full=True) == 3
+        
+        results = index.search("dal")
+        assert [f["facility_id"] for f in results] == ["BLDG-3", "BLDG-1", "BLDG-2"]
+        assert all(f["relevance_score"] == 1.0 for f in results)
+        
+        assert [f["facility_id"] for f in index.search("dallas", facility_type="office", max_capacity=150000)] == ["BLDG-3"]
+        infix = index.search("allas")
+        assert len(infix) == 3 and all(f["relevance_score"] == 0.9 for f in infix)
+        
+        fuzzy = index.search("globx")
+        assert [f["facility_id"] for f in fuzzy] == ["BLDG-2"]
+        assert fuzzy[0]["relevance_score"] < 0.9
+        assert index.search("houston") == []
+    
+    def test_short_queries_match_mid_word(self):
+        """Test needles shorter than a trigram fall back to a substring scan."""
+        from redaptive.agents.energy.facility_search import FacilityIndex
+        
+        portland = {"facility_id": "BLDG-4", "facility_name": "Portland Office", "facility_type": "office",
+                    "capacity_sqft": 50000, "location": "Portland, Maine", "energy_star_score": 70,
+                    "company_name": "Initech"}
+        index = FacilityIndex()
+        index.load(self.facility_rows() + [portland], full=True)
+        
+        # "or" sits inside "Portland" and "Acme Corp", never at a word start
+        mid_word = index.search("or")
+        assert [f["facility_id"] for f in mid_word] == ["BLDG-1", "BLDG-4"]
+        assert all(f["relevance_score"] == 0.9 for f in mid_word)
+        assert [f["facility_id"] for f in index.search("gl")] == ["BLDG-2"]
+        assert index.search("gl")[0]["relevance_score"] == 1.0
+        assert len(index.search("a")) == 4
+        assert len(index.search("a", limit=2)) == 2
+    
+    def test_incremental_refresh_replaces_postings(self):
+        """Test upserts move facilities between terms and advance the watermark."""
+        from datetime import datetime
+        from redaptive.agents.energy.facility_search import FacilityIndex
+        
+        index = FacilityIndex()
+        index.load(self.facility_rows(), full=True)
+        assert index.watermark == datetime(2024, 1, 3)
+        
+        moved = {**self.facility_rows()[1], "location": "Houston, TX", "last_updated": datetime(2024, 2, 1)}
+        assert index.load([moved]) == 1
+        assert len(index) == 3
+        assert index.watermark == datetime(2024, 2, 1)
+        assert [f["facility_id"] for f in index.search("houston")] == ["BLDG-2"]
+        assert "BLDG-2" not in [f["facility_id"] for f in index.search("dallas")]
+    
+    @pytest.mark.asyncio
+    async def test_agent_uses_index_and_falls_back_to_database(self):
+        """Test the agent serves from the index and degrades to SQL when it cannot load."""
+        from redaptive.agents.energy import PortfolioIntelligenceAgent
+        
+        agent = PortfolioIntelligenceAgent()
+        agent.connection = MagicMock()
+        cursor = agent.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = self.facility_rows()
+        
+        result = await agent.search_facilities("dallas", limit=2)
+        assert result["search_backend"] == "memory_index"
+        assert result["facilities_found"] == 2
+        
+        # Within the refresh interval the index answers without touching the database
+        cursor.execute.reset_mock()
+        await agent.search_facilities("palo")
+        cursor.execute.assert_not_called()
+        
+        fallback = PortfolioIntelligenceAgent()
+        fallback.connection = MagicMock()
+        cursor = fallback.connection.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = [Exception("permission denied"), None, None]
+        cursor.fetchone.return_value = None
+        cursor.fetchall.return_value = [{"facility_id": "BLDG-1", "relevance_score": None}]
+        
+        result = await fallback.search_facilities("dallas")
+        assert result["search_backend"] == "like"
+        assert "LIKE LOWER(%s)" in cursor.execute.call_args[0][0]
+        assert "LIMIT" not in cursor.execute.call_args[0][0]
+        fallback.connection.rollback.assert_called_once()
@@ -4,13 +4,14 @@ Test streaming infrastructure.
 
 import pytest
 import asyncio
+import time
 from unittest.mock import Mock, patch, AsyncMock
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from redaptive.streaming import StreamManager, EnergyStreamManager, StreamBackend
 from redaptive.streaming.data_models import (
     MeterReading, MeterType, StreamMessage, MessageType, 
-    StreamConfig, ProcessingStatus
+    StreamConfig, ProcessingStatus, MeterReadingBatch
 )
 
 
@@ -392,4 +393,1981 @@ class TestStreamProcessing:
         assert "stream_manager" in health
         assert "processor" in health
         assert health["stream_manager"]["status"] == "healthy"
-        assert health["processor"]["status"] == "healthy"
\ No newline at end of file
+        assert health["processor"]["status"] == "healthy"
+
+class TestBatchPublishing:
+    """Test pipelined and lingered batch publishing."""
+    
+    @staticmethod
+    def make_messages(count):
+        return [
+            StreamMessage(
+                message_id=f"msg_{i}",
+                message_type=MessageType.METER_READING,
+                source="test",
+                timestamp=datetime(2024, 1, 1, 12, 0, 0),
+                payload={"meter_id": f"meter_{i % 3}", "value": float(i)}
+            )
+            for i in range(count)
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_redis_publish_batch_uses_pipelines(self):
+        """Test chunked non-transactional pipelines, MAXLEN ~ and per-message ids."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        pipelines = []
+        
+        def make_pipeline(transaction):
+            assert transaction is False
+            pipe = Mock()
+            pipe.execute = AsyncMock(side_effect=lambda raise_on_error: [
+                Exception("OOM") if call.args[1]["data"].find('"msg_3"') >= 0 else f"1-{len(pipelines)}{index}"
+                for index, call in enumerate(pipe.xadd.call_args_list)
+            ])
+            pipelines.append(pipe)
+            return pipe
+        
+        processor.redis_client = Mock()
+        processor.redis_client.pipeline = Mock(side_effect=make_pipeline)
+        
+        message_ids = await processor.publish_batch("readings", self.make_messages(5), batch_size=2, max_length=1000)
+        
+        assert len(pipelines) == 3
+        assert message_ids == ["1-10", "1-11", "1-20", None, "1-30"]
+        assert pipelines[0].xadd.call_args.kwargs == {"maxlen": 1000, "approximate": True}
+        assert processor.get_metrics()["messages_published"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_kafka_publish_batch_enqueues_before_awaiting(self):
+        """Test every send is enqueued before delivery futures are awaited."""
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(3)]
+        processor.producer = Mock()
+        processor.producer.send = AsyncMock(side_effect=futures)
+        
+        task = asyncio.create_task(processor.publish_batch("readings", self.make_messages(3)))
+        await asyncio.sleep(0)
+        assert processor.producer.send.await_count == 3
+        
+        futures[0].set_result(Mock(partition=0, offset=7))
+        futures[1].set_exception(Exception("timeout"))
+        futures[2].set_result(Mock(partition=2, offset=9))
+        assert await task == ["0-7", None, "2-9"]
+        assert processor.producer.send.call_args.kwargs["key"] == "meter_2"
+    
+    @pytest.mark.asyncio
+    async def test_batch_publisher_flushes_on_size_and_linger(self):
+        """Test concurrent publishes share a batch and stragglers flush after linger."""
+        from redaptive.streaming.batching import BatchPublisher
+        
+        batches = []
+        
+        async def publish_batch(messages):
+            batches.append(len(messages))
+            return [f"id_{message.message_id}" for message in messages]
+        
+        publisher = BatchPublisher(publish_batch, batch_size=4, linger_ms=20)
+        messages = self.make_messages(6)
+        
+        results = await asyncio.gather(*(publisher.publish(message) for message in messages))
+        assert results == [f"id_msg_{i}" for i in range(6)]
+        assert batches == [4, 2]
+        
+        future = publisher.submit(messages[0])
+        await publisher.close()
+        assert future.result() == "id_msg_0"
+        assert batches == [4, 2, 1]
+    
+    @patch('redaptive.streaming.stream_manager.REDIS_AVAILABLE', True)
+    @patch('redaptive.streaming.stream_manager.RedisStreamProcessor')
+    @pytest.mark.asyncio
+    async def test_energy_manager_coalesces_meter_readings(self, mock_redis_processor):
+        """Test batch_publishing routes single readings through one publish_batch call."""
+        mock_processor = Mock()
+        mock_processor.connect = AsyncMock(return_value=True)
+        mock_processor.disconnect = AsyncMock()
+        mock_processor.register_processor = Mock()
+        mock_processor.get_metrics = Mock(return_value={})
+        mock_processor.publish_batch = AsyncMock(side_effect=lambda stream, messages, **kwargs: [
+            f"1-{i}" for i in range(len(messages))
+        ])
+        mock_redis_processor.return_value = mock_processor
+        
+        manager = EnergyStreamManager(StreamBackend.REDIS, batch_publishing=True)
+        await manager.start()
+        
+        readings = [
+            MeterReading(
+                meter_id=f"meter_{i}",
+                building_id="building_001",
+                meter_type=MeterType.ELECTRICITY,
+                timestamp=datetime.now(),
+                value=float(i),
+                unit="kWh"
+            )
+            for i in range(10)
+        ]
+        results = await asyncio.gather(*(manager.publish_meter_reading(reading) for reading in readings))
+        
+        assert all(results)
+        mock_processor.publish_batch.assert_awaited_once()
+        stream_name, messages = mock_processor.publish_batch.call_args.args
+        assert stream_name == "energy_meter_readings"
+        assert [m.payload["meter_id"] for m in messages] == [f"meter_{i}" for i in range(10)]
+        await manager.stop()
+
+
+class TestKafkaHighThroughput:
+    """Test the fire-and-forget Kafka producer mode."""
+    
+    @patch('redaptive.streaming.kafka_client.has_zstd', Mock(return_value=False))
+    @patch('redaptive.streaming.kafka_client.has_lz4', Mock(return_value=True))
+    @patch('redaptive.streaming.kafka_client.AIOKafkaProducer')
+    @pytest.mark.asyncio
+    async def test_high_throughput_producer_settings(self, mock_producer):
+        """Test lingered large batches and compression falling back to an installed codec."""
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        mock_producer.return_value.start = AsyncMock()
+        processor = KafkaStreamProcessor(high_throughput=True, linger_ms=100)
+        
+        assert await processor.connect() is True
+        kwargs = mock_producer.call_args.kwargs
+        assert kwargs["linger_ms"] == 100
+        assert kwargs["max_batch_size"] == 262144
+        assert kwargs["compression_type"] == "lz4"
+        assert kwargs["value_serializer"](b"raw") == b"raw"
+        assert kwargs["value_serializer"]({"a": 1}) == b'{"a":1}'
+    
+    @pytest.mark.asyncio
+    async def test_fire_and_forget_with_flush_and_failure_callbacks(self):
+        """Test publishes return on enqueue, failures reach callbacks and flush waits for deliveries."""
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor(high_throughput=True)
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(4)]
+        processor.producer = Mock()
+        processor.producer.send = AsyncMock(side_effect=futures)
+        processor.producer.flush = AsyncMock(side_effect=lambda: [
+            future.set_result(Mock(partition=0, offset=i)) if i != 2 else future.set_exception(Exception("timeout"))
+            for i, future in enumerate(futures)
+        ])
+        failures = []
+        processor.on_delivery_failure(lambda topic, message, error: failures.append((topic, message.message_id)))
+        
+        messages = TestBatchPublishing.make_messages(4)
+        assert await processor.publish_message("readings", messages[0]) is True
+        assert await processor.enqueue_batch("readings", messages[1:]) == ["msg_1", "msg_2", "msg_3"]
+        assert processor.get_metrics()["deliveries_in_flight"] == 4
+        
+        assert await processor.flush() == {"delivered": 3, "failed": 1}
+        assert failures == [("readings", "msg_2")]
+        metrics = processor.get_metrics()
+        assert metrics["messages_produced"] == 3
+        assert metrics["delivery_failures"] == 1
+        assert metrics["deliveries_in_flight"] == 0
+    
+    @patch('redaptive.streaming.stream_manager.KafkaStreamProcessor')
+    @pytest.mark.asyncio
+    async def test_energy_manager_backfill_without_waiting(self, mock_kafka_processor):
+        """Test backfills only enqueue on Kafka and flush is the barrier."""
+        mock_processor = Mock()
+        mock_processor.publish_meter_readings = AsyncMock(return_value=["a", "b"])
+        mock_processor.flush = AsyncMock(return_value={"delivered": 2, "failed": 0})
+        mock_kafka_processor.return_value = mock_processor
+        
+        manager = EnergyStreamManager(StreamBackend.KAFKA, high_throughput=True)
+        mock_kafka_processor.assert_called_once_with(high_throughput=True)
+        
+        readings = [
+            MeterReading(
+                meter_id=f"meter_{i}",
+                building_id="building_001",
+                meter_type=MeterType.ELECTRICITY,
+                timestamp=datetime.now(),
+                value=float(i),
+                unit="kWh"
+            )
+            for i in range(2)
+        ]
+        assert await manager.publish_meter_readings(readings, wait_for_delivery=False) == ["a", "b"]
+        assert mock_processor.publish_meter_readings.call_args.kwargs == {"wait_for_delivery": False}
+        assert await manager.flush() == {"delivered": 2, "failed": 0}
+
+
+class TestConcurrentConsumers:
+    """Test bounded concurrent batch processing in consumers."""
+    
+    @pytest.mark.asyncio
+    async def test_process_keyed_bounds_concurrency_and_keeps_key_order(self):
+        """Test the semaphore bound and per-key ordering."""
+        from redaptive.streaming.concurrency import process_keyed
+        
+        in_flight = 0
+        peak = 0
+        seen = []
+        
+        async def handler(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01 if item[1] == 0 else 0)
+            seen.append(item)
+            in_flight -= 1
+            return item[1] * 10
+        
+        items = [(f"meter_{i % 5}", i // 5) for i in range(20)]
+        results = await process_keyed(items, lambda item: item[0], handler, max_concurrency=3)
+        
+        assert results == [item[1] * 10 for item in items]
+        assert peak == 3
+        for meter in range(5):
+            assert [seq for key, seq in seen if key == f"meter_{meter}"] == [0, 1, 2, 3]
+    
+    @pytest.mark.asyncio
+    async def test_redis_batch_acknowledged_with_single_xack(self):
+        """Test a whole batch, including failures handed to retry, is acknowledged with one XACK."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        pipe = Mock()
+        pipe.execute = AsyncMock()
+        processor.redis_client = Mock()
+        processor.redis_client.pipeline = Mock(return_value=pipe)
+        
+        async def process(message):
+            if message.payload["value"] == 2.0:
+                raise ValueError("bad reading")
+            return True
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        entries = [
+            (f"1-{i}", processor._message_fields(message))
+            for i, message in enumerate(TestBatchPublishing.make_messages(4))
+        ]
+        
+        acked = await processor._process_batch("readings", entries, "group", "consumer_1", max_concurrency=4)
+        
+        assert acked == ["1-0", "1-1", "1-2", "1-3"]
+        pipe.xack.assert_called_once_with("readings", "group", "1-0", "1-1", "1-2", "1-3")
+        pipe.zadd.assert_called_once()
+        pipe.execute.assert_awaited_once()
+        assert processor.metrics["messages_processed"] == 3
+        assert processor.metrics["messages_failed"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_kafka_batch_commits_once(self):
+        """Test a polled batch is processed concurrently and committed once."""
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor()
+        handled = []
+        
+        async def process(message):
+            handled.append(message.message_id)
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        records = [
+            Mock(partition=0, offset=i, key=message.payload["meter_id"],
+                 value=KafkaStreamProcessor._message_data(message))
+            for i, message in enumerate(TestBatchPublishing.make_messages(6))
+        ]
+        consumer = Mock()
+        consumer.commit = AsyncMock()
+        
+        processed = await processor._process_batch(consumer, records, "readings", "consumer_1", max_concurrency=4)
+        
+        assert [result.status for result in processed] == [ProcessingStatus.COMPLETED] * 6
+        assert sorted(handled) == [f"msg_{i}" for i in range(6)]
+        consumer.commit.assert_awaited_once()
+
+    
+    @pytest.mark.asyncio
+    async def test_redis_holds_acks_until_effects_are_flushed(self):
+        """Test entries with unwritten windows stay pending, kept fresh with XCLAIM, until the gate passes them."""
+        from redaptive.streaming.concurrency import FLUSH_EVENT_FIELD, HeldAcks
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        pipe = Mock()
+        pipe.execute = AsyncMock()
+        processor.redis_client = Mock()
+        processor.redis_client.pipeline = Mock(return_value=pipe)
+        processor.redis_client.xack = AsyncMock()
+        processor.redis_client.xclaim = AsyncMock(return_value=["1-2", "1-3"])
+        flushed_before = [None]
+        processor.ack_gate = lambda: flushed_before[0]
+        
+        async def process(message):
+            # Readings 2 and 3 went into windows that are still open
+            return {FLUSH_EVENT_FIELD: int(message.payload["value"])} if message.payload["value"] >= 2 else True
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        entries = [
+            (f"1-{i}", processor._message_fields(message))
+            for i, message in enumerate(TestBatchPublishing.make_messages(4))
+        ]
+        consumer_info = {"stream_name": "readings", "consumer_name": "consumer_1", "consumer_group": "group",
+                         "held": HeldAcks(), "held_refreshed": 0.0}
+        
+        acked = await processor._process_batch("readings", entries, "group", "consumer_1",
+                                               held=consumer_info["held"])
+        assert acked == ["1-0", "1-1"]
+        assert len(consumer_info["held"]) == 2
+        
+        assert await processor._settle_held(consumer_info) == 0
+        processor.redis_client.xclaim.assert_awaited_once_with(
+            "readings", "group", "consumer_1", min_idle_time=0, message_ids=["1-2", "1-3"], justid=True
+        )
+        
+        flushed_before[0] = 3
+        assert await processor._settle_held(consumer_info) == 1
+        processor.redis_client.xack.assert_awaited_once_with("readings", "group", "1-2")
+        assert consumer_info["held"].entries() == ["1-3"]
+    
+    @pytest.mark.asyncio
+    async def test_kafka_commits_stop_at_first_held_record(self):
+        """Test a partition is committed only up to its first record whose effects are not flushed."""
+        from aiokafka import TopicPartition
+        from redaptive.streaming.concurrency import FLUSH_EVENT_FIELD, HeldAcks
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor()
+        processor.ack_gate = lambda: 1
+        
+        async def process(message):
+            return {FLUSH_EVENT_FIELD: int(message.payload["value"])}
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        records = [
+            Mock(topic="readings", partition=i % 2, offset=100 + i, key=message.payload["meter_id"],
+                 value=KafkaStreamProcessor._message_data(message))
+            for i, message in enumerate(TestBatchPublishing.make_messages(4))
+        ]
+        partitions = [TopicPartition("readings", 0), TopicPartition("readings", 1), TopicPartition("readings", 2)]
+        consumer = Mock()
+        consumer.commit = AsyncMock()
+        consumer.assignment = Mock(return_value=set(partitions))
+        consumer.position = AsyncMock(return_value=7)
+        held = HeldAcks()
+        
+        await processor._process_batch(consumer, records, "readings", "consumer_1", held=held)
+        
+        # Offset 100 (event time 0) is flushed; 101-103 are held
+        consumer.commit.assert_awaited_once_with({partitions[0]: 102, partitions[1]: 101, partitions[2]: 7})
+        assert len(held) == 3
+
+class TestRetryAndDeadLetter:
+    """Test retries with backoff, dead-letter isolation and stale entry recovery."""
+    
+    def test_backoff_doubles_and_is_capped(self):
+        """Test exponential backoff from retry_delay_seconds."""
+        from redaptive.streaming.retry import retry_delay_seconds, MAX_RETRY_DELAY_SECONDS
+        
+        config = StreamConfig(stream_name="readings", retry_delay_seconds=10)
+        assert [retry_delay_seconds(config, attempt) for attempt in (1, 2, 3)] == [10.0, 20.0, 40.0]
+        assert retry_delay_seconds(config, 20) == MAX_RETRY_DELAY_SECONDS
+    
+    @pytest.mark.asyncio
+    async def test_redis_failures_scheduled_or_dead_lettered(self):
+        """Test retryable failures go to the retry set and poison messages to the DLQ stream."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        import json
+        
+        processor = RedisStreamProcessor()
+        pipe = Mock()
+        pipe.execute = AsyncMock()
+        processor.redis_client = Mock()
+        processor.redis_client.pipeline = Mock(return_value=pipe)
+        processor.stream_configs["readings"] = StreamConfig(
+            stream_name="readings", max_retries=2, retry_delay_seconds=30, dead_letter_queue="readings_poison"
+        )
+        
+        async def process(message):
+            raise RuntimeError("downstream unavailable")
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        fresh, exhausted = TestBatchPublishing.make_messages(2)
+        exhausted.retry_count = 2
+        entries = [
+            ("1-0", processor._message_fields(fresh)),
+            ("1-1", processor._message_fields(exhausted)),
+            ("1-2", {"data": "not json", "key": "meter_x"})
+        ]
+        
+        before = datetime.now().timestamp()
+        acked = await processor._process_batch("readings", entries, "group", "consumer_1")
+        
+        assert acked == ["1-0", "1-1", "1-2"]
+        retry_key, scored = pipe.zadd.call_args.args
+        assert retry_key == "readings:retry"
+        (member, due), = scored.items()
+        assert before + 29 <= due <= before + 31
+        retried = StreamMessage.from_json(json.loads(member)["data"])
+        assert retried.retry_count == 1
+        assert retried.metadata["last_error"] == "downstream unavailable"
+        
+        dead_letters = [call.args for call in pipe.xadd.call_args_list]
+        assert [(stream, fields["original_id"]) for stream, fields in dead_letters] == [
+            ("readings_poison", "1-1"), ("readings_poison", "1-2")
+        ]
+        assert processor.get_metrics()["messages_dead_lettered"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_redis_promotes_due_retries_and_claims_stale_entries(self):
+        """Test retry promotion through the Lua script and XAUTOCLAIM cursor handling."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        script = AsyncMock(return_value=2)
+        pipe = Mock()
+        pipe.execute = AsyncMock(return_value=[[{"message_id": "1-1", "times_delivered": 2}]])
+        processor.redis_client = Mock()
+        processor.redis_client.register_script = Mock(return_value=script)
+        processor.redis_client.pipeline = Mock(return_value=pipe)
+        processor.redis_client.xautoclaim = AsyncMock(return_value=[
+            "5-0", [("1-1", {"data": "{}"}), ("1-2", None)], ["1-2"]
+        ])
+        
+        assert await processor._promote_due_retries("readings", limit=50) == 2
+        assert script.call_args.kwargs["keys"] == ["readings:retry", "readings"]
+        assert script.call_args.kwargs["args"][1] == 50
+        
+        consumer_info = {"stream_name": "readings", "consumer_group": "group", "consumer_name": "consumer_1"}
+        claimed = await processor._claim_stale_entries(consumer_info, 100)
+        assert claimed == [("1-1", {"data": "{}"})]
+        assert consumer_info["claim_cursor"] == "5-0"
+        assert processor.redis_client.xautoclaim.call_args.kwargs["min_idle_time"] == 30000
+        
+        await processor._claim_stale_entries(consumer_info, 100)
+        assert processor.redis_client.xautoclaim.call_args.kwargs["start_id"] == "5-0"
+        assert processor.get_metrics()["messages_retried"] == 2
+        pipe.xack.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_redis_dead_letters_entries_reclaimed_past_max_retries(self):
+        """Test a claimed entry whose XPENDING delivery count exceeds the retries is isolated."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        pipe = Mock()
+        pipe.execute = AsyncMock(side_effect=[
+            [[{"message_id": "1-1", "times_delivered": 5}], [{"message_id": "1-2", "times_delivered": 4}]],
+            None
+        ])
+        processor.redis_client = Mock()
+        processor.redis_client.pipeline = Mock(return_value=pipe)
+        processor.redis_client.xautoclaim = AsyncMock(return_value=[
+            "0-0", [("1-1", {"data": "poison"}), ("1-2", {"data": "{}"})], []
+        ])
+        processor.stream_configs["readings"] = StreamConfig(stream_name="readings", max_retries=3)
+        
+        consumer_info = {"stream_name": "readings", "consumer_group": "group", "consumer_name": "consumer_1"}
+        claimed = await processor._claim_stale_entries(consumer_info, 100)
+        assert claimed == [("1-2", {"data": "{}"})]
+        stream, fields = pipe.xadd.call_args.args
+        assert (stream, fields["original_id"], fields["data"]) == ("readings_dlq", "1-1", "poison")
+        assert "5 times" in fields["error"]
+        pipe.xack.assert_called_once_with("readings", "group", "1-1")
+        assert processor.get_metrics()["messages_dead_lettered"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_kafka_failures_republished_before_commit(self):
+        """Test Kafka failures go to the retry or DLQ topic and early retries pause their partition."""
+        from datetime import timedelta
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor()
+        loop = asyncio.get_running_loop()
+        sent = []
+        
+        async def send(topic, value=None, key=None):
+            sent.append((topic, value))
+            future = loop.create_future()
+            future.set_result(Mock(partition=0, offset=len(sent)))
+            return future
+        
+        processor.producer = Mock()
+        processor.producer.send = send
+        
+        async def process(message):
+            raise RuntimeError("boom")
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        fresh, exhausted, early = TestBatchPublishing.make_messages(3)
+        exhausted.retry_count = 3
+        early.retry_count = 1
+        early.metadata["retry_after"] = (datetime.now() + timedelta(minutes=5)).isoformat()
+        records = [
+            Mock(topic="readings", partition=0, offset=10, key="meter_0",
+                 value=KafkaStreamProcessor._message_data(fresh)),
+            Mock(topic="readings", partition=0, offset=11, key="meter_1",
+                 value=KafkaStreamProcessor._message_data(exhausted)),
+            Mock(topic="readings_retry", partition=1, offset=4, key="meter_2",
+                 value=KafkaStreamProcessor._message_data(early))
+        ]
+        consumer = Mock()
+        consumer.commit = AsyncMock()
+        
+        results = await processor._process_batch(consumer, records, "readings", "consumer_1")
+        
+        assert [result.status for result in results] == [ProcessingStatus.RETRYING, ProcessingStatus.FAILED]
+        assert [topic for topic, _ in sent] == ["readings_retry", "readings_dlq"]
+        assert sent[0][1]["retry_count"] == 1
+        assert sent[1][1]["original_id"] == "0-11"
+        consumer.pause.assert_called_once()
+        paused, = consumer.pause.call_args.args
+        assert (paused.topic, paused.partition) == ("readings_retry", 1)
+        consumer.seek.assert_called_once_with(paused, 4)
+        consumer.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_kafka_consumer_survives_failed_dead_letter_and_commit(self):
+        """Test the consumer keeps polling after a failed DLQ send and a failed commit."""
+        from aiokafka.errors import CommitFailedError
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor()
+        processor.producer = Mock()
+        processor.producer.send = AsyncMock(side_effect=ConnectionError("broker down"))
+        
+        exhausted, ok = TestBatchPublishing.make_messages(2)
+        exhausted.retry_count = 3
+        
+        async def process(message):
+            if message.message_id == exhausted.message_id:
+                raise RuntimeError("boom")
+        
+        processor.register_processor(MessageType.METER_READING.value, process)
+        records = [
+            Mock(topic="readings", partition=0, offset=offset, key="meter_0",
+                 value=KafkaStreamProcessor._message_data(message))
+            for offset, message in ((10, exhausted), (11, ok))
+        ]
+        consumer = Mock()
+        consumer.commit = AsyncMock(side_effect=CommitFailedError("rebalancing"))
+        consumer_info = {"consumer": consumer, "topic_name": "readings", "consumer_id": "c1", "running": True}
+        polls = iter([[records[0]], [records[1]], []])
+        
+        async def getmany(timeout_ms, max_records):
+            batch = next(polls)
+            consumer_info["running"] = bool(batch)
+            return {"readings-0": batch}
+        
+        consumer.getmany = getmany
+        with patch("redaptive.streaming.kafka_client.asyncio.sleep", AsyncMock()) as sleep:
+            await asyncio.wait_for(processor._consume_messages(consumer_info), timeout=5)
+        
+        assert sleep.await_count == 2
+        processor.producer.send.assert_awaited_once()
+        consumer.seek.assert_called_once()
+        consumer.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_kafka_consumer_backs_off_while_commit_hooks_fail(self):
+        """Test a batch whose keys cannot be recorded is rewound and re-polled with growing pauses."""
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        processor = KafkaStreamProcessor()
+        processor.register_processor(MessageType.METER_READING.value, AsyncMock())
+        hook = AsyncMock(side_effect=[ConnectionError("redis down"), ConnectionError("redis down"), None])
+        processor.commit_hooks.append(hook)
+        record = Mock(topic="readings", partition=0, offset=10, key="meter_0",
+                      value=KafkaStreamProcessor._message_data(TestBatchPublishing.make_messages(1)[0]))
+        consumer = Mock()
+        consumer.commit = AsyncMock()
+        consumer_info = {"consumer": consumer, "topic_name": "readings", "consumer_id": "c1", "running": True}
+        polls = iter([[record], [record], [record], []])
+        
+        async def getmany(timeout_ms, max_records):
+            batch = next(polls)
+            consumer_info["running"] = bool(batch)
+            return {"readings-0": batch}
+        
+        consumer.getmany = getmany
+        with patch("redaptive.streaming.kafka_client.asyncio.sleep", AsyncMock()) as sleep:
+            await asyncio.wait_for(processor._consume_messages(consumer_info), timeout=5)
+        
+        assert [call.args[0] for call in sleep.await_args_list] == [1, 2]
+        assert consumer.seek.call_count == 2
+        consumer.commit.assert_awaited_once()
+
+
+class TestWireCodecs:
+    """Test the compact binary message codec."""
+    
+    @staticmethod
+    def make_reading_message(timestamp=None):
+        reading = MeterReading(
+            meter_id="meter_000123",
+            building_id="building_0042",
+            meter_type=MeterType.ELECTRICITY,
+            timestamp=timestamp or datetime(2024, 5, 1, 12, 15, 0, 250000),
+            value=153.25,
+            unit="kWh",
+            quality_score=0.97
+        )
+        return StreamMessage(
+            message_id="3f2b6a1e-8a9c-4d1f-9f3e-2b1c0d9e8f7a",
+            message_type=MessageType.METER_READING,
+            source="energy_meter",
+            timestamp=datetime(2024, 5, 1, 12, 15, 1, 123456),
+            payload=reading.to_dict(),
+            retry_count=1,
+            metadata={"batch": 7}
+        )
+    
+    def test_msgpack_round_trip_is_exact_and_compact(self):
+        """Test readings round-trip exactly and encode far smaller than JSON."""
+        from redaptive.streaming.codecs import get_codec, decode_message, MAGIC, FORMAT_VERSION
+        
+        message = self.make_reading_message()
+        encoded = get_codec("msgpack").encode(message)
+        
+        assert encoded[0] == MAGIC and encoded[1] == FORMAT_VERSION
+        assert decode_message(encoded) == message
+        assert MeterReading.from_dict(decode_message(encoded).payload).meter_type == MeterType.ELECTRICITY
+        assert len(encoded) * 3 < len(message.to_json().encode())
+    
+    def test_msgpack_falls_back_for_non_reading_payloads(self):
+        """Test aware timestamps and arbitrary payloads keep their exact form."""
+        from datetime import timezone
+        from redaptive.streaming.codecs import get_codec, decode_message
+        
+        codec = get_codec("msgpack")
+        aware = self.make_reading_message()
+        aware.payload["timestamp"] = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc).isoformat()
+        aware.timestamp = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+        alert = StreamMessage(
+            message_id="alert_1", message_type=MessageType.ALERT, source="energy_monitor",
+            timestamp=datetime(2024, 5, 1), payload={"severity": "high", "values": [1, 2.5, None]}
+        )
+        
+        assert decode_message(codec.encode(aware)) == aware
+        assert decode_message(codec.encode(alert)) == alert
+        assert decode_message(alert.to_json()) == alert
+        assert get_codec("protobuf") is get_codec("json")
+    
+    @pytest.mark.asyncio
+    async def test_processors_decode_binary_transparently(self):
+        """Test Redis entries (surrogate-escaped strings) and Kafka records decode the binary codec."""
+        from redaptive.streaming.codecs import decode_record_value
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor
+        
+        message = self.make_reading_message()
+        handled = []
+        
+        async def process(received):
+            handled.append(received)
+        
+        redis_processor = RedisStreamProcessor()
+        redis_processor.stream_configs["readings"] = StreamConfig(stream_name="readings", codec="msgpack")
+        fields = redis_processor._message_fields(message, redis_processor._codec("readings"))
+        assert set(fields) == {"data", "key"}
+        # What a decode_responses=True, surrogateescape connection hands back
+        fields["data"] = fields["data"].decode("utf-8", "surrogateescape")
+        redis_processor.register_processor(MessageType.METER_READING.value, process)
+        result = await redis_processor._process_message("readings", "1-0", fields, None, "consumer_1")
+        assert result.status == ProcessingStatus.COMPLETED
+        
+        kafka_processor = KafkaStreamProcessor()
+        kafka_processor.topic_configs["readings"] = StreamConfig(stream_name="readings", codec="msgpack")
+        record = Mock(partition=0, offset=1, key="meter_000123",
+                      value=decode_record_value(kafka_processor._encode("readings", message)))
+        kafka_processor.register_processor(MessageType.METER_READING.value, process)
+        result = await kafka_processor._process_message(record, "readings", "consumer_1")
+        assert result.status == ProcessingStatus.COMPLETED
+        
+        assert handled == [message, message]
+
+
+class TestMeterReadingBatch:
+    """Test the columnar meter reading batch."""
+    
+    @staticmethod
+    def make_readings(count):
+        return [
+            MeterReading(
+                meter_id=f"meter_{i % 3}",
+                building_id="building_001",
+                meter_type=MeterType.GAS if i % 3 == 2 else MeterType.ELECTRICITY,
+                timestamp=datetime(2024, 1, 1, 12) + timedelta(minutes=i),
+                value=float(i) * 1.5,
+                unit="therm" if i % 3 == 2 else "kWh",
+                quality_score=0.9
+            )
+            for i in range(count)
+        ]
+    
+    def test_batch_shares_meter_dictionary(self):
+        """Test readings collapse onto a meter dictionary plus typed columns."""
+        readings = self.make_readings(7)
+        batch = MeterReadingBatch.from_readings(readings)
+        
+        assert len(batch) == 7
+        assert batch.meter_ids == ["meter_0", "meter_1", "meter_2"]
+        assert list(batch.meter_index) == [0, 1, 2, 0, 1, 2, 0]
+        assert batch.values.typecode == "d" and batch.timestamps.typecode == "q"
+        assert list(batch.readings()) == [
+            MeterReading(r.meter_id, r.building_id, r.meter_type, r.timestamp, r.value, r.unit, r.quality_score)
+            for r in readings
+        ]
+    
+    def test_batch_round_trips_through_both_codecs(self):
+        """Test JSON lists and msgpack raw column bytes both restore the batch."""
+        from redaptive.streaming.codecs import get_codec, decode_message
+        
+        batch = MeterReadingBatch.from_readings(self.make_readings(100))
+        message = StreamMessage(
+            message_id="batch_1",
+            message_type=MessageType.METER_READING_BATCH,
+            source="energy_meter",
+            timestamp=datetime(2024, 1, 1),
+            payload=batch.to_dict()
+        )
+        
+        from_json = MeterReadingBatch.from_dict(StreamMessage.from_json(message.to_json()).payload)
+        encoded = get_codec("msgpack").encode(message)
+        from_binary = MeterReadingBatch.from_dict(decode_message(encoded).payload)
+        
+        assert from_json == batch
+        assert from_binary == batch
+        # 8-byte values/timestamps, 4-byte index and quality columns, plus the meter dictionary
+        assert len(encoded) < 100 * 32 + 200
+    
+    @patch('redaptive.streaming.stream_manager.REDIS_AVAILABLE', True)
+    @patch('redaptive.streaming.stream_manager.RedisStreamProcessor')
+    @pytest.mark.asyncio
+    async def test_batch_published_as_one_message_and_processed(self, mock_redis_processor):
+        """Test a batch is one stream message and the batch processor summarizes it column-wise."""
+        mock_processor = Mock()
+        mock_processor.connect = AsyncMock(return_value=True)
+        mock_processor.register_processor = Mock()
+        mock_processor.publish_message = AsyncMock(return_value=True)
+        mock_redis_processor.return_value = mock_processor
+        
+        manager = EnergyStreamManager(StreamBackend.REDIS)
+        await manager.start()
+        batch = MeterReadingBatch.from_readings(self.make_readings(6))
+        
+        assert await manager.publish_meter_reading_batch(batch) is True
+        stream_name, message = mock_processor.publish_message.call_args.args
+        assert stream_name == "energy_meter_readings"
+        assert message.message_type == MessageType.METER_READING_BATCH
+        
+        result = await manager._process_meter_reading_batch(message)
+        assert result["readings"] == 6
+        assert result["meters"] == 3
+        assert result["start"] == "2024-01-01T12:00:00"
+        assert result["total_value"] == pytest.approx(sum(i * 1.5 for i in range(6)))
+
+
+class TestLightweightModels:
+    """Test slotted streaming models and cached lookups."""
+    
+    def test_models_are_slotted(self):
+        """Test instances carry no per-instance __dict__ and keep dataclass behaviour."""
+        import pickle
+        
+        reading = MeterReading(
+            meter_id="meter_001", building_id="building_001", meter_type=MeterType.WATER,
+            timestamp=datetime(2024, 1, 1), value=3.0, unit="gal"
+        )
+        config = StreamConfig(stream_name="readings")
+        
+        for instance in (reading, config, TestBatchPublishing.make_messages(1)[0], MeterReadingBatch()):
+            assert not hasattr(instance, "__dict__")
+        with pytest.raises(AttributeError):
+            reading.unexpected = True
+        assert reading.metadata == {} and reading.quality_score == 1.0
+        assert pickle.loads(pickle.dumps(reading)) == reading
+    
+    def test_cached_lookups_and_timestamp_fast_path(self):
+        """Test enum lookup tables and epoch/ISO timestamp parsing."""
+        from redaptive.streaming.data_models import (
+            lookup_meter_type, parse_timestamp, to_epoch_micros
+        )
+        
+        assert lookup_meter_type("gas") is MeterType.GAS
+        assert lookup_meter_type(MeterType.GAS) is MeterType.GAS
+        with pytest.raises(ValueError):
+            lookup_meter_type("plasma")
+        
+        moment = datetime(2024, 3, 10, 8, 30, 0, 125)
+        assert parse_timestamp(to_epoch_micros(moment)) == moment
+        assert parse_timestamp(moment.isoformat()) is parse_timestamp(moment.isoformat())
+        
+        data = MeterReading("m1", "b1", MeterType.STEAM, moment, 2.0, "lb").to_dict()
+        data["timestamp"] = to_epoch_micros(moment)
+        assert MeterReading.from_dict(data).timestamp == moment
+
+
+class TestWindowAggregation:
+    """Test event-time window aggregation of meter readings."""
+    
+    @staticmethod
+    def reading(meter_id, minute, value, second=0, building_id="building_001", unit="kWh"):
+        return MeterReading(
+            meter_id=meter_id,
+            building_id=building_id,
+            meter_type=MeterType.ELECTRICITY,
+            timestamp=datetime(2024, 1, 1, 12) + timedelta(minutes=minute, seconds=second),
+            value=value,
+            unit=unit
+        )
+    
+    def test_tumbling_windows_close_on_watermark(self):
+        """Test per-meter and per-building windows close once the watermark passes their end."""
+        from redaptive.streaming.windowing import WindowAggregator, WindowSpec
+        
+        aggregator = WindowAggregator([WindowSpec(60)], allowed_lateness_seconds=30)
+        aggregator.add_reading(self.reading("meter_1", 0, 2.0))
+        aggregator.add_reading(self.reading("meter_1", 0, 4.0, second=20))
+        aggregator.add_reading(self.reading("meter_2", 0, 6.0, second=40))
+        
+        # Watermark 12:00:10 is still inside the first minute
+        aggregator.add_reading(self.reading("meter_1", 1, 1.0, second=10))
+        assert aggregator.advance() == []
+        
+        aggregator.add_reading(self.reading("meter_1", 1, 3.0, second=30))
+        closed = {(a.scope, a.entity_id): a for a in aggregator.advance()}
+        
+        assert set(closed) == {("meter", "meter_1"), ("meter", "meter_2"), ("building", "building_001")}
+        meter = closed[("meter", "meter_1")]
+        assert (meter.count, meter.sum, meter.min, meter.max, meter.avg) == (2, 6.0, 2.0, 4.0, 3.0)
+        assert meter.window_start == datetime(2024, 1, 1, 12)
+        assert meter.window_end == datetime(2024, 1, 1, 12, 1)
+        assert closed[("building", "building_001")].count == 3
+        assert closed[("building", "building_001")].to_dict()["avg"] == 4.0
+        
+        remaining = aggregator.flush()
+        assert sorted(a.sum for a in remaining if a.scope == "meter") == [4.0]
+    
+    def test_late_readings_dropped_and_sliding_windows_overlap(self):
+        """Test readings behind the watermark are counted late and sliding windows share readings."""
+        from redaptive.streaming.windowing import WindowAggregator, WindowSpec
+        
+        aggregator = WindowAggregator([WindowSpec(120, slide_seconds=60)], allowed_lateness_seconds=0,
+                                      per_building=False)
+        aggregator.add_reading(self.reading("meter_1", 0, 1.0, second=30))
+        aggregator.add_reading(self.reading("meter_1", 5, 2.0))
+        
+        assert aggregator.add_reading(self.reading("meter_1", 1, 9.0)) is False
+        assert aggregator.metrics["readings_late"] == 1
+        
+        closed = aggregator.advance()
+        # 12:00:30 falls in [11:59, 12:01) and [12:00, 12:02)
+        assert [(a.window_start.minute, a.sum) for a in closed] == [(59, 1.0), (0, 1.0)]
+        assert all(a.window_seconds == 120 and a.slide_seconds == 60 for a in closed)
+        assert aggregator.open_windows() == 2
+    
+    def test_batch_matches_individual_readings(self):
+        """Test columnar batches aggregate the same as individual readings."""
+        from redaptive.streaming.windowing import WindowAggregator
+        
+        readings = TestMeterReadingBatch.make_readings(90)
+        individual, columnar = WindowAggregator(), WindowAggregator()
+        for reading in readings:
+            individual.add_reading(reading)
+        assert columnar.add_batch(MeterReadingBatch.from_readings(readings)) == 90
+        
+        key = lambda a: (a.scope, a.entity_id, a.unit, a.window_seconds, a.window_start)
+        assert sorted(map(key, individual.flush())) == sorted(map(key, columnar.flush()))
+    
+    @patch('redaptive.streaming.stream_manager.REDIS_AVAILABLE', True)
+    @patch('redaptive.streaming.stream_manager.RedisStreamProcessor')
+    @pytest.mark.asyncio
+    async def test_manager_emits_closed_windows_downstream(self, mock_redis_processor):
+        """Test consumed readings roll up and closed windows reach the stream and sink."""
+        from redaptive.streaming.windowing import WindowSpec, rollup_rows
+        
+        mock_processor = Mock()
+        mock_processor.connect = AsyncMock(return_value=True)
+        mock_processor.disconnect = AsyncMock()
+        mock_processor.register_processor = Mock()
+        mock_processor.get_metrics = Mock(return_value={})
+        mock_processor.publish_batch = AsyncMock(side_effect=lambda stream, messages, **kwargs: [
+            f"{i}-0" for i in range(len(messages))
+        ])
+        mock_redis_processor.return_value = mock_processor
+        sink = AsyncMock()
+        
+        manager = EnergyStreamManager(StreamBackend.REDIS)
+        await manager.start()
+        manager.enable_window_aggregation(windows=[WindowSpec(60)], allowed_lateness_seconds=0, sink=sink)
+        
+        for reading in (self.reading("meter_1", 0, 5.0), self.reading("meter_1", 1, 7.0)):
+            message = StreamMessage(
+                message_id=reading.meter_id,
+                message_type=MessageType.METER_READING,
+                source="energy_meter",
+                timestamp=datetime.now(),
+                payload=reading.to_dict()
+            )
+            await manager._process_meter_reading(message)
+        
+        stream_name, messages = mock_processor.publish_batch.call_args.args
+        assert stream_name == "energy_meter_aggregates"
+        assert all(m.message_type == MessageType.METER_AGGREGATE for m in messages)
+        assert {m.payload["scope"] for m in messages} == {"meter", "building"}
+        assert all(m.payload["sum"] == 5.0 for m in messages)
+        assert len(sink.await_args.args[0]) == 2
+        assert rollup_rows(sink.await_args.args[0][:1])[0][:4] == ("meter", "meter_1", "kWh", 60)
+        
+        await manager.stop()
+        assert sink.await_count == 2
+        assert manager.get_metrics()["window_aggregation"]["windows_closed"] == 4
+
+
+class TestStreamingAnomalyDetection:
+    """Test the inline per-meter anomaly detector."""
+    
+    @staticmethod
+    def feed(detector, values, meter_id="meter_1", start_minute=0):
+        anomalies = []
+        for i, value in enumerate(values):
+            reading = MeterReading(
+                meter_id=meter_id,
+                building_id="building_001",
+                meter_type=MeterType.ELECTRICITY,
+                timestamp=datetime(2024, 1, 1, 12) + timedelta(minutes=start_minute + i),
+                value=value,
+                unit="kWh"
+            )
+            anomaly = detector.observe_reading(reading)
+            if anomaly:
+                anomalies.append(anomaly)
+        return anomalies
+    
+    def test_spikes_and_drops_detected_after_warmup(self):
+        """Test deviations beyond the thresholds are flagged and stale readings skipped."""
+        from redaptive.streaming.anomaly import StreamingAnomalyDetector
+        
+        detector = StreamingAnomalyDetector()
+        baseline = [100.0 + (i % 4) for i in range(20)]
+        assert self.feed(detector, baseline) == []
+        
+        spikes = self.feed(detector, [160.0], start_minute=20)
+        assert [a["type"] for a in spikes] == ["consumption_spike"]
+        assert spikes[0]["severity"] == "high"
+        assert spikes[0]["building_id"] == "building_001"
+        assert spikes[0]["timestamp"] == "2024-01-01T12:20:00"
+        
+        drops = self.feed(detector, [100.0] * 10 + [20.0], start_minute=21)
+        assert drops[-1]["type"] == "consumption_drop"
+        
+        # Redelivered reading is not scored twice
+        assert self.feed(detector, [500.0], start_minute=0) == []
+        assert detector.metrics["readings_skipped"] == 1
+    
+    def test_sharding_and_checkpoint_restore(self, tmp_path):
+        """Test shards own disjoint meters and state survives a checkpoint round trip."""
+        from redaptive.streaming.anomaly import (
+            StreamingAnomalyDetector, read_checkpoint, shard_for, write_checkpoint
+        )
+        
+        meters = [f"meter_{i:04d}" for i in range(40)]
+        shards = [StreamingAnomalyDetector(shard_index=i, shard_count=3) for i in range(3)]
+        for meter_id in meters:
+            for shard in shards:
+                self.feed(shard, [10.0, 11.0], meter_id=meter_id)
+        
+        assert sum(len(shard.baselines) for shard in shards) == len(meters)
+        assert all(shard_for(m, 3) == i for i, shard in enumerate(shards) for m in shard.baselines)
+        
+        path = str(tmp_path / "shard.json")
+        write_checkpoint(path, shards[0].snapshot())
+        restored = StreamingAnomalyDetector(shard_index=0, shard_count=3)
+        assert restored.restore(read_checkpoint(path)) == len(shards[0].baselines)
+        assert restored.baselines == shards[0].baselines
+        assert read_checkpoint(str(tmp_path / "missing.json")) is None
+    
+    @patch('redaptive.streaming.stream_manager.REDIS_AVAILABLE', True)
+    @patch('redaptive.streaming.stream_manager.RedisStreamProcessor')
+    @pytest.mark.asyncio
+    async def test_manager_publishes_anomalies_and_alerts(self, mock_redis_processor, tmp_path):
+        """Test consumed readings are scored inline and anomalies published with alerts."""
+        mock_processor = Mock()
+        mock_processor.connect = AsyncMock(return_value=True)
+        mock_processor.disconnect = AsyncMock()
+        mock_processor.register_processor = Mock()
+        mock_processor.publish_message = AsyncMock(return_value=True)
+        mock_processor.create_stream = AsyncMock(return_value=True)
+        mock_processor.start_consumer = AsyncMock(return_value=True)
+        mock_redis_processor.return_value = mock_processor
+        
+        checkpoint = str(tmp_path / "anomaly.json")
+        manager = EnergyStreamManager(StreamBackend.REDIS)
+        await manager.start()
+        manager.enable_anomaly_detection(checkpoint_path=checkpoint)
+        
+        readings = [100.0 + (i % 4) for i in range(20)] + [200.0]
+        batch = MeterReadingBatch()
+        for i, value in enumerate(readings):
+            batch.add("meter_1", "building_001", MeterType.ELECTRICITY,
+                      datetime(2024, 1, 1, 12) + timedelta(minutes=i), value, "kWh")
+        message = StreamMessage(
+            message_id="batch_1",
+            message_type=MessageType.METER_READING_BATCH,
+            source="energy_meter",
+            timestamp=datetime.now(),
+            payload=batch.to_dict()
+        )
+        await manager._process_meter_reading_batch(message)
+        
+        published = {call.args[0]: call.args[1] for call in mock_processor.publish_message.call_args_list}
+        assert published["energy_anomalies"].payload["type"] == "consumption_spike"
+        assert published["energy_alerts"].payload["type"] == "consumption_anomaly"
+        
+        assert await manager.start_anomaly_detector() is True
+        stream_name, config = mock_processor.create_stream.call_args.args
+        assert stream_name == "energy_meter_readings"
+        assert config.consumer_group == "anomaly_detectors_shard_0"
+        assert mock_processor.start_consumer.call_args.args[1:] == ("anomaly_detector_0", "anomaly_detectors_shard_0")
+        
+        await manager.stop()
+        restarted = EnergyStreamManager(StreamBackend.REDIS)
+        detector = restarted.enable_anomaly_detection(checkpoint_path=checkpoint)
+        assert detector.baselines["meter_1"].count == len(readings)
+    
+    @pytest.mark.asyncio
+    async def test_detector_group_only_scores_readings(self):
+        """Test the detector group does not aggregate readings the regular consumers already did."""
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.setup_energy_streams()
+        aggregates = []
+        
+        async def sink(closed):
+            aggregates.extend(closed)
+        
+        manager.enable_window_aggregation(sink=sink)
+        detector = manager.enable_anomaly_detection()
+        assert await manager.start_energy_consumers() is True
+        assert await manager.start_anomaly_detector() is True
+        await manager.publish_meter_readings(TestMeterReadingBatch.make_readings(10))
+        
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 20)
+        await manager.flush_aggregates()
+        # The readings span ten minutes, so each lands in its hourly window however late
+        hourly = [a for a in aggregates if a.scope == "meter" and a.window_seconds == 3600]
+        assert sum(a.count for a in hourly) == 10
+        assert detector.metrics["readings_scored"] + detector.metrics["readings_skipped"] == 10
+        await manager.stop()
+
+
+class TestMemoryBackend:
+    """Test the in-memory stream backend end to end."""
+    
+    @staticmethod
+    async def wait_for(condition, timeout=5.0):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition():
+            assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+            await asyncio.sleep(0.01)
+    
+    @pytest.mark.asyncio
+    async def test_consumer_group_processes_and_acks(self):
+        """Test readings flow through a consumer group and leave nothing pending."""
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        assert await manager.start() is True
+        assert await manager.setup_energy_streams() is True
+        assert await manager.start_energy_consumers() is True
+        
+        readings = TestMeterReadingBatch.make_readings(50)
+        ids = await manager.publish_meter_readings(readings)
+        assert all(ids) and len(set(ids)) == 50
+        
+        processor = manager.processor
+        await self.wait_for(lambda: processor.metrics["messages_processed"] == 50)
+        assert await processor.get_pending("energy_meter_readings", "meter_processors") == []
+        info = await manager.get_stream_info("energy_meter_readings")
+        assert info["length"] == 50
+        
+        await manager.stop()
+        assert processor.consumers == {}
+    
+    @pytest.mark.asyncio
+    async def test_failures_retry_then_dead_letter(self):
+        """Test a failing message is retried with backoff and then dead-lettered."""
+        from redaptive.streaming import MemoryStreamProcessor
+        
+        processor = MemoryStreamProcessor()
+        await processor.connect()
+        await processor.create_stream("readings", StreamConfig(
+            stream_name="readings", consumer_group="group", max_retries=1, retry_delay_seconds=0
+        ))
+        attempts = []
+        
+        async def failing(message):
+            attempts.append(message.retry_count)
+            raise RuntimeError("boom")
+        
+        processor.register_processor(MessageType.METER_READING.value, failing)
+        await processor.start_consumer("readings", "c1", "group")
+        await processor.publish_meter_reading("readings", {"meter_id": "m1"})
+        
+        await self.wait_for(lambda: processor.metrics["messages_dead_lettered"] == 1)
+        assert attempts == [0, 1]
+        dead = processor.streams["readings_dlq"].entries
+        assert dead[0][1]["error"] == "boom"
+        assert await processor.get_pending("readings", "group") == []
+        await processor.disconnect()
+    
+    @pytest.mark.asyncio
+    async def test_hung_handlers_time_out_and_reclaims_are_capped(self):
+        """Test a hanging handler is cut off and an entry reclaimed past max_retries is dead-lettered."""
+        from redaptive.streaming import MemoryStreamProcessor
+        
+        processor = MemoryStreamProcessor()
+        await processor.connect()
+        await processor.create_stream("readings", StreamConfig(
+            stream_name="readings", consumer_group="group", processing_timeout_seconds=1,
+            max_retries=1, retry_delay_seconds=0
+        ))
+        
+        async def hang(message):
+            await asyncio.sleep(3600)
+        
+        processor.register_processor(MessageType.METER_READING.value, hang)
+        await processor.publish_meter_reading("readings", {"meter_id": "m1"})
+        entries = await processor._read(
+            {"stream_name": "readings", "consumer_name": "c1", "consumer_group": "group"}, 10, block_seconds=0
+        )
+        result = await processor._process_message("readings", entries[0][0], entries[0][1], "group", "c1")
+        assert result.status == ProcessingStatus.RETRYING
+        assert "exceeded 1s" in result.error_message
+        
+        # Workers that die mid-message never ack; each reclaim counts as a delivery
+        group = processor.streams["readings"].groups["group"]
+        consumer_info = {"stream_name": "readings", "consumer_name": "c2", "consumer_group": "group"}
+        group.pending[entries[0][0]].delivered_at -= 10
+        assert await processor._claim_stale_entries(consumer_info, 10) == entries
+        group.pending[entries[0][0]].delivered_at -= 10
+        assert await processor._claim_stale_entries(consumer_info, 10) == []
+        assert group.pending == {}
+        dead = await processor.read_range("readings_dlq").__anext__()
+        assert [message.payload for _, message in dead] == [{"meter_id": "m1"}]
+        assert processor.metrics["messages_dead_lettered"] == 1
+        await processor.disconnect()
+    
+    @pytest.mark.asyncio
+    async def test_stale_pending_entries_claimed_and_latency_injected(self):
+        """Test unacked entries are claimed by another consumer and latency slows round trips."""
+        from redaptive.streaming import MemoryStreamProcessor
+        
+        processor = MemoryStreamProcessor(latency_ms=20)
+        await processor.connect()
+        await processor.create_stream("readings", StreamConfig(
+            stream_name="readings", consumer_group="group", processing_timeout_seconds=0
+        ))
+        processed = []
+        processor.register_processor(
+            MessageType.METER_READING.value, AsyncMock(side_effect=lambda m: processed.append(m))
+        )
+        
+        started = asyncio.get_running_loop().time()
+        await processor.publish_meter_reading("readings", {"meter_id": "m1"})
+        assert asyncio.get_running_loop().time() - started >= 0.02
+        
+        # A consumer that fetched but died before acknowledging
+        dead_consumer = {"stream_name": "readings", "consumer_name": "dead", "consumer_group": "group"}
+        entries = await processor._read(dead_consumer, 10, block_seconds=0)
+        assert [p["consumer"] for p in await processor.get_pending("readings", "group")] == ["dead"]
+        
+        await processor.start_consumer("readings", "alive", "group")
+        await self.wait_for(lambda: len(processed) == 1)
+        assert processor.metrics["messages_claimed"] == 1
+        assert processed[0].payload == {"meter_id": "m1"}
+        assert entries[0][0] == (await processor.get_stream_info("readings"))["last_generated_id"]
+        await self.wait_for(lambda: not processor.streams["readings"].groups["group"].pending)
+        await processor.disconnect()
+
+
+class TestStreamBenchmark:
+    """Test the streaming benchmark harness on the memory backend."""
+    
+    def test_percentile_nearest_rank(self):
+        """Test percentiles use nearest rank over sorted samples."""
+        from redaptive.streaming.benchmark import percentile
+        
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 0.50) == 50.0
+        assert percentile(values, 0.99) == 99.0
+        assert percentile([], 0.95) == 0.0
+    
+    @pytest.mark.asyncio
+    async def test_benchmark_reports_end_to_end_metrics(self):
+        """Test a short run publishes and consumes everything and reports JSON-ready metrics."""
+        import json
+        from redaptive.streaming.benchmark import BenchmarkConfig, run_benchmark
+        
+        report = await run_benchmark(BenchmarkConfig(
+            meters=200, rate=400, duration_seconds=0.5, tick_ms=50, consumers=2, codec="json"
+        ))
+        
+        # 20 readings per 50ms tick for 0.5s
+        assert report["publish"]["published"] in (200, 220)
+        assert report["consume"]["consumed"] == report["publish"]["published"]
+        assert report["consume"]["drained"] is True
+        assert report["lag"]["final_messages"] == 0
+        latency = report["latency_ms"]
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+        assert report["memory"]["codec"] == "json"
+        assert report["memory"]["wire_bytes_per_message"] > 100
+        assert report["target"]["points_per_hour"] == 48000
+        json.dumps(report, default=str)
+
+
+class TestStreamHistograms:
+    """Test latency histograms and their Prometheus exposition."""
+    
+    def test_quantiles_within_relative_error(self):
+        """Test log-linear buckets keep quantiles within a few percent across scales."""
+        from redaptive.streaming.metrics import LatencyHistogram
+        
+        histogram = LatencyHistogram()
+        for value in range(1, 10001):
+            histogram.record(value / 100)  # 0.01ms .. 100ms
+        
+        assert histogram.count == 10000
+        assert histogram.quantile(0.5) == pytest.approx(50.0, rel=0.04)
+        assert histogram.quantile(0.99) == pytest.approx(99.0, rel=0.04)
+        assert histogram.quantile(1.0) == 100.0
+        assert histogram.quantile(0.0001) == pytest.approx(0.01, rel=0.04)
+        assert len(histogram.counts) < 200
+        
+        snapshot = histogram.snapshot()
+        assert snapshot["mean"] == pytest.approx(50.005)
+        assert {"p50", "p90", "p95", "p99", "p999"} <= set(snapshot)
+    
+    def test_prometheus_rendering(self):
+        """Test histograms render as summaries and counters as samples."""
+        from redaptive.streaming.metrics import StreamHistograms, render_prometheus
+        
+        histograms = StreamHistograms()
+        histograms.record_batch("readings", 10)
+        histograms.record_batch("readings", 30)
+        text = render_prometheus(histograms, counters={"messages_processed": 40, "running": True,
+                                                       "last_processed": None}, labels={"backend": "memory"})
+        
+        assert '# TYPE redaptive_stream_batch_size summary' in text
+        assert 'redaptive_stream_batch_size_count{backend="memory",stream="readings"} 2' in text
+        assert 'redaptive_stream_batch_size_sum{backend="memory",stream="readings"} 40.0' in text
+        assert 'redaptive_stream_batch_size{backend="memory",stream="readings",quantile="0.5"} 10' in text
+        assert 'redaptive_stream_messages_processed{backend="memory"} 40' in text
+        assert "running" not in text
+    
+    @pytest.mark.asyncio
+    async def test_processors_record_histograms_and_serve_metrics(self):
+        """Test processing, queue time and batch size are recorded and served over HTTP."""
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.create_stream("readings")
+        await manager.start_consumer("readings", "c1")
+        await manager.publish_meter_readings("readings", TestMeterReadingBatch.make_readings(5))
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 5)
+        
+        histograms = manager.get_metrics()["histograms"]
+        processing, = histograms["processing_time_ms"]
+        assert processing["processor"] == "_process_meter_reading"
+        assert processing["message_type"] == "meter_reading" and processing["count"] == 5
+        assert histograms["queue_time_ms"][0]["count"] == 5
+        assert sum(b["count"] for b in histograms["batch_size"]) >= 1
+        
+        assert await manager.start_metrics_server(host="127.0.0.1", port=0) is True
+        port = manager.metrics_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+        
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert 'redaptive_stream_queue_time_ms_count{backend="memory",message_type="meter_reading",stream="readings"} 5' in response
+        await manager.stop()
+        assert manager.metrics_server is None
+
+
+class TestConsumerAutoscaling:
+    """Test lag tracking and lag-driven consumer autoscaling."""
+    
+    def test_policy_bounds(self):
+        """Test desired consumer counts are clamped to the policy bounds."""
+        from redaptive.streaming import AutoscalePolicy
+        
+        policy = AutoscalePolicy(min_consumers=1, max_consumers=4, target_lag_per_consumer=10)
+        assert policy.desired_consumers(0) == 1
+        assert policy.desired_consumers(25) == 3
+        assert policy.desired_consumers(1000) == 4
+        with pytest.raises(ValueError):
+            AutoscalePolicy(min_consumers=3, max_consumers=2)
+    
+    @pytest.mark.asyncio
+    async def test_memory_consumer_lag(self):
+        """Test lag counts undelivered entries and pending counts unacknowledged ones."""
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.create_stream("readings")
+        gate = asyncio.Event()
+        
+        async def blocked(message):
+            await gate.wait()
+        
+        manager.register_processor(MessageType.METER_READING.value, blocked)
+        await manager.publish_meter_readings("readings", TestMeterReadingBatch.make_readings(10))
+        lag = await manager.get_consumer_lag("readings")
+        assert (lag["lag"], lag["pending"]) == (10, 0)
+        
+        await manager.start_consumer("readings", "c1")
+        group = manager.processor.streams["readings"].groups["readings_processors"]
+        await TestMemoryBackend.wait_for(lambda: len(group.pending) == 10)
+        lag = await manager.get_consumer_lag("readings")
+        assert (lag["lag"], lag["pending"]) == (0, 10)
+        
+        gate.set()
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 10)
+        lag = await manager.get_consumer_lag("readings")
+        assert (lag["lag"], lag["pending"]) == (0, 0)
+        await manager.stop()
+    
+    @pytest.mark.asyncio
+    async def test_scales_up_on_backlog_and_down_when_idle(self):
+        """Test a burst scales straight to the needed size and idle scales down one at a time."""
+        from redaptive.streaming import AutoscalePolicy
+        
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.create_stream("readings")
+        gate = asyncio.Event()
+        
+        async def blocked(message):
+            await gate.wait()
+        
+        manager.register_processor(MessageType.METER_READING.value, blocked)
+        policy = AutoscalePolicy(min_consumers=1, max_consumers=4, target_lag_per_consumer=10,
+                                 scale_down_delay_seconds=0, check_interval_seconds=3600,
+                                 drain_timeout_seconds=2)
+        autoscaler = await manager.autoscale_consumers("readings", policy, consumer_prefix="reader")
+        assert autoscaler.consumers == ["reader_0"]
+        
+        await manager.publish_meter_readings("readings", TestMeterReadingBatch.make_readings(35))
+        assert await autoscaler.check() == 4
+        assert autoscaler.consumers == ["reader_0", "reader_1", "reader_2", "reader_3"]
+        assert len(manager.processor.consumers) == 4
+        
+        gate.set()
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 35)
+        assert await autoscaler.check() == 3
+        assert await autoscaler.check() == 2
+        assert await autoscaler.check() == 1
+        assert await autoscaler.check() == 1
+        assert autoscaler.consumers == ["reader_0"]
+        assert manager.get_metrics()["autoscaling"]["readings"]["scale_downs"] == 3
+        
+        await manager.stop()
+        assert manager.processor.consumers == {}
+    
+    @pytest.mark.asyncio
+    async def test_energy_consumers_autoscaled(self):
+        """Test start_energy_consumers(autoscale=True) starts the minimum per stream."""
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.setup_energy_streams()
+        assert await manager.start_energy_consumers(autoscale=True) is True
+        
+        assert set(manager.autoscalers) == {
+            "energy_meter_readings", "energy_alerts", "energy_anomalies", "energy_diagnostics"
+        }
+        assert "energy_meter_readings:meter_consumer_0" in manager.processor.consumers
+        assert len(manager.processor.consumers) == 4
+        assert manager.autoscalers["energy_meter_readings"].consumer_group == "meter_processors"
+        assert manager.processor.consumers["energy_alerts:alert_consumer_0"]["consumer_group"] == "alert_processors"
+        lag = await manager.get_consumer_lag("energy_meter_readings")
+        assert lag["consumer_group"] == "meter_processors"
+        await manager.stop()
+        assert manager.autoscalers == {}
+    
+    @pytest.mark.asyncio
+    async def test_missing_group_lag_is_unknown(self):
+        """Test a group that does not exist reports no lag instead of an empty backlog."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        processor.redis_client = Mock()
+        processor.redis_client.xinfo_groups = AsyncMock(return_value=[{"name": "live", "lag": 5, "pending": 1}])
+        assert await processor.get_consumer_lag("readings", "missing") == {}
+        assert (await processor.get_consumer_lag("readings", "live"))["lag"] == 5
+        
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.create_stream("readings")
+        assert await manager.get_consumer_lag("readings", "missing") == {}
+        await manager.stop()
+
+
+class TestProcessRuntime:
+    """Test the multi-process consumer runtime's worker loop and metric aggregation."""
+    
+    @pytest.mark.asyncio
+    async def test_worker_starts_consumers_and_reports(self):
+        """Test a worker runs its consumers and reports metrics until stopped."""
+        import queue
+        import threading
+        from redaptive.streaming.process_runtime import ProcessRuntimeConfig, _worker
+        
+        config = ProcessRuntimeConfig(workers=2, backend="memory", metrics_interval_seconds=0.05,
+                                      streams={"energy_meter_readings": 2, "energy_alerts": 1})
+        stop_event, reports = threading.Event(), queue.Queue()
+        task = asyncio.create_task(_worker(1, config, stop_event, reports))
+        await TestMemoryBackend.wait_for(lambda: not reports.empty())
+        stop_event.set()
+        await task
+        
+        collected = []
+        while not reports.empty():
+            collected.append(reports.get_nowait())
+        report = collected[-1]
+        assert report["worker"] == 1
+        assert report["metrics"]["active_consumers"] == 0  # stopped before the final report
+        assert collected[0]["metrics"]["active_consumers"] == 3
+        assert "histograms" not in report["metrics"]
+    
+    def test_metrics_merged_across_workers_and_restarts(self):
+        """Test counters sum across workers, survive a restart and histograms merge."""
+        import queue
+        from redaptive.streaming.metrics import StreamHistograms
+        from redaptive.streaming.process_runtime import ProcessRuntimeConfig, ShardedConsumerRuntime
+        
+        runtime = ShardedConsumerRuntime(ProcessRuntimeConfig(workers=2, backend="redis"))
+        runtime._metrics_queue = queue.Queue()
+        runtime.processes = {
+            0: Mock(pid=100, is_alive=Mock(return_value=True)),
+            1: Mock(pid=101, is_alive=Mock(return_value=True))
+        }
+        for worker, pid, processed, latency in ((0, 100, 40, 5.0), (1, 101, 60, 50.0), (1, 999, 7, 1.0)):
+            histograms = StreamHistograms()
+            histograms.observe("processing_time_ms", latency, stream="readings")
+            runtime._metrics_queue.put({
+                "worker": worker, "pid": pid, "reported_at": 0.0, "histograms": histograms,
+                "metrics": {"messages_processed": processed, "success_rate": 100.0, "running": True}
+            })
+        
+        assert runtime.collect_metrics() == 3
+        metrics = runtime.get_metrics()
+        assert metrics["totals"] == {"messages_processed": 100}  # stale pid 999 ignored
+        assert metrics["histograms"]["processing_time_ms"][0]["count"] == 2
+        assert metrics["workers_alive"] == 2
+        
+        runtime._retire(1)
+        assert runtime.get_metrics()["totals"] == {"messages_processed": 100}
+        assert 'redaptive_stream_messages_processed{backend="redis",runtime="processes"} 100' in (
+            runtime.prometheus_metrics()
+        )
+
+
+class TestPriorityLanes:
+    """Test priority scheduling within batches, lane budgets and lane SLO tracking."""
+    
+    @pytest.mark.asyncio
+    async def test_high_priority_lanes_scheduled_first(self):
+        """Test higher-priority keys run first while each key keeps its order."""
+        from redaptive.streaming.concurrency import process_keyed
+        
+        items = [("m1", 0, "a"), ("m2", 0, "b"), ("m1", 3, "c"), ("alert", 3, "d")]
+        order = []
+        
+        async def handler(item):
+            order.append(item[2])
+        
+        await process_keyed(items, lambda item: item[0], handler, max_concurrency=1,
+                            priority=lambda item: item[1])
+        assert order == ["a", "c", "d", "b"]
+    
+    @pytest.mark.asyncio
+    async def test_lane_budget_shared_across_batches(self):
+        """Test a lane budget bounds in-flight handlers across concurrent batches."""
+        from redaptive.streaming.concurrency import process_keyed
+        
+        budget = asyncio.Semaphore(2)
+        in_flight = peak = 0
+        
+        async def handler(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+        
+        await asyncio.gather(*(
+            process_keyed(list(range(8)), lambda item: item, handler, max_concurrency=8, budget=budget)
+            for _ in range(3)
+        ))
+        assert peak == 2
+    
+    def test_alert_priority_and_histogram_threshold(self):
+        """Test alert severities map to priorities and SLO violations are counted."""
+        from redaptive.streaming.metrics import LatencyHistogram
+        from redaptive.streaming.priority import Priority, alert_priority
+        
+        assert alert_priority({"severity": "critical"}) == Priority.CRITICAL
+        assert alert_priority({"priority": "medium"}) == Priority.NORMAL
+        assert alert_priority({}) == Priority.HIGH
+        
+        histogram = LatencyHistogram()
+        for value in (10, 20, 900, 1500, 4000):
+            histogram.record(value)
+        assert histogram.count_above(1000) == 2
+        assert histogram.count_above(5000) == 0
+    
+    @pytest.mark.asyncio
+    async def test_critical_alert_overtakes_bulk_backlog(self):
+        """Test a critical alert in a fetched batch is processed before bulk readings and meets its SLO."""
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.setup_energy_streams()
+        processed = []
+        
+        async def record(message):
+            processed.append(message.message_type.value)
+        
+        manager.register_processor(MessageType.METER_READING.value, record)
+        manager.register_processor(MessageType.ALERT.value, record)
+        stream = manager.energy_streams["meter_readings"]
+        await manager.publish_meter_readings(TestMeterReadingBatch.make_readings(20))
+        alert = StreamMessage(
+            message_id="alert_1", message_type=MessageType.ALERT, source="field",
+            timestamp=datetime.now(), payload={"building_id": "b1", "severity": "critical"}, priority=3
+        )
+        await manager.publish_message(stream, alert)
+        
+        await manager.processor.start_consumer(stream, "c1", "group", batch_size=100, max_concurrency=1)
+        await TestMemoryBackend.wait_for(lambda: len(processed) == 21)
+        assert processed[0] == "alert"
+        
+        await manager.publish_alert({"severity": "critical", "message": "breaker trip"})
+        await manager.start_consumer(manager.energy_streams["alerts"], "alert_consumer")
+        await TestMemoryBackend.wait_for(
+            lambda: manager.lane_status()[0]["count"] == 1
+        )
+        critical, _, bulk = manager.lane_status()
+        assert critical["name"] == "critical" and critical["slo_met"] and critical["violations"] == 0
+        assert bulk["count"] == 21  # the alert above was published to the bulk readings stream
+        await manager.stop()
+
+
+class TestIdempotentProcessing:
+    """Test duplicate suppression and commits gated on recorded idempotency keys."""
+    
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test every added key is found and unseen keys rarely are."""
+        from redaptive.streaming.idempotency import BloomFilter
+        
+        bloom = BloomFilter(capacity=1000, error_rate=0.001)
+        for i in range(1000):
+            bloom.add(f"meter_{i}")
+        assert all(f"meter_{i}" in bloom for i in range(1000))
+        assert sum(f"other_{i}" in bloom for i in range(1000)) < 10
+        assert bloom.full
+    
+    @pytest.mark.asyncio
+    async def test_keys_recorded_only_once_settled(self):
+        """Test applied keys are skipped locally and reach the store only after settling."""
+        from redaptive.streaming.idempotency import IdempotencyGuard, MemoryTTLStore, window_key
+        
+        store = MemoryTTLStore(ttl_seconds=60)
+        guard = IdempotencyGuard(store, ttl_seconds=60, bloom_capacity=1000)
+        assert await guard.claim(["a", "b", "a"], [10, 20, 10]) == [True, True, False]
+        assert await guard.claim(["b"]) == [False]
+        assert await guard.commit() == 0
+        
+        assert guard.settle_before(15) == 1
+        assert await guard.commit() == 1
+        assert len(store) == 1
+        # A window key settles by name once its window is written
+        assert await guard.claim([window_key("b", 60, 60, 60)]) == [True]
+        guard.settle([window_key("b", 60, 60, 60)])
+        assert await guard.commit() == 1
+        
+        fresh = IdempotencyGuard(store, ttl_seconds=60)
+        # "b" itself never reached the sinks, so a replay applies it again
+        assert await fresh.claim(["a", "b", window_key("b", 60, 60, 60)]) == [False, True, False]
+        assert guard.status()["duplicates_skipped"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_redelivered_readings_not_double_counted(self):
+        """Test republished readings are skipped before window aggregation."""
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.setup_energy_streams()
+        aggregates = []
+        
+        async def sink(closed):
+            aggregates.extend(closed)
+        
+        manager.enable_window_aggregation(sink=sink)
+        manager.enable_idempotency(ttl_seconds=60)
+        readings = TestMeterReadingBatch.make_readings(150)
+        await manager.publish_meter_readings(readings)
+        await manager.publish_meter_reading_batch(MeterReadingBatch.from_readings(readings[:10]))
+        await manager.publish_meter_readings(readings[:5])
+        await manager.start_consumer(manager.energy_streams["meter_readings"], "c1")
+        
+        status = lambda: manager.get_metrics()["idempotency"]
+        await TestMemoryBackend.wait_for(lambda: status()["duplicates_skipped"] == 15)
+        # Each reading and its 1-minute, 15-minute and hourly windows
+        assert status()["keys_claimed"] == 4 * 150
+        # Windows the watermark passed were recorded before the acks
+        await TestMemoryBackend.wait_for(lambda: status()["keys_committed"] > 0)
+        
+        await manager.flush_aggregates()
+        windowing = manager.window_aggregator.metrics
+        assert windowing["readings_aggregated"] + windowing["readings_late"] == 150
+        hourly = [a for a in aggregates if a.scope == "meter" and a.window_seconds == 3600]
+        assert sum(a.count for a in hourly) == windowing["readings_aggregated"]
+        await manager.stop()
+        assert status()["keys_applied"] == 0 and status()["keys_settled"] == 0
+    
+    @staticmethod
+    def rollup_table(table):
+        """Sink that merges windows into ``table`` additively, like ROLLUP_UPSERT_SQL."""
+        async def upsert(closed):
+            for a in closed:
+                row = table.setdefault((a.scope, a.entity_id, a.window_seconds, a.window_start), [0, 0.0])
+                row[0] += a.count
+                row[1] += a.sum
+        return upsert
+    
+    @pytest.mark.asyncio
+    async def test_crash_and_replay_do_not_double_count_rollups(self):
+        """Test messages stay unacknowledged until their windows are written, and a replay
+        after a crash adds each reading only to the windows that were not written."""
+        from redaptive.streaming.idempotency import MemoryTTLStore
+        
+        store = MemoryTTLStore(ttl_seconds=3600)
+        table = {}
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.setup_energy_streams()
+        manager.enable_window_aggregation(sink=self.rollup_table(table))
+        manager.enable_idempotency(ttl_seconds=3600, store=store)
+        stream = manager.energy_streams["meter_readings"]
+        await manager.publish_meter_readings(TestMeterReadingBatch.make_readings(10))
+        await manager.start_consumer(stream, "c1")
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 10)
+        # The 1-minute windows behind the watermark are written and recorded ...
+        await TestMemoryBackend.wait_for(lambda: len(store) > 0)
+        assert table and all(window_seconds == 60 for _, _, window_seconds, _ in table)
+        # ... but every message waits for its hourly window
+        assert (await manager.get_consumer_lag(stream))["pending"] == 10
+        assert manager.processor.get_metrics()["messages_held"] == 10
+        
+        # Crash: the consumer dies with the open windows, the stream survives
+        await manager.processor.stop_consumer(stream, "c1")
+        restarted = EnergyStreamManager(StreamBackend.MEMORY)
+        restarted.processor = manager.processor
+        await restarted.start()
+        restarted.enable_window_aggregation(sink=self.rollup_table(table))
+        restarted.enable_idempotency(ttl_seconds=3600, store=store)
+        assert (await restarted.replay(stream))["messages_replayed"] == 10
+        await restarted.flush_aggregates()
+        
+        meters = {key: row for key, row in table.items() if key[0] == "meter"}
+        assert [row[0] for key, row in meters.items() if key[2] == 60] == [1] * 10
+        for window_seconds in (60, 900, 3600):
+            rows = [row for key, row in meters.items() if key[2] == window_seconds]
+            assert sum(row[0] for row in rows) == 10
+            assert sum(row[1] for row in rows) == sum(i * 1.5 for i in range(10))
+        await restarted.stop()
+    
+    @pytest.mark.asyncio
+    async def test_failed_sink_write_is_retried_not_forgotten(self):
+        """Test windows a sink rejected are written with the next ones, once, and gate the acks meanwhile."""
+        from redaptive.streaming.concurrency import held_until
+        from redaptive.streaming.data_models import ProcessingResult
+        from redaptive.streaming.windowing import WindowSpec
+        
+        table = {}
+        upsert = self.rollup_table(table)
+        calls = []
+        
+        async def flaky(closed):
+            calls.append(len(closed))
+            if len(calls) == 1:
+                raise ConnectionError("database down")
+            await upsert(closed)
+        
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        manager.enable_window_aggregation(windows=[WindowSpec(60)], allowed_lateness_seconds=0, sink=flaky)
+        guard = manager.enable_idempotency()
+        results = []
+        for minute in range(3):
+            reading = TestMeterReadingBatch.make_readings(1)[0]
+            reading.timestamp += timedelta(minutes=minute)
+            results.append(await manager._process_meter_reading(StreamMessage(
+                message_id=f"m{minute}", message_type=MessageType.METER_READING, source="test",
+                timestamp=datetime.now(), payload=reading.to_dict()
+            )))
+            if minute == 1:
+                # The first window failed to write: nothing settles and its message stays held
+                assert guard.status()["keys_settled"] == 0
+                assert held_until(ProcessingResult(
+                    message_id="m0", status=ProcessingStatus.COMPLETED, processed_at=datetime.now(),
+                    processing_time_ms=0.0, result_data=results[0]
+                ), manager.processor.ack_gate) is not None
+        
+        assert calls == [2, 4]
+        assert sorted(row[0] for row in table.values()) == [1, 1, 1, 1]
+        assert guard.status()["keys_settled"] > 0
+        await manager.stop()
+        assert calls == [2, 4, 2]
+    
+    @pytest.mark.asyncio
+    async def test_failed_commit_hook_leaves_batch_pending(self):
+        """Test a batch is not acknowledged while its keys cannot be recorded."""
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.create_stream("alerts")
+        guard = manager.enable_idempotency()
+        guard.store.add_many = AsyncMock(side_effect=ConnectionError("store down"))
+        
+        for i in range(3):
+            await manager.publish_message("alerts", StreamMessage(
+                message_id=f"alert_{i}", message_type=MessageType.ALERT, source="test",
+                timestamp=datetime.now(), payload={"message": "breaker trip"}
+            ))
+        await manager.start_consumer("alerts", "c1")
+        await TestMemoryBackend.wait_for(lambda: guard.metrics["commit_failures"] > 0)
+        
+        lag = await manager.get_consumer_lag("alerts")
+        assert lag["pending"] == 3
+        assert guard.status()["keys_settled"] == 3
+        await manager.stop()
+    
+    @pytest.mark.asyncio
+    async def test_failed_processing_releases_claims(self):
+        """Test a reading or batch that fails after its claim is processed again on retry."""
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        guard = manager.enable_idempotency()
+        manager.meter_store = Mock()
+        manager.meter_store.append.side_effect = [OSError("disk full"), 1]
+        manager.meter_store.append_batch.side_effect = [OSError("disk full"), 3]
+        readings = TestMeterReadingBatch.make_readings(4)
+        
+        single = StreamMessage(
+            message_id="single", message_type=MessageType.METER_READING, source="test",
+            timestamp=datetime.now(), payload=readings[0].to_dict()
+        )
+        with pytest.raises(OSError):
+            await manager._process_meter_reading(single)
+        assert guard.status()["keys_applied"] == 0
+        assert (await manager._process_meter_reading(single))["status"] == "processed"
+        assert (await manager._process_meter_reading(single))["status"] == "duplicate"
+        
+        batch = StreamMessage(
+            message_id="batch", message_type=MessageType.METER_READING_BATCH, source="test",
+            timestamp=datetime.now(), payload=MeterReadingBatch.from_readings(readings).to_dict()
+        )
+        with pytest.raises(OSError):
+            await manager._process_meter_reading_batch(batch)
+        assert guard.status()["keys_applied"] == 0
+        result = await manager._process_meter_reading_batch(batch)
+        assert result["readings"] == 3 and result["duplicates"] == 1
+        await manager.stop()
+
+
+class TestStreamReplay:
+    """Test replaying stream ranges into processor sets outside the live consumer groups."""
+    
+    @pytest.mark.asyncio
+    async def test_replay_range_leaves_live_group_untouched(self):
+        """Test id and time ranges replay into their own processors while the live group stays settled."""
+        manager = EnergyStreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        await manager.setup_energy_streams()
+        stream = manager.energy_streams["meter_readings"]
+        ids = await manager.publish_meter_readings(TestMeterReadingBatch.make_readings(40))
+        await manager.start_consumer(stream, "live")
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 40)
+        
+        replayed = []
+        
+        async def rebuild(message):
+            replayed.append(message.payload["value"])
+        
+        processors = {MessageType.METER_READING.value: rebuild}
+        result = await manager.replay(stream, processors=processors, batch_size=7)
+        assert result["messages_replayed"] == 40 and result["batches"] == 6
+        
+        replayed.clear()
+        result = await manager.replay(stream, start=ids[10], end=ids[20], processors=processors)
+        assert (result["first_id"], result["last_id"]) == (ids[10], ids[19])
+        assert sorted(replayed) == [float(i) * 1.5 for i in range(10, 20)]
+        
+        result = await manager.replay(stream, start=datetime.now() + timedelta(seconds=5), processors=processors)
+        assert result["messages_read"] == 0
+        
+        assert manager.processor.metrics["messages_processed"] == 40
+        lag = await manager.get_consumer_lag(stream)
+        assert (lag["lag"], lag["pending"]) == (0, 0)
+        await manager.stop()
+    
+    @pytest.mark.asyncio
+    async def test_rate_limiter_paces_after_burst(self):
+        """Test the token bucket allows one second of burst, then paces at the rate."""
+        from redaptive.streaming.replay import RateLimiter
+        
+        limiter = RateLimiter(1000)
+        started = time.monotonic()
+        await limiter.acquire(1000)
+        assert time.monotonic() - started < 0.05
+        await limiter.acquire(200)
+        assert time.monotonic() - started >= 0.19
+    
+    @pytest.mark.asyncio
+    @patch('redaptive.streaming.kafka_client.AIOKafkaConsumer')
+    async def test_kafka_replay_reads_without_group(self, mock_consumer_class):
+        """Test a Kafka replay assigns partitions itself and stops at the end offsets."""
+        from redaptive.streaming.kafka_client import KafkaStreamProcessor, TopicPartition
+        
+        messages = TestBatchPublishing.make_messages(5)
+        records = [Mock(partition=0, offset=i, key=None, value=KafkaStreamProcessor._message_data(message))
+                   for i, message in enumerate(messages)]
+        tp = TopicPartition("readings", 0)
+        consumer = mock_consumer_class.return_value
+        consumer.start = AsyncMock()
+        consumer.stop = AsyncMock()
+        consumer.partitions_for_topic = Mock(return_value={0})
+        consumer.beginning_offsets = AsyncMock(return_value={tp: 0})
+        consumer.end_offsets = AsyncMock(return_value={tp: 5})
+        consumer.getmany = AsyncMock(return_value={tp: records[1:]})
+        consumer.position = AsyncMock(return_value=5)
+        
+        processor = KafkaStreamProcessor()
+        batches = [batch async for batch in processor.read_range("readings", start=1, end=4)]
+        
+        assert mock_consumer_class.call_args.kwargs["group_id"] is None
+        consumer.seek.assert_called_once_with(tp, 1)
+        assert [entry_id for entry_id, _ in batches[0]] == ["0-1", "0-2", "0-3"]
+        assert batches[0][0][1].message_id == messages[1].message_id
+        consumer.stop.assert_awaited_once()
+
+
+class TestStreamRetention:
+    """Test retention trimming that respects consumer groups and archives before deleting."""
+    
+    @pytest.mark.asyncio
+    async def test_trimmer_holds_back_for_consumer_group_and_archives(self):
+        """Test nothing a group still needs is trimmed, and trimmed entries reach the archive first."""
+        from redaptive.streaming.retention import StreamTrimmer
+        
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        config = StreamConfig(stream_name="readings", consumer_group="readings_processors", retention_seconds=0)
+        await manager.create_stream("readings", config)
+        await manager.publish_batch("readings", TestBatchPublishing.make_messages(40))
+        
+        archived = []
+        
+        async def archive(stream_name, entries):
+            archived.extend(message.message_id for _, message in entries)
+        
+        trimmer = StreamTrimmer(manager, archive=archive, batch_size=15)
+        later = datetime.now() + timedelta(seconds=1)
+        assert await trimmer.trim(config, now=later) == 0
+        
+        manager.register_processor(MessageType.METER_READING.value, AsyncMock())
+        await manager.start_consumer("readings", "worker")
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 40)
+        
+        assert await trimmer.trim(config, now=later) == 40
+        assert archived == [f"msg_{i}" for i in range(40)]
+        assert (await manager.get_stream_info("readings"))["length"] == 0
+        assert trimmer.metrics["entries_archived"] == 40
+        
+        await manager.publish_batch("readings", TestBatchPublishing.make_messages(5))
+        await TestMemoryBackend.wait_for(lambda: manager.processor.metrics["messages_processed"] == 45)
+        await manager.stop()
+    
+    @pytest.mark.asyncio
+    async def test_archive_failure_stops_trim(self):
+        """Test a failed archive call leaves its batch and everything after it in the stream."""
+        from redaptive.streaming.retention import StreamTrimmer
+        
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        config = StreamConfig(stream_name="readings", consumer_group=None, retention_seconds=0)
+        await manager.create_stream("readings", config)
+        await manager.publish_batch("readings", TestBatchPublishing.make_messages(30))
+        
+        archive = AsyncMock(side_effect=[None, ConnectionError("database down")])
+        trimmer = StreamTrimmer(manager, archive=archive, batch_size=10)
+        
+        assert await trimmer.trim(config, now=datetime.now() + timedelta(seconds=1)) == 10
+        assert (await manager.get_stream_info("readings"))["length"] == 20
+        assert trimmer.metrics["archive_failures"] == 1
+        await manager.stop()
+    
+    @pytest.mark.asyncio
+    async def test_redis_floor_and_minid_trim(self):
+        """Test the Redis floor is the oldest pending or next undelivered entry across groups."""
+        from redaptive.streaming.redis_client import RedisStreamProcessor
+        
+        processor = RedisStreamProcessor()
+        processor.redis_client = Mock()
+        processor.redis_client.xinfo_groups = AsyncMock(return_value=[
+            {"name": "live", "last-delivered-id": "1700-4"},
+            {"name": "audit", "last-delivered-id": "1500-2"}
+        ])
+        processor.redis_client.xpending = AsyncMock(side_effect=[
+            {"pending": 2, "min": "1600-0", "max": "1700-4", "consumers": []},
+            {"pending": 0, "min": None, "max": None, "consumers": []}
+        ])
+        processor.redis_client.xtrim = AsyncMock(return_value=12)
+        
+        assert await processor.retention_floor("readings") == "1500-3"
+        assert await processor.trim_stream("readings", "1500-3") == 12
+        processor.redis_client.xtrim.assert_awaited_once_with("readings", minid="1500-3", approximate=True)
+
+
+class TestMeterSeriesStoreSink:
+    """Test consumed meter readings are appended to the memory-mapped series store."""
+    
+    @pytest.mark.asyncio
+    async def test_readings_and_batches_appended_for_readers(self, tmp_path):
+        """Test single readings and batches land in the store, and replays are not appended twice."""
+        pytest.importorskip("numpy")
+        from redaptive.tools.timeseries_store import MeterSeriesStore
+        
+        manager = StreamManager(StreamBackend.MEMORY)
+        await manager.start()
+        manager.enable_meter_store(str(tmp_path))
+        readings = TestMeterReadingBatch.make_readings(9)
+        
+        await manager._process_meter_reading(StreamMessage(
+            message_id="single", message_type=MessageType.METER_READING, source="test",
+            timestamp=datetime.now(), payload=readings[0].to_dict()
+        ))
+        batch_message = StreamMessage(
+            message_id="batch", message_type=MessageType.METER_READING_BATCH, source="test",
+            timestamp=datetime.now(), payload=MeterReadingBatch.from_readings(readings).to_dict()
+        )
+        await manager._process_meter_reading_batch(batch_message)
+        await manager._process_meter_reading_batch(batch_message)
+        
+        reader = MeterSeriesStore(str(tmp_path), readonly=True)
+        assert reader.meters() == ["meter_0", "meter_1", "meter_2"]
+        window = reader.window("meter_0", start=datetime(2024, 1, 1, 12, 1))
+        assert window.columns["value"].tolist() == [4.5, 9.0]
+        assert window.columns["quality_score"].tolist() == [0.9, 0.9]
+        assert manager.get_metrics()["meter_store"]["points_appended"] == 9
+        assert manager.get_metrics()["meter_store"]["points_dropped"] == 10
+        await manager.stop()
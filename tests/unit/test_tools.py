@@ -2,6 +2,7 @@
 Test shared tools functionality.
 """
 
+import os
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 
@@ -139,4 +140,194 @@ class TestDataProcessor:
         
         assert result['simple_payback'] == float('inf')
         assert result['roi_percentage'] == 0.0
-        assert result['net_benefit'] == -0
\ No newline at end of file
+        assert result['net_benefit'] == -0
+
+class TestParquetArchive:
+    """Test the day- and building-partitioned Parquet history archive."""
+    
+    @staticmethod
+    def write_days(archive, first_day, days, buildings=2, meters=2):
+        """15-minute readings at 1 kWh, 2 kWh from 14:00 to 15:00, 40°F, with a demand spike at 15:00."""
+        from datetime import datetime, timedelta
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            rows = []
+            for building in range(buildings):
+                for meter in range(meters):
+                    for quarter in range(96):
+                        rows.append({
+                            "meter_id": f"M-{building}-{meter}",
+                            "building_id": f"BLDG-{building}",
+                            "reading_date": datetime.combine(day, datetime.min.time()) + timedelta(minutes=15 * quarter),
+                            "energy_type": "electricity",
+                            "energy_consumption": 2.0 if quarter // 4 == 14 else 1.0,
+                            "demand_kw": 5.0 if quarter == 60 else 4.0,
+                            "weather_temp_f": 40.0,
+                            "occupancy_percentage": 80
+                        })
+            archive.write_day(day, rows)
+    
+    def test_write_query_and_replace_day(self, tmp_path):
+        """Test partition-pruned queries, complete-month bounds and re-exporting a day."""
+        pytest.importorskip("pyarrow")
+        from datetime import date, datetime
+        from redaptive.tools.parquet_archive import ParquetArchive
+        
+        archive = ParquetArchive(str(tmp_path))
+        self.write_days(archive, date(2024, 1, 15), 50)
+        assert archive.archived_through() == date(2024, 3, 4)
+        assert archive.complete_months() == (date(2024, 2, 1), date(2024, 3, 1))
+        
+        table = archive.query(datetime(2024, 1, 20, 6), datetime(2024, 1, 20, 7), building_ids=["BLDG-0"])
+        assert table.num_rows == 8
+        assert set(table["meter_id"].to_pylist()) == {"M-0-0", "M-0-1"}
+        assert archive.query(date(2024, 1, 20), date(2024, 1, 21), meter_ids=["M-1-1"]).num_rows == 96
+        
+        assert archive.write_day(date(2024, 1, 20), []) == 0
+        assert archive.query(date(2024, 1, 20), date(2024, 1, 21)).num_rows == 0
+        assert not [name for name in tmp_path.iterdir() if name.name.startswith(".")]
+    
+    def test_monthly_rollups_and_usage_profiles(self, tmp_path):
+        """Test monthly rollups match the SQL rollup format and profiles find the daily peak."""
+        pytest.importorskip("pyarrow")
+        from datetime import date, datetime
+        from redaptive.tools.parquet_archive import ParquetArchive
+        
+        archive = ParquetArchive(str(tmp_path))
+        self.write_days(archive, date(2024, 1, 1), 60)
+        
+        rows = archive.monthly_rollups(["BLDG-1"], date(2024, 1, 1), date(2024, 3, 1))
+        assert [(row["month"], row["consumption"]) for row in rows] == [
+            (datetime(2024, 1, 1), 31 * 200.0), (datetime(2024, 2, 1), 29 * 200.0)
+        ]
+        assert rows[0]["hdd"] == 31 * 25.0 and rows[0]["cdd"] == 0.0 and rows[0]["occupancy"] == 80.0
+        
+        profiles = archive.usage_profiles(datetime(2024, 1, 1), datetime(2024, 2, 1), building_ids=["BLDG-0"])
+        assert profiles["daily_profile"]["peak_load"] == 16.0 and profiles["daily_profile"]["base_load"] == 8.0
+        assert "14:00" in profiles["daily_profile"]["peak_hours"]
+        assert profiles["weekly_profile"]["days_analyzed"] == 31
+        assert profiles["peak_demand"]["max_demand_kw"] == 10.0
+        assert profiles["peak_demand"]["coincident_peak"] == "15:00"
+        assert archive.usage_profiles(datetime(2023, 1, 1), datetime(2023, 2, 1)) == {}
+    
+    @pytest.mark.asyncio
+    async def test_monitoring_agent_uses_archive(self, tmp_path):
+        """Test analyze_usage_patterns reads a building's profiles from the archive."""
+        pytest.importorskip("pyarrow")
+        from datetime import date
+        from redaptive.agents.energy import EnergyMonitoringAgent
+        from redaptive.tools.parquet_archive import ParquetArchive
+        
+        archive = ParquetArchive(str(tmp_path))
+        self.write_days(archive, date(2024, 1, 1), 7)
+        agent = EnergyMonitoringAgent(history_archive=archive)
+        
+        result = await agent.analyze_usage_patterns(
+            "building", "BLDG-0", time_range={"start_date": "2024-01-01", "end_date": "2024-01-07"}
+        )
+        assert result["status"] == "success"
+        assert result["data_source"] == "history_archive"
+        assert result["pattern_analysis"]["peak_demand"]["max_demand_kw"] == 10.0
+
+
+class TestMeterSeriesStore:
+    """Test the memory-mapped per-meter series store."""
+    
+    def test_append_window_and_shared_readers(self, tmp_path):
+        """Test windows are read-only views that a second, read-only store sees appends through."""
+        np = pytest.importorskip("numpy")
+        from datetime import datetime, timedelta
+        from redaptive.tools.timeseries_store import MeterSeriesStore
+        
+        writer = MeterSeriesStore(str(tmp_path), columns=("power_kw", "temperature"))
+        reader = MeterSeriesStore(str(tmp_path), readonly=True)
+        start = datetime(2024, 1, 1)
+        times = [start + timedelta(minutes=15 * i) for i in range(8)]
+        
+        assert writer.append("site/M-1", times, {"power_kw": [float(i) for i in range(8)]}) == 8
+        window = reader.window("site/M-1", start=times[2], end=times[5])
+        assert window.columns["power_kw"].tolist() == [2.0, 3.0, 4.0]
+        assert np.isnan(window.columns["temperature"]).all()
+        assert not window.columns["power_kw"].flags.writeable
+        assert np.shares_memory(window.columns["power_kw"], reader.latest("site/M-1", 6).columns["power_kw"])
+        
+        # Out-of-order and replayed readings are dropped, unsorted new ones sorted
+        later = [times[-1] + timedelta(minutes=30), times[3], times[-1] + timedelta(minutes=15)]
+        assert writer.append("site/M-1", later, {"power_kw": [10.0, 99.0, 9.0]}) == 2
+        assert reader.latest("site/M-1", 3).columns["power_kw"].tolist() == [7.0, 9.0, 10.0]
+        assert reader.meters() == ["site/M-1"] and reader.window("M-2").timestamps.size == 0
+        with pytest.raises(PermissionError):
+            reader.append("site/M-1", [start], {})
+        with pytest.raises(ValueError):
+            MeterSeriesStore(str(tmp_path), columns=("value",))
+    
+    def test_growth_and_compaction_keep_old_views(self, tmp_path):
+        """Test files grow, then compact to the newest points, while earlier views stay readable."""
+        pytest.importorskip("numpy")
+        from redaptive.tools.timeseries_store import MeterSeriesStore
+        
+        writer = MeterSeriesStore(str(tmp_path), columns=("value",), initial_capacity=4, max_points=16)
+        reader = MeterSeriesStore(str(tmp_path), readonly=True)
+        writer.append_batch(["M-1", "M-2"], [0, 1, 0, 1], [1, 1, 2, 2], {"value": [1.0, 10.0, 2.0, 20.0]})
+        early = reader.window("M-1")
+        
+        for micros in range(3, 41):
+            writer.append("M-1", [micros], {"value": [float(micros)]})
+        assert writer.metrics["files_grown"] == 2 and writer.metrics["files_compacted"] > 0
+        assert early.columns["value"].tolist() == [1.0, 2.0]
+        
+        recent = reader.window("M-1")
+        assert len(recent) <= 16 and recent.timestamps[-1] == 40
+        assert (recent.columns["value"] == recent.timestamps).all()
+        assert reader.latest("M-2", 5).columns["value"].tolist() == [10.0, 20.0]
+    
+    def test_more_meters_than_the_descriptor_limit(self, tmp_path):
+        """Test mappings are evicted least recently used so appends never run out of descriptors."""
+        pytest.importorskip("numpy")
+        resource = pytest.importorskip("resource")
+        if not os.path.isdir("/proc/self/fd"):
+            pytest.skip("needs /proc to count open descriptors")
+        from redaptive.tools.timeseries_store import MeterSeriesStore
+        
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        limit = len(os.listdir("/proc/self/fd")) + 64
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        try:
+            writer = MeterSeriesStore(str(tmp_path), columns=("value",), initial_capacity=4, max_open_files=16)
+            reader = MeterSeriesStore(str(tmp_path), readonly=True, max_open_files=16)
+            meters = [f"M-{n}" for n in range(limit + 100)]
+            writer.append_batch(meters, list(range(len(meters))), [1] * len(meters), {"value": [1.0] * len(meters)})
+            for n, meter_id in enumerate(meters):
+                writer.append(meter_id, [2], {"value": [float(n)]})
+            assert sum(reader.latest(meter_id, 1).columns["value"][0] == n for n, meter_id in enumerate(meters)) == len(meters)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        assert writer.status()["open_mappings"] == 16
+        assert writer.metrics["mappings_evicted"] >= len(meters) - 16
+    
+    @pytest.mark.asyncio
+    async def test_monitoring_agent_uses_store(self, tmp_path):
+        """Test the monitoring agent keeps readings in the store and analyses windows from it."""
+        pytest.importorskip("numpy")
+        from datetime import datetime, timedelta
+        from redaptive.agents.energy import EnergyMonitoringAgent
+        from redaptive.agents.energy.monitoring import METER_STORE_COLUMNS
+        from redaptive.tools.timeseries_store import MeterSeriesStore
+        
+        store = MeterSeriesStore(str(tmp_path), columns=METER_STORE_COLUMNS)
+        agent = EnergyMonitoringAgent(meter_store=store)
+        start = datetime.now() - timedelta(minutes=100)
+        readings = [
+            {"meter_id": "M-1", "timestamp": (start + timedelta(minutes=5 * i)).isoformat(),
+             "energy_kwh": 1.0, "power_kw": 50.0 if i == 19 else 10.0 + i % 2}
+            for i in range(20)
+        ]
+        
+        result = await agent.process_meter_data(readings)
+        assert result["processed_readings"] == 20 and agent.meter_data_cache == {}
+        assert result["details"]["anomalies"][0]["type"] == "consumption_spike"
+        
+        analysis = await agent.detect_anomalies("M-1", analysis_window=2)
+        assert analysis["data_points_analyzed"] == 20
+        assert analysis["analysis_summary"]["peak_power"] == 50.0
+        assert (await agent.detect_anomalies("M-2"))["status"] == "error"